@@ -0,0 +1,311 @@
+"""并发负载测试
+
+在本地模拟服务（benchmarks/simulator.py）上并发调用文生视频 / 图生视频工具，报告：
+  - 吞吐量（每秒完成的任务数）
+  - 出结果耗时（从调用到拿到视频 URL）的 p50 / p90 / p99 / 最大值
+  - 每个任务的请求数（按创建、查询、上传等接口分开统计，包括注入的 429 和 503）
+  - 工作线程利用率（调用占用工作线程的时间比例）、引擎同时监视的任务数峰值、进程 CPU 利用率
+
+工具按插件运行时的方式调用（_invoke 生成器），请求经由共享的 HTTP 客户端和 asyncio 轮询引擎。
+time_scale 同时加快模拟服务的时间和轮询调度器的间隔，几分钟的渲染可以在几秒内跑完。
+
+用法（在插件目录下运行）:
+    python benchmarks/load_test.py --tasks 200 --concurrency 200 --time-scale 20 \\
+        --queue-delay 5:60 --rate-limit-rate 0.02 --latency lognormal:0.05:0.5
+
+不指定 --url 时自动启动一个模拟服务进程。
+"""
+
+# 导入 SDK 时会 gevent monkey patch 并移除 select.epoll；httpcore 在装有 trio 的环境中
+# 会在创建异步客户端时导入 trio（需要 epoll），所以要在 SDK 之前导入
+import httpcore  # noqa: F401
+import dify_plugin  # noqa: F401
+
+import argparse
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from urllib.request import Request, urlopen
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.simulator import add_config_arguments  # noqa: E402
+
+TOOLS = ("text", "image", "mixed")
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """最近秩法的百分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered), max(1, math.ceil(fraction * len(ordered)))) - 1
+    return ordered[index]
+
+
+def _sim_request(url: str, path: str, method: str = "GET") -> Dict[str, Any]:
+    request = Request(f"{url}{path}", method=method, data=b"" if method == "POST" else None)
+    with urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def start_simulator(args: List[str]) -> "tuple[subprocess.Popen, str]":
+    """启动模拟服务进程，返回 (进程, 地址)"""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "simulator.py"), "--port", "0", *args],
+        stdout=subprocess.PIPE, text=True
+    )
+    line = process.stdout.readline().strip()
+    if " on " not in line:
+        process.kill()
+        raise RuntimeError(f"模拟服务启动失败: {line}")
+    return process, line.rsplit(" ", 1)[-1]
+
+
+class _Backends:
+    """让工具请求模拟服务：临时替换后端的默认地址"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self._saved: Dict[type, str] = {}
+
+    def __enter__(self):
+        from utils.backends import JuxinBackend, ZhenzhenBackend
+
+        for cls in (ZhenzhenBackend, JuxinBackend):
+            self._saved[cls] = cls.default_base_url
+            cls.default_base_url = self.url
+        return self
+
+    def __exit__(self, *exc_info):
+        for cls, value in self._saved.items():
+            cls.default_base_url = value
+
+
+class _ScaledScheduler:
+    """按 time_scale 缩短轮询调度器的间隔和预估渲染耗时"""
+
+    def __init__(self, time_scale: float):
+        self.time_scale = time_scale
+        self._saved = None
+
+    def __enter__(self):
+        from utils import async_engine
+        from utils.polling import PollScheduler
+
+        time_scale = self.time_scale
+
+        class ScaledPollScheduler(PollScheduler):
+            def __init__(self, **kwargs):
+                super().__init__(**kwargs)
+                self.min_interval /= time_scale
+                self.max_interval /= time_scale
+                self.queue_interval /= time_scale
+                self.expected_seconds /= time_scale
+
+        self._saved = async_engine.PollScheduler
+        async_engine.PollScheduler = ScaledPollScheduler
+        return self
+
+    def __exit__(self, *exc_info):
+        from utils import async_engine
+
+        async_engine.PollScheduler = self._saved
+
+
+def _run_one(tool_cls, credentials: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+    """调用一次工具直到结束，记录各阶段耗时"""
+    from dify_plugin.entities.tool import ToolRuntime
+
+    tool = tool_cls(ToolRuntime(credentials=credentials, user_id=None, session_id=None), None)
+    start = time.perf_counter()
+    record: Dict[str, Any] = {"status": "error", "submitted": None, "error": ""}
+    try:
+        for message in tool._invoke(params):
+            data = getattr(message.message, "json_object", None)
+            if not isinstance(data, dict):
+                record["error"] = getattr(message.message, "text", "")
+                continue
+            if data.get("status") == "pending" and record["submitted"] is None:
+                record["submitted"] = time.perf_counter() - start
+            if data.get("status") in ("completed", "failed", "timeout"):
+                record["status"] = data["status"]
+                record["error"] = data.get("error", "")
+    except Exception as e:
+        record["error"] = str(e)
+    record["start"] = start
+    record["seconds"] = time.perf_counter() - start
+    return record
+
+
+def run_load(
+    url: str,
+    tasks: int = 200,
+    concurrency: int = 200,
+    tool: str = "text",
+    backend: str = "zhenzhen",
+    time_scale: float = 1.0,
+    model: str = "sora-2"
+) -> Dict[str, Any]:
+    """对 url 上的模拟服务运行负载测试，返回统计结果"""
+    from tools.image_to_video import ImageToVideoTool
+    from tools.text_to_video import TextToVideoTool
+    from utils.async_engine import get_engine
+
+    credentials = {"api_key": "sim-zhenzhen"} if backend in ("zhenzhen", "both") else {}
+    if backend in ("juxin", "both"):
+        credentials["juxin_api_key"] = "sim-juxin"
+
+    jobs = []
+    for index in range(tasks):
+        kind = tool if tool != "mixed" else ("text", "image")[index % 2]
+        # 提示词各不相同，避免结果缓存把请求合并成一个任务
+        params = {"prompt": f"load test #{index}", "model": model, "duration": "10", "aspect_ratio": "16:9"}
+        if kind == "image":
+            params["images"] = f"{url}/files/reference_{index}.png"
+            jobs.append((ImageToVideoTool, params))
+        else:
+            jobs.append((TextToVideoTool, params))
+
+    _sim_request(url, "/_sim/reset", "POST")
+    engine = get_engine()
+    peak = {"in_flight": 0}
+    done = threading.Event()
+
+    def monitor():
+        while not done.wait(0.05):
+            peak["in_flight"] = max(peak["in_flight"], engine.in_flight)
+
+    with _Backends(url), _ScaledScheduler(time_scale):
+        watcher = threading.Thread(target=monitor, daemon=True)
+        watcher.start()
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            records = list(executor.map(lambda job: _run_one(job[0], credentials, job[1]), jobs))
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        done.set()
+        watcher.join()
+
+    stats = _sim_request(url, "/_sim/stats")
+    completed = [record for record in records if record["status"] == "completed"]
+    statuses: Dict[str, int] = {}
+    for record in records:
+        statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+    latencies = [record["seconds"] for record in completed]
+    submits = [record["submitted"] for record in records if record["submitted"] is not None]
+    requests_total = sum(stats["requests"].values())
+
+    def summary(values: List[float]) -> Dict[str, Optional[float]]:
+        return {
+            "p50": percentile(values, 0.5),
+            "p90": percentile(values, 0.9),
+            "p99": percentile(values, 0.99),
+            "max": max(values) if values else None,
+            "mean": statistics.fmean(values) if values else None
+        }
+
+    return {
+        "tasks": tasks,
+        "concurrency": concurrency,
+        "tool": tool,
+        "backend": backend,
+        "time_scale": time_scale,
+        "wall_seconds": wall,
+        "statuses": statuses,
+        "errors": sorted({record["error"] for record in records if record["status"] != "completed" and record["error"]})[:5],
+        "throughput_per_second": len(completed) / wall if wall else 0.0,
+        "time_to_result": summary(latencies),
+        # 换算为模拟时间，可以直接和真实平台上的耗时比较
+        "time_to_result_simulated": {
+            key: value * time_scale if value is not None else None for key, value in summary(latencies).items()
+        },
+        "time_to_submit": summary(submits),
+        "requests": stats["requests"],
+        "requests_per_task": requests_total / tasks if tasks else 0.0,
+        "queries_per_task": stats["requests"].get("query", 0) / tasks if tasks else 0.0,
+        "rate_limited": stats["rate_limited"],
+        "injected_errors": stats["errors"],
+        "worker_utilization": sum(record["seconds"] for record in records) / (concurrency * wall) if wall else 0.0,
+        "engine_peak_in_flight": peak["in_flight"],
+        "cpu_utilization": cpu / wall if wall else 0.0
+    }
+
+
+def _format(report: Dict[str, Any]) -> str:
+    def seconds(value: Optional[float]) -> str:
+        return "-" if value is None else f"{value:.2f}s"
+
+    lines = [
+        f"{report['tasks']} tasks ({report['tool']}, {report['backend']}), concurrency {report['concurrency']}, "
+        f"time scale {report['time_scale']:g}",
+        f"  wall time        {report['wall_seconds']:.2f}s",
+        f"  statuses         {report['statuses']}",
+        f"  throughput       {report['throughput_per_second']:.2f} tasks/s",
+    ]
+    for label, key in (("time to result", "time_to_result"), ("  (simulated)", "time_to_result_simulated"),
+                       ("time to submit", "time_to_submit")):
+        values = report[key]
+        lines.append(f"  {label:<16} p50 {seconds(values['p50'])}  p90 {seconds(values['p90'])}  "
+                     f"p99 {seconds(values['p99'])}  max {seconds(values['max'])}")
+    lines += [
+        f"  requests/task    {report['requests_per_task']:.2f} (queries {report['queries_per_task']:.2f}) "
+        f"{report['requests']}",
+        f"  injected         {report['rate_limited']} x 429, {report['injected_errors']} x 503",
+        f"  worker util      {report['worker_utilization']:.0%}",
+        f"  engine peak      {report['engine_peak_in_flight']} tasks in flight",
+        f"  cpu util         {report['cpu_utilization']:.0%}",
+    ]
+    for error in report["errors"]:
+        lines.append(f"  error: {error}")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="在本地模拟服务上并发调用视频工具")
+    parser.add_argument("--url", help="已运行的模拟服务地址（不指定时自动启动）")
+    parser.add_argument("--tasks", type=int, default=200, help="任务总数")
+    parser.add_argument("--concurrency", type=int, default=200, help="同时进行的工具调用数")
+    parser.add_argument("--tool", choices=TOOLS, default="text", help="调用的工具（mixed 为文生视频和图生视频各半）")
+    parser.add_argument("--backend", choices=("zhenzhen", "juxin", "both"), default="zhenzhen", help="配置的平台")
+    parser.add_argument("--model", default="sora-2")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    # 本地状态（任务登记表、上传缓存）放在临时目录，不在导入时预热真实平台的连接
+    os.environ.setdefault("SORA2_PLUGIN_DATA_DIR", tempfile.mkdtemp(prefix="sora2-load-"))
+    os.environ.setdefault("SORA2_HTTP_WARMUP", "0")
+
+    process = None
+    url = args.url
+    if not url:
+        simulator_args = []
+        for name in ("queue_delay", "render_seconds", "curve", "failure_rate", "error_rate",
+                     "rate_limit_rate", "latency", "time_scale", "seed"):
+            value = getattr(args, name)
+            if value is not None:
+                simulator_args += [f"--{name.replace('_', '-')}", str(value)]
+        process, url = start_simulator(simulator_args)
+    try:
+        report = run_load(url, args.tasks, args.concurrency, args.tool, args.backend, args.time_scale, args.model)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    print(json.dumps(report, ensure_ascii=False, indent=2) if args.json else _format(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,430 @@
+"""每次调用的插件自身开销微基准
+
+网络替换为进程内的桩（httpx.MockTransport），只测插件代码的开销：
+
+  build_params    从工具参数构建请求参数
+  parse_zhenzhen  解析贞贞的查询响应
+  parse_juxin     解析聚鑫的查询响应
+  query_task      引擎 query_task 一次查询（请求构建、熔断器、重试、JSON 解码、状态解析）
+  json_message    create_json_message 创建一条结果消息
+  poll_iteration  引擎轮询一个任务的每次查询（查询、解析、登记表更新、调度、事件分发）
+  invocation      文生视频工具一次完整调用（缓存键、提交、3 次查询、结果缓存、消息）
+
+每项报告每次操作的 CPU 时间（多轮取最小值）和峰值内存（tracemalloc，单次操作期间新分配的峰值）。
+CPU 时间换算为校准操作（固定的 JSON 解码和字典处理）的倍数后与 benchmarks/baselines.json 比较，
+机器快慢不影响结果；超出基准加容差时退出码为 1。
+
+用法（在插件目录下运行）:
+    python benchmarks/micro.py                  # 运行并与基准比较
+    python benchmarks/micro.py --update         # 以本次结果更新基准
+    python benchmarks/micro.py --quick --json   # 减少迭代次数，以 JSON 输出
+"""
+
+# 异步引擎创建 httpx 客户端时会导入 httpcore，见 load_test.py
+import httpcore  # noqa: F401
+import dify_plugin  # noqa: F401
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+BASELINES_PATH = os.path.join(ROOT, "benchmarks", "baselines.json")
+
+# 默认容差：CPU 倍数允许超出 50%，峰值内存允许超出 25%（另加 MEMORY_SLACK 字节，避免小对象的抖动）
+DEFAULT_TOLERANCE = {"cpu": 0.5, "memory": 0.25}
+MEMORY_SLACK = 512
+
+# 每块校准操作的次数（约几毫秒）
+CALIBRATION_ITERATIONS = 200
+
+# 引擎基准中每个任务的查询次数
+POLLS_PER_TASK = 10
+
+# query_task 基准每次操作在事件循环中连续查询的次数（分摊跨线程提交协程的开销）
+QUERIES_PER_OP = 20
+
+TOOL_PARAMETERS = {"prompt": "一只可爱的橙猫在草地上奔跑", "model": "sora-2", "duration": "10", "aspect_ratio": "16:9"}
+
+ZHENZHEN_RESPONSE = {
+    "task_id": "task_01k6x15vhrff09dkkqjrzwhm60",
+    "status": "IN_PROGRESS",
+    "progress": "45%",
+    "fail_reason": "",
+    "submit_time": 1759650000,
+    "start_time": 1759650012,
+    "detail": {"pending_info": {"progress_pct": 0.45, "progress_pos_in_queue": None}},
+    "thumbnail_url": "https://example.com/thumbnails/task_01k6x15vhrff09dkkqjrzwhm60.webp",
+    "enhanced_prompt": "A cute orange cat running across a sunlit meadow, cinematic, shallow depth of field"
+}
+
+JUXIN_RESPONSE = {
+    "id": "sora-2:task_01k6x15vhrff09dkkqjrzwhm60",
+    "status": "processing",
+    "detail": {
+        "id": "task_01k6x15vhrff09dkkqjrzwhm60",
+        "status": "processing",
+        "pending_info": {"progress_pct": 0.45, "progress_pos_in_queue": 0}
+    },
+    "thumbnail_url": "https://example.com/thumbnails/task_01k6x15vhrff09dkkqjrzwhm60.webp"
+}
+
+COMPLETED_MESSAGE = {
+    "task_id": "task_01k6x15vhrff09dkkqjrzwhm60",
+    "status": "completed",
+    "video_url": "https://example.com/videos/task_01k6x15vhrff09dkkqjrzwhm60.mp4",
+    "duration": "10",
+    "polls": 12,
+    "thumbnail_url": "https://example.com/thumbnails/task_01k6x15vhrff09dkkqjrzwhm60.webp",
+    "enhanced_prompt": "A cute orange cat running across a sunlit meadow"
+}
+
+_CALIBRATION_BODY = json.dumps([ZHENZHEN_RESPONSE, JUXIN_RESPONSE, COMPLETED_MESSAGE])
+
+
+def _calibrate() -> Any:
+    """校准操作：与插件热路径同类的纯 Python 工作（JSON 解码、字典遍历和构建）"""
+    items = json.loads(_CALIBRATION_BODY)
+    return [{key: str(value) for key, value in item.items() if value is not None} for item in items]
+
+
+class Benchmark:
+    """一项基准：setup 是产出单次操作（无参可调用对象）的上下文管理器"""
+
+    def __init__(self, name: str, setup: Callable[[], Any], iterations: int, per: int = 1):
+        self.name = name
+        self.setup = setup
+        # 每块运行的次数
+        self.iterations = iterations
+        # 一次操作包含的计量单位数（引擎基准一次操作轮询 POLLS_PER_TASK 次）
+        self.per = per
+
+
+BENCHMARKS: Dict[str, Benchmark] = {}
+
+
+def benchmark(name: str, iterations: int, per: int = 1):
+    def register(setup):
+        BENCHMARKS[name] = Benchmark(name, contextlib.contextmanager(setup), iterations, per)
+        return setup
+    return register
+
+
+def _tool(tool_cls):
+    from dify_plugin.entities.tool import ToolRuntime
+
+    runtime = ToolRuntime(credentials={"api_key": "bench-key"}, user_id=None, session_id=None)
+    return tool_cls(runtime, None)
+
+
+def _instant_scheduler(**kwargs):
+    from utils.polling import PollScheduler
+
+    return PollScheduler(min_interval=0, max_interval=0, queue_interval=0, **kwargs)
+
+
+def _engine(handler):
+    """由进程内 handler 应答的引擎，登记表在临时目录中，完成耗时历史在内存中"""
+    import httpx
+    from utils.async_engine import AsyncPollEngine
+    from utils.backends import BackendRouter
+    from utils.circuit_breaker import CircuitBreakers
+    from utils.latency_history import LatencyHistory
+    from utils.retry import RetryPolicy
+    from utils.task_registry import TaskRegistry
+
+    return AsyncPollEngine(
+        client_factory=lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        registry=TaskRegistry(os.path.join(tempfile.mkdtemp(prefix="sora2-bench-"), "tasks.db")),
+        router=BackendRouter(),
+        breakers=CircuitBreakers(),
+        retry_policy=RetryPolicy(base_delay=0),
+        latency=LatencyHistory(":memory:")
+    )
+
+
+def _zhenzhen_handler(polls: int):
+    """贞贞接口的桩：创建任务，每个任务查询 polls 次后完成"""
+    import httpx
+
+    counter = itertools.count()
+    queries: Dict[str, int] = {}
+
+    def handler(request: "httpx.Request") -> "httpx.Response":
+        if request.method == "POST":
+            return httpx.Response(200, json={"task_id": f"task_bench{next(counter):08d}"})
+        task_id = request.url.path.rsplit("/", 1)[-1]
+        count = queries[task_id] = queries.get(task_id, 0) + 1
+        if count >= polls:
+            del queries[task_id]
+            return httpx.Response(200, json={
+                **ZHENZHEN_RESPONSE, "task_id": task_id, "status": "SUCCESS", "progress": "100%",
+                "data": {"output": f"https://example.com/videos/{task_id}.mp4"}
+            })
+        return httpx.Response(200, json={
+            **ZHENZHEN_RESPONSE, "task_id": task_id, "progress": f"{count * 100 // polls}%"
+        })
+
+    return handler
+
+
+@benchmark("build_params", iterations=2000)
+def _build_params() -> Iterator[Callable[[], Any]]:
+    from tools.text_to_video import TextToVideoTool
+
+    tool = _tool(TextToVideoTool)
+    yield lambda: tool._build_params(TOOL_PARAMETERS)
+
+
+@benchmark("parse_zhenzhen", iterations=2000)
+def _parse_zhenzhen() -> Iterator[Callable[[], Any]]:
+    from utils.async_engine import parse_task_response
+
+    yield lambda: parse_task_response(ZHENZHEN_RESPONSE)
+
+
+@benchmark("parse_juxin", iterations=2000)
+def _parse_juxin() -> Iterator[Callable[[], Any]]:
+    from utils.backends import JuxinBackend
+
+    backend = JuxinBackend("bench-key")
+    yield lambda: backend.parse_status(JUXIN_RESPONSE)
+
+
+@benchmark("query_task", iterations=25, per=QUERIES_PER_OP)
+def _query_task() -> Iterator[Callable[[], Any]]:
+    import asyncio
+    import httpx
+    from utils.backends import ZhenzhenBackend
+
+    body = json.dumps(ZHENZHEN_RESPONSE).encode("utf-8")
+    engine = _engine(lambda request: httpx.Response(200, content=body))
+    backend = ZhenzhenBackend("bench-key")
+    loop = engine._ensure_started()
+
+    async def queries():
+        for _ in range(QUERIES_PER_OP):
+            status = await engine.query_task(backend, ZHENZHEN_RESPONSE["task_id"])
+        return status
+
+    def op():
+        status = asyncio.run_coroutine_threadsafe(queries(), loop).result()
+        assert status.status == "IN_PROGRESS", status
+
+    try:
+        yield op
+    finally:
+        engine.shutdown()
+
+
+@benchmark("json_message", iterations=500)
+def _json_message() -> Iterator[Callable[[], Any]]:
+    from tools.text_to_video import TextToVideoTool
+
+    tool = _tool(TextToVideoTool)
+    yield lambda: tool.create_json_message(COMPLETED_MESSAGE)
+
+
+@benchmark("poll_iteration", iterations=10, per=POLLS_PER_TASK)
+def _poll_iteration() -> Iterator[Callable[[], Any]]:
+    from utils.backends import ZhenzhenBackend
+
+    engine = _engine(_zhenzhen_handler(POLLS_PER_TASK))
+    backend = ZhenzhenBackend("bench-key")
+    counter = itertools.count()
+
+    def op():
+        task_id = f"task_bench{next(counter):08d}"
+        handle = engine.watch(backend, task_id, timeout=60, scheduler=_instant_scheduler())
+        events = list(handle.events())
+        assert events[-1]["type"] == "completed", events[-1]
+
+    try:
+        yield op
+    finally:
+        engine.shutdown()
+
+
+@benchmark("invocation", iterations=5)
+def _invocation() -> Iterator[Callable[[], Any]]:
+    import utils.async_engine as async_engine
+    from tools.text_to_video import TextToVideoTool
+
+    tool = _tool(TextToVideoTool)
+    engine = _engine(_zhenzhen_handler(3))
+    counter = itertools.count()
+    saved = async_engine._engine, async_engine.PollScheduler
+    async_engine._engine, async_engine.PollScheduler = engine, _instant_scheduler
+
+    def op():
+        # 提示词各不相同，每次都真正提交（不命中结果缓存）
+        params = {**TOOL_PARAMETERS, "prompt": f"{TOOL_PARAMETERS['prompt']} #{next(counter)}"}
+        messages = list(tool._invoke(params))
+        assert messages[-1].message.json_object["status"] == "completed", messages[-1]
+
+    try:
+        yield op
+    finally:
+        async_engine._engine, async_engine.PollScheduler = saved
+        engine.shutdown()
+
+
+def _block(fn: Callable[[], Any], iterations: int) -> float:
+    start = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - start) / iterations
+
+
+def _cpu_per_op(op: Callable[[], Any], iterations: int, blocks: int, calibrations: List[float]) -> "tuple[float, float]":
+    """每次操作的进程 CPU 时间（秒，包括引擎线程）和校准倍数
+
+    校准操作和被测操作交替分块运行，每块各自求倍数再取中位数，CPU 频率和邻居负载的变化对两者的影响相同。
+    """
+    times, ratios = [], []
+    for _ in range(blocks):
+        calibration = _block(_calibrate, CALIBRATION_ITERATIONS)
+        spent = _block(op, iterations)
+        calibrations.append(calibration)
+        times.append(spent)
+        ratios.append(spent / calibration)
+    return statistics.median(times), statistics.median(ratios)
+
+
+def _peak_per_op(op: Callable[[], Any], samples: int) -> int:
+    """单次操作期间新分配内存的峰值（字节），取中位数"""
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(samples):
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            op()
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    finally:
+        tracemalloc.stop()
+    return int(statistics.median(peaks))
+
+
+def run(names: Optional[List[str]] = None, quick: bool = False) -> Dict[str, Any]:
+    """运行基准，返回校准耗时和每项的 CPU 时间、校准倍数、峰值内存"""
+    blocks = 5 if quick else 15
+    calibrations: List[float] = []
+    results: Dict[str, Any] = {"python": sys.version.split()[0], "benchmarks": {}}
+    for name in names or list(BENCHMARKS):
+        bench = BENCHMARKS[name]
+        with bench.setup() as op:
+            # 预热：首次调用的导入、连接和事件循环启动不计入
+            for _ in range(min(bench.iterations, 20)):
+                op()
+            cpu, units = _cpu_per_op(op, bench.iterations, blocks, calibrations)
+            peak = _peak_per_op(op, 20 if quick else 50)
+        results["benchmarks"][name] = {
+            "cpu_us": round(cpu / bench.per * 1e6, 3),
+            "cpu_units": round(units / bench.per, 4),
+            "peak_bytes": peak
+        }
+    results["calibration_us"] = round(statistics.median(calibrations) * 1e6, 3) if calibrations else None
+    return results
+
+
+def load_baselines(path: str = BASELINES_PATH) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {"tolerance": dict(DEFAULT_TOLERANCE), "benchmarks": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_baselines(results: Dict[str, Any], path: str = BASELINES_PATH) -> None:
+    """以本次结果为基准写入文件（保留已有的容差设置和未运行项的基准）"""
+    baselines = load_baselines(path)
+    baselines["python"] = results["python"]
+    baselines["calibration_us"] = results["calibration_us"]
+    baselines.setdefault("tolerance", dict(DEFAULT_TOLERANCE))
+    benchmarks = baselines.setdefault("benchmarks", {})
+    for name, result in results["benchmarks"].items():
+        entry = benchmarks.setdefault(name, {})
+        entry.update(cpu_units=result["cpu_units"], peak_bytes=result["peak_bytes"])
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def check(results: Dict[str, Any], baselines: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """逐项与基准比较，返回每项的预算和是否超出（没有基准的项不判定）
+
+    容差依次取默认值、基准文件的 tolerance、单项基准的 tolerance（经过线程和 SQLite 的项波动更大）。
+    """
+    rows = []
+    for name, result in results["benchmarks"].items():
+        baseline = baselines.get("benchmarks", {}).get(name)
+        row = {"name": name, **result, "cpu_budget": None, "memory_budget": None, "over": []}
+        if baseline:
+            tolerance = {**DEFAULT_TOLERANCE, **baselines.get("tolerance", {}), **baseline.get("tolerance", {})}
+            row["cpu_budget"] = round(baseline["cpu_units"] * (1 + tolerance["cpu"]), 3)
+            row["memory_budget"] = int(baseline["peak_bytes"] * (1 + tolerance["memory"])) + MEMORY_SLACK
+            if result["cpu_units"] > row["cpu_budget"]:
+                row["over"].append("cpu")
+            if result["peak_bytes"] > row["memory_budget"]:
+                row["over"].append("memory")
+        rows.append(row)
+    return rows
+
+
+def _format(results: Dict[str, Any], rows: List[Dict[str, Any]], baselines: Dict[str, Any]) -> str:
+    lines = [f"Python {results['python']}, calibration op {results['calibration_us']:.2f} us"]
+    if baselines.get("python") and baselines["python"].rsplit(".", 1)[0] != results["python"].rsplit(".", 1)[0]:
+        lines.append(f"  note: baselines were recorded on Python {baselines['python']}")
+    lines.append(f"  {'benchmark':<16} {'cpu/op':>10} {'x calib':>8} {'budget':>8} {'peak':>9} {'budget':>9}")
+    for row in rows:
+        cpu_budget = f"{row['cpu_budget']:.3f}" if row["cpu_budget"] is not None else "-"
+        memory_budget = f"{row['memory_budget'] / 1024:.1f} KB" if row["memory_budget"] is not None else "-"
+        verdict = "OVER " + "+".join(row["over"]) if row["over"] else ("ok" if row["cpu_budget"] is not None else "no baseline")
+        lines.append(
+            f"  {row['name']:<16} {row['cpu_us']:>7.2f} us {row['cpu_units']:>8.3f} {cpu_budget:>8} "
+            f"{row['peak_bytes'] / 1024:>6.1f} KB {memory_budget:>9}  {verdict}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="测量插件每次调用的自身开销并与基准比较")
+    parser.add_argument("names", nargs="*", metavar="NAME", help=f"只运行指定的基准（{', '.join(BENCHMARKS)}）")
+    parser.add_argument("--quick", action="store_true", help="减少迭代次数")
+    parser.add_argument("--update", action="store_true", help="以本次结果更新 benchmarks/baselines.json")
+    parser.add_argument("--baselines", default=BASELINES_PATH, help="基准文件")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"未知的基准: {', '.join(unknown)}")
+
+    # 登记表、结果缓存等本地状态写到临时目录，不在导入时预热连接
+    os.environ["SORA2_PLUGIN_DATA_DIR"] = tempfile.mkdtemp(prefix="sora2-bench-")
+    os.environ["SORA2_HTTP_WARMUP"] = "0"
+
+    results = run(args.names or None, args.quick)
+    if args.update:
+        write_baselines(results, args.baselines)
+    baselines = load_baselines(args.baselines)
+    rows = check(results, baselines)
+    if args.json:
+        print(json.dumps({**results, "checks": rows}, ensure_ascii=False, indent=2))
+    else:
+        print(_format(results, rows, baselines))
+    return 1 if any(row["over"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
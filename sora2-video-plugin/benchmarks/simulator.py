@@ -0,0 +1,540 @@
+"""Sora2 API 本地模拟服务
+
+实现插件用到的接口，供负载测试和集成测试使用，不访问真实平台：
+
+  贞贞  POST /v2/videos/generations            创建任务 -> {"task_id"}
+        GET  /v2/videos/generations/{task_id}  查询任务（status / progress / data.output）
+  聚鑫  POST /v1/video/create                  创建任务 -> {"id"}（ID 形如 sora-2:task_...）
+        GET  /v1/video/query?id=               查询任务（统一视频格式，detail.pending_info）
+        GET  /v1/videos/{id}/content           下载视频（支持 Range）
+        POST /api/upload                       图床上传
+  通用  POST /sora/v1/characters               创建角色
+        GET  /files/{name}                     视频 / 图片文件（支持 Range）
+  统计  GET  /_sim/stats                       各接口请求数、注入的错误数、任务状态
+        POST /_sim/reset                       清空任务和统计
+
+可配置排队时间、渲染时间和进度曲线、错误率和 429 比例、每个请求的延迟分布。
+time_scale 让模拟时间比真实时间快（例如 20 表示 60 秒的渲染在 3 秒内完成）。
+
+用法:
+    python benchmarks/simulator.py --port 8765 --render-seconds 60 --queue-delay 5:30 \\
+        --error-rate 0.01 --rate-limit-rate 0.02 --latency lognormal:0.05:0.5 --time-scale 20
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+# 进度曲线：渲染时间的比例 -> 进度
+PROGRESS_CURVES: Dict[str, Callable[[float], float]] = {
+    "linear": lambda x: x,
+    # 开始慢、后面快
+    "ease_in": lambda x: x * x,
+    # 开始快、接近完成时变慢
+    "ease_out": lambda x: 1 - (1 - x) ** 2,
+    # 很快到 90%，然后长时间停在 90%
+    "stall": lambda x: min(x * 3, 0.9) if x < 0.98 else x,
+}
+
+# 各模型相对 sora-2 的渲染耗时倍数
+MODEL_FACTORS = {"sora-2": 1.0, "sora-2-pro": 2.5}
+
+
+def _png_1x1() -> bytes:
+    """1x1 像素的 PNG，作为图生视频的参考图和缩略图"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(b"\x00\xff\x80\x00")) \
+        + chunk(b"IEND", b"")
+
+
+PNG_1X1 = _png_1x1()
+
+
+class LatencyModel:
+    """请求延迟分布
+
+    格式：0 / fixed:秒 / uniform:最小:最大 / normal:均值:标准差 / lognormal:中位数:sigma / exp:均值
+    """
+
+    def __init__(self, spec: str = "0"):
+        self.spec = spec
+        name, _, rest = str(spec).partition(":")
+        args = [float(value) for value in rest.split(":")] if rest else []
+        if name in ("0", "", "none"):
+            self._sample = lambda rng: 0.0
+        elif name == "fixed":
+            self._sample = lambda rng: args[0]
+        elif name == "uniform":
+            self._sample = lambda rng: rng.uniform(args[0], args[1])
+        elif name == "normal":
+            self._sample = lambda rng: rng.gauss(args[0], args[1])
+        elif name == "lognormal":
+            self._sample = lambda rng: rng.lognormvariate(math.log(args[0]), args[1])
+        elif name == "exp":
+            self._sample = lambda rng: rng.expovariate(1 / args[0])
+        else:
+            raise ValueError(f"未知的延迟分布: {spec}")
+
+    def sample(self, rng: random.Random) -> float:
+        return max(0.0, self._sample(rng))
+
+
+def _parse_range(value: Any) -> Tuple[float, float]:
+    """"5" 或 "5:30" -> (最小, 最大)"""
+    if isinstance(value, (tuple, list)):
+        return float(value[0]), float(value[1])
+    low, _, high = str(value).partition(":")
+    return float(low), float(high or low)
+
+
+class SimulatorConfig:
+    """模拟服务的行为参数（时间都是模拟时间，单位秒）"""
+
+    def __init__(
+        self,
+        queue_delay: Any = (0.0, 0.0),
+        render_seconds: float = 60.0,
+        render_jitter: float = 0.2,
+        progress_curve: str = "linear",
+        failure_rate: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after: float = 1.0,
+        latency: str = "0",
+        time_scale: float = 1.0,
+        video_bytes: int = 256 * 1024,
+        preview: bool = True,
+        seed: Optional[int] = None
+    ):
+        if progress_curve not in PROGRESS_CURVES:
+            raise ValueError(f"未知的进度曲线: {progress_curve}")
+        self.queue_delay = _parse_range(queue_delay)
+        self.render_seconds = render_seconds
+        self.render_jitter = render_jitter
+        self.progress_curve = progress_curve
+        self.failure_rate = failure_rate
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.latency = latency if isinstance(latency, LatencyModel) else LatencyModel(latency)
+        self.time_scale = time_scale
+        self.video_bytes = video_bytes
+        self.preview = preview
+        self.seed = seed
+
+
+class _Task:
+    __slots__ = ("task_id", "backend", "params", "created_at", "queue_seconds", "render_seconds", "fails")
+
+    def __init__(self, task_id, backend, params, created_at, queue_seconds, render_seconds, fails):
+        self.task_id = task_id
+        self.backend = backend
+        self.params = params
+        self.created_at = created_at
+        self.queue_seconds = queue_seconds
+        self.render_seconds = render_seconds
+        self.fails = fails
+
+
+class Simulator:
+    """任务状态和统计（与 HTTP 无关，便于直接调用）"""
+
+    def __init__(self, config: Optional[SimulatorConfig] = None, clock: Callable[[], float] = time.monotonic):
+        self.config = config or SimulatorConfig()
+        self._clock = clock
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._tasks: Dict[str, _Task] = {}
+            self._counter = 0
+            self.stats: Dict[str, Any] = {"requests": {}, "rate_limited": 0, "errors": 0}
+
+    def now(self) -> float:
+        """模拟时间"""
+        return self._clock() * self.config.time_scale
+
+    def random(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+    def latency(self) -> float:
+        """本次请求的延迟（真实时间）"""
+        with self._lock:
+            return self.config.latency.sample(self._rng) / self.config.time_scale
+
+    def count(self, route: str) -> None:
+        with self._lock:
+            self.stats["requests"][route] = self.stats["requests"].get(route, 0) + 1
+
+    def inject(self) -> Optional[int]:
+        """按配置的比例返回要注入的错误状态码（429 或 503），不注入时返回 None"""
+        roll = self.random()
+        with self._lock:
+            if roll < self.config.rate_limit_rate:
+                self.stats["rate_limited"] += 1
+                return 429
+            if roll < self.config.rate_limit_rate + self.config.error_rate:
+                self.stats["errors"] += 1
+                return 503
+        return None
+
+    def create(self, backend: str, params: Dict[str, Any]) -> str:
+        with self._lock:
+            self._counter += 1
+            model = str(params.get("model") or "sora-2")
+            task_id = f"task_sim{self._counter:06d}"
+            if backend == "juxin":
+                task_id = f"{model}:{task_id}"
+            try:
+                duration = float(params.get("duration") or 10)
+            except (TypeError, ValueError):
+                duration = 10.0
+            config = self.config
+            render = config.render_seconds * MODEL_FACTORS.get(model, 1.0) * duration / 10
+            render *= 1 + self._rng.uniform(-config.render_jitter, config.render_jitter)
+            self._tasks[task_id] = _Task(
+                task_id, backend, params, self.now(),
+                self._rng.uniform(*config.queue_delay), max(render, 0.001),
+                self._rng.random() < config.failure_rate
+            )
+            return task_id
+
+    def state(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """任务当前状态：status（NOT_START / IN_PROGRESS / SUCCESS / FAILURE）、progress（0~1）、queue_position"""
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return None
+            elapsed = self.now() - task.created_at
+            if elapsed < task.queue_seconds:
+                # 排在前面的是比它早创建、仍在排队的任务
+                position = sum(
+                    1 for other in self._tasks.values()
+                    if other.created_at < task.created_at and self.now() - other.created_at < other.queue_seconds
+                )
+                return {"task": task, "status": "NOT_START", "progress": 0.0, "queue_position": position + 1}
+            fraction = (elapsed - task.queue_seconds) / task.render_seconds
+            if fraction >= 1:
+                return {"task": task, "status": "FAILURE" if task.fails else "SUCCESS", "progress": 1.0}
+            # 失败的任务在渲染到一半时失败
+            if task.fails and fraction >= 0.5:
+                return {"task": task, "status": "FAILURE", "progress": fraction}
+            progress = PROGRESS_CURVES[self.config.progress_curve](fraction)
+            return {"task": task, "status": "IN_PROGRESS", "progress": min(progress, 0.99)}
+
+    def snapshot(self) -> Dict[str, Any]:
+        statuses: Dict[str, int] = {}
+        for task_id in list(self._tasks):
+            state = self.state(task_id)
+            statuses[state["status"]] = statuses.get(state["status"], 0) + 1
+        with self._lock:
+            return {**json.loads(json.dumps(self.stats)), "tasks": len(self._tasks), "statuses": statuses}
+
+
+def video_content(size: int) -> bytes:
+    """最小的 MP4 结构（ftyp + mdat），内容可预测，便于校验断点续传"""
+    ftyp = struct.pack(">I4s4sI4s4s", 24, b"ftyp", b"isom", 512, b"isom", b"mp41")
+    body = bytes(range(256)) * (max(size - 32, 0) // 256 + 1)
+    body = body[:max(size - 32, 0)]
+    return ftyp + struct.pack(">I4s", len(body) + 8, b"mdat") + body
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "Sora2Simulator"
+    simulator: Simulator
+    video: bytes
+
+    def log_message(self, format, *args):  # 不输出访问日志
+        pass
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _json(self, status: int, data: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _file(self, data: bytes, content_type: str) -> None:
+        """返回文件，支持 Range: bytes=start-"""
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range") or "")
+        if match and int(match.group(1)) < len(data):
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else len(data) - 1
+            chunk = data[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{start + len(chunk) - 1}/{len(data)}")
+        else:
+            chunk = data
+            self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(chunk)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(chunk)
+
+    def _route(self) -> Tuple[str, Optional[Callable[[], None]]]:
+        path = urlsplit(self.path).path
+        method = self.command
+        routes = [
+            ("POST", r"/v2/videos/generations", "create", self._create_zhenzhen),
+            ("GET", r"/v2/videos/generations/([^/]+)", "query", self._query_zhenzhen),
+            ("POST", r"/v1/video/create", "create", self._create_juxin),
+            ("GET", r"/v1/video/query", "query", self._query_juxin),
+            ("GET", r"/v1/videos/([^/]+)/content", "content", self._content),
+            ("POST", r"/api/upload", "upload", self._upload),
+            ("POST", r"/sora/v1/characters", "characters", self._characters),
+            ("GET", r"/files/([^/]+)", "files", self._files),
+            ("HEAD", r"/files/([^/]+)", "files", self._files),
+            ("GET", r"/_sim/stats", "", self._stats),
+            ("POST", r"/_sim/reset", "", self._reset),
+        ]
+        for route_method, pattern, name, handler in routes:
+            match = re.fullmatch(pattern, path)
+            if route_method == method and match:
+                return name, lambda: handler(*match.groups())
+        return "unknown", None
+
+    def _handle(self) -> None:
+        name, handler = self._route()
+        if handler is None:
+            self._body()
+            self._json(404, {"error": "not found"})
+            return
+        if not name:
+            handler()
+            return
+
+        self.simulator.count(name)
+        delay = self.simulator.latency()
+        if delay:
+            time.sleep(delay)
+        if name in ("create", "query", "characters", "upload"):
+            status = self.simulator.inject()
+            if status is not None:
+                # 注入的错误都在处理请求之前返回，带 Retry-After（创建请求据此确定可以重试）
+                self._body()
+                error = "rate limited" if status == 429 else "service unavailable"
+                self._json(status, {"error": error}, {"Retry-After": f"{self.simulator.config.retry_after:g}"})
+                return
+        handler()
+
+    do_GET = do_POST = do_HEAD = _handle
+
+    # --- 贞贞 ---
+
+    def _create_zhenzhen(self) -> None:
+        params = json.loads(self._body() or b"{}")
+        task_id = self.simulator.create("zhenzhen", params)
+        self._json(200, {"task_id": task_id})
+
+    def _query_zhenzhen(self, task_id: str) -> None:
+        state = self.simulator.state(task_id)
+        if state is None:
+            self._json(404, {"error": "task not found"})
+            return
+        data: Dict[str, Any] = {
+            "task_id": task_id,
+            "status": state["status"],
+            "progress": f"{int(state['progress'] * 100)}%",
+            "fail_reason": "simulated failure" if state["status"] == "FAILURE" else ""
+        }
+        if "queue_position" in state:
+            data["queue_position"] = state["queue_position"]
+        data.update(self._preview(task_id, state))
+        if state["status"] == "SUCCESS":
+            data["data"] = {"output": f"{self.base_url}/files/{task_id}.mp4"}
+        self._json(200, data)
+
+    # --- 聚鑫 ---
+
+    def _create_juxin(self) -> None:
+        params = json.loads(self._body() or b"{}")
+        task_id = self.simulator.create("juxin", params)
+        self._json(200, {"id": task_id, "status": "pending"})
+
+    def _query_juxin(self) -> None:
+        task_id = (parse_qs(urlsplit(self.path).query).get("id") or [""])[0]
+        state = self.simulator.state(task_id)
+        if state is None:
+            self._json(404, {"error": "task not found"})
+            return
+        status = {"NOT_START": "pending", "IN_PROGRESS": "processing",
+                  "SUCCESS": "completed", "FAILURE": "failed"}[state["status"]]
+        pending_info: Dict[str, Any] = {"progress_pct": round(state["progress"], 4)}
+        if "queue_position" in state:
+            pending_info["progress_pos_in_queue"] = state["queue_position"]
+        detail: Dict[str, Any] = {"status": status, "pending_info": pending_info}
+        data: Dict[str, Any] = {"id": task_id, "status": status, "detail": detail}
+        if state["status"] == "FAILURE":
+            detail["failure_reason"] = "simulated failure"
+        if state["status"] == "SUCCESS":
+            data["video_url"] = detail["url"] = f"{self.base_url}/files/{task_id.replace(':', '_')}.mp4"
+        data.update(self._preview(task_id, state))
+        self._json(200, data)
+
+    def _content(self, task_id: str) -> None:
+        state = self.simulator.state(task_id)
+        if state is None or state["status"] != "SUCCESS":
+            self._json(404, {"error": "video not ready"})
+            return
+        self._file(self.video, "video/mp4")
+
+    def _upload(self) -> None:
+        self._body()
+        self._json(200, {"url": f"{self.base_url}/files/upload_{self.simulator.random():.8f}.png"})
+
+    # --- 通用 ---
+
+    def _characters(self) -> None:
+        body = json.loads(self._body() or b"{}")
+        seed = body.get("from_task") or body.get("url") or ""
+        digest = hashlib.sha256(f"{seed}|{body.get('timestamps')}".encode("utf-8")).hexdigest()
+        username = f"sim.{digest[:8]}"
+        self._json(200, {
+            "id": f"ch_{username[4:]}",
+            "username": username,
+            "permalink": f"{self.base_url}/profile/{username}",
+            "profile_picture_url": f"{self.base_url}/files/{username}.png"
+        })
+
+    def _files(self, name: str) -> None:
+        if name.endswith(".png"):
+            self._file(PNG_1X1, "image/png")
+        else:
+            self._file(self.video, "video/mp4")
+
+    def _preview(self, task_id: str, state: Dict[str, Any]) -> Dict[str, str]:
+        # 渲染过半后出现缩略图和改写后的提示词
+        if not self.simulator.config.preview or state["progress"] < 0.5:
+            return {}
+        return {
+            "thumbnail_url": f"{self.base_url}/files/{task_id.replace(':', '_')}.png",
+            "enhanced_prompt": f"{state['task'].params.get('prompt', '')} (enhanced)"
+        }
+
+    # --- 统计 ---
+
+    def _stats(self) -> None:
+        self._json(200, self.simulator.snapshot())
+
+    def _reset(self) -> None:
+        self._body()
+        self.simulator.reset()
+        self._json(200, {"ok": True})
+
+
+class SimulatorServer:
+    """在后台线程中运行的模拟服务"""
+
+    def __init__(self, config: Optional[SimulatorConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.simulator = Simulator(config)
+        handler = type("Handler", (_Handler,), {
+            "simulator": self.simulator,
+            "video": video_content(self.simulator.config.video_bytes)
+        })
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        # 并发连接多时不拒绝新连接
+        self._server.request_queue_size = 1024
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "SimulatorServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="sora2-simulator", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "SimulatorServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    """模拟服务的命令行参数（负载测试脚本共用）"""
+    parser.add_argument("--queue-delay", default="0", help="排队时间（秒），固定值或 最小:最大")
+    parser.add_argument("--render-seconds", type=float, default=60, help="sora-2 10 秒视频的渲染时间")
+    parser.add_argument("--curve", default="linear", choices=sorted(PROGRESS_CURVES), help="进度曲线")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="任务失败的比例")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="请求返回 503 的比例")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="请求返回 429 的比例")
+    parser.add_argument("--latency", default="0", help="请求延迟分布，例如 lognormal:0.05:0.5")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="模拟时间相对真实时间的倍数")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子")
+
+
+def config_from_args(args: argparse.Namespace) -> SimulatorConfig:
+    return SimulatorConfig(
+        queue_delay=args.queue_delay,
+        render_seconds=args.render_seconds,
+        progress_curve=args.curve,
+        failure_rate=args.failure_rate,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        latency=args.latency,
+        time_scale=args.time_scale,
+        seed=args.seed
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sora2 API 本地模拟服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口（0 表示随机端口）")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = SimulatorServer(config_from_args(args), args.host, args.port)
+    print(f"Sora2 simulator listening on {server.url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""插件冷启动基准
+
+在全新的解释器中按插件运行时的方式导入入口模块（manifest 中登记的 provider、工具和端点源码），
+测量导入耗时。每个场景运行多次取中位数：
+
+  sdk       只导入 dify_plugin（插件自身无法优化的下限）
+  source    在 sdk 之后导入插件模块，没有可用的字节码（每次启动都重新编译，对应不带 .pyc 的包，
+            运行目录只读或设置了 PYTHONDONTWRITEBYTECODE 时每次冷启动都是这种情况）
+  bytecode  同上，但使用预编译的字节码（对应 package.py 打出的带 .pyc 的包）
+
+插件源码复制到临时目录中运行，工作区里已有的 __pycache__ 不影响结果。
+
+用法（在插件目录下运行）:
+    python benchmarks/startup.py [--runs 7] [--json] [--modules]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_DIRS = ("provider", "tools", "endpoints", "utils")
+
+# 子进程中执行：先导入 SDK，再导入插件模块，输出两段耗时（秒）
+_PROBE = """
+import time
+t0 = time.perf_counter()
+import dify_plugin
+t1 = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+t2 = time.perf_counter()
+print(t1 - t0, t2 - t1)
+"""
+
+
+def entry_modules(root: str = ROOT) -> List[str]:
+    """manifest 中登记的 Python 源码（provider、工具、端点）对应的模块名"""
+    def load(path: str) -> dict:
+        with open(os.path.join(root, path), encoding="utf-8") as f:
+            return yaml.safe_load(f) or {}
+
+    def source(config: dict) -> str:
+        return config["extra"]["python"]["source"]
+
+    manifest = load("manifest.yaml")
+    sources = []
+    for provider_file in manifest.get("plugins", {}).get("tools", []):
+        provider = load(provider_file)
+        sources.append(source(provider))
+        sources.extend(source(load(tool)) for tool in provider.get("tools", []))
+    for group_file in manifest.get("plugins", {}).get("endpoints", []):
+        sources.extend(source(load(endpoint)) for endpoint in load(group_file).get("endpoints", []))
+    return [path[:-3].replace("/", ".") for path in sources]
+
+
+def _run(workdir: str, modules: List[str], importtime: bool = False) -> subprocess.CompletedProcess:
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", _PROBE.format(modules=modules)]
+    # 不写入字节码（每次运行的条件相同），不在导入时预热连接
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1", "SORA2_HTTP_WARMUP": "0"}
+    return subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True, check=True)
+
+
+def _copy_sources(workdir: str) -> None:
+    """复制插件源码（不含已有的 __pycache__），SDK 和第三方库仍使用各自安装时的字节码"""
+    for name in SOURCE_DIRS:
+        shutil.copytree(os.path.join(ROOT, name), os.path.join(workdir, name),
+                        ignore=shutil.ignore_patterns("__pycache__"))
+
+
+def _compile(workdir: str) -> None:
+    """预编译插件源码（与打包时相同的 checked-hash 模式，不依赖文件修改时间）"""
+    subprocess.run(
+        [sys.executable, "-m", "compileall", "-q", "--invalidation-mode", "checked-hash", *SOURCE_DIRS],
+        cwd=workdir, check=True
+    )
+
+
+def _slowest_modules(output: str, limit: int = 10) -> List[Dict[str, float]]:
+    """解析 -X importtime 输出，返回自身耗时最多的插件模块"""
+    rows = []
+    for line in output.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:"):
+            continue
+        self_us, _, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if name.split(".")[0] in SOURCE_DIRS and self_us.isdigit():
+            rows.append({"module": name, "self_ms": int(self_us) / 1000})
+    return sorted(rows, key=lambda row: row["self_ms"], reverse=True)[:limit]
+
+
+def measure(runs: int = 7, breakdown: bool = False) -> dict:
+    modules = entry_modules()
+    results: dict = {"python": sys.version.split()[0], "runs": runs, "modules": modules}
+    with tempfile.TemporaryDirectory() as source_dir, tempfile.TemporaryDirectory() as bytecode_dir:
+        _copy_sources(source_dir)
+        _copy_sources(bytecode_dir)
+        _compile(bytecode_dir)
+        scenarios = {"source": source_dir, "bytecode": bytecode_dir}
+
+        samples: Dict[str, List[float]] = {"sdk": [], "source": [], "bytecode": []}
+        for _ in range(runs):
+            for name, workdir in scenarios.items():
+                sdk, plugin = map(float, _run(workdir, modules).stdout.split())
+                samples["sdk"].append(sdk)
+                samples[name].append(plugin)
+        for name, values in samples.items():
+            results[f"{name}_ms"] = round(statistics.median(values) * 1000, 2)
+
+        if breakdown:
+            for name, workdir in scenarios.items():
+                results[f"{name}_slowest"] = _slowest_modules(_run(workdir, modules, importtime=True).stderr)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="测量插件冷启动的导入耗时")
+    parser.add_argument("--runs", type=int, default=7, help="每个场景运行的次数（取中位数）")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    parser.add_argument("--modules", action="store_true", help="同时列出自身导入耗时最多的插件模块")
+    args = parser.parse_args()
+
+    results = measure(args.runs, args.modules)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+
+    print(f"Python {results['python']}, {results['runs']} runs, {len(results['modules'])} entry modules")
+    print(f"  dify_plugin            {results['sdk_ms']:8.2f} ms")
+    print(f"  plugin (no bytecode)   {results['source_ms']:8.2f} ms")
+    print(f"  plugin (bytecode)      {results['bytecode_ms']:8.2f} ms")
+    for name in ("source", "bytecode"):
+        for row in results.get(f"{name}_slowest", []):
+            print(f"    [{name}] {row['module']:<32} {row['self_ms']:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import json
+from typing import Mapping, Optional
+from werkzeug import Request, Response
+from dify_plugin import Endpoint
+
+from utils.async_engine import get_engine
+
+
+class CallbackEndpoint(Endpoint):
+    def _invoke(self, r: Request, values: Mapping, settings: Mapping) -> Response:
+        """平台回调 - 任务状态变化时唤醒等待该任务的调用，结果由等待方查询确认（不信任回调内容）"""
+        task_id = self._task_id(r)
+        if not task_id:
+            return self._json({"ok": False, "error": "缺少 task_id"}, status=400)
+
+        waiting = get_engine().notify(task_id)
+        return self._json({"ok": True, "task_id": task_id, "waiting": waiting})
+
+    @staticmethod
+    def _task_id(r: Request) -> Optional[str]:
+        """从 JSON 或表单请求体中取出 task_id（task_id、id 或 data.task_id）"""
+        payload = r.get_json(silent=True)
+        if not isinstance(payload, dict):
+            payload = r.form.to_dict() or r.args.to_dict()
+        data = payload.get("data")
+        for value in (
+            payload.get("task_id"),
+            payload.get("id"),
+            data.get("task_id") if isinstance(data, dict) else None
+        ):
+            if value:
+                return str(value).strip()
+        return None
+
+    @staticmethod
+    def _json(body: dict, status: int = 200) -> Response:
+        return Response(json.dumps(body, ensure_ascii=False), status=status, content_type="application/json")
@@ -0,0 +1,17 @@
+import json
+from typing import Mapping
+from werkzeug import Request, Response
+from dify_plugin import Endpoint
+
+from utils.metrics import PROMETHEUS_CONTENT_TYPE, get_metrics
+
+
+class MetricsEndpoint(Endpoint):
+    def _invoke(self, r: Request, values: Mapping, settings: Mapping) -> Response:
+        """指标 - Prometheus 文本格式，?format=json 时返回 JSON"""
+        metrics = get_metrics()
+        if r.args.get("format") == "json":
+            return Response(
+                json.dumps(metrics.snapshot(), ensure_ascii=False), status=200, content_type="application/json"
+            )
+        return Response(metrics.render_prometheus(), status=200, content_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,40 +1,309 @@
-import zipfile
+"""插件打包工具
+
+文件列表从 manifest.yaml 推导：manifest、入口 main.py、requirements.txt、图标，
+provider / 工具 / 端点的 YAML 及其 Python 源码，以及这些源码（递归地）导入的本地模块。
+不需要手动维护文件列表，新增工具或模块不会漏打包。
+
+打出的包是确定的：条目按路径排序，时间戳固定（可用 SOURCE_DATE_EPOCH 指定），
+权限和压缩参数固定，相同的源码得到逐字节相同的 .difypkg。
+
+可选项：
+  --vendor    把 requirements.txt 中的依赖（含传递依赖）按 manifest 中的运行时版本和架构下载为 wheel，
+              放进包内 wheels/，并让 requirements.txt 只从包内安装（离线安装，不必在线解析依赖）
+  --verify    打包后在临时目录解压，安装依赖并导入入口模块，测量安装和导入耗时
+
+构建用的 Python 版本与 manifest 中的运行时版本一致时，源码旁附带 checked-hash 模式的 .pyc
+（按源码哈希校验，不依赖解压后的文件修改时间），插件冷启动时不必重新编译。
+
+用法（在插件目录下运行）:
+    python package.py [--vendor] [--verify] [--no-bytecode] [--max-size-mb 50] [--max-install-seconds 120]
+
+包大小或安装耗时超出预算时退出码为 1。
+"""
+
+import argparse
+import ast
+import importlib.util
+import io
 import os
+import py_compile
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from typing import Dict, List, Optional, Set
+
+import yaml
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Dify 默认允许的插件包大小上限（PLUGIN_MAX_PACKAGE_SIZE）
+DEFAULT_MAX_SIZE_MB = 50
+DEFAULT_MAX_INSTALL_SECONDS = 120
+
+WHEELS_DIR = "wheels"
+
+# zip 不能表示 1980 年之前的时间
+ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+# manifest 中的架构 -> wheel 平台标签
+PLATFORMS = {
+    "amd64": ["manylinux2014_x86_64", "manylinux_2_17_x86_64"],
+    "arm64": ["manylinux2014_aarch64", "manylinux_2_17_aarch64"],
+}
+
+
+def load_yaml(root: str, path: str) -> dict:
+    with open(os.path.join(root, path), encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def _python_source(config: dict) -> Optional[str]:
+    return ((config.get("extra") or {}).get("python") or {}).get("source")
+
+
+def _local_imports(root: str, path: str) -> Set[str]:
+    """源码中导入的本地模块文件（包括函数内的延迟导入）"""
+    with open(os.path.join(root, path), encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module)
+            # from utils import http_client：导入的也可能是子模块
+            names.update(f"{node.module}.{alias.name}" for alias in node.names)
+
+    files = set()
+    for name in names:
+        candidate = name.replace(".", "/")
+        for file_path in (f"{candidate}.py", f"{candidate}/__init__.py"):
+            if os.path.isfile(os.path.join(root, file_path)):
+                files.add(file_path)
+    return files
+
+
+def collect_files(root: str = ROOT) -> List[str]:
+    """按 manifest 推导需要打包的文件（相对路径，已排序）"""
+    manifest = load_yaml(root, "manifest.yaml")
+    files = {"manifest.yaml", "requirements.txt", f"{manifest['meta']['entrypoint']}.py"}
+    if manifest.get("icon"):
+        files.add(f"_assets/{manifest['icon']}")
+
+    configs = []
+    plugins = manifest.get("plugins") or {}
+    for provider_file in plugins.get("tools") or []:
+        provider = load_yaml(root, provider_file)
+        configs.append((provider_file, provider))
+        configs.extend((tool, load_yaml(root, tool)) for tool in provider.get("tools") or [])
+    for group_file in plugins.get("endpoints") or []:
+        group = load_yaml(root, group_file)
+        configs.append((group_file, group))
+        configs.extend((endpoint, load_yaml(root, endpoint)) for endpoint in group.get("endpoints") or [])
+
+    # 待扫描导入的 Python 源码
+    pending = [f"{manifest['meta']['entrypoint']}.py"]
+    for config_file, config in configs:
+        files.add(config_file)
+        source = _python_source(config)
+        if source:
+            pending.append(source)
+
+    scanned: Set[str] = set()
+    while pending:
+        source = pending.pop()
+        if source in scanned:
+            continue
+        scanned.add(source)
+        files.add(source)
+        pending.extend(_local_imports(root, source) - scanned)
+
+    missing = sorted(path for path in files if not os.path.isfile(os.path.join(root, path)))
+    if missing:
+        raise FileNotFoundError(f"manifest 引用的文件不存在: {', '.join(missing)}")
+    return sorted(files)
+
+
+def runner_version(root: str = ROOT) -> str:
+    return str(load_yaml(root, "manifest.yaml")["meta"]["runner"]["version"])
+
+
+def compile_bytecode(root: str, source: str) -> bytes:
+    """编译为 checked-hash 模式的字节码（内容只取决于源码，可重复）"""
+    with tempfile.TemporaryDirectory() as workdir:
+        cfile = py_compile.compile(
+            os.path.join(root, source),
+            cfile=os.path.join(workdir, "module.pyc"),
+            dfile=source,
+            doraise=True,
+            invalidation_mode=py_compile.PycInvalidationMode.CHECKED_HASH
+        )
+        with open(cfile, "rb") as f:
+            return f.read()
+
+
+def download_wheels(root: str, dest: str) -> List[str]:
+    """按 manifest 中的运行时版本和每个架构下载依赖的 wheel，返回下载到的文件名"""
+    meta = load_yaml(root, "manifest.yaml")["meta"]
+    for arch in meta.get("arch") or ["amd64"]:
+        command = [
+            sys.executable, "-m", "pip", "download", "--quiet", "--only-binary=:all:",
+            "--python-version", str(meta["runner"]["version"]),
+            "--dest", dest, "-r", os.path.join(root, "requirements.txt")
+        ]
+        for platform in PLATFORMS.get(arch, []):
+            command += ["--platform", platform]
+        subprocess.run(command, check=True)
+    return sorted(name for name in os.listdir(dest) if name.endswith(".whl"))
+
+
+def offline_requirements(requirements: bytes) -> bytes:
+    """只从包内 wheels/ 安装的 requirements.txt（pip 按 requirements 文件所在目录解析相对路径）"""
+    return f"--no-index\n--find-links {WHEELS_DIR}\n".encode("utf-8") + requirements
+
+
+def _date_time() -> tuple:
+    epoch = os.environ.get("SOURCE_DATE_EPOCH")
+    if not epoch:
+        return ZIP_EPOCH
+    return max(ZIP_EPOCH, time.gmtime(int(epoch))[:6])
+
+
+def write_archive(entries: Dict[str, bytes], output: str) -> None:
+    """按路径顺序写入 zip，时间戳、权限、压缩参数固定"""
+    date_time = _date_time()
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zipf:
+        for arcname in sorted(entries):
+            info = zipfile.ZipInfo(arcname, date_time=date_time)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.create_system = 3
+            info.external_attr = 0o644 << 16
+            zipf.writestr(info, entries[arcname], compresslevel=9)
+    with open(output, "wb") as f:
+        f.write(buffer.getvalue())
+
+
+def build(
+    output: str,
+    root: str = ROOT,
+    bytecode: Optional[bool] = None,
+    vendor: bool = False,
+    wheels_dir: Optional[str] = None
+) -> Dict[str, bytes]:
+    """打包，返回写入的条目（路径 -> 内容）
+
+    bytecode 为 None 时按构建用的 Python 版本是否与运行时一致决定；
+    wheels_dir 指定时使用其中已下载的 wheel，不再下载。
+    """
+    entries: Dict[str, bytes] = {}
+    for path in collect_files(root):
+        with open(os.path.join(root, path), "rb") as f:
+            entries[path] = f.read()
+
+    version = runner_version(root)
+    build_version = f"{sys.version_info.major}.{sys.version_info.minor}"
+    if bytecode is None:
+        bytecode = version == build_version
+        if not bytecode:
+            print(f"Skipping bytecode: building with Python {build_version}, plugin runs on Python {version}")
+    if bytecode:
+        for path in [path for path in entries if path.endswith(".py")]:
+            entries[importlib.util.cache_from_source(path)] = compile_bytecode(root, path)
+
+    if vendor:
+        with tempfile.TemporaryDirectory() as download_dir:
+            source_dir = wheels_dir or download_dir
+            wheels = download_wheels(root, download_dir) if wheels_dir is None else sorted(
+                name for name in os.listdir(wheels_dir) if name.endswith(".whl")
+            )
+            for name in wheels:
+                with open(os.path.join(source_dir, name), "rb") as f:
+                    entries[f"{WHEELS_DIR}/{name}"] = f.read()
+        entries["requirements.txt"] = offline_requirements(entries["requirements.txt"])
+
+    write_archive(entries, output)
+    return entries
+
+
+def verify(package: str) -> Dict[str, float]:
+    """在临时目录解压并安装依赖、导入入口模块，返回各步骤耗时（秒）"""
+    with tempfile.TemporaryDirectory() as workdir:
+        plugin_dir = os.path.join(workdir, "plugin")
+        site_dir = os.path.join(workdir, "site")
+        with zipfile.ZipFile(package) as zipf:
+            zipf.extractall(plugin_dir)
+
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-m", "pip", "install", "--quiet", "--disable-pip-version-check",
+             "--target", site_dir, "-r", os.path.join(plugin_dir, "requirements.txt")],
+            check=True
+        )
+        install_seconds = time.perf_counter() - start
+
+        # 入口 main.py 会启动插件进程，只导入其余模块
+        entrypoint = f"{load_yaml(plugin_dir, 'manifest.yaml')['meta']['entrypoint']}.py"
+        modules = [path[:-3].replace("/", ".") for path in collect_files(plugin_dir)
+                   if path.endswith(".py") and path != entrypoint]
+        env = {**os.environ, "PYTHONPATH": site_dir, "PYTHONDONTWRITEBYTECODE": "1", "SORA2_HTTP_WARMUP": "0"}
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", f"for name in {modules!r}: __import__(name)"],
+            cwd=plugin_dir, env=env, check=True
+        )
+        import_seconds = time.perf_counter() - start
+    return {"install_seconds": install_seconds, "import_seconds": import_seconds}
+
+
+def _format_size(size: int) -> str:
+    return f"{size / 1024:.1f} KB" if size < 1024 * 1024 else f"{size / 1024 / 1024:.2f} MB"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    manifest = load_yaml(ROOT, "manifest.yaml")
+    parser = argparse.ArgumentParser(description="打包 Dify 插件")
+    parser.add_argument("--output", default=os.path.join(ROOT, f"{manifest['name']}.difypkg"), help="输出文件")
+    parser.add_argument("--vendor", action="store_true", help="把依赖的 wheel 打进包里，离线安装")
+    parser.add_argument("--no-bytecode", action="store_true", help="不附带预编译的 .pyc")
+    parser.add_argument("--verify", action="store_true", help="打包后解压、安装依赖并导入入口模块，测量耗时")
+    parser.add_argument("--max-size-mb", type=float, default=DEFAULT_MAX_SIZE_MB, help="包大小预算（MB）")
+    parser.add_argument("--max-install-seconds", type=float, default=DEFAULT_MAX_INSTALL_SECONDS,
+                        help="安装耗时预算（秒，需要 --verify）")
+    args = parser.parse_args(argv)
+
+    entries = build(args.output, bytecode=False if args.no_bytecode else None, vendor=args.vendor)
+    size = os.path.getsize(args.output)
+    counts = {
+        "bytecode": sum(path.endswith(".pyc") for path in entries),
+        "wheels": sum(path.startswith(f"{WHEELS_DIR}/") for path in entries),
+    }
+    print(f"Package created: {os.path.relpath(args.output)}")
+    print(f"  files: {len(entries)} ({counts['bytecode']} bytecode, {counts['wheels']} wheels)")
+
+    within_budget = True
+    budget = args.max_size_mb * 1024 * 1024
+    within_budget &= size <= budget
+    print(f"  size: {_format_size(size)} / budget {_format_size(int(budget))}"
+          f"{'' if size <= budget else '  OVER BUDGET'}")
+
+    build_version = f"{sys.version_info.major}.{sys.version_info.minor}"
+    if args.verify and args.vendor and build_version != runner_version():
+        # 包内的 wheel 是为运行时版本下载的，当前解释器无法安装
+        print(f"  install: skipped (vendored wheels target Python {runner_version()}, "
+              f"verifying needs the same version, not {build_version})")
+    elif args.verify:
+        timings = verify(args.output)
+        over = timings["install_seconds"] > args.max_install_seconds
+        within_budget &= not over
+        print(f"  install: {timings['install_seconds']:.1f} s / budget {args.max_install_seconds:g} s"
+              f"{'  OVER BUDGET' if over else ''}")
+        print(f"  import: {timings['import_seconds']:.2f} s")
+    return 0 if within_budget else 1
+
 
-# 删除旧包
-if os.path.exists('sora2-video-plugin.difypkg'):
-    os.remove('sora2-video-plugin.difypkg')
-
-# 文件列表
-files_to_include = [
-    'manifest.yaml',
-    'main.py',
-    'requirements.txt',
-    '_assets/icon.svg',
-    'provider/sora2.yaml',
-    'provider/sora2.py',
-    'tools/text_to_video.yaml',
-    'tools/text_to_video.py',
-    'tools/image_to_video.yaml',
-    'tools/image_to_video.py'
-]
-
-# 创建新的 zip 包
-with zipfile.ZipFile('sora2-video-plugin.difypkg', 'w', zipfile.ZIP_DEFLATED) as zipf:
-    for file_path in files_to_include:
-        if os.path.exists(file_path):
-            arcname = file_path.replace(os.sep, '/')
-            zipf.write(file_path, arcname)
-            print(f'Added: {arcname}')
-        else:
-            print(f'Missing: {file_path}')
-
-print('')
-print('Package created: sora2-video-plugin.difypkg')
-
-# 验证内容
-print('')
-print('Package contents:')
-with zipfile.ZipFile('sora2-video-plugin.difypkg', 'r') as zipf:
-    for info in zipf.filelist:
-        print(f'  {info.filename}: {info.file_size} bytes')
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,24 +1,69 @@
-from typing import Any
+from typing import Any, Optional
 from dify_plugin import ToolProvider
 from dify_plugin.errors.tool import ToolProviderCredentialValidationError
-import requests
+
+# 只做凭证校验的进程也会加载 Provider：校验用到的模块在校验时才导入，
+# 轮询引擎（连同它的线程、SQLite 和连接预热）在工具第一次使用时才创建
+
+# 校验用的探测请求：查询一个不存在的任务，只看状态码。
+# 2xx 和参数校验失败（400 / 422）说明 Key 通过了鉴权；401 / 403 说明 Key 无效或被禁用；
+# 其他状态（404、5xx 等，例如 base URL 配错或平台故障）无法判断，不缓存
+VALID_STATUSES = {400, 422}
+INVALID_STATUSES = {401, 403}
+ZHENZHEN_PROBE_PATH = "/v2/videos/generations/validate"
+JUXIN_PROBE_PATH = "/v1/video/query"
+JUXIN_PROBE_PARAMS = {"id": "validate"}
 
 
 class Sora2Provider(ToolProvider):
     def _validate_credentials(self, credentials: dict[str, Any]) -> None:
-        """验证 API Key 是否有效"""
+        """验证 API Key 是否有效（结果按 Key 的哈希缓存）"""
         api_key = credentials.get("api_key")
         if not api_key:
             raise ToolProviderCredentialValidationError("API Key is required")
+        from utils.backends import JUXIN_BASE_URL, ZHENZHEN_BASE_URL
+
+        self._check_key(f"{ZHENZHEN_BASE_URL}{ZHENZHEN_PROBE_PATH}", api_key, "")
+
+        # 可选的聚鑫平台 API Key
+        juxin_api_key = credentials.get("juxin_api_key")
+        if juxin_api_key:
+            self._check_key(f"{JUXIN_BASE_URL}{JUXIN_PROBE_PATH}", juxin_api_key, "Juxin ", JUXIN_PROBE_PARAMS)
+
+    @staticmethod
+    def _check_key(probe_url: str, api_key: str, platform: str, params: Optional[dict] = None) -> None:
+        """探测 Key 是否有效；只缓存明确的结果，无法判断的状态码和网络错误不缓存"""
+        import requests
+
+        from utils import http_client
+        from utils.credential_cache import get_credential_cache
+
+        cache = get_credential_cache()
+        valid = cache.get(probe_url, api_key)
+        if valid is None:
+            try:
+                # stream=True 只读取状态行和响应头，不下载响应体
+                response = http_client.get(
+                    probe_url,
+                    headers={"Authorization": f"Bearer {api_key}"},
+                    params=params,
+                    timeout=10,
+                    stream=True
+                )
+                response.close()
+            except requests.RequestException as e:
+                raise ToolProviderCredentialValidationError(f"{platform}API connection failed: {str(e)}")
+            status = response.status_code
+            if status >= 500:
+                # 平台暂时不可用，下次校验重新探测
+                raise ToolProviderCredentialValidationError(f"{platform}API unavailable: HTTP {status}")
+            if 200 <= status < 300 or status in VALID_STATUSES:
+                valid = True
+            elif status in INVALID_STATUSES:
+                valid = False
+            else:
+                raise ToolProviderCredentialValidationError(f"{platform}API unexpected response: HTTP {status}")
+            cache.put(probe_url, api_key, valid)
 
-        # 测试 API 连接
-        try:
-            response = requests.get(
-                "https://ai.t8star.cn/v2/videos/generations",
-                headers={"Authorization": f"Bearer {api_key}"},
-                timeout=10
-            )
-            if response.status_code == 401:
-                raise ToolProviderCredentialValidationError("Invalid API Key")
-        except requests.RequestException as e:
-            raise ToolProviderCredentialValidationError(f"API connection failed: {str(e)}")
+        if not valid:
+            raise ToolProviderCredentialValidationError(f"Invalid {platform}API Key")
@@ -1,8 +1,12 @@
 """
 Direct API test script for Zhenzhen platform Sora2 API
-Run with: python test_api.py
+Run with: SORA2_API_KEY=sk-... python test_api.py
+
+Against the local simulator (benchmarks/simulator.py):
+    SORA2_API_KEY=sim SORA2_ZHENZHEN_BASE_URL=http://127.0.0.1:8765 python test_api.py
 """
 
+import os
 import requests
 import time
 import json
@@ -13,8 +17,8 @@ import io
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
 # Test credentials
-API_KEY = "sk-2TqUEzLnk28nJzvXBRPlMX25a1F23hYXZy0BlRxDtWE4Kcn0"
-BASE_URL = "https://ai.t8star.cn"
+API_KEY = os.getenv("SORA2_API_KEY", "")
+BASE_URL = os.getenv("SORA2_ZHENZHEN_BASE_URL", "https://ai.t8star.cn").rstrip("/")
 
 HEADERS = {
     "Authorization": f"Bearer {API_KEY}",
@@ -152,7 +156,11 @@ def test_provider_validation():
 
 
 if __name__ == "__main__":
+    if not API_KEY:
+        sys.exit("SORA2_API_KEY is not set")
+
     print("Sora2 API Test Script")
+    print(f"Base URL: {BASE_URL}")
     print("=" * 40)
 
     # Test 1: Provider validation
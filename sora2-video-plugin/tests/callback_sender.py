@@ -0,0 +1,69 @@
+"""Local stand-in for the video platform's completion callback
+
+CallbackSender plays the platform side of callback mode: its ``handler`` serves
+create / query requests on an httpx MockTransport and remembers the callback URL
+sent with each create request. ``complete()`` finishes a task and delivers the
+notification to the plugin's callback endpoint in-process, the way the platform
+would POST it to the Dify endpoint URL.
+"""
+
+import json
+import threading
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from unittest.mock import Mock, patch
+from werkzeug import Request
+from werkzeug.test import EnvironBuilder
+
+from endpoints.callback import CallbackEndpoint
+
+CALLBACK_URL = "https://dify.example.com/e/abc123/sora2/callback"
+VIDEO_URL = "https://example.com/video.mp4"
+
+
+class CallbackSender:
+    """Fake platform that creates tasks and sends completion callbacks"""
+
+    def __init__(self, engine, callback_field: str = "notify_hook"):
+        self.engine = engine
+        self.callback_field = callback_field
+        self.statuses: Dict[str, dict] = {}
+        self.callback_urls: Dict[str, Optional[str]] = {}
+        self.created: List[dict] = []
+        self.queries: List[str] = []
+        self.sent: List[dict] = []
+        self._lock = threading.Lock()
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        """httpx MockTransport handler for create and query requests"""
+        with self._lock:
+            if request.method == "POST":
+                body = json.loads(request.content)
+                task_id = f"task_{len(self.created) + 1}"
+                self.created.append(body)
+                self.callback_urls[task_id] = body.get(self.callback_field)
+                self.statuses[task_id] = {"status": "IN_PROGRESS", "progress": "10%"}
+                return httpx.Response(200, json={"task_id": task_id})
+            task_id = request.url.path.rsplit("/", 1)[-1]
+            self.queries.append(task_id)
+            return httpx.Response(200, json=self.statuses[task_id])
+
+    def complete(self, task_id: str, video_url: str = VIDEO_URL, notify: bool = True) -> Optional[dict]:
+        """Finish the task, then POST the callback if one was registered; returns the endpoint's reply"""
+        with self._lock:
+            self.statuses[task_id] = {"status": "SUCCESS", "progress": "100%", "data": {"output": video_url}}
+            url = self.callback_urls.get(task_id)
+        if not notify or not url:
+            return None
+        return self.send(url, {"task_id": task_id, "status": "SUCCESS"})
+
+    def send(self, url: str, payload: dict) -> dict:
+        """Deliver a callback body to the plugin endpoint and return its JSON reply"""
+        request = Request(EnvironBuilder(path=urlsplit(url).path, method="POST", json=payload).get_environ())
+        with patch("endpoints.callback.get_engine", return_value=self.engine):
+            response = CallbackEndpoint(Mock()).invoke(request, {}, {})
+        reply = {"status_code": response.status_code, **json.loads(response.get_data())}
+        self.sent.append(reply)
+        return reply
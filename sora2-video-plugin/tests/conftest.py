@@ -1,8 +1,44 @@
 """Pytest configuration and fixtures for sora2-video-plugin tests"""
 
+import os
+import tempfile
+import httpx
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 
+# Do not open real connections when the provider module is imported
+os.environ.setdefault("SORA2_HTTP_WARMUP", "0")
+# Keep the task registry and other local state out of the home directory
+os.environ.setdefault("SORA2_PLUGIN_DATA_DIR", tempfile.mkdtemp(prefix="sora2-tests-"))
+
+
+@pytest.fixture(autouse=True)
+def reset_shared_engine():
+    """Stop the process-wide poll engine and drop its breaker/router state after each test
+
+    Tests that invoke a tool without patching get_engine would otherwise leave the engine's
+    event loop running and a tripped circuit breaker behind for later tests. Cached credential
+    checks, the process-wide metrics and the completion history are dropped too, so every
+    provider test probes the (mocked) API.
+    """
+    yield
+    import utils.async_engine as async_engine
+    import utils.backends as backends
+    import utils.circuit_breaker as circuit_breaker
+    import utils.credential_cache as credential_cache
+    import utils.latency_history as latency_history
+    import utils.metrics as metrics
+
+    credential_cache._cache = None
+    metrics._metrics = None
+    latency_history._history = None
+
+    engine, async_engine._engine = async_engine._engine, None
+    if engine is not None:
+        engine.shutdown()
+        circuit_breaker._breakers = None
+        backends._router = None
+
 
 @pytest.fixture
 def mock_api_key():
@@ -10,6 +46,14 @@ def mock_api_key():
     return "test_api_key_12345"
 
 
+@pytest.fixture
+def mock_account(mock_api_key):
+    """Account hash of the mock API Key (task registry and character cache owner)"""
+    from utils.backends import account_key
+
+    return account_key(mock_api_key)
+
+
 @pytest.fixture
 def mock_credentials(mock_api_key):
     """Mock credentials dict"""
@@ -55,31 +99,32 @@ def mock_video_task_response():
 
 @pytest.fixture
 def mock_video_completed_response():
-    """Mock completed video task response"""
+    """Mock completed video task query response (Zhenzhen format)"""
     return {
         "task_id": "test_task_123",
-        "status": "completed",
-        "video_url": "https://example.com/video.mp4",
-        "duration": "5s"
+        "status": "SUCCESS",
+        "progress": "100%",
+        "data": {"output": "https://example.com/video.mp4"}
     }
 
 
 @pytest.fixture
 def mock_video_processing_response():
-    """Mock processing video task response"""
+    """Mock processing video task query response (Zhenzhen format)"""
     return {
         "task_id": "test_task_123",
-        "status": "processing"
+        "status": "IN_PROGRESS",
+        "progress": "50%"
     }
 
 
 @pytest.fixture
 def mock_video_failed_response():
-    """Mock failed video task response"""
+    """Mock failed video task query response (Zhenzhen format)"""
     return {
         "task_id": "test_task_123",
-        "status": "failed",
-        "error": "Generation failed"
+        "status": "FAILURE",
+        "fail_reason": "Generation failed"
     }
 
 
@@ -104,3 +149,74 @@ def image_to_video_params():
         "duration": "10",
         "aspect_ratio": "16:9"
     }
+
+
+@pytest.fixture
+def make_engine():
+    """Factory for AsyncPollEngine instances served by an in-process httpx handler"""
+    from utils.async_engine import AsyncPollEngine
+    from utils.backends import BackendRouter
+    from utils.circuit_breaker import CircuitBreakers
+    from utils.latency_history import LatencyHistory
+    from utils.retry import RetryPolicy
+
+    engines = []
+
+    def factory(handler):
+        # Fresh router stats, breakers and completion history so tests cannot affect each other;
+        # retry without sleeping
+        engine = AsyncPollEngine(
+            client_factory=lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+            router=BackendRouter(),
+            breakers=CircuitBreakers(),
+            retry_policy=RetryPolicy(base_delay=0),
+            latency=LatencyHistory(":memory:")
+        )
+        engines.append(engine)
+        return engine
+
+    yield factory
+    for engine in engines:
+        engine.shutdown()
+
+
+@pytest.fixture
+def no_poll_delay():
+    """Make the engine's default schedulers poll without sleeping"""
+    from utils.polling import PollScheduler
+
+    def scheduler(**kwargs):
+        return PollScheduler(min_interval=0, max_interval=0, queue_interval=0, **kwargs)
+
+    with patch("utils.async_engine.PollScheduler", side_effect=scheduler):
+        yield
+
+
+@pytest.fixture
+def run_tool(make_engine, no_poll_delay):
+    """Invoke a video tool against an in-process platform handler and return its JSON messages
+
+    The tool gets its own engine and an empty result cache, so no request leaves the process.
+    timeout replaces the history-sized deadline of the engine.
+    """
+    from utils.result_cache import ResultCache
+
+    def run(tool, handler, tool_parameters, timeout=None):
+        engine = make_engine(handler)
+        if timeout is not None:
+            engine.latency.timeout = lambda backend, params: timeout
+        with patch("utils.video_tool.get_engine", return_value=engine), \
+             patch("utils.video_tool.get_result_cache", return_value=ResultCache()):
+            return [message.message.json_object for message in tool._invoke(tool_parameters)]
+
+    return run
+
+
+@pytest.fixture
+def task_registry(tmp_path):
+    """Fresh task registry backed by a temporary SQLite file"""
+    from utils.task_registry import TaskRegistry
+
+    registry = TaskRegistry(str(tmp_path / "tasks.db"))
+    yield registry
+    registry.close()
@@ -0,0 +1,288 @@
+"""Tests for the asyncio polling engine"""
+
+import asyncio
+import threading
+import time
+
+import httpx
+from unittest.mock import patch
+
+from utils.async_engine import parse_task_response
+from utils.backends import ZhenzhenBackend
+from utils.polling import PollScheduler
+from tools.text_to_video import TextToVideoTool
+
+BACKEND = ZhenzhenBackend("test_key")
+
+
+def fast_scheduler():
+    """Scheduler that never sleeps, so tests run instantly"""
+    return PollScheduler(min_interval=0, max_interval=0, queue_interval=0)
+
+
+def scripted_handler(statuses, task_id="task_1"):
+    """Create returns task_id, each query returns the next scripted status"""
+    remaining = list(statuses)
+
+    def handler(request):
+        if request.method == "POST":
+            return httpx.Response(200, json={"task_id": task_id})
+        return httpx.Response(200, json=remaining.pop(0) if len(remaining) > 1 else remaining[0])
+
+    return handler
+
+
+class TestParseTaskResponse:
+    """Test query response parsing"""
+
+    def test_parse_success_response(self):
+        """Test video_url extraction from data.output"""
+        result = parse_task_response({
+            "status": "SUCCESS", "progress": "100%",
+            "data": {"output": "https://example.com/video.mp4"}
+        })
+        assert result["video_url"] == "https://example.com/video.mp4"
+
+    def test_parse_pending_info(self):
+        """Test progress_pct and queue position from detail.pending_info"""
+        result = parse_task_response({
+            "status": "pending",
+            "detail": {"pending_info": {"progress_pct": 0.4, "progress_pos_in_queue": 3}}
+        })
+        assert result["progress_pct"] == 0.4
+        assert result["queue_position"] == 3
+
+    def test_parse_preview_fields(self):
+        """Test thumbnail_url and enhanced_prompt from the top level or detail"""
+        result = parse_task_response({
+            "status": "IN_PROGRESS",
+            "enhanced_prompt": "An orange cat runs across a meadow",
+            "detail": {"thumbnail_url": "https://example.com/t.webp"}
+        })
+        assert result["thumbnail_url"] == "https://example.com/t.webp"
+        assert result["enhanced_prompt"] == "An orange cat runs across a meadow"
+        assert "thumbnail_url" not in parse_task_response({"status": "IN_PROGRESS", "thumbnail_url": None})
+
+
+class TestAsyncPollEngine:
+    """Test event flow through the engine"""
+
+    def test_submit_emits_lifecycle_events(self, make_engine):
+        """Test created -> progress -> completed"""
+        engine = make_engine(scripted_handler([
+            {"status": "IN_PROGRESS", "progress": "50%"},
+            {"status": "SUCCESS", "progress": "100%", "data": {"output": "https://example.com/v.mp4"}},
+        ]))
+
+        events = list(engine.submit(BACKEND, {"prompt": "x"}, scheduler=fast_scheduler()).events())
+
+        assert [e["type"] for e in events] == ["created", "progress", "progress", "completed"]
+        assert events[-1]["result"]["video_url"] == "https://example.com/v.mp4"
+        assert events[-1]["polls"] == 2
+
+    def test_preview_event_before_completion(self, make_engine):
+        """Test that preview fields are emitted once, as soon as they appear"""
+        engine = make_engine(scripted_handler([
+            {"status": "IN_PROGRESS", "progress": "10%", "enhanced_prompt": "cat"},
+            {"status": "IN_PROGRESS", "progress": "60%", "enhanced_prompt": "cat", "thumbnail_url": "https://t"},
+            {"status": "IN_PROGRESS", "progress": "90%", "enhanced_prompt": "cat", "thumbnail_url": "https://t"},
+            {"status": "SUCCESS", "thumbnail_url": "https://t", "data": {"output": "https://example.com/v.mp4"}},
+        ]))
+
+        events = list(engine.submit(BACKEND, {"prompt": "x"}, scheduler=fast_scheduler()).events())
+
+        previews = [e for e in events if e["type"] == "preview"]
+        assert previews == [
+            {"type": "preview", "task_id": "task_1", "enhanced_prompt": "cat"},
+            {"type": "preview", "task_id": "task_1", "enhanced_prompt": "cat", "thumbnail_url": "https://t"},
+        ]
+        assert events.index(previews[-1]) < len(events) - 1
+
+    def test_failure_event(self, make_engine):
+        """Test that FAILURE ends with a failed event"""
+        engine = make_engine(scripted_handler([{"status": "FAILURE", "fail_reason": "policy"}]))
+
+        events = list(engine.submit(BACKEND, {"prompt": "x"}, scheduler=fast_scheduler()).events())
+
+        timing = events[-1].pop("timing")
+        assert events[-1] == {"type": "failed", "task_id": "task_1", "error": "policy", "polls": 1}
+        assert timing["polls"] == 1 and timing["errors"] == 0
+
+    def test_timeout_event(self, make_engine):
+        """Test that a task still running at the deadline times out"""
+        engine = make_engine(scripted_handler([{"status": "IN_PROGRESS"}]))
+        scheduler = PollScheduler(min_interval=0.01, max_interval=0.01, queue_interval=0.01)
+
+        events = list(engine.submit(BACKEND, {"prompt": "x"}, timeout=0.05, scheduler=scheduler).events())
+
+        assert events[-1]["type"] == "timeout"
+        assert "超时" in events[-1]["error"]
+
+    def test_create_error_event(self, make_engine):
+        """Test that an HTTP error on create is reported as an error event"""
+        engine = make_engine(lambda request: httpx.Response(500, json={}))
+
+        events = list(engine.submit(BACKEND, {"prompt": "x"}, scheduler=fast_scheduler()).events())
+
+        assert len(events) == 1
+        assert events[0]["type"] == "error"
+        assert events[0]["task_id"] is None
+
+    def test_watch_existing_task(self, make_engine):
+        """Test that watch() polls without creating a task"""
+        engine = make_engine(scripted_handler([{"status": "SUCCESS", "data": {"output": "https://example.com/v.mp4"}}]))
+
+        events = list(engine.watch(BACKEND, "task_9", scheduler=fast_scheduler()).events())
+
+        assert [e["type"] for e in events] == ["completed"]
+        assert events[0]["task_id"] == "task_9"
+
+    def test_many_tasks_share_one_loop(self, make_engine):
+        """Test that hundreds of tasks wait concurrently instead of serially"""
+        counter = {"n": 0}
+
+        async def handler(request):
+            await asyncio.sleep(0.05)
+            if request.method == "POST":
+                counter["n"] += 1
+                return httpx.Response(200, json={"task_id": f"task_{counter['n']}"})
+            return httpx.Response(200, json={"status": "SUCCESS", "data": {"output": "https://example.com/v.mp4"}})
+
+        engine = make_engine(handler)
+
+        start = time.monotonic()
+        handles = [engine.submit(BACKEND, {"prompt": str(i)}, scheduler=fast_scheduler()) for i in range(200)]
+        finals = [list(handle.events())[-1] for handle in handles]
+        elapsed = time.monotonic() - start
+
+        assert all(event["type"] == "completed" for event in finals)
+        assert len({event["task_id"] for event in finals}) == 200
+        # 200 tasks x 2 requests x 50ms would take 20s serially
+        assert elapsed < 5
+        assert engine.in_flight == 0
+
+    def test_abandoned_invocation_cancels_task(self, make_engine):
+        """Test that closing the event iterator cancels the coroutine"""
+        engine = make_engine(scripted_handler([{"status": "IN_PROGRESS"}]))
+        scheduler = PollScheduler(min_interval=10, max_interval=10)
+
+        handle = engine.submit(BACKEND, {"prompt": "x"}, scheduler=scheduler)
+        events = handle.events()
+        assert next(events)["type"] == "created"
+        events.close()
+
+        for _ in range(50):
+            if handle.future.done():
+                break
+            time.sleep(0.01)
+        assert handle.future.cancelled()
+
+
+class TestSharedPolling:
+    """Test that every task_id has a single poll stream per process"""
+
+    @staticmethod
+    def counting_handler(ready, queries):
+        """Queries stay IN_PROGRESS until `ready` is set; each GET is counted"""
+        async def handler(request):
+            queries.append(request.url.path)
+            if ready.is_set():
+                return httpx.Response(200, json={"status": "SUCCESS", "data": {"output": "https://example.com/v.mp4"}})
+            return httpx.Response(200, json={"status": "IN_PROGRESS", "progress": "50%"})
+
+        return handler
+
+    def test_concurrent_watchers_share_queries(self, make_engine):
+        """Test that two watchers of one task send one query per poll, not two"""
+        ready = threading.Event()
+        queries = []
+        engine = make_engine(self.counting_handler(ready, queries))
+        scheduler = PollScheduler(min_interval=0.05, max_interval=0.05, queue_interval=0.05)
+
+        first = engine.watch(BACKEND, "task_7", scheduler=scheduler)
+        second = engine.watch(BACKEND, "task_7", scheduler=fast_scheduler())
+        time.sleep(0.3)
+        ready.set()
+        first_events = list(first.events())
+        second_events = list(second.events())
+
+        assert first_events[-1]["type"] == second_events[-1]["type"] == "completed"
+        # the late watcher gets the progress already seen by the first one
+        assert [e["type"] for e in second_events] == ["progress", "completed"]
+        # the second watcher's zero-delay scheduler is unused: polling stays at the shared 50ms pace
+        assert len(queries) < 12
+        assert engine.shared_streams == 0
+
+    def test_watcher_timeout_keeps_stream_for_others(self, make_engine):
+        """Test that one watcher timing out does not stop the poll for the other"""
+        ready = threading.Event()
+        queries = []
+        engine = make_engine(self.counting_handler(ready, queries))
+
+        short = engine.watch(BACKEND, "task_8", timeout=0.1, scheduler=PollScheduler(min_interval=0.02, max_interval=0.02))
+        long = engine.watch(BACKEND, "task_8", timeout=5)
+        assert list(short.events())[-1]["type"] == "timeout"
+
+        ready.set()
+        assert list(long.events())[-1]["type"] == "completed"
+
+    def test_resume_joins_running_submit(self, make_engine):
+        """Test that watch() on a task created by submit() joins its poll stream"""
+        ready = threading.Event()
+        queries = []
+        handler = self.counting_handler(ready, queries)
+
+        async def create_then_poll(request):
+            if request.method == "POST":
+                return httpx.Response(200, json={"task_id": "task_9"})
+            return await handler(request)
+
+        engine = make_engine(create_then_poll)
+        scheduler = PollScheduler(min_interval=0.05, max_interval=0.05, queue_interval=0.05)
+        submitted = engine.submit(BACKEND, {"prompt": "x"}, scheduler=scheduler)
+        events = submitted.events()
+        assert next(events)["type"] == "created"
+
+        resumed = engine.watch(BACKEND, "task_9", scheduler=fast_scheduler())
+        time.sleep(0.2)
+        ready.set()
+
+        assert list(events)[-1]["type"] == "completed"
+        assert list(resumed.events())[-1]["type"] == "completed"
+        assert len(queries) < 8
+
+
+class TestToolUsesEngine:
+    """Test that the tools translate engine events into messages"""
+
+    def test_invoke_reports_completed(self, make_engine, no_poll_delay, mock_tool_runtime, mock_tool_session):
+        """Test pending and completed messages with poll count"""
+        engine = make_engine(scripted_handler([
+            {"status": "IN_PROGRESS"},
+            {"status": "SUCCESS", "data": {"output": "https://example.com/video.mp4"}},
+        ]))
+        tool = TextToVideoTool(mock_tool_runtime, mock_tool_session)
+
+        with patch("utils.video_tool.get_engine", return_value=engine):
+            results = list(tool._invoke({"prompt": "a cat"}))
+
+        messages = [r.message.json_object for r in results]
+        assert messages[0]["status"] == "pending"
+        assert messages[-1]["status"] == "completed"
+        assert messages[-1]["video_url"] == "https://example.com/video.mp4"
+        assert messages[-1]["polls"] == 2
+
+    def test_invoke_reports_preview(self, make_engine, no_poll_delay, mock_tool_runtime, mock_tool_session):
+        """Test that the thumbnail is returned before the video and kept in the final result"""
+        engine = make_engine(scripted_handler([
+            {"status": "IN_PROGRESS", "thumbnail_url": "https://example.com/t.webp"},
+            {"status": "SUCCESS", "thumbnail_url": "https://example.com/t.webp",
+             "data": {"output": "https://example.com/video.mp4"}},
+        ]))
+        tool = TextToVideoTool(mock_tool_runtime, mock_tool_session)
+
+        with patch("utils.video_tool.get_engine", return_value=engine):
+            messages = [r.message.json_object for r in tool._invoke({"prompt": "a preview cat"})]
+
+        assert messages[1] == {"task_id": "task_1", "status": "processing", "thumbnail_url": "https://example.com/t.webp"}
+        assert messages[-1]["thumbnail_url"] == "https://example.com/t.webp"
@@ -0,0 +1,302 @@
+"""Tests for the Zhenzhen / Juxin backends and the latency router"""
+
+import httpx
+import pytest
+from unittest.mock import Mock, patch
+
+from utils.async_engine import AsyncPollEngine
+from utils.backends import (
+    JUXIN, ZHENZHEN, BackendRouter, JuxinBackend, JuxinOpenAIBackend, ZhenzhenBackend, account_key, backend_for_task,
+    backends_from_credentials
+)
+from utils.circuit_breaker import CircuitBreakers
+from utils.latency_history import LatencyHistory
+from utils.polling import PollScheduler
+from tools.text_to_video import TextToVideoTool
+
+ZHENZHEN_BACKEND = ZhenzhenBackend("zz_key")
+JUXIN_BACKEND = JuxinBackend("jx_key")
+
+
+class TestJuxinBackend:
+    """Test the Juxin unified-format adapter"""
+
+    def test_create_request_maps_params(self):
+        """Test that tool params become a /v1/video/create body"""
+        url, body = JUXIN_BACKEND.create_request({
+            "prompt": "猫", "model": "sora-2-pro", "duration": "15", "aspect_ratio": "9:16", "images": ["a.png"]
+        })
+
+        assert url == "https://api.jxincm.cn/v1/video/create"
+        assert body["orientation"] == "portrait"
+        assert body["duration"] == 15
+        assert body["size"] == "large"
+        assert body["images"] == ["a.png"]
+
+    def test_query_request_uses_id_parameter(self):
+        """Test that tasks are queried with ?id="""
+        assert JUXIN_BACKEND.query_request("sora-2:task_1") == (
+            "https://api.jxincm.cn/v1/video/query", {"id": "sora-2:task_1"}
+        )
+
+    def test_parse_created(self):
+        """Test that the task id comes from the id field"""
+        assert JUXIN_BACKEND.parse_created({"id": "sora-2:task_1", "status": "pending"}) == "sora-2:task_1"
+
+    def test_parse_pending_with_progress(self):
+        """Test that a pending task with render progress counts as in progress"""
+        result = JUXIN_BACKEND.parse_status({
+            "status": "pending",
+            "detail": {"pending_info": {"progress_pct": 0.93, "progress_pos_in_queue": None}}
+        })
+
+        assert result["status"] == "IN_PROGRESS"
+        assert result["progress"] == "93%"
+        assert result["progress_pct"] == 0.93
+
+    def test_parse_queued(self):
+        """Test a task waiting in the queue"""
+        result = JUXIN_BACKEND.parse_status({"status": "queued", "detail": {"pending_info": {"progress_pos_in_queue": 4}}})
+
+        assert result["status"] == "NOT_START"
+        assert result["queue_position"] == 4
+
+    def test_parse_completed(self):
+        """Test that the top-level video_url is returned"""
+        result = JUXIN_BACKEND.parse_status({"status": "completed", "video_url": "https://example.com/v.mp4"})
+
+        assert result["status"] == "SUCCESS"
+        assert result["progress"] == "100%"
+        assert result["video_url"] == "https://example.com/v.mp4"
+
+    def test_parse_preview_fields(self):
+        """Test that the thumbnail and enhanced prompt are returned while rendering"""
+        result = JUXIN_BACKEND.parse_status({
+            "status": "processing",
+            "enhanced_prompt": "A cat, cinematic lighting",
+            "detail": {"thumbnail_url": "https://example.com/t.webp"}
+        })
+
+        assert result["thumbnail_url"] == "https://example.com/t.webp"
+        assert result["enhanced_prompt"] == "A cat, cinematic lighting"
+
+    def test_parse_failed(self):
+        """Test that the failure reason is taken from detail"""
+        result = JUXIN_BACKEND.parse_status({"status": "failed", "detail": {"failure_reason": "policy"}})
+
+        assert result["status"] == "FAILURE"
+        assert result["fail_reason"] == "policy"
+
+
+class TestJuxinOpenAIBackend:
+    """Test the Juxin OpenAI video-format adapter"""
+
+    def test_create_request_form_fields(self):
+        """Test that tool params become /v1/videos form fields"""
+        backend = JuxinOpenAIBackend("jx_key")
+        url, body = backend.create_request({"prompt": "猫", "model": "sora-2", "duration": "15", "aspect_ratio": "9:16"})
+
+        assert url == "https://api.jxincm.cn/v1/videos"
+        assert body == {"model": "sora-2", "prompt": "猫", "seconds": "15", "size": "9x16",
+                        "watermark": "true", "private": "false"}
+        assert backend.reference_image({"images": ["https://a/1.png", "https://a/2.png"]}) == "https://a/1.png"
+        assert JUXIN_BACKEND.reference_image({"images": ["https://a/1.png"]}) is None
+
+    def test_query_and_content_urls(self):
+        """Test the query path and the download path of video_ ids"""
+        backend = JuxinOpenAIBackend("jx_key")
+
+        assert backend.query_request("video_1") == ("https://api.jxincm.cn/v1/videos/video_1", None)
+        assert backend.content_url("video_1") == "https://api.jxincm.cn/v1/videos/video_1/content"
+
+    def test_engine_sends_multipart_with_reference(self, make_engine):
+        """Test that the engine uploads the reference image as input_reference and polls the video"""
+        seen = {}
+
+        def handler(request):
+            if request.url.host == "images.example.com":
+                return httpx.Response(200, content=b"PNGDATA", headers={"Content-Type": "image/png"})
+            if request.method == "POST":
+                seen["content_type"] = request.headers["Content-Type"]
+                seen["body"] = request.read()
+                return httpx.Response(200, json={"id": "video_1", "object": "video", "status": "queued", "progress": 0})
+            seen["query"] = request.url.path
+            return httpx.Response(200, json={"id": "video_1", "status": "completed", "progress": 100,
+                                             "video_url": "https://example.com/v.mp4"})
+
+        engine = make_engine(handler)
+        backend = JuxinOpenAIBackend("jx_key")
+        params = {"prompt": "cat", "model": "sora-2", "duration": "10", "images": ["https://images.example.com/ref.png"]}
+
+        events = list(engine.submit(backend, params, scheduler=PollScheduler(min_interval=0, max_interval=0)).events())
+
+        assert events[0]["task_id"] == "video_1"
+        assert events[-1]["result"]["video_url"] == "https://example.com/v.mp4"
+        assert seen["content_type"].startswith("multipart/form-data")
+        assert b'name="seconds"\r\n\r\n10' in seen["body"]
+        assert b'name="input_reference"; filename="ref.png"' in seen["body"]
+        assert b"PNGDATA" in seen["body"]
+        assert seen["query"] == "/v1/videos/video_1"
+
+
+class TestBackendSelection:
+    """Test building backends from credentials"""
+
+    def test_backends_from_credentials(self):
+        """Test that only platforms with a key are used, Zhenzhen first"""
+        backends = backends_from_credentials({"api_key": "zz", "juxin_api_key": "jx"})
+        assert [backend.name for backend in backends] == [ZHENZHEN, JUXIN]
+        assert backends_from_credentials({"juxin_api_key": "jx"})[0].name == JUXIN
+        assert backends_from_credentials({}) == []
+
+    def test_juxin_api_format(self):
+        """Test that the Juxin format credential picks the OpenAI video-format adapter"""
+        unified, = backends_from_credentials({"juxin_api_key": "jx", "juxin_api_format": "unified"})
+        openai, = backends_from_credentials({"juxin_api_key": "jx", "juxin_api_format": "openai"})
+
+        assert type(unified) is JuxinBackend
+        assert type(openai) is JuxinOpenAIBackend
+        assert openai.name == JUXIN
+
+    def test_backend_for_task(self):
+        """Test registry names first, then the task id format"""
+        backends = [ZHENZHEN_BACKEND, JUXIN_BACKEND]
+        assert backend_for_task(backends, "task_1", JUXIN) is JUXIN_BACKEND
+        assert backend_for_task(backends, "sora-2:task_1") is JUXIN_BACKEND
+        assert backend_for_task(backends, "task_1") is ZHENZHEN_BACKEND
+        assert backend_for_task([JUXIN_BACKEND], "task_1", ZHENZHEN) is JUXIN_BACKEND
+
+
+class TestBackendRouter:
+    """Test latency-based routing"""
+
+    def test_unmeasured_backends_are_tried_first(self):
+        """Test that a backend without data wins over a measured one"""
+        router = BackendRouter()
+        router.choose([ZHENZHEN_BACKEND])
+        router.record_submit(ZHENZHEN, 0.5)
+
+        assert router.choose([ZHENZHEN_BACKEND, JUXIN_BACKEND]) is JUXIN_BACKEND
+
+    def test_in_flight_submits_spread_load(self):
+        """Test that concurrent choices alternate while nothing is measured"""
+        router = BackendRouter()
+        backends = [ZHENZHEN_BACKEND, JUXIN_BACKEND]
+
+        assert [router.choose(backends).name for _ in range(4)] == [ZHENZHEN, JUXIN, ZHENZHEN, JUXIN]
+
+    def test_faster_completion_wins(self):
+        """Test that render speed outweighs a slightly slower submit"""
+        router = BackendRouter()
+        params = {"model": "sora-2", "duration": "10"}
+        for name, submit, render in [(ZHENZHEN, 0.5, 300), (JUXIN, 1.0, 150)]:
+            router.choose([ZHENZHEN_BACKEND if name == ZHENZHEN else JUXIN_BACKEND])
+            router.record_submit(name, submit)
+            router.record_completion(name, render, params)
+
+        assert router.choose([ZHENZHEN_BACKEND, JUXIN_BACKEND], params) is JUXIN_BACKEND
+
+    def test_failed_submit_releases_in_flight(self):
+        """Test that record_submit(None) still ends the in-flight submit"""
+        router = BackendRouter()
+        router.choose([ZHENZHEN_BACKEND])
+        router.record_submit(ZHENZHEN, None)
+
+        stats = router.snapshot()[ZHENZHEN]
+        assert stats["in_flight"] == 0
+        assert stats["submit_seconds"] is None
+
+
+def two_platform_handler(seen):
+    """Serve Zhenzhen and Juxin from one MockTransport, keyed by host"""
+    def handler(request):
+        seen.append((request.url.host, request.method, request.url.path))
+        if request.url.host == "api.jxincm.cn":
+            if request.method == "POST":
+                return httpx.Response(200, json={"id": "sora-2:task_j", "status": "pending"})
+            return httpx.Response(200, json={"status": "completed", "video_url": "https://example.com/j.mp4"})
+        if request.method == "POST":
+            return httpx.Response(200, json={"task_id": "task_z"})
+        return httpx.Response(200, json={"status": "SUCCESS", "data": {"output": "https://example.com/z.mp4"}})
+
+    return handler
+
+
+class TestEngineRouting:
+    """Test that the engine creates tasks on the routed backend"""
+
+    @pytest.fixture
+    def engine(self, task_registry):
+        self.seen = []
+        self.router = BackendRouter()
+        engine = AsyncPollEngine(
+            client_factory=lambda: httpx.AsyncClient(transport=httpx.MockTransport(two_platform_handler(self.seen))),
+            registry=task_registry,
+            router=self.router,
+            breakers=CircuitBreakers(),
+            latency=LatencyHistory(":memory:")
+        )
+        yield engine
+        engine.shutdown()
+
+    def test_submit_goes_to_fastest_backend(self, engine, task_registry):
+        """Test routing, the created event and the registry entry"""
+        self.router.choose([ZHENZHEN_BACKEND])
+        self.router.record_submit(ZHENZHEN, 5.0)
+        self.router.choose([JUXIN_BACKEND])
+        self.router.record_submit(JUXIN, 0.5)
+
+        scheduler = PollScheduler(min_interval=0, max_interval=0)
+        events = list(engine.submit([ZHENZHEN_BACKEND, JUXIN_BACKEND], {"prompt": "x"}, scheduler=scheduler).events())
+
+        assert events[0] == {"type": "created", "task_id": "sora-2:task_j", "backend": JUXIN, "eta_seconds": 60}
+        assert events[-1]["result"]["video_url"] == "https://example.com/j.mp4"
+        assert all(host == "api.jxincm.cn" for host, _, _ in self.seen)
+        assert task_registry.get("sora-2:task_j", [JUXIN_BACKEND])["backend"] == JUXIN
+        assert self.router.snapshot()[JUXIN]["completions"] == 1
+
+    def test_batch_spreads_across_backends(self, engine):
+        """Test that a batch uses both platforms when neither is measured"""
+        scheduler_factory = lambda params: PollScheduler(min_interval=0, max_interval=0)
+        handle = engine.submit_batch(
+            [ZHENZHEN_BACKEND, JUXIN_BACKEND], [{"prompt": "a"}, {"prompt": "b"}],
+            concurrency=2, scheduler_factory=scheduler_factory
+        )
+        backends = {event["backend"] for event in handle.events() if event["type"] == "created"}
+
+        assert backends == {ZHENZHEN, JUXIN}
+
+
+class TestToolBackends:
+    """Test backend handling in the tools"""
+
+    def test_resume_uses_registered_backend(self, mock_tool_session, task_registry, no_poll_delay):
+        """Test that a resumed Juxin task is polled on Juxin"""
+        seen = []
+        task_registry.record_created("sora-2:task_j", {"prompt": "x"}, backend=JUXIN, account=account_key("jx"))
+        engine = AsyncPollEngine(
+            client_factory=lambda: httpx.AsyncClient(transport=httpx.MockTransport(two_platform_handler(seen))),
+            registry=task_registry,
+            router=BackendRouter(),
+            breakers=CircuitBreakers()
+        )
+        runtime = Mock()
+        runtime.credentials = {"api_key": "zz", "juxin_api_key": "jx"}
+        tool = TextToVideoTool(runtime, mock_tool_session)
+
+        try:
+            with patch("utils.video_tool.get_engine", return_value=engine), \
+                 patch("utils.video_tool.get_registry", return_value=task_registry):
+                results = [r.message.json_object for r in tool._invoke({"task_id": "sora-2:task_j"})]
+        finally:
+            engine.shutdown()
+
+        assert seen == [("api.jxincm.cn", "GET", "/v1/video/query")]
+        assert results[-1]["video_url"] == "https://example.com/j.mp4"
+
+    def test_unconfigured_platform_rejected(self, mock_tool_runtime, mock_tool_session):
+        """Test choosing a platform without an API key"""
+        tool = TextToVideoTool(mock_tool_runtime, mock_tool_session)
+
+        results = list(tool._invoke({"prompt": "x", "backend": JUXIN}))
+        assert results[0].message.text == "平台 juxin 的 API Key 未配置"
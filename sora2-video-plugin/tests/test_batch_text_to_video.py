@@ -0,0 +1,130 @@
+"""Tests for BatchTextToVideoTool"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+from unittest.mock import Mock, patch
+
+from tools.batch_text_to_video import BatchTextToVideoTool
+
+
+def render_handler(render_delays, fail=()):
+    """Each prompt finishes after its own delay; prompts in `fail` end in FAILURE"""
+    state = {"created": 0, "in_flight": 0, "max_in_flight": 0}
+
+    async def handler(request):
+        if request.method == "POST":
+            state["in_flight"] += 1
+            state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+            await asyncio.sleep(0.02)
+            state["in_flight"] -= 1
+            prompt = json.loads(request.content)["prompt"]
+            state["created"] += 1
+            return httpx.Response(200, json={"task_id": f"task_{prompt}"})
+
+        prompt = request.url.path.rsplit("task_", 1)[1]
+        await asyncio.sleep(render_delays[prompt])
+        if prompt in fail:
+            return httpx.Response(200, json={"status": "FAILURE", "fail_reason": "policy"})
+        return httpx.Response(200, json={
+            "status": "SUCCESS", "data": {"output": f"https://example.com/{prompt}.mp4"}
+        })
+
+    return handler, state
+
+
+class TestBatchTextToVideoTool:
+    """Test cases for BatchTextToVideoTool"""
+
+    @pytest.fixture
+    def tool(self, mock_tool_runtime, mock_tool_session):
+        return BatchTextToVideoTool(mock_tool_runtime, mock_tool_session)
+
+    def test_invoke_missing_credentials(self, mock_tool_session):
+        """Test invoke with missing API key"""
+        runtime = Mock()
+        runtime.credentials = {}
+        tool = BatchTextToVideoTool(runtime, mock_tool_session)
+
+        results = list(tool._invoke({"prompts": "a\nb"}))
+        assert results[0].message.text == "API Key 未配置"
+
+    def test_invoke_empty_prompts(self, tool):
+        """Test that an empty prompt list is rejected"""
+        results = list(tool._invoke({"prompts": "  \n "}))
+        assert results[0].message.text == "提示词列表为空"
+
+    def test_invalid_concurrency(self, tool):
+        """Test that a non-numeric concurrency is reported instead of raising"""
+        results = list(tool._invoke({"prompts": "a\nb", "concurrency": "fast"}))
+        assert results[0].message.text == "并发数必须是整数: fast"
+
+    @pytest.mark.parametrize("raw,expected", [
+        ("a cat\n\na dog\n", ["a cat", "a dog"]),
+        ('["a cat", "a dog"]', ["a cat", "a dog"]),
+        (["a cat", " "], ["a cat"]),
+        ("[not json", ["[not json"]),
+    ])
+    def test_parse_prompts(self, raw, expected):
+        """Test newline and JSON array prompt lists"""
+        assert BatchTextToVideoTool._parse_prompts(raw) == expected
+
+    def test_results_stream_in_completion_order(self, tool, make_engine, no_poll_delay):
+        """Test that each video is yielded as soon as its task completes"""
+        handler, _ = render_handler({"slow": 0.3, "fast": 0.0, "mid": 0.1})
+        engine = make_engine(handler)
+
+        with patch("tools.batch_text_to_video.get_engine", return_value=engine):
+            results = [r.message.json_object for r in tool._invoke({"prompts": "slow\nfast\nmid"})]
+
+        assert results[0]["status"] == "pending"
+        assert results[0]["total"] == 3
+        per_task = results[1:-1]
+        assert [r["prompt"] for r in per_task] == ["fast", "mid", "slow"]
+        assert per_task[0]["video_url"] == "https://example.com/fast.mp4"
+
+        summary = results[-1]
+        assert summary["status"] == "completed"
+        assert summary["succeeded"] == 3
+        # Summary keeps submission order
+        assert [v["prompt"] for v in summary["videos"]] == ["slow", "fast", "mid"]
+
+    def test_concurrency_limits_submissions(self, tool, make_engine, no_poll_delay):
+        """Test that no more than `concurrency` creates are in flight"""
+        prompts = [f"p{i}" for i in range(12)]
+        handler, state = render_handler({p: 0.0 for p in prompts})
+        engine = make_engine(handler)
+
+        with patch("tools.batch_text_to_video.get_engine", return_value=engine):
+            list(tool._invoke({"prompts": "\n".join(prompts), "concurrency": 3}))
+
+        assert state["created"] == 12
+        assert state["max_in_flight"] == 3
+
+    def test_partial_failure(self, tool, make_engine, no_poll_delay):
+        """Test that one failed task does not stop the batch"""
+        handler, _ = render_handler({"ok": 0.0, "bad": 0.0}, fail={"bad"})
+        engine = make_engine(handler)
+
+        with patch("tools.batch_text_to_video.get_engine", return_value=engine):
+            results = [r.message.json_object for r in tool._invoke({"prompts": '["ok", "bad"]'})]
+
+        summary = results[-1]
+        assert summary["status"] == "partial"
+        assert summary["succeeded"] == 1
+        assert summary["videos"][1]["error"] == "policy"
+
+    def test_all_failed(self, tool, make_engine, no_poll_delay):
+        """Test that a batch where every task failed is reported as failed, not partial"""
+        handler, _ = render_handler({"bad": 0.0, "worse": 0.0}, fail={"bad", "worse"})
+        engine = make_engine(handler)
+
+        with patch("tools.batch_text_to_video.get_engine", return_value=engine):
+            results = [r.message.json_object for r in tool._invoke({"prompts": '["bad", "worse"]'})]
+
+        summary = results[-1]
+        assert summary["status"] == "failed"
+        assert summary["succeeded"] == 0
+        assert summary["failed"] == 2
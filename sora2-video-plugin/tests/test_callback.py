@@ -0,0 +1,203 @@
+"""Tests for callback completion mode and the callback endpoint"""
+
+import json
+import time
+
+import httpx
+import pytest
+from unittest.mock import Mock, patch
+from werkzeug import Request
+from werkzeug.test import EnvironBuilder
+
+from endpoints.callback import CallbackEndpoint
+from tests.callback_sender import CALLBACK_URL, VIDEO_URL, CallbackSender
+from tools.text_to_video import TextToVideoTool
+from utils.async_engine import COMPLETED, CREATED, TIMEOUT
+from utils.backends import JuxinBackend, ZhenzhenBackend
+from utils.polling import PollScheduler
+from utils.result_cache import ResultCache
+
+BACKEND = ZhenzhenBackend("test_key")
+PARAMS = {"prompt": "test", "model": "sora-2"}
+
+
+def fast_scheduler():
+    """Scheduler that never sleeps"""
+    return PollScheduler(min_interval=0, max_interval=0, queue_interval=0)
+
+
+def slow_scheduler(interval=60):
+    """Scheduler that waits interval seconds between queries, so only a callback can wake the poll sooner"""
+    return PollScheduler(min_interval=interval, max_interval=interval, queue_interval=interval)
+
+
+@pytest.fixture
+def sender(make_engine):
+    """Callback sender backed by an in-process engine"""
+    holder = {}
+    engine = make_engine(lambda request: holder["sender"].handler(request))
+    holder["sender"] = CallbackSender(engine)
+    return holder["sender"]
+
+
+def endpoint_request(**kwargs):
+    return Request(EnvironBuilder(path="/sora2/callback", method="POST", **kwargs).get_environ())
+
+
+class TestCallbackMode:
+    """Test that callbacks replace polling while a task runs"""
+
+    def test_callback_url_sent_on_create(self, sender):
+        """Test that the create body carries the backend's callback field"""
+        handle = sender.engine.submit(BACKEND, PARAMS, timeout=5, scheduler=slow_scheduler(),
+                                      callback_url=CALLBACK_URL)
+        for event in handle.events():
+            if event["type"] == CREATED:
+                sender.complete(event["task_id"])
+
+        assert sender.created[0]["notify_hook"] == CALLBACK_URL
+
+    def test_only_documented_callback_field(self):
+        """Test that only Zhenzhen documents a callback field"""
+        assert ZhenzhenBackend("k").callback_field == "notify_hook"
+        assert JuxinBackend("k").callback_field == ""
+
+    def test_backend_without_callback_polls(self, make_engine):
+        """Test that a backend without a callback field gets no callback URL and is polled as usual"""
+        bodies = []
+        queries = []
+
+        def handler(request):
+            if request.method == "POST":
+                bodies.append(json.loads(request.content))
+                return httpx.Response(200, json={"id": "sora-2:task_1", "status": "pending"})
+            queries.append(request.url.params["id"])
+            status = "completed" if len(queries) == 3 else "processing"
+            return httpx.Response(200, json={"status": status, "video_url": VIDEO_URL})
+
+        engine = make_engine(handler)
+        handle = engine.submit(JuxinBackend("k"), PARAMS, timeout=5, scheduler=fast_scheduler(),
+                               callback_url=CALLBACK_URL)
+        events = list(handle.events())
+
+        assert events[-1]["type"] == COMPLETED
+        assert "callback_url" not in bodies[0]
+        assert "notify_hook" not in bodies[0]
+        assert len(queries) == 3
+
+    def test_no_callback_field_without_url(self, sender):
+        """Test that plain polling does not send a callback field"""
+        handle = sender.engine.submit(BACKEND, PARAMS, timeout=5, scheduler=fast_scheduler())
+        for event in handle.events():
+            if event["type"] == CREATED:
+                sender.complete(event["task_id"])
+
+        assert "notify_hook" not in sender.created[0]
+
+    def test_callback_wakes_waiting_task(self, sender):
+        """Test that the task completes on the callback instead of after the scheduled wait"""
+        start = time.monotonic()
+        handle = sender.engine.submit(BACKEND, PARAMS, timeout=30, scheduler=slow_scheduler(),
+                                      callback_url=CALLBACK_URL)
+        events = []
+        for event in handle.events():
+            events.append(event)
+            if event["type"] == CREATED:
+                # let the first query find the task still running, then notify
+                while not sender.queries:
+                    time.sleep(0.01)
+                reply = sender.complete(event["task_id"])
+                assert reply["ok"] is True
+
+        assert events[-1]["type"] == COMPLETED
+        assert events[-1]["result"]["video_url"] == VIDEO_URL
+        assert len(sender.queries) == 2
+        assert time.monotonic() - start < 10
+
+    def test_fallback_poll_without_callback(self, sender):
+        """Test that a missing callback is covered by the scheduler's adaptive polling"""
+        handle = sender.engine.submit(BACKEND, PARAMS, timeout=5, scheduler=slow_scheduler(0.05),
+                                      callback_url=CALLBACK_URL)
+        events = []
+        for event in handle.events():
+            events.append(event)
+            if event["type"] == CREATED:
+                while not sender.queries:
+                    time.sleep(0.01)
+                sender.complete(event["task_id"], notify=False)
+
+        assert events[-1]["type"] == COMPLETED
+        assert sender.sent == []
+
+    def test_timeout_without_callback(self, sender):
+        """Test that the invocation still times out when the task never finishes"""
+        handle = sender.engine.submit(BACKEND, PARAMS, timeout=0.3, scheduler=slow_scheduler(),
+                                      callback_url=CALLBACK_URL)
+        events = list(handle.events())
+
+        assert events[-1]["type"] == TIMEOUT
+        assert len(sender.queries) == 1
+
+    def test_tool_passes_credential_callback_url(
+        self, sender, mock_tool_runtime, mock_tool_session, no_poll_delay
+    ):
+        """Test that the callback_url credential switches the tool to callback mode"""
+        mock_tool_runtime.credentials = {"api_key": "test_key", "callback_url": CALLBACK_URL}
+        tool = TextToVideoTool(mock_tool_runtime, mock_tool_session)
+
+        with patch("utils.video_tool.get_engine", return_value=sender.engine), \
+             patch("utils.video_tool.get_result_cache", return_value=ResultCache()):
+            results = []
+            for message in tool._invoke({"prompt": "test", "model": "sora-2"}):
+                results.append(message.message.json_object)
+                if results[-1]["status"] == "pending":
+                    sender.complete(results[-1]["task_id"])
+
+        assert sender.created[0]["notify_hook"] == CALLBACK_URL
+        assert results[-1]["status"] == "completed"
+        assert results[-1]["video_url"] == VIDEO_URL
+
+
+class TestCallbackEndpoint:
+    """Test the plugin endpoint that receives platform callbacks"""
+
+    @pytest.fixture
+    def engine(self):
+        engine = Mock()
+        engine.notify.return_value = True
+        with patch("endpoints.callback.get_engine", return_value=engine):
+            yield engine
+
+    @pytest.mark.parametrize("payload", [
+        {"task_id": "task_1"},
+        {"id": "task_1", "status": "completed"},
+        {"data": {"task_id": "task_1"}},
+    ])
+    def test_task_id_locations(self, engine, payload):
+        """Test that the task id is found in the common callback body shapes"""
+        response = CallbackEndpoint(Mock()).invoke(endpoint_request(json=payload), {}, {})
+
+        assert response.status_code == 200
+        engine.notify.assert_called_once_with("task_1")
+
+    def test_form_body(self, engine):
+        """Test that form-encoded callbacks are accepted"""
+        response = CallbackEndpoint(Mock()).invoke(endpoint_request(data={"task_id": "task_1"}), {}, {})
+
+        assert response.status_code == 200
+        engine.notify.assert_called_once_with("task_1")
+
+    def test_missing_task_id(self, engine):
+        """Test that a body without a task id is rejected"""
+        response = CallbackEndpoint(Mock()).invoke(endpoint_request(json={"status": "SUCCESS"}), {}, {})
+
+        assert response.status_code == 400
+        engine.notify.assert_not_called()
+
+    def test_unknown_task_reported(self, engine):
+        """Test that a callback nobody waits for is acknowledged but marked as not waiting"""
+        engine.notify.return_value = False
+        response = CallbackEndpoint(Mock()).invoke(endpoint_request(json={"task_id": "task_9"}), {}, {})
+
+        assert response.status_code == 200
+        assert b'"waiting": false' in response.get_data()
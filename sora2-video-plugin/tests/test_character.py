@@ -0,0 +1,285 @@
+"""Tests for the character tool and the local character cache"""
+
+import json
+
+import httpx
+import pytest
+from unittest.mock import Mock, patch
+
+from tools.character import CharacterTool
+from tools.text_to_video import TextToVideoTool
+from utils.backends import JuxinBackend, ZhenzhenBackend
+from utils.character_cache import CharacterCache, resolve_mentions, task_source_key, video_source_key
+from utils.result_cache import ResultCache
+
+CHARACTER = {
+    "id": "ch_123",
+    "username": "neo.cat",
+    "permalink": "https://sora.chatgpt.com/profile/neo.cat",
+    "profile_picture_url": "https://example.com/neo.jpg",
+}
+
+ZHENZHEN_A = ZhenzhenBackend("key_a")
+JUXIN_A = JuxinBackend("key_a")
+ZHENZHEN_B = ZhenzhenBackend("key_b")
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = CharacterCache(str(tmp_path / "characters.db"))
+    yield cache
+    cache.close()
+
+
+def created(character=CHARACTER):
+    response = Mock()
+    response.json.return_value = character
+    response.raise_for_status.return_value = None
+    return response
+
+
+class TestCharacterCache:
+    """Test the persistent character index"""
+
+    def test_put_and_get(self, cache):
+        """Test that a stored character is found by its source key"""
+        key = task_source_key(ZHENZHEN_A, "task_1", "1,3")
+        cache.put(key, CHARACTER, ZHENZHEN_A, name="小猫")
+
+        record = cache.get(key)
+        assert record["username"] == "neo.cat"
+        assert record["character_id"] == "ch_123"
+        assert record["name"] == "小猫"
+        assert record["account"] == ZHENZHEN_A.account != "key_a"
+
+    def test_find_by_url_matches_timestamps_backend_and_account(self, cache):
+        """Test that a video URL only matches the same time range on the same backend and key"""
+        cache.put(video_source_key(ZHENZHEN_A, "abc", "1,3"), CHARACTER, ZHENZHEN_A,
+                  source_url="https://example.com/v.mp4")
+
+        assert cache.find_by_url("https://example.com/v.mp4", "1,3", ZHENZHEN_A)["username"] == "neo.cat"
+        assert cache.find_by_url("https://example.com/v.mp4", "2,4", ZHENZHEN_A) is None
+        assert cache.find_by_url("https://example.com/v.mp4", "1,3", JUXIN_A) is None
+        assert cache.find_by_url("https://example.com/v.mp4", "1,3", ZHENZHEN_B) is None
+
+    def test_source_keys_include_backend_and_account(self):
+        """Test that the same source gets its own key per backend and per API key"""
+        keys = {task_source_key(backend, "task_1", "1,3") for backend in (ZHENZHEN_A, JUXIN_A, ZHENZHEN_B)}
+        assert len(keys) == 3
+        keys = {video_source_key(backend, "abc", "1,3") for backend in (ZHENZHEN_A, JUXIN_A, ZHENZHEN_B)}
+        assert len(keys) == 3
+        assert all("key_a" not in key for key in keys)
+
+    def test_mentions_by_name_and_username(self, cache):
+        """Test that both the custom name and the platform username can be referenced"""
+        cache.put(task_source_key(ZHENZHEN_A, "task_1", "1,3"), CHARACTER, ZHENZHEN_A, name="小猫")
+
+        assert cache.mentions([ZHENZHEN_A, JUXIN_A]) == {"小猫": "neo.cat", "neo.cat": "neo.cat"}
+        assert cache.mentions([JUXIN_A]) == {}
+        assert cache.mentions([ZHENZHEN_B]) == {}
+        assert cache.mentions([]) == {}
+
+    def test_list_only_own_characters(self, cache):
+        """Test that listing shows only the caller's characters"""
+        cache.put(task_source_key(ZHENZHEN_A, "task_1", "1,3"), CHARACTER, ZHENZHEN_A)
+        cache.put(task_source_key(ZHENZHEN_B, "task_2", "1,3"), {**CHARACTER, "username": "b.dog"}, ZHENZHEN_B)
+
+        assert [c["username"] for c in cache.list([ZHENZHEN_A])] == ["neo.cat"]
+        assert [c["username"] for c in cache.list([ZHENZHEN_B, JUXIN_A])] == ["b.dog"]
+
+    def test_legacy_rows_get_account_column(self, tmp_path):
+        """Test that a database from before accounts gains the column and its rows belong to no key"""
+        import sqlite3
+
+        path = str(tmp_path / "old.db")
+        conn = sqlite3.connect(path)
+        conn.execute(
+            "CREATE TABLE characters (source_key TEXT PRIMARY KEY, username TEXT NOT NULL, "
+            "character_id TEXT NOT NULL, name TEXT, source_url TEXT, permalink TEXT, "
+            "profile_picture_url TEXT, backend TEXT, created_at REAL NOT NULL)"
+        )
+        conn.execute("INSERT INTO characters VALUES ('task:task_1:1,3', 'old.cat', 'ch', '猫', NULL, '', '', "
+                     "'zhenzhen', 0)")
+        conn.commit()
+        conn.close()
+
+        cache = CharacterCache(path)
+        try:
+            assert cache.mentions([ZHENZHEN_A]) == {}
+            assert cache.list([ZHENZHEN_A]) == []
+        finally:
+            cache.close()
+
+
+class TestResolveMentions:
+    """Test @mention rewriting in prompts"""
+
+    def test_name_replaced_and_spaced(self, cache):
+        """Test that a known name becomes @username with spaces around it"""
+        cache.put(task_source_key(ZHENZHEN_A, "task_1", "1,3"), CHARACTER, ZHENZHEN_A, name="小猫")
+
+        assert resolve_mentions("一只@小猫在跳舞", [ZHENZHEN_A], cache) == "一只 @neo.cat 在跳舞"
+        assert resolve_mentions("@{小猫}, 跳舞", [ZHENZHEN_A], cache) == "@neo.cat , 跳舞"
+        assert resolve_mentions("with @neo.cat.", [ZHENZHEN_A], cache) == "with @neo.cat ."
+
+    def test_unknown_mentions_untouched(self, cache):
+        """Test that emails and unknown names are left as they are"""
+        cache.put(task_source_key(ZHENZHEN_A, "task_1", "1,3"), CHARACTER, ZHENZHEN_A, name="neo")
+        prompt = "联系 a@neo.com 或 @nobody 或 @neon"
+        assert resolve_mentions(prompt, [ZHENZHEN_A], cache) == prompt
+
+    def test_only_target_backends_resolved(self, cache):
+        """Test that a character is only used on the backend it was created on"""
+        cache.put(task_source_key(ZHENZHEN_A, "task_1", "1,3"), CHARACTER, ZHENZHEN_A, name="小猫")
+
+        assert resolve_mentions("@小猫 跳舞", [ZHENZHEN_A, JUXIN_A], cache) == "@neo.cat 跳舞"
+        assert resolve_mentions("@小猫 跳舞", [JUXIN_A], cache) == "@小猫 跳舞"
+
+    def test_other_keys_characters_not_resolved(self, cache):
+        """Test that one API key's names are never rewritten to another key's characters"""
+        cache.put(task_source_key(ZHENZHEN_A, "task_1", "1,3"), CHARACTER, ZHENZHEN_A, name="小猫")
+        cache.put(task_source_key(ZHENZHEN_B, "task_2", "1,3"), {**CHARACTER, "username": "b.cat"},
+                  ZHENZHEN_B, name="小猫")
+
+        assert resolve_mentions("@小猫 跳舞", [ZHENZHEN_A], cache) == "@neo.cat 跳舞"
+        assert resolve_mentions("@小猫 跳舞", [ZHENZHEN_B], cache) == "@b.cat 跳舞"
+        assert resolve_mentions("@neo.cat 跳舞", [ZhenzhenBackend("key_c")], cache) == "@neo.cat 跳舞"
+
+
+class TestCharacterTool:
+    """Test creating and reusing characters"""
+
+    @pytest.fixture
+    def tool(self, mock_tool_runtime, mock_tool_session, cache, task_registry):
+        with patch("tools.character.get_character_cache", return_value=cache), \
+             patch("tools.character.get_registry", return_value=task_registry):
+            yield CharacterTool(mock_tool_runtime, mock_tool_session)
+
+    @patch("tools.character.http_client.post")
+    def test_create_from_task_then_cached(self, mock_post, tool):
+        """Test that the same task and time range is only created once"""
+        mock_post.return_value = created()
+        params = {"from_task": "task_1", "timestamps": "1, 3", "name": "@小猫"}
+
+        first = list(tool._invoke(params))[0].message.json_object
+        second = list(tool._invoke(params))[0].message.json_object
+
+        assert mock_post.call_count == 1
+        url = mock_post.call_args[0][0]
+        assert url.endswith("/sora/v1/characters")
+        assert mock_post.call_args[1]["json"] == {"timestamps": "1,3", "from_task": "task_1"}
+        assert first["mention"] == "@neo.cat"
+        assert first["name"] == "小猫"
+        assert first["cached"] is False
+        assert second["cached"] is True
+        assert second["character_id"] == "ch_123"
+
+    @patch("tools.character.http_client.post")
+    def test_same_video_content_reused(self, mock_post, tool):
+        """Test that two URLs with identical content share one character"""
+        mock_post.return_value = created()
+
+        with patch("tools.character.hash_video", return_value="digest") as mock_hash:
+            first = list(tool._invoke({"video_url": "https://a.com/v.mp4", "timestamps": "1,3"}))
+            second = list(tool._invoke({"video_url": "https://b.com/v.mp4", "timestamps": "1,3"}))
+            # the first URL is known now and is not downloaded again
+            third = list(tool._invoke({"video_url": "https://a.com/v.mp4", "timestamps": "1,3"}))
+
+        assert mock_post.call_count == 1
+        assert mock_post.call_args[1]["json"]["url"] == "https://a.com/v.mp4"
+        assert mock_hash.call_count == 2
+        assert second[0].message.json_object["cached"] is True
+        assert third[0].message.json_object["username"] == first[0].message.json_object["username"]
+
+    @patch("tools.character.http_client.post")
+    def test_same_source_created_per_backend(self, mock_post, tool):
+        """Test that a character made on one backend is created again on another"""
+        tool.runtime.credentials = {"api_key": "zz_key", "juxin_api_key": "jx_key"}
+        mock_post.return_value = created()
+
+        with patch("tools.character.hash_video", return_value="digest"):
+            zhenzhen = list(tool._invoke({"video_url": "https://a.com/v.mp4", "timestamps": "1,3", "backend": "zhenzhen"}))
+            juxin = list(tool._invoke({"video_url": "https://a.com/v.mp4", "timestamps": "1,3", "backend": "juxin"}))
+            again = list(tool._invoke({"video_url": "https://a.com/v.mp4", "timestamps": "1,3", "backend": "juxin"}))
+
+        assert mock_post.call_count == 2
+        assert zhenzhen[0].message.json_object["cached"] is False
+        assert juxin[0].message.json_object["cached"] is False
+        assert again[0].message.json_object["cached"] is True
+        assert [c["backend"] for c in list(tool._invoke({}))[0].message.json_object["characters"]] == ["juxin", "zhenzhen"]
+
+    @patch("tools.character.http_client.post")
+    def test_same_video_created_per_api_key(self, mock_post, tool):
+        """Test that another API key neither reuses nor lists the first key's character"""
+        mock_post.return_value = created()
+        params = {"video_url": "https://a.com/v.mp4", "timestamps": "1,3"}
+
+        with patch("tools.character.hash_video", return_value="digest"):
+            tool.runtime.credentials = {"api_key": "key_a"}
+            first = list(tool._invoke(params))[0].message.json_object
+            tool.runtime.credentials = {"api_key": "key_b"}
+            assert list(tool._invoke({}))[0].message.json_object["total"] == 0
+            second = list(tool._invoke(params))[0].message.json_object
+
+        assert mock_post.call_count == 2
+        assert mock_post.call_args[1]["headers"]["Authorization"] == "Bearer key_b"
+        assert first["cached"] is False
+        assert second["cached"] is False
+        assert list(tool._invoke({}))[0].message.json_object["total"] == 1
+
+    @pytest.mark.parametrize("timestamps", ["", "1", "1,5", "3,3"])
+    def test_invalid_timestamps(self, tool, timestamps):
+        """Test that the time range must be 1 to 3 seconds"""
+        results = list(tool._invoke({"from_task": "task_1", "timestamps": timestamps}))
+        assert "timestamps" in results[0].message.text
+
+    def test_both_sources_rejected(self, tool):
+        """Test that video_url and from_task are mutually exclusive"""
+        results = list(tool._invoke({"from_task": "task_1", "video_url": "https://a.com/v.mp4"}))
+        assert "只能设置一个" in results[0].message.text
+
+    @patch("tools.character.http_client.post")
+    def test_list_characters(self, mock_post, tool):
+        """Test that calling without a source lists saved characters"""
+        mock_post.return_value = created()
+        list(tool._invoke({"from_task": "task_1", "timestamps": "1,3"}))
+
+        listing = list(tool._invoke({}))[0].message.json_object
+        assert listing["total"] == 1
+        assert listing["characters"][0]["username"] == "neo.cat"
+
+    @patch("tools.character.http_client.post")
+    def test_api_error(self, mock_post, tool):
+        """Test that an API error is reported and nothing is cached"""
+        mock_post.return_value = created({"error": "no face found"})
+
+        results = list(tool._invoke({"from_task": "task_1", "timestamps": "1,3"}))
+        assert results[0].message.text.startswith("角色创建失败")
+        assert list(tool._invoke({}))[0].message.json_object["total"] == 0
+
+
+class TestMentionsInPrompts:
+    """Test that video tools submit resolved @usernames"""
+
+    def test_text_to_video_resolves_mentions(
+        self, cache, mock_api_key, mock_tool_runtime, mock_tool_session, make_engine, no_poll_delay
+    ):
+        """Test that @name in the prompt is sent as @username"""
+        backend = ZhenzhenBackend(mock_api_key)
+        cache.put(task_source_key(backend, "task_1", "1,3"), CHARACTER, backend, name="小猫")
+        seen = []
+
+        async def handler(request):
+            if request.method == "POST":
+                seen.append(json.loads(request.content))
+                return httpx.Response(200, json={"task_id": "task_new"})
+            return httpx.Response(200, json={"status": "SUCCESS", "data": {"output": "https://example.com/v.mp4"}})
+
+        engine = make_engine(handler)
+        tool = TextToVideoTool(mock_tool_runtime, mock_tool_session)
+        with patch("utils.character_cache.get_character_cache", return_value=cache), \
+             patch("utils.video_tool.get_engine", return_value=engine), \
+             patch("utils.video_tool.get_result_cache", return_value=ResultCache()):
+            list(tool._invoke({"prompt": "@小猫在草地上奔跑", "model": "sora-2"}))
+
+        assert seen[0]["prompt"] == "@neo.cat 在草地上奔跑"
@@ -0,0 +1,256 @@
+"""Tests for the per-endpoint circuit breaker and create failover"""
+
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+from utils.async_engine import AsyncPollEngine
+from utils.backends import JUXIN, BackendRouter, JuxinBackend, ZhenzhenBackend
+from utils.circuit_breaker import (
+    CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitBreakers, is_endpoint_failure
+)
+from utils.latency_history import LatencyHistory
+from utils.polling import PollScheduler
+from utils.retry import RetryPolicy
+
+ZHENZHEN_BACKEND = ZhenzhenBackend("zz_key")
+JUXIN_BACKEND = JuxinBackend("jx_key")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def status_error(status_code):
+    request = httpx.Request("GET", "https://ai.t8star.cn")
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(status_code, request=request))
+
+
+class TestCircuitBreaker:
+    """Test breaker state transitions"""
+
+    @pytest.fixture
+    def clock(self):
+        return FakeClock()
+
+    @pytest.fixture
+    def breaker(self, clock):
+        return CircuitBreaker("https://ai.t8star.cn", window=10, min_calls=4, failure_rate=0.5,
+                              slow_call_seconds=5, open_seconds=30, clock=clock)
+
+    def test_opens_when_failure_rate_exceeded(self, breaker):
+        """Test that half the calls failing opens the circuit"""
+        for _ in range(2):
+            breaker.record_success(0.1)
+        breaker.record_failure()
+        assert breaker.state == CLOSED
+
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        assert not breaker.allow_request()
+        assert breaker.retry_after() == 30
+
+    def test_slow_calls_count_as_failures(self, breaker):
+        """Test that successful but slow calls still trip the breaker"""
+        for _ in range(4):
+            breaker.record_success(6)
+        assert breaker.state == OPEN
+
+    def test_half_open_probe_success_closes(self, breaker, clock):
+        """Test that one successful probe restores traffic"""
+        for _ in range(4):
+            breaker.record_failure()
+        clock.now = 30
+
+        assert breaker.state == HALF_OPEN
+        assert breaker.allow_request()
+        # Only one probe at a time
+        assert not breaker.allow_request()
+        assert not breaker.is_available()
+
+        breaker.record_success(0.1)
+        assert breaker.state == CLOSED
+        assert breaker.allow_request()
+
+    def test_half_open_probe_failure_reopens(self, breaker, clock):
+        """Test that a failed probe starts a new cool-down"""
+        for _ in range(4):
+            breaker.record_failure()
+        clock.now = 30
+        assert breaker.allow_request()
+
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        assert breaker.retry_after() == 30
+
+    def test_release_returns_probe_slot(self, breaker, clock):
+        """Test that a probe without an outcome frees its slot and leaves the state alone"""
+        for _ in range(4):
+            breaker.record_failure()
+        clock.now = 30
+        assert breaker.allow_request()
+        assert not breaker.allow_request()
+
+        breaker.release()
+        assert breaker.state == HALF_OPEN
+        assert breaker.allow_request()
+
+    @pytest.mark.parametrize("error,expected", [
+        (status_error(503), True),
+        (status_error(429), True),
+        (status_error(400), False),
+        (status_error(401), False),
+        (httpx.ConnectError("refused"), True),
+        (httpx.ReadTimeout("slow"), True),
+        (ValueError("bad json"), False),
+    ])
+    def test_is_endpoint_failure(self, error, expected):
+        """Test which errors count against the endpoint"""
+        assert is_endpoint_failure(error) is expected
+
+
+def platform_handler(seen, zhenzhen_response):
+    def handler(request):
+        seen.append(request.url.host)
+        if request.url.host == "api.jxincm.cn":
+            if request.method == "POST":
+                return httpx.Response(200, json={"id": "sora-2:task_j"})
+            return httpx.Response(200, json={"status": "completed", "video_url": "https://example.com/j.mp4"})
+        return zhenzhen_response(request)
+
+    return handler
+
+
+@pytest.fixture
+def make_breaker_engine():
+    engines = []
+
+    def factory(handler, retry_policy=None, **breaker_options):
+        engine = AsyncPollEngine(
+            client_factory=lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+            router=BackendRouter(),
+            breakers=CircuitBreakers(**breaker_options),
+            retry_policy=retry_policy or RetryPolicy(base_delay=0),
+            latency=LatencyHistory(":memory:")
+        )
+        engines.append(engine)
+        return engine
+
+    yield factory
+    for engine in engines:
+        engine.shutdown()
+
+
+def fast_scheduler():
+    return PollScheduler(min_interval=0, max_interval=0)
+
+
+class TestEngineBreaker:
+    """Test the breaker inside the poll engine"""
+
+    def test_open_circuit_fails_fast(self, make_breaker_engine):
+        """Test that once open, creates fail without sending a request"""
+        seen = []
+        engine = make_breaker_engine(
+            platform_handler(seen, lambda request: httpx.Response(503)),
+            retry_policy=RetryPolicy(max_attempts=1), min_calls=3, failure_rate=0.5
+        )
+
+        for _ in range(3):
+            events = list(engine.submit(ZHENZHEN_BACKEND, {"prompt": "x"}, scheduler=fast_scheduler()).events())
+            assert events[-1]["type"] == "error"
+        assert len(seen) == 3
+
+        events = list(engine.submit(ZHENZHEN_BACKEND, {"prompt": "x"}, scheduler=fast_scheduler()).events())
+        assert events[-1]["type"] == "error"
+        assert "熔断" in events[-1]["error"]
+        assert len(seen) == 3
+        assert engine.breakers.get(ZHENZHEN_BACKEND.base_url).state == OPEN
+
+    def test_create_fails_over_to_alternate_backend(self, make_breaker_engine):
+        """Test that a gateway error on one platform resubmits on the other"""
+        seen = []
+        engine = make_breaker_engine(platform_handler(seen, lambda request: httpx.Response(503)))
+
+        events = list(engine.submit(
+            [ZHENZHEN_BACKEND, JUXIN_BACKEND], {"prompt": "x"}, scheduler=fast_scheduler()
+        ).events())
+
+        assert events[0] == {"type": "created", "task_id": "sora-2:task_j", "backend": JUXIN, "eta_seconds": 60}
+        assert events[-1]["type"] == "completed"
+        assert seen[0] == "ai.t8star.cn"
+
+    def test_open_backend_is_skipped(self, make_breaker_engine):
+        """Test that an open circuit routes creates straight to the alternate"""
+        seen = []
+        engine = make_breaker_engine(platform_handler(seen, lambda request: httpx.Response(503)))
+        breaker = engine.breakers.get(ZHENZHEN_BACKEND.base_url)
+        for _ in range(5):
+            breaker.record_failure()
+
+        list(engine.submit([ZHENZHEN_BACKEND, JUXIN_BACKEND], {"prompt": "x"}, scheduler=fast_scheduler()).events())
+
+        assert "ai.t8star.cn" not in seen
+
+    def test_ambiguous_error_is_not_failed_over(self, make_breaker_engine):
+        """Test that a read timeout is neither retried nor resubmitted elsewhere (the task may exist)"""
+        seen = []
+
+        def timeout(request):
+            raise httpx.ReadTimeout("slow", request=request)
+
+        engine = make_breaker_engine(platform_handler(seen, timeout))
+
+        events = list(engine.submit(
+            [ZHENZHEN_BACKEND, JUXIN_BACKEND], {"prompt": "x"}, scheduler=fast_scheduler()
+        ).events())
+
+        assert events[-1]["type"] == "error"
+        assert "可能已" in events[-1]["error"]
+        assert seen == ["ai.t8star.cn"]
+
+    def test_query_many_fails_fast_when_open(self, make_breaker_engine):
+        """Test that status queries against an open endpoint return at once"""
+        seen = []
+        engine = make_breaker_engine(platform_handler(seen, lambda request: httpx.Response(503)))
+        breaker = engine.breakers.get(ZHENZHEN_BACKEND.base_url)
+        for _ in range(5):
+            breaker.record_failure()
+
+        results = engine.query_many([(ZHENZHEN_BACKEND, "task_1")]).result(timeout=5)
+
+        assert seen == []
+        assert "熔断" in results[0]["error"]
+
+    def test_cancelled_probe_releases_slot(self, make_breaker_engine):
+        """Test that cancelling a half-open probe in flight lets the next probe through"""
+        started = threading.Event()
+
+        async def hang(request):
+            started.set()
+            await asyncio.sleep(30)
+
+        engine = make_breaker_engine(hang, min_calls=1, open_seconds=0)
+        breaker = engine.breakers.get(ZHENZHEN_BACKEND.base_url)
+        breaker.record_failure()
+        assert breaker.state == HALF_OPEN
+
+        loop = engine._ensure_started()
+        probe = asyncio.run_coroutine_threadsafe(engine.query_task(ZHENZHEN_BACKEND, "task_1"), loop)
+        assert started.wait(5)
+        assert not breaker.is_available()
+
+        probe.cancel()
+        deadline = time.monotonic() + 5
+        while not breaker.is_available() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert breaker.state == HALF_OPEN
+        assert breaker.allow_request()
@@ -0,0 +1,153 @@
+"""Tests for the shared pooled HTTP client"""
+
+import asyncio
+
+import httpx
+import pytest
+import requests
+from unittest.mock import Mock, patch
+
+from utils import http_client
+
+
+@pytest.fixture(autouse=True)
+def fresh_session():
+    """Each test starts with a new shared session and zeroed counters"""
+    http_client.close()
+    with patch.dict(http_client._stats, {"requests": 0, "errors": 0, "async_requests": 0, "warmups": 0}):
+        yield
+    http_client.close()
+
+
+class TestSharedSession:
+    """Test the process-wide session"""
+
+    def test_get_session_is_singleton(self):
+        """Test that every caller gets the same session"""
+        assert http_client.get_session() is http_client.get_session()
+
+    def test_adapter_pool_is_bounded(self):
+        """Test that the mounted adapter uses a bounded blocking pool"""
+        adapter = http_client.get_session().get_adapter("https://ai.t8star.cn")
+        assert adapter._pool_maxsize == http_client.POOL_MAXSIZE
+        assert adapter._pool_block is True
+
+    def test_close_drops_session(self):
+        """Test that close() forces a new session on next use"""
+        first = http_client.get_session()
+        http_client.close()
+        assert http_client.get_session() is not first
+
+
+class TestRequests:
+    """Test request helpers and counters"""
+
+    def test_post_goes_through_session(self):
+        """Test that post() uses the shared session"""
+        with patch.object(requests.Session, "request") as mock_request:
+            mock_request.return_value = Mock(status_code=200)
+            http_client.post("https://ai.t8star.cn/v2/videos/generations", json={"prompt": "x"}, timeout=30)
+
+        mock_request.assert_called_once_with(
+            "POST", "https://ai.t8star.cn/v2/videos/generations", json={"prompt": "x"}, timeout=30
+        )
+        assert http_client.pool_stats()["requests"] == 1
+
+    def test_errors_are_counted(self):
+        """Test that transport errors are counted and re-raised"""
+        with patch.object(requests.Session, "request", side_effect=requests.ConnectionError("down")):
+            with pytest.raises(requests.ConnectionError):
+                http_client.get("https://ai.t8star.cn/v2/videos/generations/task_1")
+
+        stats = http_client.pool_stats()
+        assert stats["requests"] == 1
+        assert stats["errors"] == 1
+
+
+class TestWarmUp:
+    """Test warm-up of the poll engine's async connection pool"""
+
+    def test_warm_up_opens_connections(self, monkeypatch, make_engine):
+        """Test that warm_up issues one HEAD per requested connection through the engine's client"""
+        monkeypatch.setenv("SORA2_HTTP_WARMUP", "1")
+        requests_seen = []
+        engine = make_engine(lambda request: requests_seen.append(request) or httpx.Response(200))
+
+        engine.warm_up(["https://ai.t8star.cn"], connections=3).result(timeout=5)
+
+        assert [request.method for request in requests_seen] == ["HEAD"] * 3
+        assert http_client.pool_stats()["warmups"] == 3
+
+    def test_warm_up_disabled_by_env(self, monkeypatch, make_engine):
+        """Test that SORA2_HTTP_WARMUP=0 skips warm-up without starting the event loop"""
+        monkeypatch.setenv("SORA2_HTTP_WARMUP", "0")
+        engine = make_engine(lambda request: httpx.Response(200))
+
+        assert engine.warm_up(["https://ai.t8star.cn"]) is None
+        assert engine._loop is None
+
+    def test_warm_up_ignores_errors(self, monkeypatch, make_engine):
+        """Test that a failing warm-up does not raise"""
+        monkeypatch.setenv("SORA2_HTTP_WARMUP", "1")
+
+        def handler(request):
+            raise httpx.ConnectTimeout("slow", request=request)
+
+        make_engine(handler).warm_up(["https://ai.t8star.cn"], connections=1).result(timeout=5)
+
+        assert http_client.pool_stats()["warmups"] == 0
+
+
+class TestPoolStats:
+    """Test pool statistics surface"""
+
+    def test_pool_stats_without_session(self):
+        """Test stats before any request was made"""
+        stats = http_client.pool_stats()
+        assert stats["hosts"] == {}
+        assert stats["pool_maxsize"] == http_client.POOL_MAXSIZE
+
+    def test_pool_stats_lists_host_pools(self):
+        """Test that per-host pools show up once created"""
+        adapter = http_client.get_session().get_adapter("https://ai.t8star.cn")
+        adapter.poolmanager.connection_from_url("https://ai.t8star.cn")
+
+        hosts = http_client.pool_stats()["hosts"]
+        assert "https://ai.t8star.cn:443" in hosts
+        assert hosts["https://ai.t8star.cn:443"]["maxsize"] == http_client.POOL_MAXSIZE
+
+    def test_pool_stats_include_async_client(self):
+        """Test that requests and connections of the engine's async client are reported"""
+        async def run():
+            client = http_client.create_async_client(transport=httpx.MockTransport(lambda request: httpx.Response(200)))
+            await client.get("https://ai.t8star.cn/v2/videos/generations/task_1")
+            await client.aclose()
+
+        with patch.object(http_client, "_async_client", None):
+            asyncio.run(run())
+            stats = http_client.pool_stats()
+
+        assert stats["async_requests"] == 1
+        assert stats["async_max_connections"] == http_client.POOL_MAXSIZE * http_client.POOL_CONNECTIONS
+        assert stats["async_hosts"] == {}
+
+    def test_async_pool_stats_lists_connections(self):
+        """Test the per-host connection counts read from the async connection pool"""
+        origin = Mock(scheme=b"https", host=b"ai.t8star.cn", port=443)
+        connections = [Mock(_origin=origin, is_idle=lambda: True), Mock(_origin=origin, is_idle=lambda: False)]
+        client = Mock(_transport=Mock(_pool=Mock(connections=connections)))
+
+        assert http_client.async_pool_stats(client) == {"https://ai.t8star.cn:443": {"connections": 2, "idle": 1}}
+
+    def test_shared_engine_warms_up_on_first_use(self, monkeypatch):
+        """Test that the shared engine warms up Zhenzhen once, when it is first created"""
+        from utils import async_engine
+        from utils.backends import ZHENZHEN_BASE_URL
+
+        monkeypatch.setattr(async_engine, "_engine", None)
+        with patch.object(async_engine, "AsyncPollEngine") as engine_class:
+            first = async_engine.get_engine()
+            second = async_engine.get_engine()
+
+        assert first is second
+        engine_class.return_value.warm_up.assert_called_once_with([ZHENZHEN_BASE_URL])
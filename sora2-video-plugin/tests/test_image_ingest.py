@@ -0,0 +1,180 @@
+"""Tests for reference image ingestion"""
+
+import io
+import threading
+
+import pytest
+from unittest.mock import Mock, patch
+
+from utils import image_ingest
+from utils.image_ingest import ImageIngestor, UploadCache, _extract_url, _sniff, downscale
+
+UPLOAD_URL = "https://api.jxincm.cn/api/upload"
+PNG = b"\x89PNG\r\n\x1a\n" + b"0" * 100
+
+
+def download_response(data):
+    response = Mock()
+    response.iter_content.return_value = [data[i:i + 10] for i in range(0, len(data), 10)]
+    return response
+
+
+def upload_response(url):
+    response = Mock()
+    response.json.return_value = {"code": 0, "data": {"url": url}}
+    return response
+
+
+@pytest.fixture
+def upload_cache(tmp_path):
+    cache = UploadCache(str(tmp_path / "uploads.db"))
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def ingestor(upload_cache):
+    return ImageIngestor(UPLOAD_URL, "jx_key", cache=upload_cache)
+
+
+class TestHelpers:
+    """Test response parsing and format sniffing"""
+
+    @pytest.mark.parametrize("data,expected", [
+        ({"url": "https://a/1.png"}, "https://a/1.png"),
+        ({"data": {"url": "https://a/2.png"}}, "https://a/2.png"),
+        ({"data": "https://a/3.png"}, "https://a/3.png"),
+    ])
+    def test_extract_url(self, data, expected):
+        assert _extract_url(data) == expected
+
+    def test_extract_url_missing(self):
+        with pytest.raises(ValueError):
+            _extract_url({"code": 1, "msg": "error"})
+
+    @pytest.mark.parametrize("data,expected", [
+        (PNG, "png"),
+        (b"GIF89a", "gif"),
+        (b"RIFF\x00\x00\x00\x00WEBP", "webp"),
+        (b"\xff\xd8\xff", "jpg"),
+    ])
+    def test_sniff(self, data, expected):
+        assert _sniff(data)[0] == expected
+
+    def test_downscale_without_pillow_keeps_data(self):
+        """Test that the original bytes are uploaded when Pillow is missing"""
+        with patch.object(image_ingest, "Image", None):
+            assert downscale(PNG, 1280) is PNG
+
+    def test_downscale_shrinks_large_image(self):
+        """Test that a 2000px image is reduced to the model's long edge"""
+        pil = pytest.importorskip("PIL.Image")
+        source = io.BytesIO()
+        pil.new("RGB", (2000, 1000), "red").save(source, format="PNG")
+
+        result = pil.open(io.BytesIO(downscale(source.getvalue(), 1280)))
+        assert result.size == (1280, 640)
+
+
+class TestImageIngestor:
+    """Test download, upload and content-hash caching"""
+
+    def test_uploads_once_per_content(self, ingestor):
+        """Test that the same bytes behind two URLs are uploaded once"""
+        with patch("utils.http_client.get", side_effect=lambda url, **kw: download_response(PNG)) as mock_get, \
+             patch("utils.http_client.post", return_value=upload_response("https://api.jxincm.cn/i/1.png")) as mock_post:
+            first = ingestor.ingest(["https://notion.so/a.png"])
+            second = ingestor.ingest(["https://example.com/copy.png"])
+
+        assert first == second == ["https://api.jxincm.cn/i/1.png"]
+        assert mock_get.call_count == 2
+        mock_post.assert_called_once()
+        files = mock_post.call_args.kwargs["files"]
+        assert files["file"][0] == "image.png"
+        assert mock_post.call_args.kwargs["headers"] == {"Authorization": "Bearer jx_key"}
+
+    def test_cache_survives_new_ingestor(self, upload_cache):
+        """Test that the cache is persistent, not per instance"""
+        with patch("utils.http_client.get", side_effect=lambda url, **kw: download_response(PNG)), \
+             patch("utils.http_client.post", return_value=upload_response("https://api.jxincm.cn/i/1.png")) as mock_post:
+            ImageIngestor(UPLOAD_URL, "jx_key", cache=upload_cache).ingest(["https://a/1.png"])
+            ImageIngestor(UPLOAD_URL, "jx_key", cache=upload_cache).ingest(["https://a/1.png"])
+
+        mock_post.assert_called_once()
+
+    def test_downloads_run_concurrently_and_keep_order(self, ingestor):
+        """Test that images are fetched in parallel and returned in input order"""
+        barrier = threading.Barrier(3, timeout=5)
+
+        def fake_get(url, **kwargs):
+            barrier.wait()
+            return download_response(url.encode())
+
+        def fake_post(url, files, **kwargs):
+            return upload_response("https://api.jxincm.cn/i/" + files["file"][1].decode().rsplit("/", 1)[1])
+
+        with patch("utils.http_client.get", side_effect=fake_get), \
+             patch("utils.http_client.post", side_effect=fake_post):
+            result = ingestor.ingest(["https://a/1", "https://a/2", "https://a/3"])
+
+        assert result == ["https://api.jxincm.cn/i/1", "https://api.jxincm.cn/i/2", "https://api.jxincm.cn/i/3"]
+
+    def test_failure_keeps_original_url(self, ingestor):
+        """Test that a failed download does not block the task"""
+        with patch("utils.http_client.get", side_effect=ConnectionError("down")):
+            assert ingestor.ingest(["https://a/1.png"]) == ["https://a/1.png"]
+
+    def test_oversized_image_keeps_original_url(self, ingestor):
+        """Test that downloads stop at the size limit"""
+        with patch.object(image_ingest, "MAX_IMAGE_BYTES", 50), \
+             patch("utils.http_client.get", return_value=download_response(PNG)), \
+             patch("utils.http_client.post") as mock_post:
+            assert ingestor.ingest(["https://a/big.png"]) == ["https://a/big.png"]
+        mock_post.assert_not_called()
+
+    def test_hosted_images_pass_through(self, ingestor):
+        """Test that images already on the image host are not reprocessed"""
+        with patch("utils.http_client.get") as mock_get:
+            assert ingestor.ingest(["https://api.jxincm.cn/i/1.png"]) == ["https://api.jxincm.cn/i/1.png"]
+        mock_get.assert_not_called()
+
+
+class TestImageToVideoIngestion:
+    """Test the ingestion step inside ImageToVideoTool"""
+
+    def run_tool(self, credentials, parameters, mock_tool_session):
+        from tools.image_to_video import ImageToVideoTool
+
+        runtime = Mock()
+        runtime.credentials = credentials
+        tool = ImageToVideoTool(runtime, mock_tool_session)
+        engine = Mock()
+        engine.submit.return_value.events.return_value = iter([])
+        with patch("utils.video_tool.get_engine", return_value=engine), \
+             patch("utils.image_ingest.ImageIngestor") as ingestor_class:
+            ingestor_class.return_value.ingest.return_value = ["https://api.jxincm.cn/i/1.png"]
+            list(tool._invoke({"prompt": "x", "images": "https://notion.so/a.png", "use_cache": False, **parameters}))
+        return engine.submit.call_args.args[1], ingestor_class
+
+    def test_images_replaced_with_uploaded_urls(self, mock_tool_session):
+        """Test that submitted params use the image host URLs"""
+        params, ingestor_class = self.run_tool({"api_key": "zz", "juxin_api_key": "jx"}, {}, mock_tool_session)
+
+        assert params["images"] == ["https://api.jxincm.cn/i/1.png"]
+        ingestor_class.assert_called_once_with(UPLOAD_URL, "jx")
+
+    def test_no_image_host_without_juxin_key(self, mock_tool_session):
+        """Test that images are passed through when no image host is configured"""
+        params, ingestor_class = self.run_tool({"api_key": "zz"}, {}, mock_tool_session)
+
+        assert params["images"] == ["https://notion.so/a.png"]
+        ingestor_class.assert_not_called()
+
+    def test_optimize_images_can_be_disabled(self, mock_tool_session):
+        """Test the optimize_images switch"""
+        params, ingestor_class = self.run_tool(
+            {"api_key": "zz", "juxin_api_key": "jx"}, {"optimize_images": False}, mock_tool_session
+        )
+
+        assert params["images"] == ["https://notion.so/a.png"]
+        ingestor_class.assert_not_called()
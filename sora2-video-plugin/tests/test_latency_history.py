@@ -0,0 +1,166 @@
+"""Tests for the completion-time history, ETA, first-poll delay and timeout sizing"""
+
+import time
+
+import httpx
+import pytest
+
+from utils.backends import ZhenzhenBackend
+from utils.latency_history import (
+    DEFAULT_TIMEOUT, MAX_TIMEOUT, MIN_TIMEOUT, LatencyEstimate, LatencyHistory, history_key
+)
+from utils.polling import PollScheduler
+
+BACKEND = ZhenzhenBackend("test_key")
+PARAMS = {"prompt": "x", "model": "sora-2", "duration": "10", "aspect_ratio": "16:9"}
+
+
+def fast_scheduler():
+    return PollScheduler(min_interval=0, max_interval=0, queue_interval=0)
+
+
+def completing_handler(queries):
+    """Create returns task_1, every query succeeds and is appended to queries with its time"""
+    def handler(request):
+        if request.method == "POST":
+            return httpx.Response(200, json={"task_id": "task_1"})
+        queries.append(time.monotonic())
+        return httpx.Response(200, json={"status": "SUCCESS", "data": {"output": "https://example.com/v.mp4"}})
+
+    return handler
+
+
+@pytest.fixture
+def history():
+    history = LatencyHistory(":memory:")
+    yield history
+    history.close()
+
+
+class TestLatencyHistory:
+    """Test recording and estimating completion times"""
+
+    def test_estimate_needs_min_samples(self, history):
+        """Test that there is no estimate until enough tasks have completed"""
+        for seconds in (50, 60, 70, 80):
+            history.record("zhenzhen", PARAMS, seconds)
+        assert history.estimate("zhenzhen", PARAMS) is None
+
+        history.record("zhenzhen", PARAMS, 90)
+        estimate = history.estimate("zhenzhen", PARAMS)
+        assert estimate.count == 5
+        assert estimate.median == 70
+        assert estimate.quantile(0.1) == 50
+        assert estimate.quantile(0.95) == 90
+
+    def test_keyed_by_backend_model_duration_and_aspect_ratio(self, history):
+        """Test that samples of another combination do not mix in"""
+        for _ in range(5):
+            history.record("zhenzhen", PARAMS, 60)
+            history.record("zhenzhen", {**PARAMS, "aspect_ratio": "9:16"}, 300)
+
+        assert history.estimate("zhenzhen", PARAMS).median == 60
+        assert history.estimate("juxin", PARAMS) is None
+        assert history.estimate("zhenzhen", {**PARAMS, "model": "sora-2-pro"}) is None
+        assert history_key("zhenzhen", {}) == history_key("zhenzhen", PARAMS)
+
+    def test_keeps_most_recent_samples(self, tmp_path):
+        """Test that only the newest max_samples are kept, in memory and on disk"""
+        history = LatencyHistory(str(tmp_path / "latency.db"), max_samples=5)
+        for seconds in range(1, 9):
+            history.record("zhenzhen", PARAMS, seconds)
+        history.close()
+
+        reopened = LatencyHistory(str(tmp_path / "latency.db"), max_samples=5)
+        assert reopened.estimate("zhenzhen", PARAMS).samples == [4, 5, 6, 7, 8]
+        reopened.close()
+
+    def test_quantile_single_sample(self):
+        """Test the nearest-rank quantile at the edges"""
+        estimate = LatencyEstimate([42.0])
+
+        assert estimate.quantile(0) == 42
+        assert estimate.quantile(1) == 42
+
+
+class TestSizing:
+    """Test the ETA, first-poll delay and timeout derived from the history"""
+
+    def test_fallback_without_history(self, history):
+        """Test that a long pro video gets more than the old fixed 300 seconds"""
+        assert history.eta_seconds("zhenzhen", PARAMS) == 60
+        assert history.first_poll_delay("zhenzhen", PARAMS) == 0
+        assert history.timeout("zhenzhen", PARAMS) == DEFAULT_TIMEOUT
+        assert history.timeout("zhenzhen", {**PARAMS, "model": "sora-2-pro", "duration": "25"}) > DEFAULT_TIMEOUT
+
+    def test_sized_from_history(self, history):
+        """Test the ETA, first poll and timeout of a stable distribution"""
+        for seconds in range(60, 80):
+            history.record("zhenzhen", PARAMS, seconds)
+
+        assert history.eta_seconds("zhenzhen", PARAMS) == 69
+        assert history.first_poll_delay("zhenzhen", PARAMS) == 61
+        assert history.timeout("zhenzhen", PARAMS) == MIN_TIMEOUT
+
+    def test_timeout_bounds(self, history):
+        """Test that the timeout stays inside its range"""
+        slow = {**PARAMS, "model": "sora-2-pro", "duration": "25"}
+        for seconds in (900, 1000, 1100, 1200, 1300):
+            history.record("zhenzhen", slow, seconds)
+            history.record("zhenzhen", PARAMS, seconds / 100)
+
+        assert history.timeout("zhenzhen", slow) == MAX_TIMEOUT
+        assert history.timeout("zhenzhen", PARAMS) == MIN_TIMEOUT
+
+
+class TestEngineUsesHistory:
+    """Test the history in the polling engine"""
+
+    def test_completion_recorded_and_eta_emitted(self, make_engine):
+        """Test that a created task reports its ETA and its completion time is recorded"""
+        engine = make_engine(completing_handler([]))
+
+        events = list(engine.submit(BACKEND, PARAMS, scheduler=fast_scheduler()).events())
+
+        assert events[0]["eta_seconds"] == 60
+        assert events[-1]["type"] == "completed"
+        assert engine.latency.estimate("zhenzhen", PARAMS) is None
+        assert len(engine.latency._samples[history_key("zhenzhen", PARAMS)]) == 1
+
+    def test_first_poll_delayed(self, make_engine):
+        """Test that the first query waits for the history's early-completion time"""
+        queries = []
+        engine = make_engine(completing_handler(queries))
+        for _ in range(5):
+            engine.latency.record("zhenzhen", PARAMS, 0.2)
+
+        started = time.monotonic()
+        events = list(engine.submit(BACKEND, PARAMS, scheduler=fast_scheduler()).events())
+
+        assert events[0]["eta_seconds"] == 0
+        assert events[-1]["type"] == "completed"
+        assert queries[0] - started >= 0.2
+
+    def test_timeout_sized_from_history(self, make_engine):
+        """Test that the deadline comes from the history when no timeout is given"""
+        engine = make_engine(lambda request: httpx.Response(
+            200, json={"task_id": "task_1"} if request.method == "POST" else {"status": "IN_PROGRESS"}
+        ))
+        engine.latency.timeout = lambda backend, params: 0.1
+        scheduler = PollScheduler(min_interval=0.01, max_interval=0.01, queue_interval=0.01)
+
+        events = list(engine.submit(BACKEND, PARAMS, scheduler=scheduler).events())
+
+        assert events[-1]["type"] == "timeout"
+
+    def test_watch_does_not_delay_or_record(self, make_engine):
+        """Test that resuming a task neither waits for the first poll nor adds a sample"""
+        queries = []
+        engine = make_engine(completing_handler(queries))
+        for _ in range(5):
+            engine.latency.record("zhenzhen", PARAMS, 30)
+
+        events = list(engine.watch(BACKEND, "task_9", scheduler=fast_scheduler(), params=PARAMS).events())
+
+        assert [event["type"] for event in events] == ["completed"]
+        assert len(engine.latency._samples[history_key("zhenzhen", PARAMS)]) == 5
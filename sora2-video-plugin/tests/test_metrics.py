@@ -0,0 +1,263 @@
+"""Tests for the latency breakdown, metrics export and the metrics endpoint"""
+
+import json
+import logging
+
+import httpx
+import pytest
+from unittest.mock import Mock, patch
+from werkzeug import Request
+from werkzeug.test import EnvironBuilder
+
+from endpoints.metrics import MetricsEndpoint
+from tools.text_to_video import TextToVideoTool
+from utils.backends import ZhenzhenBackend
+from utils.metrics import Metrics, TaskTrace, status_time
+from utils.polling import PollScheduler
+from utils.result_cache import ResultCache
+
+BACKEND = ZhenzhenBackend("test_key")
+PARAMS = {"prompt": "x", "model": "sora-2", "duration": "10"}
+LABELS = (("backend", "zhenzhen"), ("model", "sora-2"), ("duration", "10"))
+
+
+def fast_scheduler():
+    return PollScheduler(min_interval=0, max_interval=0, queue_interval=0)
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def scripted_handler(statuses, fail_first_query=False):
+    """Create returns task_1, each query returns the next scripted status (optionally a 503 first)"""
+    remaining = list(statuses)
+    failed = []
+
+    def handler(request):
+        if request.method == "POST":
+            return httpx.Response(200, json={"task_id": "task_1"})
+        if fail_first_query and not failed:
+            failed.append(request)
+            return httpx.Response(503, json={"error": "busy"})
+        return httpx.Response(200, json=remaining.pop(0) if len(remaining) > 1 else remaining[0])
+
+    return handler
+
+
+class TestStatusTime:
+    """Test reading the provider's status_update_time"""
+
+    def test_seconds_milliseconds_and_iso(self):
+        """Test the supported timestamp formats"""
+        assert status_time({"status_update_time": 1700000000}, 1700000100) == 1700000000
+        assert status_time({"status_update_time": 1700000000500}, 1700000100) == 1700000000.5
+        assert status_time({"status_update_time": "2023-11-14T22:13:20Z"}, 1700000100) == 1700000000
+
+    def test_falls_back_to_observed_time(self):
+        """Test that missing, malformed or future timestamps use the observation time"""
+        assert status_time({}, 50.0) == 50.0
+        assert status_time({"status_update_time": "soon"}, 50.0) == 50.0
+        assert status_time({"status_update_time": 1700000200}, 1700000100) == 1700000100
+
+
+class TestTaskTrace:
+    """Test the per-task latency breakdown"""
+
+    def test_queue_and_render_from_transitions(self):
+        """Test queue wait and render time from the observed status changes"""
+        clock = FakeClock()
+        trace = TaskTrace(Metrics(), PARAMS, "zhenzhen", clock=clock)
+        trace.record_submit(0.8)
+
+        for now, status in ((1005, "NOT_START"), (1020, "IN_PROGRESS"), (1050, "IN_PROGRESS"), (1110, "SUCCESS")):
+            clock.now = now
+            trace.observe({"status": status})
+
+        summary = trace.summary()
+        assert summary["submit_seconds"] == 0.8
+        assert summary["queue_seconds"] == 20
+        assert summary["render_seconds"] == 90
+        assert summary["polls"] == 4
+
+    def test_status_update_time_preferred(self):
+        """Test that the provider's transition times replace the poll observation times"""
+        clock = FakeClock()
+        trace = TaskTrace(Metrics(), PARAMS, "zhenzhen", clock=clock)
+        trace.record_submit(0.5)
+
+        clock.now = 1030
+        trace.observe({"status": "IN_PROGRESS", "status_update_time": 1012})
+        clock.now = 1100
+        trace.observe({"status": "SUCCESS", "status_update_time": 1091})
+
+        assert trace.queue_seconds == 12
+        assert trace.render_seconds == 79
+
+    def test_resumed_task_has_no_queue_time(self):
+        """Test that a task watched without being submitted here reports no queue wait"""
+        trace = TaskTrace(Metrics(), PARAMS, "zhenzhen", clock=FakeClock())
+
+        trace.observe({"status": "IN_PROGRESS"})
+        trace.observe({"status": "SUCCESS"})
+
+        assert trace.queue_seconds is None
+        assert trace.render_seconds == 0
+
+    def test_finish_records_once(self):
+        """Test that finishing records the stage histograms and outcome a single time"""
+        metrics = Metrics()
+        clock = FakeClock()
+        trace = TaskTrace(metrics, PARAMS, "zhenzhen", clock=clock)
+        trace.record_submit(0.5)
+        clock.now = 1010
+        trace.observe({"status": "IN_PROGRESS"})
+        clock.now = 1070
+        trace.observe({"status": "SUCCESS"})
+
+        trace.finish("completed")
+        trace.finish("cancelled")
+
+        assert metrics.value("sora2_tasks_total", outcome="completed") == 1
+        assert metrics.value("sora2_tasks_total") == 1
+        histograms = {item["name"]: item for item in metrics.snapshot()["histograms"]}
+        assert histograms["sora2_queue_seconds"]["sum"] == 10
+        assert histograms["sora2_render_seconds"]["sum"] == 60
+
+    def test_finish_writes_json_log(self, caplog):
+        """Test the structured log line written when a task finishes"""
+        trace = TaskTrace(Metrics(), PARAMS, "zhenzhen", clock=FakeClock())
+        trace.observe({"status": "FAILURE"})
+
+        with caplog.at_level(logging.INFO, logger="sora2.metrics"):
+            trace.finish("failed", "task_1")
+
+        record = json.loads(caplog.records[-1].getMessage())
+        assert record["event"] == "task"
+        assert record["task_id"] == "task_1"
+        assert record["outcome"] == "failed"
+        assert record["model"] == "sora-2"
+        assert record["polls"] == 1
+
+
+class TestPrometheus:
+    """Test the Prometheus text export"""
+
+    def test_counters_and_histograms(self):
+        """Test the exposition format, cumulative buckets and label escaping"""
+        metrics = Metrics()
+        metrics.inc("sora2_polls_total", LABELS, 3)
+        metrics.inc("sora2_polls_total", (("backend", 'a"b'),))
+        metrics.observe("sora2_submit_seconds", LABELS, 0.3)
+        metrics.observe("sora2_submit_seconds", LABELS, 2.0)
+
+        text = metrics.render_prometheus()
+
+        assert "# TYPE sora2_polls_total counter" in text
+        assert 'sora2_polls_total{backend="zhenzhen",model="sora-2",duration="10"} 3' in text
+        assert 'sora2_polls_total{backend="a\\"b"} 1' in text
+        assert "# TYPE sora2_submit_seconds histogram" in text
+        assert 'sora2_submit_seconds_bucket{backend="zhenzhen",model="sora-2",duration="10",le="0.25"} 0' in text
+        assert 'sora2_submit_seconds_bucket{backend="zhenzhen",model="sora-2",duration="10",le="0.5"} 1' in text
+        assert 'sora2_submit_seconds_bucket{backend="zhenzhen",model="sora-2",duration="10",le="2.5"} 2' in text
+        assert 'sora2_submit_seconds_bucket{backend="zhenzhen",model="sora-2",duration="10",le="+Inf"} 2' in text
+        assert 'sora2_submit_seconds_count{backend="zhenzhen",model="sora-2",duration="10"} 2' in text
+
+    def test_empty(self):
+        """Test that nothing is exported before the first task"""
+        assert Metrics().render_prometheus() == ""
+
+
+class TestEngineInstrumentation:
+    """Test the breakdown recorded by the polling engine"""
+
+    @pytest.fixture
+    def engine(self, make_engine):
+        def factory(handler):
+            engine = make_engine(handler)
+            engine._metrics = Metrics()
+            return engine
+        return factory
+
+    def test_terminal_event_timing(self, engine):
+        """Test that the completed event carries the breakdown and the counters add up"""
+        engine = engine(scripted_handler([
+            {"status": "NOT_START"},
+            {"status": "IN_PROGRESS", "progress": "50%"},
+            {"status": "SUCCESS", "progress": "100%", "data": {"output": "https://example.com/v.mp4"}},
+        ]))
+
+        events = list(engine.submit(BACKEND, PARAMS, scheduler=fast_scheduler()).events())
+
+        timing = events[-1]["timing"]
+        assert timing["polls"] == 3
+        assert timing["errors"] == 0
+        assert timing["bytes"] > 0
+        assert timing["submit_seconds"] >= 0
+        assert timing["queue_seconds"] >= 0
+        assert timing["render_seconds"] >= 0
+        assert timing["total_seconds"] >= timing["submit_seconds"]
+        metrics = engine.metrics
+        assert metrics.value("sora2_polls_total", backend="zhenzhen", model="sora-2", duration="10") == 3
+        assert metrics.value("sora2_transfer_bytes_total") == timing["bytes"]
+        assert metrics.value("sora2_tasks_total", outcome="completed") == 1
+
+    def test_retried_errors_counted(self, engine):
+        """Test that a query retried after a 503 counts as an error"""
+        engine = engine(scripted_handler([{"status": "SUCCESS", "data": {"output": "https://v"}}],
+                                         fail_first_query=True))
+
+        events = list(engine.submit(BACKEND, PARAMS, scheduler=fast_scheduler()).events())
+
+        assert events[-1]["type"] == "completed"
+        assert events[-1]["timing"]["errors"] == 1
+        assert engine.metrics.value("sora2_request_errors_total") == 1
+
+    def test_tool_result_includes_timing(self, engine):
+        """Test that the final JSON message of the text-to-video tool carries the timing summary"""
+        engine = engine(scripted_handler([{"status": "SUCCESS", "data": {"output": "https://example.com/v.mp4"}}]))
+        tool = TextToVideoTool(Mock(credentials={"api_key": "test_key"}), Mock())
+
+        with patch("utils.video_tool.get_engine", return_value=engine), \
+             patch("utils.video_tool.get_result_cache", return_value=ResultCache()), \
+             patch("utils.async_engine.PollScheduler", side_effect=lambda **kwargs: fast_scheduler()):
+            messages = list(tool._invoke({"prompt": "a cat"}))
+
+        final = messages[-1].message.json_object
+        assert final["status"] == "completed"
+        assert final["timing"]["polls"] == 1
+        assert set(final["timing"]) >= {"submit_seconds", "queue_seconds", "render_seconds", "total_seconds"}
+
+
+class TestMetricsEndpoint:
+    """Test the /sora2/metrics endpoint"""
+
+    def request(self, query=""):
+        return Request(EnvironBuilder(path="/sora2/metrics", method="GET", query_string=query).get_environ())
+
+    def test_prometheus_text(self):
+        """Test the default Prometheus exposition"""
+        metrics = Metrics()
+        metrics.inc("sora2_polls_total", LABELS)
+
+        with patch("endpoints.metrics.get_metrics", return_value=metrics):
+            response = MetricsEndpoint(Mock()).invoke(self.request(), {}, {})
+
+        assert response.status_code == 200
+        assert response.content_type.startswith("text/plain; version=0.0.4")
+        assert 'sora2_polls_total{backend="zhenzhen",model="sora-2",duration="10"} 1' in response.get_data(as_text=True)
+
+    def test_json(self):
+        """Test the JSON snapshot"""
+        metrics = Metrics()
+        metrics.inc("sora2_polls_total", LABELS, 2)
+
+        with patch("endpoints.metrics.get_metrics", return_value=metrics):
+            response = MetricsEndpoint(Mock()).invoke(self.request("format=json"), {}, {})
+
+        body = json.loads(response.get_data(as_text=True))
+        assert body["counters"] == [{"name": "sora2_polls_total", "labels": dict(LABELS), "value": 2}]
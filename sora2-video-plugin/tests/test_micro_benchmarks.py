@@ -0,0 +1,93 @@
+"""Tests for the per-invocation overhead benchmarks and their regression budgets"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.micro import BENCHMARKS, ROOT, check, load_baselines, write_baselines
+
+
+def result(cpu_units, peak_bytes):
+    return {"cpu_us": cpu_units * 20, "cpu_units": cpu_units, "peak_bytes": peak_bytes}
+
+
+class TestBudgets:
+    """Test the comparison against stored baselines"""
+
+    def test_every_benchmark_has_baseline(self):
+        """Test that benchmarks/baselines.json covers every registered benchmark"""
+        baselines = load_baselines()
+
+        assert set(baselines["benchmarks"]) == set(BENCHMARKS)
+
+    def test_within_budget(self):
+        """Test that results inside the tolerance pass"""
+        baselines = {"tolerance": {"cpu": 0.5, "memory": 0.25},
+                     "benchmarks": {"parse": {"cpu_units": 1.0, "peak_bytes": 4096}}}
+
+        rows = check({"benchmarks": {"parse": result(1.4, 5000)}}, baselines)
+
+        assert rows[0]["over"] == []
+        assert rows[0]["cpu_budget"] == 1.5
+
+    def test_regression_flagged(self):
+        """Test that CPU and memory regressions beyond the tolerance are reported"""
+        baselines = {"tolerance": {"cpu": 0.5, "memory": 0.25},
+                     "benchmarks": {"parse": {"cpu_units": 1.0, "peak_bytes": 4096}}}
+
+        rows = check({"benchmarks": {"parse": result(1.6, 8192)}}, baselines)
+
+        assert rows[0]["over"] == ["cpu", "memory"]
+
+    def test_per_benchmark_tolerance(self):
+        """Test that a benchmark's own tolerance overrides the file-wide one"""
+        baselines = {"tolerance": {"cpu": 0.5},
+                     "benchmarks": {"poll": {"cpu_units": 10.0, "peak_bytes": 1024, "tolerance": {"cpu": 1.0}}}}
+
+        rows = check({"benchmarks": {"poll": result(19.0, 1024)}}, baselines)
+
+        assert rows[0]["over"] == []
+
+    def test_missing_baseline_not_judged(self):
+        """Test that a new benchmark without a baseline is reported but does not fail"""
+        rows = check({"benchmarks": {"new": result(5.0, 1024)}}, {"benchmarks": {}})
+
+        assert rows[0]["cpu_budget"] is None
+        assert rows[0]["over"] == []
+
+    def test_update_keeps_tolerance(self, tmp_path):
+        """Test that --update rewrites the numbers but keeps tolerances"""
+        path = str(tmp_path / "baselines.json")
+        with open(path, "w") as f:
+            json.dump({"tolerance": {"cpu": 0.3, "memory": 0.1},
+                       "benchmarks": {"poll": {"cpu_units": 10.0, "peak_bytes": 1, "tolerance": {"cpu": 1.0}}}}, f)
+
+        write_baselines({"python": "3.12.0", "calibration_us": 20.0,
+                         "benchmarks": {"poll": result(12.0, 2048)}}, path)
+        baselines = load_baselines(path)
+
+        assert baselines["tolerance"] == {"cpu": 0.3, "memory": 0.1}
+        assert baselines["benchmarks"]["poll"] == {"cpu_units": 12.0, "peak_bytes": 2048, "tolerance": {"cpu": 1.0}}
+
+
+class TestSuite:
+    """Run the benchmarks against the stored baselines"""
+
+    @pytest.mark.slow
+    def test_within_baselines(self):
+        """Test that the plugin's hot paths stay within their budgets
+
+        Runs in a fresh interpreter: a coverage tracer in this process would inflate both CPU
+        time and allocations.
+        """
+        env = {key: value for key, value in os.environ.items() if not key.startswith("COV_CORE")}
+        completed = subprocess.run([sys.executable, "benchmarks/micro.py", "--quick", "--json"], cwd=ROOT, env=env,
+                                   capture_output=True, text=True, timeout=300)
+        report = json.loads(completed.stdout)
+        over = {row["name"]: row for row in report["checks"] if row["over"]}
+
+        assert set(report["benchmarks"]) == set(BENCHMARKS)
+        assert completed.returncode == 0 and not over, over
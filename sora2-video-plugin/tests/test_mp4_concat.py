@@ -0,0 +1,286 @@
+"""Tests for container-level MP4 concatenation"""
+
+import struct
+
+import pytest
+
+from utils.mp4_concat import Mp4ConcatError, concat_mp4, parse_boxes, scan_top_level
+
+MOVIE_TIMESCALE = 1000
+VIDEO_TIMESCALE = 15360
+AUDIO_TIMESCALE = 44100
+VIDEO_DELTA = 512
+AUDIO_DELTA = 1024
+
+
+def box(box_type, payload):
+    return struct.pack(">I4s", len(payload) + 8, box_type) + payload
+
+
+def full_box(box_type, payload, version=0):
+    return box(box_type, struct.pack(">B3x", version) + payload)
+
+
+def table(box_type, fmt, entries, version=0):
+    body = b"".join(struct.pack(fmt, *entry) for entry in entries)
+    return full_box(box_type, struct.pack(">I", len(entries)) + body, version)
+
+
+def make_trak(track_id, handler, timescale, samples, delta, offsets, chunk_sizes, entry, extra=b"", media_time=None):
+    media_duration = len(samples) * delta
+    movie_duration = media_duration * MOVIE_TIMESCALE // timescale
+    tkhd = full_box(b"tkhd", struct.pack(">IIIII", 0, 0, track_id, 0, movie_duration) + b"\x00" * 60)
+    edts = b""
+    if media_time is not None:
+        edts = box(b"edts", table(b"elst", ">IiI", [(movie_duration, media_time, 0x00010000)]))
+    mdhd = full_box(b"mdhd", struct.pack(">IIIIHH", 0, 0, timescale, media_duration, 0x55C4, 0))
+    hdlr = full_box(b"hdlr", struct.pack(">I4s12x", 0, handler) + b"handler\x00")
+    stsc = []
+    for index, size in enumerate(chunk_sizes, 1):
+        if not stsc or stsc[-1][1] != size:
+            stsc.append((index, size, 1))
+    stbl = box(b"stbl", b"".join([
+        full_box(b"stsd", struct.pack(">I", 1) + entry),
+        table(b"stts", ">II", [(len(samples), delta)]),
+        extra,
+        table(b"stsc", ">III", stsc),
+        full_box(b"stsz", struct.pack(">II", 0, len(samples)) + b"".join(struct.pack(">I", len(s)) for s in samples)),
+        table(b"stco", ">I", [(offset,) for offset in offsets]),
+        full_box(b"sdtp", b"\x00" * len(samples)),
+    ]))
+    minf = box(b"minf", full_box(b"vmhd" if handler == b"vide" else b"smhd", b"\x00" * 8) + stbl)
+    return box(b"trak", tkhd + edts + box(b"mdia", mdhd + hdlr + minf))
+
+
+def make_mp4(path, tag, video_count=6, audio_count=4, avc_config=b"config-A", sync=True, moov_first=False):
+    """Write a two-track MP4 whose sample bytes identify the file (tag) and sample index"""
+    video = [bytes([tag, i]) * (5 + i) for i in range(video_count)]
+    audio = [bytes([tag, 100 + i]) * 3 for i in range(audio_count)]
+    video_chunks = [video[:video_count // 2], video[video_count // 2:]]
+    audio_chunks = [audio[:audio_count // 2], audio[audio_count // 2:]]
+    ftyp = box(b"ftyp", b"isom\x00\x00\x02\x00isomiso2mp41")
+    avc1 = box(b"avc1", b"\x00" * 78 + box(b"avcC", avc_config))
+    mp4a = box(b"mp4a", b"\x00" * 28)
+
+    def build(base):
+        payload = b""
+        video_offsets, audio_offsets = [], []
+        for video_chunk, audio_chunk in zip(video_chunks, audio_chunks):
+            video_offsets.append(base + len(payload))
+            payload += b"".join(video_chunk)
+            audio_offsets.append(base + len(payload))
+            payload += b"".join(audio_chunk)
+        extra = b""
+        if sync:
+            extra += table(b"stss", ">I", [(1,), (video_count // 2 + 1,)])
+        extra += table(b"ctts", ">II", [(video_count, VIDEO_DELTA)])
+        mvhd = full_box(b"mvhd", struct.pack(">IIII", 0, 0, MOVIE_TIMESCALE, 0) + b"\x00" * 80)
+        moov = box(b"moov", mvhd + b"".join([
+            make_trak(1, b"vide", VIDEO_TIMESCALE, video, VIDEO_DELTA, video_offsets,
+                      [len(c) for c in video_chunks], avc1, extra, media_time=VIDEO_DELTA),
+            make_trak(2, b"soun", AUDIO_TIMESCALE, audio, AUDIO_DELTA, audio_offsets,
+                      [len(c) for c in audio_chunks], mp4a),
+        ]))
+        return moov, box(b"mdat", payload)
+
+    if moov_first:
+        moov, _ = build(0)
+        moov, mdat = build(len(ftyp) + len(moov) + 8)
+        data = ftyp + moov + mdat
+    else:
+        moov, mdat = build(len(ftyp) + 8)
+        data = ftyp + mdat + moov
+    with open(path, "wb") as f:
+        f.write(data)
+    return video, audio
+
+
+def read_file(path):
+    """Parse the moov of an MP4 and return its tracks' tables"""
+    with open(path, "rb") as f:
+        top = scan_top_level(f)
+        data = f.seek(0) or f.read()
+    moov_offset, moov_header, moov_size = next((o, h, s) for t, o, h, s in top if t == b"moov")
+    moov = parse_boxes(data[moov_offset + moov_header:moov_offset + moov_size])
+    return data, [t for t, _, _, _ in top], moov
+
+
+def find_path(boxes, *path):
+    for box_type in path:
+        boxes = next(b for b in boxes if b.type == box_type)
+        if box_type != path[-1]:
+            boxes = boxes.children
+    return boxes
+
+
+def entries(b, fmt):
+    count = struct.unpack_from(">I", b.data, 4)[0]
+    return list(struct.iter_unpack(fmt, b.data[8:8 + count * struct.calcsize(fmt)]))
+
+
+def track_samples(data, trak):
+    """Read every sample of a track back using stsc / stco / stsz"""
+    stbl = find_path(trak.children, b"mdia", b"minf", b"stbl").children
+    offsets = [e[0] for e in entries(next(b for b in stbl if b.type in (b"stco", b"co64")), ">I")]
+    stsz = next(b for b in stbl if b.type == b"stsz")
+    count = struct.unpack_from(">I", stsz.data, 8)[0]
+    sizes = struct.unpack_from(f">{count}I", stsz.data, 12)
+    stsc = entries(next(b for b in stbl if b.type == b"stsc"), ">III")
+    samples = []
+    sample = 0
+    for chunk_index, offset in enumerate(offsets, 1):
+        per_chunk = [spc for first, spc, _ in stsc if first <= chunk_index][-1]
+        for _ in range(per_chunk):
+            samples.append(data[offset:offset + sizes[sample]])
+            offset += sizes[sample]
+            sample += 1
+    return samples
+
+
+class TestConcat:
+    """Test joining MP4 files without re-encoding"""
+
+    def test_samples_survive_concatenation(self, tmp_path):
+        """Test that every sample of every input is readable, in order, from the output"""
+        inputs = []
+        expected_video, expected_audio = [], []
+        for tag in range(3):
+            path = str(tmp_path / f"in{tag}.mp4")
+            video, audio = make_mp4(path, tag, moov_first=(tag == 1))
+            inputs.append(path)
+            expected_video += video
+            expected_audio += audio
+        output = str(tmp_path / "out.mp4")
+
+        duration = concat_mp4(inputs, output)
+
+        data, top, moov = read_file(output)
+        assert top == [b"ftyp", b"moov", b"mdat"]
+        traks = [b for b in moov if b.type == b"trak"]
+        assert track_samples(data, traks[0]) == expected_video
+        assert track_samples(data, traks[1]) == expected_audio
+        assert duration == pytest.approx(3 * 6 * VIDEO_DELTA / VIDEO_TIMESCALE)
+
+    def test_tables_and_durations(self, tmp_path):
+        """Test shifted sync samples, merged stts/ctts and updated durations"""
+        inputs = [str(tmp_path / "a.mp4"), str(tmp_path / "b.mp4")]
+        make_mp4(inputs[0], 0)
+        make_mp4(inputs[1], 1, sync=False)
+        output = str(tmp_path / "out.mp4")
+
+        concat_mp4(inputs, output)
+
+        _, _, moov = read_file(output)
+        video = [b for b in moov if b.type == b"trak"][0]
+        stbl = find_path(video.children, b"mdia", b"minf", b"stbl").children
+        assert entries(find_path(stbl, b"stts"), ">II") == [(12, VIDEO_DELTA)]
+        assert entries(find_path(stbl, b"ctts"), ">II") == [(6, VIDEO_DELTA), (6, VIDEO_DELTA)]
+        # second file has no stss, so all of its samples are sync samples
+        assert [e[0] for e in entries(find_path(stbl, b"stss"), ">I")] == [1, 4] + list(range(7, 13))
+        assert all(b.type != b"sdtp" for b in stbl)
+
+        mdhd = find_path(video.children, b"mdia", b"mdhd")
+        assert struct.unpack_from(">I", mdhd.data, 16)[0] == 12 * VIDEO_DELTA
+        movie_duration = 12 * VIDEO_DELTA * MOVIE_TIMESCALE // VIDEO_TIMESCALE
+        assert struct.unpack_from(">I", find_path(video.children, b"tkhd").data, 20)[0] == movie_duration
+        assert struct.unpack_from(">I", find_path(moov, b"mvhd").data, 16)[0] == movie_duration
+        segment, media_time, _ = entries(find_path(video.children, b"edts").children[0], ">IiI")[0]
+        assert media_time == VIDEO_DELTA
+        # the single edit keeps its start and grows by the appended duration
+        assert segment == movie_duration
+
+    def test_different_codec_config_adds_sample_entry(self, tmp_path):
+        """Test that a changed avcC becomes a second stsd entry referenced by stsc"""
+        inputs = [str(tmp_path / "a.mp4"), str(tmp_path / "b.mp4")]
+        make_mp4(inputs[0], 0, avc_config=b"config-A")
+        make_mp4(inputs[1], 1, avc_config=b"config-B")
+        output = str(tmp_path / "out.mp4")
+
+        concat_mp4(inputs, output)
+
+        _, _, moov = read_file(output)
+        stbl = find_path([b for b in moov if b.type == b"trak"][0].children, b"mdia", b"minf", b"stbl").children
+        assert struct.unpack_from(">I", find_path(stbl, b"stsd").data, 4)[0] == 2
+        assert entries(find_path(stbl, b"stsc"), ">III") == [(1, 3, 1), (3, 3, 2)]
+
+    def test_trim_to_durations(self, tmp_path):
+        """Test that inputs are cut at sample boundaries to the requested durations"""
+        inputs = [str(tmp_path / "a.mp4"), str(tmp_path / "b.mp4")]
+        first_video, first_audio = make_mp4(inputs[0], 0)
+        second_video, second_audio = make_mp4(inputs[1], 1)
+        output = str(tmp_path / "out.mp4")
+
+        # 0.06 s keeps 2 of the 3 video samples in the first chunk and 3 of the 4 audio samples
+        duration = concat_mp4(inputs, output, [0.06, None])
+
+        data, _, moov = read_file(output)
+        video, audio = [b for b in moov if b.type == b"trak"]
+        assert track_samples(data, video) == first_video[:2] + second_video
+        assert track_samples(data, audio) == first_audio[:3] + second_audio
+        assert duration == pytest.approx(8 * VIDEO_DELTA / VIDEO_TIMESCALE)
+
+        stbl = find_path(video.children, b"mdia", b"minf", b"stbl").children
+        assert entries(find_path(stbl, b"stts"), ">II") == [(8, VIDEO_DELTA)]
+        assert entries(find_path(stbl, b"ctts"), ">II") == [(2, VIDEO_DELTA), (6, VIDEO_DELTA)]
+        assert [e[0] for e in entries(find_path(stbl, b"stss"), ">I")] == [1, 3, 6]
+        audio_stbl = find_path(audio.children, b"mdia", b"minf", b"stbl").children
+        assert entries(find_path(audio_stbl, b"stsc"), ">III") == [(1, 2, 1), (2, 1, 1), (3, 2, 1)]
+        # the edit list shrinks with the trimmed first file
+        movie_duration = 8 * VIDEO_DELTA * MOVIE_TIMESCALE // VIDEO_TIMESCALE
+        segment, _, _ = entries(find_path(video.children, b"edts").children[0], ">IiI")[0]
+        assert segment == movie_duration
+
+    def test_trim_longer_than_input_keeps_everything(self, tmp_path):
+        """Test that a duration beyond the input's length leaves the input whole"""
+        path = str(tmp_path / "a.mp4")
+        video, _ = make_mp4(path, 0)
+        output = str(tmp_path / "out.mp4")
+
+        duration = concat_mp4([path], output, [10])
+
+        data, _, moov = read_file(output)
+        assert track_samples(data, [b for b in moov if b.type == b"trak"][0]) == video
+        assert duration == pytest.approx(6 * VIDEO_DELTA / VIDEO_TIMESCALE)
+
+    def test_invalid_durations_rejected(self, tmp_path):
+        """Test that a duration list of the wrong length or a non-positive duration is refused"""
+        path = str(tmp_path / "a.mp4")
+        make_mp4(path, 0)
+
+        with pytest.raises(Mp4ConcatError):
+            concat_mp4([path, path], str(tmp_path / "out.mp4"), [1])
+        with pytest.raises(Mp4ConcatError):
+            concat_mp4([path], str(tmp_path / "out.mp4"), [0])
+
+    def test_mismatched_tracks_rejected(self, tmp_path):
+        """Test that inputs with a different track layout are refused"""
+        first = str(tmp_path / "a.mp4")
+        make_mp4(first, 0)
+        with open(first, "rb") as f:
+            data = f.read()
+        second = str(tmp_path / "b.mp4")
+        with open(second, "wb") as f:
+            f.write(data.replace(b"soun", b"vide"))
+
+        with pytest.raises(Mp4ConcatError):
+            concat_mp4([first, second], str(tmp_path / "out.mp4"))
+
+    def test_fragmented_mp4_rejected(self, tmp_path):
+        """Test that fragmented MP4 input is refused"""
+        path = str(tmp_path / "frag.mp4")
+        make_mp4(path, 0)
+        with open(path, "ab") as f:
+            f.write(box(b"moof", b"\x00" * 8))
+
+        with pytest.raises(Mp4ConcatError):
+            concat_mp4([path, path], str(tmp_path / "out.mp4"))
+
+    def test_truncated_file_rejected(self, tmp_path):
+        """Test that a cut-off download is reported as an error"""
+        path = str(tmp_path / "cut.mp4")
+        make_mp4(path, 0)
+        with open(path, "r+b") as f:
+            f.truncate(100)
+
+        with pytest.raises(Mp4ConcatError):
+            concat_mp4([path], str(tmp_path / "out.mp4"))
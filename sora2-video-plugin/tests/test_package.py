@@ -0,0 +1,119 @@
+"""Tests for the package builder"""
+
+import hashlib
+import os
+import zipfile
+
+import pytest
+
+import package
+
+
+@pytest.fixture
+def wheels(tmp_path):
+    """A directory with fake downloaded wheels"""
+    directory = tmp_path / "wheels"
+    directory.mkdir()
+    (directory / "requests-2.32.0-py3-none-any.whl").write_bytes(b"wheel")
+    return str(directory)
+
+
+def sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class TestCollectFiles:
+    """Test deriving the file list from the manifest"""
+
+    def test_manifest_sources_included(self):
+        """Test that every YAML referenced by the manifest and its Python source is packaged"""
+        files = package.collect_files()
+
+        for path in ("manifest.yaml", "main.py", "requirements.txt", "_assets/icon.svg",
+                     "provider/sora2.yaml", "provider/sora2.py",
+                     "tools/storyboard.yaml", "tools/storyboard.py",
+                     "group/sora2.yaml", "endpoints/callback.yaml", "endpoints/callback.py"):
+            assert path in files
+
+    def test_imported_modules_included(self):
+        """Test that local modules are found through imports, including lazy ones"""
+        files = package.collect_files()
+
+        assert "utils/video_tool.py" in files
+        assert "utils/http_client.py" in files
+        assert "utils/mp4_concat.py" in files
+        assert "utils/credential_cache.py" in files
+
+    def test_development_files_excluded(self):
+        """Test that tests, benchmarks and build scripts are not packaged"""
+        files = package.collect_files()
+
+        assert not any(path.startswith(("tests/", "benchmarks/")) for path in files)
+        assert "package.py" not in files
+        assert "test_api.py" not in files
+
+
+class TestBuild:
+    """Test archive contents and reproducibility"""
+
+    def test_reproducible(self, tmp_path, monkeypatch):
+        """Test that two builds produce byte-identical archives"""
+        monkeypatch.delenv("SOURCE_DATE_EPOCH", raising=False)
+        first, second = str(tmp_path / "a.difypkg"), str(tmp_path / "b.difypkg")
+        package.build(first, bytecode=True)
+        package.build(second, bytecode=True)
+
+        assert sha256(first) == sha256(second)
+        with zipfile.ZipFile(first) as zipf:
+            names = zipf.namelist()
+            assert names == sorted(names)
+            assert {info.date_time for info in zipf.infolist()} == {package.ZIP_EPOCH}
+
+    def test_source_date_epoch(self, tmp_path, monkeypatch):
+        """Test that SOURCE_DATE_EPOCH sets the entry timestamps"""
+        monkeypatch.setenv("SOURCE_DATE_EPOCH", "1700000000")
+        output = str(tmp_path / "a.difypkg")
+        package.build(output, bytecode=False)
+
+        with zipfile.ZipFile(output) as zipf:
+            assert zipf.infolist()[0].date_time == (2023, 11, 14, 22, 13, 20)
+
+    def test_bytecode_next_to_sources(self, tmp_path):
+        """Test that each source gets a checked-hash .pyc in __pycache__"""
+        output = str(tmp_path / "a.difypkg")
+        entries = package.build(output, bytecode=True)
+
+        pyc = entries[package.importlib.util.cache_from_source("tools/storyboard.py")]
+        # flags field: bit 0 = hash based, bit 1 = check source
+        assert int.from_bytes(pyc[4:8], "little") == 0b11
+
+    def test_bytecode_skipped_for_other_runtime(self, tmp_path, monkeypatch):
+        """Test that no .pyc is shipped when the runtime Python version differs"""
+        monkeypatch.setattr(package, "runner_version", lambda root=None: "2.7")
+        entries = package.build(str(tmp_path / "a.difypkg"))
+
+        assert not any(path.endswith(".pyc") for path in entries)
+
+    def test_vendored_wheels(self, tmp_path, wheels):
+        """Test that vendored wheels are packaged and installed offline"""
+        entries = package.build(str(tmp_path / "a.difypkg"), bytecode=False, vendor=True, wheels_dir=wheels)
+
+        assert entries["wheels/requests-2.32.0-py3-none-any.whl"] == b"wheel"
+        requirements = entries["requirements.txt"].decode().splitlines()
+        assert requirements[:2] == ["--no-index", "--find-links wheels"]
+        assert "requests" in requirements
+
+
+class TestBudget:
+    """Test the size budget report"""
+
+    def test_within_budget(self, tmp_path, capsys):
+        """Test that a small package passes"""
+        assert package.main(["--output", str(tmp_path / "a.difypkg"), "--no-bytecode"]) == 0
+        assert "size:" in capsys.readouterr().out
+
+    def test_over_budget(self, tmp_path, capsys):
+        """Test that exceeding the size budget fails the build"""
+        assert package.main(["--output", str(tmp_path / "a.difypkg"), "--max-size-mb", "0.001"]) == 1
+        assert "OVER BUDGET" in capsys.readouterr().out
@@ -1,202 +1,181 @@
-"""Tests for polling behavior across tools"""
+"""Tests for polling a task through AsyncPollEngine._follow"""
 
+import asyncio
+
+import httpx
 import pytest
-import time
-from unittest.mock import Mock, patch
-from tools.text_to_video import TextToVideoTool
-from tools.image_to_video import ImageToVideoTool
-
-
-class TestPollingBehavior:
-    """Test shared polling behavior"""
-
-    @pytest.fixture
-    def text_tool(self, mock_tool_runtime, mock_tool_session):
-        tool = TextToVideoTool(mock_tool_runtime, mock_tool_session)
-        return tool
-
-    @pytest.fixture
-    def image_tool(self, mock_tool_runtime, mock_tool_session):
-        tool = ImageToVideoTool(mock_tool_runtime, mock_tool_session)
-        return tool
-
-    @patch("tools.text_to_video.time.sleep")
-    @patch("tools.text_to_video.requests.get")
-    def test_poll_interval_is_30_seconds(self, mock_get, mock_sleep, text_tool):
-        """Test that polling interval is 30 seconds"""
-        # First call: processing, second call: completed
-        mock_get.side_effect = [
-            Mock(json=lambda: {"status": "processing"}),
-            Mock(json=lambda: {"status": "completed", "video_url": "https://example.com/video.mp4"})
-        ]
-
-        text_tool._poll_until_complete("test_key", "task_123", poll_interval=30)
-
-        # Verify sleep was called with 30 seconds
-        mock_sleep.assert_called_with(30)
-
-    @patch("tools.text_to_video.time.sleep")
-    @patch("tools.text_to_video.requests.get")
-    def test_custom_poll_interval(self, mock_get, mock_sleep, text_tool):
-        """Test custom polling interval"""
-        mock_get.side_effect = [
-            Mock(json=lambda: {"status": "processing"}),
-            Mock(json=lambda: {"status": "completed", "video_url": "https://example.com/video.mp4"})
-        ]
-
-        text_tool._poll_until_complete("test_key", "task_123", poll_interval=15)
-
-        # Verify sleep was called with custom interval
-        mock_sleep.assert_called_with(15)
-
-    @patch("tools.text_to_video.time.sleep")
-    @patch("tools.text_to_video.requests.get")
-    @patch("tools.text_to_video.time.time")
-    def test_timeout_after_300_seconds(self, mock_time, mock_get, mock_sleep, text_tool):
-        """Test that timeout occurs after 300 seconds (5 minutes)"""
-        # Simulate time progression
-        mock_time.side_effect = [0, 30, 60, 90, 120, 150, 180, 210, 240, 270, 301]
-
-        # Always return processing status
-        mock_get.return_value = Mock(json=lambda: {"status": "processing"})
-
-        with pytest.raises(TimeoutError) as exc_info:
-            text_tool._poll_until_complete("test_key", "task_123", timeout=300)
-
-        assert "超时" in str(exc_info.value)
-
-    @patch("tools.text_to_video.time.sleep")
-    @patch("tools.text_to_video.requests.get")
-    def test_max_retries_behavior(self, mock_get, mock_sleep, text_tool):
-        """Test that polling continues until completion (no artificial retry limit)"""
-        # Simulate 5 processing states before completion
-        processing_responses = [
-            Mock(json=lambda: {"status": "processing"})
-        ] * 5
-        completed_response = Mock(json=lambda: {
-            "status": "completed",
-            "video_url": "https://example.com/video.mp4"
-        })
-        mock_get.side_effect = processing_responses + [completed_response]
-
-        result = text_tool._poll_until_complete("test_key", "task_123")
-
-        assert result["status"] == "completed"
-        assert mock_sleep.call_count == 5
-
-    @patch("tools.image_to_video.time.sleep")
-    @patch("tools.image_to_video.requests.get")
-    def test_image_tool_polling(self, mock_get, mock_sleep, image_tool):
-        """Test that ImageToVideoTool uses same polling logic"""
-        mock_get.side_effect = [
-            Mock(json=lambda: {"status": "processing"}),
-            Mock(json=lambda: {"status": "completed", "video_url": "https://example.com/video.mp4"})
-        ]
-
-        result = image_tool._poll_until_complete("test_key", "task_123")
-
-        assert result["status"] == "completed"
-        mock_sleep.assert_called_once_with(30)
-
-
-class TestPollingEdgeCases:
-    """Test edge cases in polling behavior"""
-
-    @pytest.fixture
-    def tool(self, mock_tool_runtime, mock_tool_session):
-        tool = TextToVideoTool(mock_tool_runtime, mock_tool_session)
-        return tool
-
-    @patch("tools.text_to_video.time.sleep")
-    @patch("tools.text_to_video.requests.get")
-    def test_immediate_completion(self, mock_get, mock_sleep, tool):
-        """Test when task completes immediately (no sleep needed)"""
-        mock_get.return_value = Mock(json=lambda: {
-            "status": "completed",
-            "video_url": "https://example.com/video.mp4"
-        })
-
-        result = tool._poll_until_complete("test_key", "task_123")
-
-        assert result["status"] == "completed"
-        mock_sleep.assert_not_called()
-
-    @patch("tools.text_to_video.time.sleep")
-    @patch("tools.text_to_video.requests.get")
-    def test_failed_status_stops_polling(self, mock_get, mock_sleep, tool):
-        """Test that failed status immediately stops polling"""
-        mock_get.return_value = Mock(json=lambda: {
-            "status": "failed",
-            "error": "Video generation failed"
-        })
-
-        with pytest.raises(Exception) as exc_info:
-            tool._poll_until_complete("test_key", "task_123")
-
-        assert "failed" in str(exc_info.value).lower()
-        mock_sleep.assert_not_called()
-
-    @patch("tools.text_to_video.time.sleep")
-    @patch("tools.text_to_video.requests.get")
-    @patch("tools.text_to_video.time.time")
-    def test_timeout_during_processing(self, mock_time, mock_get, mock_sleep, tool):
-        """Test timeout that occurs while task is still processing"""
-        # Simulate time approaching and exceeding timeout
-        mock_time.side_effect = [0, 30, 60, 90, 120, 150, 180, 210, 240, 270, 301]
 
-        mock_get.return_value = Mock(json=lambda: {"status": "processing"})
-
-        with pytest.raises(TimeoutError):
-            tool._poll_until_complete("test_key", "task_123", timeout=300)
-
-        # Should have called sleep 9 times before timeout
-        assert mock_sleep.call_count == 9
+from utils.backends import JuxinBackend, ZhenzhenBackend
+from utils.polling import PollScheduler
+
+ZHENZHEN_BACKEND = ZhenzhenBackend("test_key")
+JUXIN_BACKEND = JuxinBackend("test_key")
+
+COMPLETED = {"status": "SUCCESS", "progress": "100%", "data": {"output": "https://example.com/video.mp4"}}
+
+
+def fast_scheduler():
+    return PollScheduler(min_interval=0, max_interval=0, queue_interval=0)
+
+
+def query_handler(responses, queries):
+    """Answer queries with responses in order (the last one repeats); query task ids go to queries"""
+    remaining = list(responses)
+
+    def handler(request):
+        queries.append(request.url.path.rsplit("/", 1)[-1])
+        return httpx.Response(200, json=remaining.pop(0) if len(remaining) > 1 else remaining[0])
+
+    return handler
+
+
+def run(engine, coroutine_factory):
+    """Run a coroutine on the engine's event loop and wait for its result"""
+    loop = engine._ensure_started()
+    return asyncio.run_coroutine_threadsafe(coroutine_factory(), loop).result(timeout=10)
+
+
+def follow(engine, task_id, timeout=5.0, scheduler=None, backend=ZHENZHEN_BACKEND):
+    """Follow one task to its terminal event; returns (emitted events, final event)"""
+    events = []
+    final = run(engine, lambda: engine._follow(backend, task_id, timeout, scheduler or fast_scheduler(), events.append))
+    return events, final
+
+
+class TestFollow:
+    """Test a single caller following a task"""
+
+    def test_polls_until_complete(self, make_engine):
+        """Test that polling continues through processing states until completion"""
+        queries = []
+        engine = make_engine(query_handler([{"status": "IN_PROGRESS"}] * 5 + [COMPLETED], queries))
+
+        events, final = follow(engine, "task_123")
+
+        assert final["type"] == "completed"
+        assert final["result"]["video_url"] == "https://example.com/video.mp4"
+        assert final["polls"] == 6
+        assert queries == ["task_123"] * 6
+        assert events[-1] == final
+
+    def test_immediate_completion(self, make_engine):
+        """Test that a finished task needs a single query"""
+        queries = []
+        engine = make_engine(query_handler([COMPLETED], queries))
+
+        events, final = follow(engine, "task_123")
+
+        assert final["type"] == "completed"
+        assert final["polls"] == 1
+        assert [event["type"] for event in events] == ["progress", "completed"]
+
+    def test_failed_status_stops_polling(self, make_engine):
+        """Test that a failed status ends polling with the platform's reason"""
+        queries = []
+        engine = make_engine(query_handler([{"status": "FAILURE", "fail_reason": "Video generation failed"}], queries))
+
+        events, final = follow(engine, "task_123")
+
+        assert final["type"] == "failed"
+        assert final["error"] == "Video generation failed"
+        assert len(queries) == 1
+
+    def test_timeout_during_processing(self, make_engine):
+        """Test the timeout of a task that is still processing; the query in flight counts as a poll"""
+        queries = []
+
+        async def handler(request):
+            queries.append(request.url.path.rsplit("/", 1)[-1])
+            if len(queries) == 3:
+                # the third query is still in flight when the deadline passes
+                await asyncio.sleep(30)
+            return httpx.Response(200, json={"status": "IN_PROGRESS"})
+
+        engine = make_engine(handler)
+
+        events, final = follow(engine, "task_123", timeout=0.3, scheduler=fast_scheduler())
+
+        assert final["type"] == "timeout"
+        assert "超时" in final["error"]
+        assert final["polls"] == len(queries) == 3
+
+    def test_poll_delay_comes_from_scheduler(self, make_engine):
+        """Test that the wait between queries is the scheduler's next delay"""
+        delays = []
+
+        class RecordingScheduler(PollScheduler):
+            def next_delay(self, result, elapsed):
+                delays.append(super().next_delay(result, elapsed))
+                return 0
+
+        engine = make_engine(query_handler([{"status": "IN_PROGRESS"}, COMPLETED], []))
+        follow(engine, "task_123", scheduler=RecordingScheduler(min_interval=15, max_interval=15, queue_interval=15))
+
+        assert delays == [15, 15]
+
+    @pytest.mark.parametrize("backend,response", [
+        (ZHENZHEN_BACKEND, COMPLETED),
+        (JUXIN_BACKEND, {"status": "completed", "video_url": "https://example.com/video.mp4"}),
+    ])
+    def test_both_platforms(self, make_engine, backend, response):
+        """Test that both platforms' query formats complete with the video URL"""
+        engine = make_engine(lambda request: httpx.Response(200, json=response))
+
+        events, final = follow(engine, "task_123", backend=backend)
+
+        assert final["type"] == "completed"
+        assert final["result"]["video_url"] == "https://example.com/video.mp4"
 
 
 class TestConcurrentPolling:
-    """Test concurrent polling scenarios"""
-
-    @pytest.fixture
-    def text_tool(self, mock_tool_runtime, mock_tool_session):
-        tool = TextToVideoTool(mock_tool_runtime, mock_tool_session)
-        return tool
-
-    @pytest.fixture
-    def image_tool(self, mock_tool_runtime, mock_tool_session):
-        tool = ImageToVideoTool(mock_tool_runtime, mock_tool_session)
-        return tool
-
-    @patch("tools.image_to_video.time.sleep")
-    @patch("tools.image_to_video.requests.get")
-    @patch("tools.text_to_video.time.sleep")
-    @patch("tools.text_to_video.requests.get")
-    def test_both_tools_can_poll_simultaneously(
-        self,
-        text_mock_get,
-        text_mock_sleep,
-        image_mock_get,
-        image_mock_sleep,
-        text_tool,
-        image_tool
-    ):
-        """Test that both tools can poll simultaneously without interference"""
-        # Setup text tool polling
-        text_mock_get.side_effect = [
-            Mock(json=lambda: {"status": "processing"}),
-            Mock(json=lambda: {"status": "completed", "video_url": "https://example.com/text.mp4"})
-        ]
-
-        # Setup image tool polling
-        image_mock_get.side_effect = [
-            Mock(json=lambda: {"status": "processing"}),
-            Mock(json=lambda: {"status": "completed", "video_url": "https://example.com/image.mp4"})
-        ]
-
-        # Poll both tools
-        text_result = text_tool._poll_until_complete("test_key", "task_1")
-        image_result = image_tool._poll_until_complete("test_key", "task_2")
-
-        assert text_result["status"] == "completed"
-        assert image_result["status"] == "completed"
-        assert text_mock_sleep.call_count == 1
-        assert image_mock_sleep.call_count == 1
+    """Test concurrent callers following tasks"""
+
+    def test_concurrent_follows_share_queries(self, make_engine):
+        """Test that two callers waiting on the same task share every query"""
+        queries = []
+        engine = make_engine(query_handler([{"status": "IN_PROGRESS"}] * 2 + [COMPLETED], queries))
+        first, second = [], []
+
+        async def both():
+            return await asyncio.gather(
+                engine._follow(ZHENZHEN_BACKEND, "task_shared", 5, fast_scheduler(), first.append),
+                engine._follow(ZHENZHEN_BACKEND, "task_shared", 5, fast_scheduler(), second.append)
+            )
+
+        finals = run(engine, both)
+
+        assert [final["result"]["video_url"] for final in finals] == ["https://example.com/video.mp4"] * 2
+        assert queries == ["task_shared"] * 3
+        assert first[-1]["type"] == second[-1]["type"] == "completed"
+
+    def test_follower_receives_failure(self, make_engine):
+        """Test that a failure seen by the shared poll reaches every caller"""
+        queries = []
+        engine = make_engine(query_handler([{"status": "FAILURE", "fail_reason": "policy violation"}], queries))
+
+        async def both():
+            return await asyncio.gather(*[
+                engine._follow(ZHENZHEN_BACKEND, "task_bad", 5, fast_scheduler(), lambda event: None)
+                for _ in range(2)
+            ])
+
+        finals = run(engine, both)
+
+        assert [final["error"] for final in finals] == ["policy violation"] * 2
+        assert len(queries) == 1
+
+    def test_different_tasks_poll_independently(self, make_engine):
+        """Test that two tasks followed at the same time each get their own queries"""
+        queries = []
+        engine = make_engine(query_handler([{"status": "IN_PROGRESS"}, COMPLETED], queries))
+
+        async def both():
+            return await asyncio.gather(
+                engine._follow(ZHENZHEN_BACKEND, "task_1", 5, fast_scheduler(), lambda event: None),
+                engine._follow(ZHENZHEN_BACKEND, "task_2", 5, fast_scheduler(), lambda event: None)
+            )
+
+        finals = run(engine, both)
+
+        assert [final["type"] for final in finals] == ["completed", "completed"]
+        assert sorted(set(queries)) == ["task_1", "task_2"]
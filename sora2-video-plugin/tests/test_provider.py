@@ -4,7 +4,11 @@ import pytest
 from unittest.mock import Mock, patch
 import requests
 
+from dify_plugin.errors.tool import ToolProviderCredentialValidationError
+
 from provider.sora2 import Sora2Provider
+from utils.backends import ZHENZHEN_BASE_URL
+from utils.credential_cache import CredentialCache
 
 
 class TestSora2Provider:
@@ -17,7 +21,7 @@ class TestSora2Provider:
 
     def test_validate_credentials_success(self, provider, mock_credentials):
         """Test successful credential validation"""
-        with patch("requests.get") as mock_get:
+        with patch("utils.http_client.get") as mock_get:
             mock_response = Mock()
             mock_response.status_code = 200
             mock_get.return_value = mock_response
@@ -37,7 +41,7 @@ class TestSora2Provider:
 
     def test_validate_credentials_invalid_key(self, provider, mock_credentials):
         """Test validation with invalid API key (401 response)"""
-        with patch("requests.get") as mock_get:
+        with patch("utils.http_client.get") as mock_get:
             mock_response = Mock()
             mock_response.status_code = 401
             mock_get.return_value = mock_response
@@ -49,7 +53,7 @@ class TestSora2Provider:
 
     def test_validate_credentials_connection_error(self, provider, mock_credentials):
         """Test validation with connection error"""
-        with patch("requests.get") as mock_get:
+        with patch("utils.http_client.get") as mock_get:
             mock_get.side_effect = requests.ConnectionError("Connection failed")
 
             with pytest.raises(ValueError) as exc_info:
@@ -59,10 +63,146 @@ class TestSora2Provider:
 
     def test_validate_credentials_timeout(self, provider, mock_credentials):
         """Test validation with timeout"""
-        with patch("requests.get") as mock_get:
+        with patch("utils.http_client.get") as mock_get:
             mock_get.side_effect = requests.Timeout("Request timed out")
 
             with pytest.raises(ValueError) as exc_info:
                 provider._validate_credentials(mock_credentials)
 
             assert "API connection failed" in str(exc_info.value)
+
+    def test_probe_queries_configured_base_url(self, provider, mock_credentials):
+        """Test that validation probes a single task on the configured Zhenzhen base URL"""
+        with patch("utils.http_client.get") as mock_get:
+            mock_get.return_value = Mock(status_code=400)
+
+            provider._validate_credentials(mock_credentials)
+
+            url = mock_get.call_args[0][0]
+            assert url == f"{ZHENZHEN_BASE_URL}/v2/videos/generations/validate"
+
+    def test_probe_does_not_read_body(self, provider, mock_credentials):
+        """Test that the probe only reads the status and closes the response"""
+        with patch("utils.http_client.get") as mock_get:
+            response = Mock(status_code=422)
+            mock_get.return_value = response
+
+            provider._validate_credentials(mock_credentials)
+
+            assert mock_get.call_args[1]["stream"] is True
+            response.close.assert_called_once()
+            response.json.assert_not_called()
+            response.iter_content.assert_not_called()
+
+    def test_validate_credentials_server_error(self, provider, mock_credentials):
+        """Test that a 5xx response fails validation without accepting the key"""
+        with patch("utils.http_client.get") as mock_get:
+            mock_get.return_value = Mock(status_code=502)
+
+            with pytest.raises(ToolProviderCredentialValidationError, match="API unavailable: HTTP 502"):
+                provider._validate_credentials(mock_credentials)
+
+
+class TestCredentialCache:
+    """Test caching of credential validation results"""
+
+    @pytest.fixture
+    def provider(self):
+        return Sora2Provider()
+
+    def test_valid_key_cached(self, provider, mock_credentials):
+        """Test that a valid key is only probed once"""
+        with patch("utils.http_client.get") as mock_get:
+            mock_get.return_value = Mock(status_code=200)
+
+            provider._validate_credentials(mock_credentials)
+            provider._validate_credentials(mock_credentials)
+
+            mock_get.assert_called_once()
+
+    def test_invalid_key_negative_cached(self, provider, mock_credentials):
+        """Test that a 401 is remembered and raised again without a request"""
+        with patch("utils.http_client.get") as mock_get:
+            mock_get.return_value = Mock(status_code=401)
+
+            for _ in range(2):
+                with pytest.raises(ToolProviderCredentialValidationError, match="Invalid API Key"):
+                    provider._validate_credentials(mock_credentials)
+
+            mock_get.assert_called_once()
+
+    def test_forbidden_key_negative_cached(self, provider, mock_credentials):
+        """Test that a 403 (forbidden or disabled key) is cached as invalid"""
+        with patch("utils.http_client.get") as mock_get:
+            mock_get.return_value = Mock(status_code=403)
+
+            for _ in range(2):
+                with pytest.raises(ToolProviderCredentialValidationError, match="Invalid API Key"):
+                    provider._validate_credentials(mock_credentials)
+
+            mock_get.assert_called_once()
+
+    def test_unexpected_status_not_cached(self, provider, mock_credentials):
+        """Test that a 404 (e.g. a wrong base URL) fails validation and is not cached"""
+        with patch("utils.http_client.get") as mock_get:
+            mock_get.side_effect = [Mock(status_code=404), Mock(status_code=200)]
+
+            with pytest.raises(ToolProviderCredentialValidationError, match="unexpected response: HTTP 404"):
+                provider._validate_credentials(mock_credentials)
+            provider._validate_credentials(mock_credentials)
+
+            assert mock_get.call_count == 2
+
+    def test_connection_error_not_cached(self, provider, mock_credentials):
+        """Test that a network error is retried on the next validation"""
+        with patch("utils.http_client.get") as mock_get:
+            mock_get.side_effect = [requests.ConnectionError("down"), Mock(status_code=200)]
+
+            with pytest.raises(ToolProviderCredentialValidationError, match="API connection failed"):
+                provider._validate_credentials(mock_credentials)
+            provider._validate_credentials(mock_credentials)
+
+            assert mock_get.call_count == 2
+
+    def test_server_error_not_cached(self, provider, mock_credentials):
+        """Test that a 5xx is probed again on the next validation"""
+        with patch("utils.http_client.get") as mock_get:
+            mock_get.side_effect = [Mock(status_code=503), Mock(status_code=200)]
+
+            with pytest.raises(ToolProviderCredentialValidationError, match="API unavailable"):
+                provider._validate_credentials(mock_credentials)
+            provider._validate_credentials(mock_credentials)
+
+            assert mock_get.call_count == 2
+
+    def test_keys_cached_separately(self, provider):
+        """Test that a different key and the Juxin key are probed on their own"""
+        with patch("utils.http_client.get") as mock_get:
+            mock_get.return_value = Mock(status_code=200)
+
+            provider._validate_credentials({"api_key": "key_a"})
+            provider._validate_credentials({"api_key": "key_b"})
+            provider._validate_credentials({"api_key": "key_a", "juxin_api_key": "key_a"})
+
+            assert mock_get.call_count == 3
+            assert mock_get.call_args[1]["params"] == {"id": "validate"}
+
+    def test_ttl_expiry(self):
+        """Test that valid and invalid results expire after their own TTLs"""
+        now = [0.0]
+        cache = CredentialCache(valid_ttl=600, invalid_ttl=60, clock=lambda: now[0])
+        cache.put("https://a", "good", True)
+        cache.put("https://a", "bad", False)
+
+        now[0] = 61
+        assert cache.get("https://a", "good") is True
+        assert cache.get("https://a", "bad") is None
+        now[0] = 601
+        assert cache.get("https://a", "good") is None
+
+    def test_key_not_stored_in_plain_text(self):
+        """Test that only a hash of the key is kept"""
+        cache = CredentialCache()
+        cache.put("https://a", "secret_key", True)
+
+        assert all("secret_key" not in key for key in cache._entries)
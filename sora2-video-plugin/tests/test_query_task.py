@@ -0,0 +1,135 @@
+"""Tests for QueryTaskTool"""
+
+import asyncio
+
+import httpx
+import pytest
+from unittest.mock import Mock, patch
+
+from tools.query_task import QueryTaskTool
+
+STATUSES = {
+    "task_a": {"status": "SUCCESS", "progress": "100%", "data": {"output": "https://example.com/a.mp4"}},
+    "task_b": {"status": "IN_PROGRESS", "progress": "40%"},
+    "task_c": {"status": "FAILURE", "progress": "100%", "fail_reason": "policy"},
+    "task_d": {"status": "NOT_START", "progress": "0%"},
+}
+
+
+def status_handler(state, delay=0.1):
+    async def handler(request):
+        task_id = request.url.path.rsplit("/", 1)[1]
+        state["queries"].append(task_id)
+        state["in_flight"] += 1
+        state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+        await asyncio.sleep(delay)
+        state["in_flight"] -= 1
+        if task_id not in STATUSES:
+            return httpx.Response(404, json={"error": "not found"})
+        return httpx.Response(200, json=STATUSES[task_id])
+
+    return handler
+
+
+@pytest.fixture
+def state():
+    return {"queries": [], "in_flight": 0, "max_in_flight": 0}
+
+
+class TestQueryTaskTool:
+    """Test cases for QueryTaskTool"""
+
+    @pytest.fixture
+    def tool(self, mock_tool_runtime, mock_tool_session):
+        return QueryTaskTool(mock_tool_runtime, mock_tool_session)
+
+    def invoke(self, tool, engine, registry, parameters):
+        with patch("tools.query_task.get_engine", return_value=engine), \
+             patch("tools.query_task.get_registry", return_value=registry):
+            return [r.message.json_object for r in tool._invoke(parameters)]
+
+    def test_invoke_missing_credentials(self, mock_tool_session):
+        """Test invoke with missing API key"""
+        runtime = Mock()
+        runtime.credentials = {}
+        tool = QueryTaskTool(runtime, mock_tool_session)
+
+        results = list(tool._invoke({"task_ids": "task_a"}))
+        assert results[0].message.text == "API Key 未配置"
+
+    def test_invoke_empty_task_ids(self, tool):
+        """Test that an empty list is rejected"""
+        results = list(tool._invoke({"task_ids": " , "}))
+        assert results[0].message.text == "task_id 列表为空"
+
+    @pytest.mark.parametrize("raw,expected", [
+        ("task_a\ntask_b", ["task_a", "task_b"]),
+        ("task_a, task_b，task_c", ["task_a", "task_b", "task_c"]),
+        ('["task_a", "task_b"]', ["task_a", "task_b"]),
+        ("task_a task_a task_b", ["task_a", "task_b"]),
+        (["task_a", ""], ["task_a"]),
+    ])
+    def test_parse_task_ids(self, raw, expected):
+        """Test separators, JSON arrays and de-duplication"""
+        assert QueryTaskTool._parse_task_ids(raw) == expected
+
+    def test_normalized_statuses(self, tool, make_engine, task_registry, state):
+        """Test that each task gets a normalized status, progress and video_url"""
+        engine = make_engine(status_handler(state, delay=0))
+
+        results = self.invoke(tool, engine, task_registry, {"task_ids": "task_a\ntask_b\ntask_c\ntask_d"})
+
+        assert len(results) == 1
+        assert results[0]["total"] == 4
+        assert results[0]["completed"] == 1
+        assert results[0]["tasks"] == [
+            {"task_id": "task_a", "status": "completed", "progress": "100%",
+             "video_url": "https://example.com/a.mp4"},
+            {"task_id": "task_b", "status": "processing", "progress": "40%", "video_url": ""},
+            {"task_id": "task_c", "status": "failed", "progress": "100%", "video_url": "", "error": "policy"},
+            {"task_id": "task_d", "status": "pending", "progress": "0%", "video_url": ""},
+        ]
+
+    def test_queries_run_concurrently(self, tool, make_engine, task_registry, state):
+        """Test that queries overlap and respect the concurrency limit"""
+        engine = make_engine(status_handler(state, delay=0.1))
+
+        self.invoke(tool, engine, task_registry, {"task_ids": "task_a task_b task_c task_d", "concurrency": 2})
+
+        assert sorted(state["queries"]) == ["task_a", "task_b", "task_c", "task_d"]
+        assert state["max_in_flight"] == 2
+
+    def test_unknown_task_reported_per_item(self, tool, make_engine, task_registry, state):
+        """Test that one failing query does not fail the whole batch"""
+        engine = make_engine(status_handler(state, delay=0))
+
+        results = self.invoke(tool, engine, task_registry, {"task_ids": "task_a,missing"})
+
+        tasks = results[0]["tasks"]
+        assert tasks[0]["status"] == "completed"
+        assert tasks[1]["task_id"] == "missing"
+        assert tasks[1]["status"] == "error"
+        assert "404" in tasks[1]["error"]
+
+    def test_registered_success_skips_request(self, tool, make_engine, task_registry, state, mock_account):
+        """Test that tasks already known to have succeeded are not queried again"""
+        task_registry.record_created("task_done", {"prompt": "x"}, account=mock_account)
+        task_registry.update_status("task_done", {"status": "SUCCESS", "video_url": "https://example.com/done.mp4"})
+        engine = make_engine(status_handler(state, delay=0))
+
+        results = self.invoke(tool, engine, task_registry, {"task_ids": "task_done,task_b"})
+
+        assert state["queries"] == ["task_b"]
+        assert results[0]["tasks"][0] == {"task_id": "task_done", "status": "completed", "progress": "100%",
+                                          "video_url": "https://example.com/done.mp4"}
+
+    def test_other_account_record_is_queried(self, tool, make_engine, task_registry, state):
+        """Test that a task registered by another API Key is queried upstream with the caller's key"""
+        task_registry.record_created("task_a", {"prompt": "x"}, account="other_account")
+        task_registry.update_status("task_a", {"status": "SUCCESS", "video_url": "https://example.com/other.mp4"})
+        engine = make_engine(status_handler(state, delay=0))
+
+        results = self.invoke(tool, engine, task_registry, {"task_ids": "task_a"})
+
+        assert state["queries"] == ["task_a"]
+        assert results[0]["tasks"][0]["video_url"] == "https://example.com/a.mp4"
@@ -0,0 +1,192 @@
+"""Tests for the result cache and in-flight request coalescing"""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+from unittest.mock import patch
+
+from utils.backends import ZhenzhenBackend
+from utils.polling import PollScheduler
+from utils.result_cache import ResultCache, cache_key
+from tools.text_to_video import TextToVideoTool
+
+BACKEND = ZhenzhenBackend("test_key")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCacheKey:
+    """Test canonical hashing of params"""
+
+    def test_key_ignores_dict_order(self):
+        """Test that key order does not change the hash"""
+        assert cache_key({"prompt": "猫", "model": "sora-2"}) == cache_key({"model": "sora-2", "prompt": "猫"})
+
+    def test_key_keeps_image_order(self):
+        """Test that the images tuple is order sensitive"""
+        assert cache_key({"images": ["a", "b"]}) != cache_key({"images": ["b", "a"]})
+
+    def test_key_namespaced_by_api_key(self):
+        """Test that two accounts never share a key"""
+        params = {"prompt": "x"}
+        assert cache_key(params, namespace="key_1") != cache_key(params, namespace="key_2")
+
+
+class TestResultCache:
+    """Test TTL and LRU behaviour"""
+
+    def test_get_after_put(self):
+        """Test a simple hit and the hit counter"""
+        cache = ResultCache()
+        cache.put("k", {"video_url": "https://example.com/v.mp4"})
+
+        assert cache.get("k") == {"video_url": "https://example.com/v.mp4"}
+        assert cache.hits == 1
+
+    def test_entries_expire(self):
+        """Test that entries are dropped after the TTL"""
+        clock = FakeClock()
+        cache = ResultCache(ttl=10, clock=clock)
+        cache.put("k", {"video_url": "u"})
+
+        clock.now = 10
+        assert cache.get("k") is None
+        assert len(cache) == 0
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first"""
+        cache = ResultCache(max_entries=2)
+        cache.put("a", {"v": 1})
+        cache.put("b", {"v": 2})
+        cache.get("a")
+        cache.put("c", {"v": 3})
+
+        assert cache.get("b") is None
+        assert cache.get("a") == {"v": 1}
+        assert cache.get("c") == {"v": 3}
+
+
+def wait_until(predicate, timeout=1.0):
+    """Poll a condition set from the engine loop thread"""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def slow_handler(state, render_seconds=0.1):
+    async def handler(request):
+        if request.method == "POST":
+            state["creates"] += 1
+            return httpx.Response(200, json={"task_id": f"task_{state['creates']}"})
+        state["queries"] += 1
+        await asyncio.sleep(render_seconds)
+        return httpx.Response(200, json={"status": "SUCCESS", "data": {"output": "https://example.com/v.mp4"}})
+
+    return handler
+
+
+class TestInFlightCoalescing:
+    """Test that identical concurrent requests share one task"""
+
+    def test_identical_submissions_share_one_task(self, make_engine):
+        """Test that two submits with the same key create one task"""
+        state = {"creates": 0, "queries": 0}
+        engine = make_engine(slow_handler(state))
+        scheduler = PollScheduler(min_interval=0, max_interval=0)
+
+        first = engine.submit(BACKEND, {"prompt": "x"}, scheduler=scheduler, share_key="k")
+        second = engine.submit(BACKEND, {"prompt": "x"}, scheduler=scheduler, share_key="k")
+        first_events, second_events = list(first.events()), list(second.events())
+
+        assert state["creates"] == 1
+        assert state["queries"] == 1
+        assert [e["type"] for e in first_events] == [e["type"] for e in second_events] == ["created", "completed"]
+        assert second_events[0]["task_id"] == "task_1"
+        assert wait_until(lambda: engine.shared_streams == 0)
+
+    def test_different_keys_do_not_share(self, make_engine):
+        """Test that different keys create separate tasks"""
+        state = {"creates": 0, "queries": 0}
+        engine = make_engine(slow_handler(state, render_seconds=0))
+        scheduler = PollScheduler(min_interval=0, max_interval=0)
+
+        handles = [engine.submit(BACKEND, {"prompt": k}, scheduler=scheduler, share_key=k) for k in "ab"]
+        for handle in handles:
+            list(handle.events())
+
+        assert state["creates"] == 2
+
+    def test_leaving_subscriber_does_not_cancel_others(self, make_engine):
+        """Test that the shared task survives while one subscriber remains"""
+        state = {"creates": 0, "queries": 0}
+        engine = make_engine(slow_handler(state, render_seconds=0.2))
+        scheduler = PollScheduler(min_interval=0, max_interval=0)
+
+        first = engine.submit(BACKEND, {"prompt": "x"}, scheduler=scheduler, share_key="k")
+        second = engine.submit(BACKEND, {"prompt": "x"}, scheduler=scheduler, share_key="k")
+        first_events = first.events()
+        assert next(first_events)["type"] == "created"
+        first_events.close()
+
+        assert list(second.events())[-1]["type"] == "completed"
+
+    def test_last_subscriber_leaving_cancels_task(self, make_engine):
+        """Test that the shared task is cancelled once nobody waits for it"""
+        state = {"creates": 0, "queries": 0}
+        engine = make_engine(slow_handler(state, render_seconds=5))
+        scheduler = PollScheduler(min_interval=0, max_interval=0)
+
+        handle = engine.submit(BACKEND, {"prompt": "x"}, scheduler=scheduler, share_key="k")
+        events = handle.events()
+        next(events)
+        events.close()
+
+        assert wait_until(lambda: engine.shared_streams == 0)
+
+
+class TestToolCache:
+    """Test cache use inside the tool"""
+
+    @pytest.fixture
+    def tool(self, mock_tool_runtime, mock_tool_session):
+        return TextToVideoTool(mock_tool_runtime, mock_tool_session)
+
+    def test_second_invoke_served_from_cache(self, tool, make_engine, no_poll_delay):
+        """Test that a repeated request is answered without any request"""
+        state = {"creates": 0, "queries": 0}
+        engine = make_engine(slow_handler(state, render_seconds=0))
+        cache = ResultCache()
+
+        with patch("utils.video_tool.get_engine", return_value=engine), \
+             patch("utils.video_tool.get_result_cache", return_value=cache):
+            list(tool._invoke({"prompt": "x"}))
+            results = [r.message.json_object for r in tool._invoke({"prompt": "x"})]
+
+        assert state["creates"] == 1
+        assert results == [{"task_id": "task_1", "video_url": "https://example.com/v.mp4", "duration": "10",
+                            "status": "completed", "polls": 0, "cached": True}]
+
+    def test_use_cache_false_bypasses(self, tool, make_engine, no_poll_delay):
+        """Test that use_cache=False always submits a new task"""
+        state = {"creates": 0, "queries": 0}
+        engine = make_engine(slow_handler(state, render_seconds=0))
+        cache = ResultCache()
+
+        with patch("utils.video_tool.get_engine", return_value=engine), \
+             patch("utils.video_tool.get_result_cache", return_value=cache):
+            list(tool._invoke({"prompt": "x"}))
+            results = [r.message.json_object for r in tool._invoke({"prompt": "x", "use_cache": False})]
+
+        assert state["creates"] == 2
+        assert "cached" not in results[-1]
@@ -0,0 +1,225 @@
+"""Tests for the retry policy and create retries"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httpx
+import pytest
+from unittest.mock import patch
+
+from utils.backends import ZhenzhenBackend
+from utils.circuit_breaker import CircuitOpenError
+from utils.polling import PollScheduler
+from utils.retry import RetryBudget, RetryPolicy, is_retryable, is_uncertain, retry_after_seconds
+
+BACKEND = ZhenzhenBackend("test_key")
+
+
+def status_error(status_code, headers=None):
+    request = httpx.Request("GET", "https://ai.t8star.cn")
+    response = httpx.Response(status_code, headers=headers, request=request)
+    return httpx.HTTPStatusError("error", request=request, response=response)
+
+
+class TestClassification:
+    """Test which errors are retried"""
+
+    @pytest.mark.parametrize("error,idempotent,expected", [
+        (status_error(502), True, True),
+        (status_error(502), False, False),
+        (status_error(429), True, True),
+        (status_error(429), False, False),
+        (status_error(429, {"Retry-After": "2"}), False, True),
+        (status_error(503, {"Retry-After": "2"}), False, True),
+        (status_error(500, {"Retry-After": "2"}), False, False),
+        (status_error(500), True, True),
+        (status_error(500), False, False),
+        (status_error(404), True, False),
+        (httpx.ConnectError("refused"), False, True),
+        (httpx.ReadTimeout("slow"), True, True),
+        (httpx.ReadTimeout("slow"), False, False),
+        (CircuitOpenError("https://ai.t8star.cn", 10), True, False),
+        (KeyError("task_id"), True, False),
+    ])
+    def test_is_retryable(self, error, idempotent, expected):
+        """Test retryable errors for idempotent and non-idempotent requests"""
+        assert is_retryable(error, idempotent) is expected
+
+    @pytest.mark.parametrize("error,expected", [
+        (httpx.ReadTimeout("slow"), True),
+        (httpx.RemoteProtocolError("reset"), True),
+        (status_error(500), True),
+        (status_error(502), True),
+        (httpx.ConnectError("refused"), False),
+        (status_error(400), False),
+        (CircuitOpenError("https://ai.t8star.cn", 10), False),
+    ])
+    def test_is_uncertain(self, error, expected):
+        """Test which failed creates may have created the task"""
+        assert is_uncertain(error) is expected
+
+
+class TestRetryAfter:
+    """Test Retry-After parsing"""
+
+    def test_seconds(self):
+        assert retry_after_seconds(httpx.Response(429, headers={"Retry-After": "7"})) == 7
+
+    def test_http_date(self):
+        when = datetime.now(timezone.utc) + timedelta(seconds=30)
+        seconds = retry_after_seconds(httpx.Response(429, headers={"Retry-After": format_datetime(when, usegmt=True)}))
+        assert 25 < seconds <= 30
+
+    def test_missing_or_invalid(self):
+        assert retry_after_seconds(httpx.Response(429)) is None
+        assert retry_after_seconds(httpx.Response(429, headers={"Retry-After": "soon"})) is None
+
+
+class TestRetryPolicy:
+    """Test backoff, budget and the retry loop"""
+
+    @pytest.fixture
+    def sleeps(self):
+        delays = []
+
+        async def fake_sleep(delay):
+            delays.append(delay)
+
+        with patch("utils.retry.asyncio.sleep", fake_sleep):
+            yield delays
+
+    def test_backoff_is_capped_exponential(self):
+        """Test the upper bound of the full-jitter backoff"""
+        policy = RetryPolicy(base_delay=0.5, max_delay=4, rand=lambda low, high: high)
+        assert [policy.backoff(attempt) for attempt in range(1, 6)] == [0.5, 1, 2, 4, 4]
+
+    def test_transient_error_is_retried(self, sleeps):
+        """Test that a 502 followed by success returns the result"""
+        outcomes = [status_error(502), "ok"]
+
+        async def call():
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        assert asyncio.run(RetryPolicy(rand=lambda low, high: high).call(call)) == "ok"
+        assert sleeps == [0.5]
+
+    def test_retry_after_is_honored(self, sleeps):
+        """Test that the 429 Retry-After header replaces the backoff"""
+        outcomes = [status_error(429, {"Retry-After": "3"}), "ok"]
+
+        async def call():
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        asyncio.run(RetryPolicy().call(call))
+        assert sleeps == [3]
+
+    def test_long_retry_after_gives_up(self, sleeps):
+        """Test that waits beyond max_retry_after are not attempted"""
+        async def call():
+            raise status_error(429, {"Retry-After": "600"})
+
+        with pytest.raises(httpx.HTTPStatusError):
+            asyncio.run(RetryPolicy(max_retry_after=60).call(call))
+        assert sleeps == []
+
+    def test_attempts_are_limited(self, sleeps):
+        """Test that the error is raised after max_attempts"""
+        calls = []
+
+        async def call():
+            calls.append(1)
+            raise status_error(503)
+
+        with pytest.raises(httpx.HTTPStatusError):
+            asyncio.run(RetryPolicy(max_attempts=3).call(call))
+        assert len(calls) == 3
+
+    def test_budget_limits_retries(self, sleeps):
+        """Test that an exhausted budget stops retrying"""
+        calls = []
+
+        async def call():
+            calls.append(1)
+            raise status_error(503)
+
+        policy = RetryPolicy(max_attempts=10, budget=RetryBudget(ratio=0, max_tokens=2))
+        with pytest.raises(httpx.HTTPStatusError):
+            asyncio.run(policy.call(call))
+        assert len(calls) == 3
+
+
+class TestEngineRetry:
+    """Test retries inside the poll engine"""
+
+    def test_transient_query_error_does_not_fail_task(self, make_engine):
+        """Test that a single 502 while polling is retried"""
+        state = {"queries": 0}
+
+        def handler(request):
+            if request.method == "POST":
+                return httpx.Response(200, json={"task_id": "task_1"})
+            state["queries"] += 1
+            if state["queries"] == 1:
+                return httpx.Response(502)
+            return httpx.Response(200, json={"status": "SUCCESS", "data": {"output": "https://example.com/v.mp4"}})
+
+        engine = make_engine(handler)
+        events = list(engine.submit(BACKEND, {"prompt": "x"}, scheduler=PollScheduler(min_interval=0)).events())
+
+        assert [event["type"] for event in events] == ["created", "completed"]
+        assert state["queries"] == 2
+
+    def test_ambiguous_create_is_not_resubmitted(self, make_engine):
+        """Test that a create read timeout is reported without a second POST (the task may exist)"""
+        posts = []
+
+        def handler(request):
+            posts.append(request)
+            raise httpx.ReadTimeout("slow", request=request)
+
+        engine = make_engine(handler)
+        events = list(engine.submit(BACKEND, {"prompt": "x"}, scheduler=PollScheduler(min_interval=0)).events())
+
+        assert [event["type"] for event in events] == ["error"]
+        assert "可能已在 zhenzhen 平台创建" in events[0]["error"]
+        assert len(posts) == 1
+        assert "Idempotency-Key" not in posts[0].headers
+
+    def test_server_error_create_is_not_resubmitted(self, make_engine):
+        """Test that a 500 on create is not retried"""
+        posts = []
+
+        def handler(request):
+            posts.append(request)
+            return httpx.Response(500)
+
+        engine = make_engine(handler)
+        events = list(engine.submit(BACKEND, {"prompt": "x"}, scheduler=PollScheduler(min_interval=0)).events())
+
+        assert events[-1]["type"] == "error"
+        assert len(posts) == 1
+
+    def test_rejected_create_is_retried(self, make_engine):
+        """Test that a 429 with Retry-After is retried and creates one task"""
+        posts = []
+
+        def handler(request):
+            if request.method == "POST":
+                posts.append(request)
+                if len(posts) == 1:
+                    return httpx.Response(429, headers={"Retry-After": "0"})
+                return httpx.Response(200, json={"task_id": "task_1"})
+            return httpx.Response(200, json={"status": "SUCCESS", "data": {"output": "https://example.com/v.mp4"}})
+
+        engine = make_engine(handler)
+        events = list(engine.submit(BACKEND, {"prompt": "x"}, scheduler=PollScheduler(min_interval=0)).events())
+
+        assert [event["type"] for event in events] == ["created", "completed"]
+        assert len(posts) == 2
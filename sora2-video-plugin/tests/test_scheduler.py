@@ -0,0 +1,135 @@
+"""Tests for the adaptive polling scheduler"""
+
+import httpx
+import pytest
+from unittest.mock import patch
+
+from tools.text_to_video import TextToVideoTool
+from utils.polling import PollScheduler, expected_render_seconds, parse_progress
+from utils.result_cache import ResultCache
+
+
+class TestParseProgress:
+    """Test progress normalization"""
+
+    @pytest.mark.parametrize("value,expected", [
+        ("45%", 0.45),
+        ("100%", 1.0),
+        (0.93, 0.93),
+        (45, 0.45),
+        ("0.5", 0.5),
+    ])
+    def test_parse_progress_formats(self, value, expected):
+        """Test that all progress formats map onto 0..1"""
+        assert parse_progress(value) == pytest.approx(expected)
+
+    @pytest.mark.parametrize("value", [None, "", "n/a"])
+    def test_parse_progress_unknown(self, value):
+        """Test that missing or invalid progress returns None"""
+        assert parse_progress(value) is None
+
+
+class TestPollScheduler:
+    """Test delay selection"""
+
+    def test_pro_model_expected_longer(self):
+        """Test that pro and longer clips get a longer expected render time"""
+        assert expected_render_seconds("sora-2-pro", "25") > expected_render_seconds("sora-2", "10")
+        assert expected_render_seconds("sora-2", "20") == 120
+
+    def test_backs_off_while_queued(self):
+        """Test exponential backoff while the task is queued"""
+        scheduler = PollScheduler(queue_interval=4, max_interval=30)
+        delays = [scheduler.next_delay({"status": "NOT_START"}, t) for t in (0, 4, 10, 19)]
+
+        assert delays == sorted(delays)
+        assert delays[0] == 4
+        assert delays[-1] <= 30
+
+    def test_queue_position_lengthens_delay(self):
+        """Test that a deep queue position waits longer"""
+        scheduler = PollScheduler(queue_interval=4)
+        assert scheduler.next_delay({"status": "pending", "queue_position": 10}, 0) == 20
+
+    def test_fast_near_completion(self):
+        """Test that the minimum interval is used near completion"""
+        scheduler = PollScheduler(min_interval=2)
+        assert scheduler.next_delay({"status": "IN_PROGRESS", "progress": "95%"}, 40) == 2
+
+    def test_delay_tracks_progress_rate(self):
+        """Test that the delay follows the observed progress rate"""
+        scheduler = PollScheduler(min_interval=1, max_interval=60)
+        scheduler.next_delay({"status": "IN_PROGRESS", "progress": "0%"}, 10)
+        # 20% in 10s -> 40s remaining -> poll again in 20s
+        assert scheduler.next_delay({"status": "IN_PROGRESS", "progress": "20%"}, 20) == pytest.approx(20)
+
+    def test_progress_pct_preferred(self):
+        """Test that progress_pct is used when present"""
+        scheduler = PollScheduler(min_interval=2)
+        result = {"status": "IN_PROGRESS", "progress": "10%", "progress_pct": 0.93}
+        assert scheduler.next_delay(result, 30) == 2
+
+    def test_falls_back_to_expected_time(self):
+        """Test delay estimate without progress information"""
+        scheduler = PollScheduler(model="sora-2", duration="10", min_interval=3, max_interval=30)
+        assert scheduler.next_delay({"status": "IN_PROGRESS"}, 0) == 30
+        assert scheduler.next_delay({"status": "IN_PROGRESS"}, 50) == 5
+        assert scheduler.next_delay({"status": "IN_PROGRESS"}, 90) == 6
+
+    def test_counts_polls(self):
+        """Test that every dispatched query counts as one poll, whether or not it has returned"""
+        scheduler = PollScheduler()
+        for elapsed in range(3):
+            scheduler.record_query()
+            scheduler.next_delay({"status": "IN_PROGRESS"}, elapsed)
+        scheduler.record_query()
+        assert scheduler.polls == 4
+
+
+class RecordingScheduler(PollScheduler):
+    """Scheduler that records every delay it picks"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**{**kwargs, "min_interval": 0.01, "queue_interval": 0.01})
+        self.delays = []
+
+    def next_delay(self, result, elapsed):
+        delay = super().next_delay(result, elapsed)
+        self.delays.append(delay)
+        return delay
+
+
+class TestToolUsesScheduler:
+    """Test that the engine polls tool tasks according to the scheduler"""
+
+    def test_invoke_reports_polls(self, make_engine, mock_tool_runtime, mock_tool_session):
+        """Test near-complete polling and the poll count in the final message"""
+        statuses = [
+            {"status": "IN_PROGRESS", "progress": "95%"},
+            {"status": "SUCCESS", "progress": "100%", "data": {"output": "https://example.com/video.mp4"}},
+        ]
+
+        def handler(request):
+            if request.method == "POST":
+                return httpx.Response(200, json={"task_id": "task_1"})
+            return httpx.Response(200, json=statuses.pop(0))
+
+        engine = make_engine(handler)
+        schedulers = []
+
+        def scheduler(**kwargs):
+            schedulers.append(RecordingScheduler(**kwargs))
+            return schedulers[-1]
+
+        tool = TextToVideoTool(mock_tool_runtime, mock_tool_session)
+        with patch("utils.video_tool.get_engine", return_value=engine), \
+             patch("utils.video_tool.get_result_cache", return_value=ResultCache()), \
+             patch("utils.async_engine.PollScheduler", side_effect=scheduler):
+            results = list(tool._invoke({"prompt": "a cat"}))
+
+        final = results[-1].message.json_object
+        assert final["status"] == "completed"
+        assert final["video_url"] == "https://example.com/video.mp4"
+        assert final["polls"] == 2
+        # 95% is near completion: the next poll comes after the minimum interval
+        assert schedulers[0].delays[0] == 0.01
@@ -0,0 +1,195 @@
+"""Tests for the local API simulator and the load-test harness"""
+
+import random
+
+import pytest
+import requests
+
+from benchmarks.load_test import percentile, run_load
+from benchmarks.simulator import (
+    LatencyModel, Simulator, SimulatorConfig, SimulatorServer, video_content
+)
+from utils.backends import JuxinBackend, ZhenzhenBackend
+
+PARAMS = {"prompt": "a cat running on grass", "model": "sora-2", "duration": "10"}
+
+
+class FakeClock:
+    """Manually advanced clock for the in-memory simulator"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def server():
+    """Simulator where a 60s render takes 60ms of real time"""
+    with SimulatorServer(SimulatorConfig(render_seconds=60, render_jitter=0, time_scale=1000)) as server:
+        yield server
+
+
+class TestSimulator:
+    """Test the simulated task lifecycle without HTTP"""
+
+    def test_task_lifecycle(self):
+        """Test that a task queues, renders along the progress curve and then succeeds"""
+        clock = FakeClock()
+        simulator = Simulator(SimulatorConfig(queue_delay=10, render_seconds=60, render_jitter=0), clock)
+        task_id = simulator.create("zhenzhen", PARAMS)
+
+        state = simulator.state(task_id)
+        assert state["status"] == "NOT_START"
+        assert state["queue_position"] == 1
+
+        clock.now = 40
+        state = simulator.state(task_id)
+        assert state["status"] == "IN_PROGRESS"
+        assert state["progress"] == pytest.approx(0.5)
+
+        clock.now = 70
+        assert simulator.state(task_id)["status"] == "SUCCESS"
+
+    def test_render_time_scales_with_model_and_duration(self):
+        """Test that sora-2-pro and longer videos take longer to render"""
+        clock = FakeClock()
+        simulator = Simulator(SimulatorConfig(render_seconds=60, render_jitter=0), clock)
+        short = simulator.create("zhenzhen", PARAMS)
+        pro = simulator.create("zhenzhen", {**PARAMS, "model": "sora-2-pro", "duration": "15"})
+
+        clock.now = 61
+        assert simulator.state(short)["status"] == "SUCCESS"
+        assert simulator.state(pro)["status"] == "IN_PROGRESS"
+
+    def test_failed_task_fails_halfway(self):
+        """Test that tasks drawn as failures fail halfway through rendering"""
+        clock = FakeClock()
+        simulator = Simulator(SimulatorConfig(render_seconds=60, render_jitter=0, failure_rate=1), clock)
+        task_id = simulator.create("zhenzhen", PARAMS)
+
+        clock.now = 20
+        assert simulator.state(task_id)["status"] == "IN_PROGRESS"
+        clock.now = 31
+        assert simulator.state(task_id)["status"] == "FAILURE"
+
+    def test_juxin_task_ids(self):
+        """Test that every Juxin create starts a new task with a model-prefixed ID"""
+        simulator = Simulator()
+        first = simulator.create("juxin", PARAMS)
+
+        assert simulator.create("juxin", PARAMS) != first
+        assert first.startswith("sora-2:task_")
+
+    def test_latency_models(self):
+        """Test the latency distribution specs"""
+        rng = random.Random(1)
+
+        assert LatencyModel("0").sample(rng) == 0
+        assert LatencyModel("fixed:0.2").sample(rng) == 0.2
+        assert 0.1 <= LatencyModel("uniform:0.1:0.3").sample(rng) <= 0.3
+        assert LatencyModel("lognormal:0.05:0.5").sample(rng) > 0
+        assert LatencyModel("normal:0:1").sample(random.Random(3)) >= 0
+        with pytest.raises(ValueError):
+            LatencyModel("pareto:1")
+
+    def test_unknown_progress_curve(self):
+        """Test that an unknown progress curve is rejected"""
+        with pytest.raises(ValueError):
+            SimulatorConfig(progress_curve="zigzag")
+
+
+class TestSimulatorServer:
+    """Test the simulator's HTTP endpoints"""
+
+    def wait_for(self, backend, task_id):
+        for _ in range(200):
+            url, query = backend.query_request(task_id)
+            response = requests.get(url, headers=backend.headers, params=query, timeout=5)
+            response.raise_for_status()
+            result = backend.parse_status(response.json())
+            if result["status"] in ("SUCCESS", "FAILURE"):
+                return result
+        raise AssertionError(f"task {task_id} did not finish")
+
+    def test_zhenzhen_lifecycle(self, server):
+        """Test create and query in the format the Zhenzhen backend parses"""
+        backend = ZhenzhenBackend("sim", server.url)
+        url, body = backend.create_request(PARAMS)
+        response = requests.post(url, headers=backend.headers, json=body, timeout=5)
+        task_id = backend.parse_created(response.json())
+
+        result = self.wait_for(backend, task_id)
+
+        assert result["status"] == "SUCCESS"
+        assert result["video_url"] == f"{server.url}/files/{task_id}.mp4"
+        assert result["thumbnail_url"].endswith(".png")
+        assert server.simulator.snapshot()["requests"]["create"] == 1
+
+    def test_juxin_lifecycle(self, server):
+        """Test create and query in the format the Juxin backend parses"""
+        backend = JuxinBackend("sim", server.url)
+        url, body = backend.create_request(PARAMS)
+        response = requests.post(url, headers=backend.headers, json=body, timeout=5)
+        task_id = backend.parse_created(response.json())
+
+        result = self.wait_for(backend, task_id)
+
+        assert task_id.startswith("sora-2:")
+        assert result["status"] == "SUCCESS"
+        assert result["video_url"].startswith(f"{server.url}/files/")
+        content = requests.get(f"{server.url}/v1/videos/{task_id}/content", headers=backend.headers, timeout=5)
+        assert content.content == video_content(server.simulator.config.video_bytes)
+
+    def test_files_support_range(self, server):
+        """Test that file downloads honour Range requests for resumed downloads"""
+        video = video_content(server.simulator.config.video_bytes)
+
+        response = requests.get(f"{server.url}/files/x.mp4", headers={"Range": "bytes=100-"}, timeout=5)
+
+        assert response.status_code == 206
+        assert response.headers["Content-Range"] == f"bytes 100-{len(video) - 1}/{len(video)}"
+        assert response.content == video[100:]
+
+    def test_rate_limit_injection(self):
+        """Test that injected 429s carry Retry-After and are counted"""
+        config = SimulatorConfig(rate_limit_rate=1, retry_after=2)
+        with SimulatorServer(config) as server:
+            response = requests.post(f"{server.url}/v2/videos/generations", json=PARAMS, timeout=5)
+            stats = requests.get(f"{server.url}/_sim/stats", timeout=5).json()
+
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "2"
+        assert stats["rate_limited"] == 1
+        assert stats["tasks"] == 0
+
+    def test_unknown_task(self, server):
+        """Test that querying an unknown task returns 404"""
+        response = requests.get(f"{server.url}/v2/videos/generations/missing", timeout=5)
+
+        assert response.status_code == 404
+
+
+class TestLoadTest:
+    """Test the load-test harness end to end against an in-process simulator"""
+
+    def test_percentile(self):
+        """Test the nearest-rank percentile"""
+        values = list(range(1, 101))
+
+        assert percentile(values, 0.5) == 50
+        assert percentile(values, 0.99) == 99
+        assert percentile([], 0.5) is None
+
+    @pytest.mark.slow
+    def test_run_load(self):
+        """Test that concurrent tool invocations all complete and the report adds up"""
+        config = SimulatorConfig(render_seconds=60, time_scale=100)
+        with SimulatorServer(config) as server:
+            report = run_load(server.url, tasks=6, concurrency=6, tool="mixed", backend="both", time_scale=100)
+
+        assert report["statuses"] == {"completed": 6}
+        assert report["requests"]["create"] == 6
+        assert report["queries_per_task"] >= 1
+        assert report["engine_peak_in_flight"] >= 1
@@ -0,0 +1,54 @@
+"""Tests for the plugin's startup path"""
+
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.startup import ROOT, entry_modules
+
+# Only needed by some invocations, so they must not be imported at startup
+LAZY_MODULES = ["utils.mp4_concat", "utils.image_ingest", "utils.credential_cache", "PIL"]
+# Not needed to load the provider or validate credentials (httpx and requests come with the SDK itself)
+PROVIDER_LAZY_MODULES = LAZY_MODULES + ["utils.async_engine", "utils.http_client", "utils.task_registry", "sqlite3"]
+
+
+class TestStartup:
+    """Test what the plugin runtime imports on a cold start"""
+
+    def test_entry_modules_from_manifest(self):
+        """Test that the benchmark imports every source registered in the manifest"""
+        modules = entry_modules()
+
+        assert modules[0] == "provider.sora2"
+        assert "tools.text_to_video" in modules
+        assert "tools.storyboard" in modules
+        assert "endpoints.callback" in modules
+
+    def test_optional_modules_imported_lazily(self):
+        """Test that importing the entry modules leaves invocation-only modules unloaded"""
+        code = (
+            f"import sys\n"
+            f"for name in {entry_modules()!r}:\n"
+            f"    __import__(name)\n"
+            f"print(__import__('json').dumps([name for name in {LAZY_MODULES!r} if name in sys.modules]))\n"
+        )
+        env = {**os.environ, "SORA2_HTTP_WARMUP": "0"}
+        result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True)
+
+        assert json.loads(result.stdout.strip().splitlines()[-1]) == []
+
+    def test_provider_import_has_no_side_effects(self):
+        """Test that loading the provider imports no engine modules and starts no thread, even with warm-up on"""
+        code = (
+            f"import json, sys, threading\n"
+            f"import provider.sora2\n"
+            f"print(json.dumps({{'modules': [name for name in {PROVIDER_LAZY_MODULES!r} if name in sys.modules],\n"
+            f"                  'threads': [t.name for t in threading.enumerate() if t.name.startswith('sora2')]}}))\n"
+        )
+        env = {**os.environ, "SORA2_HTTP_WARMUP": "1"}
+        result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True)
+
+        assert json.loads(result.stdout.strip().splitlines()[-1]) == {"modules": [], "threads": []}
@@ -0,0 +1,193 @@
+"""Tests for StoryboardTool"""
+
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from unittest.mock import Mock, patch
+
+from dify_plugin.entities.tool import ToolInvokeMessage
+
+from tools.storyboard import StoryboardTool
+from tests.test_mp4_concat import make_mp4, read_file, track_samples
+
+
+def shot_handler(render_delays, fail=(), seen=None):
+    """Each shot (keyed by prompt) finishes after its own delay; shots in `fail` end in FAILURE"""
+    async def handler(request):
+        if request.method == "POST":
+            body = json.loads(request.content)
+            if seen is not None:
+                seen.append(body)
+            # parallel shots are keyed by the start of their scene, a native storyboard is "story"
+            shot = "story" if body["prompt"].startswith("Shot 1:") else body["prompt"][:8]
+            return httpx.Response(200, json={"task_id": f"task_{shot}"})
+
+        shot = request.url.path.rsplit("task_", 1)[1]
+        await asyncio.sleep(render_delays.get(shot, 0))
+        if shot in fail:
+            return httpx.Response(200, json={"status": "FAILURE", "fail_reason": "policy"})
+        return httpx.Response(200, json={"status": "SUCCESS", "data": {"output": f"https://example.com/{shot}.mp4"}})
+
+    return handler
+
+
+def fake_download(url, path, headers=None):
+    """Write a small MP4 whose samples are tagged with the shot number in the URL"""
+    make_mp4(path, int(url.split("/shot", 1)[1][0]))
+
+
+class TestParsing:
+    """Test shot parsing and prompt formatting"""
+
+    def test_parse_json_shots(self):
+        """Test objects with scene/duration and plain strings"""
+        shots = StoryboardTool._parse_shots('[{"scene": "门打开", "duration": "4sec"}, "怪物走出来"]')
+        assert shots == [{"scene": "门打开", "duration": 4.0}, {"scene": "怪物走出来", "duration": 5}]
+
+    def test_parse_storyboard_text(self):
+        """Test the platform's Shot N / duration / Scene format"""
+        text = "Shot 1:\nduration: 7.5sec\nScene: The fridge opens.\n\nShot 2:\nduration: 5sec\nScene: A monster appears."
+        shots = StoryboardTool._parse_shots(text)
+        assert shots == [
+            {"scene": "The fridge opens.", "duration": 7.5},
+            {"scene": "A monster appears.", "duration": 5.0},
+        ]
+
+    def test_parse_lines(self):
+        """Test one scene per line with the default duration"""
+        assert [s["scene"] for s in StoryboardTool._parse_shots("a\n\n b ")] == ["a", "b"]
+
+    def test_storyboard_prompt(self):
+        """Test the generated native storyboard prompt"""
+        prompt = StoryboardTool._storyboard_prompt([{"scene": "A", "duration": 5.0}, {"scene": "B", "duration": 7.5}])
+        assert prompt == "Shot 1:\nduration: 5sec\nScene: A\n\nShot 2:\nduration: 7.5sec\nScene: B"
+
+    @pytest.mark.parametrize("seconds,durations,expected", [
+        (5, (10, 15), "10"),
+        (12, (10, 15), "15"),
+        (20, (10, 15, 25), "25"),
+    ])
+    def test_fit_duration(self, seconds, durations, expected):
+        assert StoryboardTool._fit_duration(seconds, durations) == expected
+
+
+class TestStoryboardTool:
+    """Test native and parallel rendering"""
+
+    @pytest.fixture
+    def tool(self, mock_tool_runtime, mock_tool_session):
+        return StoryboardTool(mock_tool_runtime, mock_tool_session)
+
+    def test_missing_credentials(self, mock_tool_session):
+        """Test that a missing API key is reported"""
+        runtime = Mock()
+        runtime.credentials = {}
+        results = list(StoryboardTool(runtime, mock_tool_session)._invoke({"shots": "a"}))
+        assert results[0].message.text == "API Key 未配置"
+
+    def test_auto_uses_native_storyboard(self, tool, make_engine, no_poll_delay):
+        """Test that shots within the model limit are submitted as one storyboard task"""
+        seen = []
+        engine = make_engine(shot_handler({}, seen=seen))
+        shots = json.dumps([{"scene": "shot1 门打开", "duration": 5}, {"scene": "怪物出现", "duration": 7}])
+
+        with patch("tools.storyboard.get_engine", return_value=engine):
+            results = [r.message.json_object for r in tool._invoke({"shots": shots})]
+
+        assert len(seen) == 1
+        assert seen[0]["duration"] == "15"
+        assert seen[0]["prompt"].startswith("Shot 1:\nduration: 5sec\nScene: shot1 门打开")
+        assert results[-1]["mode"] == "native"
+        assert results[-1]["status"] == "completed"
+
+    def test_native_over_limit_rejected(self, tool):
+        """Test that an explicit native storyboard longer than the model allows is refused"""
+        shots = json.dumps([{"scene": "a", "duration": 10}, {"scene": "b", "duration": 10}])
+        results = list(tool._invoke({"shots": shots, "mode": "native"}))
+        assert "超过 sora-2 的上限 15 秒" in results[0].message.text
+
+    def test_parallel_shots_are_joined(self, tool, make_engine, no_poll_delay, tmp_path):
+        """Test that shots render concurrently and are delivered as one joined MP4"""
+        engine = make_engine(shot_handler({f"shot{i} sc": 0.3 for i in (1, 2, 3)}))
+        shots = json.dumps([{"scene": f"shot{i} scene", "duration": 10} for i in (1, 2, 3)])
+
+        start = time.monotonic()
+        with patch("tools.storyboard.get_engine", return_value=engine), \
+             patch("tools.storyboard.download_to_file", side_effect=fake_download):
+            results = list(tool._invoke({"shots": shots, "mode": "parallel"}))
+        elapsed = time.monotonic() - start
+
+        messages = [r.message.json_object for r in results if r.type == ToolInvokeMessage.MessageType.JSON]
+        blobs = [r.message for r in results if r.type == ToolInvokeMessage.MessageType.BLOB_CHUNK]
+        summary = messages[-1]
+        assert summary["status"] == "completed"
+        assert [shot["video_url"] for shot in summary["shots"]] == [
+            f"https://example.com/shot{i} sc.mp4" for i in (1, 2, 3)
+        ]
+        # wall clock tracks the slowest shot, not the sum
+        assert elapsed < 0.8
+
+        assert blobs[-1].end
+        joined = tmp_path / "joined.mp4"
+        joined.write_bytes(b"".join(blob.blob for blob in blobs))
+        data, _, moov = read_file(str(joined))
+        video = [b for b in moov if b.type == b"trak"][0]
+        assert [sample[0] for sample in track_samples(data, video)] == [1] * 6 + [2] * 6 + [3] * 6
+
+    def test_parallel_clips_trimmed_to_shot_duration(self, tool, make_engine, no_poll_delay, tmp_path):
+        """Test that each rendered clip is cut to its shot's duration before joining"""
+        engine = make_engine(shot_handler({}))
+        shots = json.dumps([{"scene": f"shot{i} scene", "duration": 0.1} for i in (1, 2)])
+
+        with patch("tools.storyboard.get_engine", return_value=engine), \
+             patch("tools.storyboard.download_to_file", side_effect=fake_download):
+            results = list(tool._invoke({"shots": shots, "mode": "parallel"}))
+
+        summary = [r.message.json_object for r in results if r.type == ToolInvokeMessage.MessageType.JSON][-1]
+        assert summary["duration"] == 0.2
+        joined = tmp_path / "joined.mp4"
+        joined.write_bytes(b"".join(r.message.blob for r in results if r.type == ToolInvokeMessage.MessageType.BLOB_CHUNK))
+        data, _, moov = read_file(str(joined))
+        video = [b for b in moov if b.type == b"trak"][0]
+        # 0.1 s of each 6-frame clip is 3 frames
+        assert [sample[0] for sample in track_samples(data, video)] == [1] * 3 + [2] * 3
+
+    def test_parallel_shot_over_limit_rejected(self, tool):
+        """Test that a single shot longer than the model can render is refused"""
+        shots = json.dumps([{"scene": "a", "duration": 10}, {"scene": "b", "duration": 20}])
+        results = list(tool._invoke({"shots": shots, "mode": "parallel"}))
+        assert "镜头时长 20 秒超过 sora-2 的上限 15 秒" in results[0].message.text
+
+    def test_failed_shot_skips_join(self, tool, make_engine, no_poll_delay):
+        """Test that a failed shot returns the other shots without joining"""
+        engine = make_engine(shot_handler({}, fail={"shot2 sc"}))
+        shots = json.dumps([{"scene": f"shot{i} scene", "duration": 10} for i in (1, 2)])
+
+        with patch("tools.storyboard.get_engine", return_value=engine), \
+             patch("tools.storyboard.download_to_file") as mock_download:
+            results = list(tool._invoke({"shots": shots, "mode": "parallel"}))
+
+        summary = results[-1].message.json_object
+        assert summary["status"] == "partial"
+        assert summary["shots"][1]["error"] == "policy"
+        mock_download.assert_not_called()
+
+    def test_join_failure_keeps_shot_urls(self, tool, make_engine, no_poll_delay):
+        """Test that a concat error still returns every shot's URL"""
+        engine = make_engine(shot_handler({}))
+        shots = json.dumps([{"scene": f"shot{i} scene", "duration": 10} for i in (1, 2)])
+
+        def broken_download(url, path, headers=None):
+            with open(path, "wb") as f:
+                f.write(b"not an mp4")
+
+        with patch("tools.storyboard.get_engine", return_value=engine), \
+             patch("tools.storyboard.download_to_file", side_effect=broken_download):
+            results = list(tool._invoke({"shots": shots, "mode": "parallel"}))
+
+        summary = results[-1].message.json_object
+        assert summary["error"].startswith("镜头拼接失败")
+        assert all(shot["video_url"] for shot in summary["shots"])
@@ -0,0 +1,239 @@
+"""Tests for the persistent task registry and resume-after-timeout"""
+
+import sqlite3
+import threading
+
+import httpx
+import pytest
+from unittest.mock import patch
+
+from utils.async_engine import AsyncPollEngine
+from utils.backends import ZhenzhenBackend
+from utils.polling import PollScheduler
+from utils.task_registry import TaskRegistry
+from tools.text_to_video import TextToVideoTool
+from tools.image_to_video import ImageToVideoTool
+
+BACKEND = ZhenzhenBackend("test_key")
+
+
+class TestTaskRegistry:
+    """Test registry persistence"""
+
+    def test_record_and_get(self, task_registry):
+        """Test that a created task is stored with its params"""
+        task_registry.record_created("task_1", {"prompt": "猫", "model": "sora-2"}, account=BACKEND.account)
+
+        record = task_registry.get("task_1", [BACKEND])
+        assert record["params"] == {"prompt": "猫", "model": "sora-2"}
+        assert record["status"] == "NOT_START"
+
+    def test_get_unknown(self, task_registry):
+        """Test that unknown task ids return None"""
+        assert task_registry.get("missing", [BACKEND]) is None
+
+    def test_get_is_scoped_to_account(self, task_registry):
+        """Test that another API Key cannot read a task's params or video url"""
+        task_registry.record_created("task_1", {"prompt": "secret"}, account=BACKEND.account)
+        task_registry.update_status("task_1", {"status": "SUCCESS", "video_url": "https://example.com/v.mp4"})
+        other = ZhenzhenBackend("other_key")
+
+        assert task_registry.get("task_1", [other]) is None
+        assert task_registry.get("task_1", [other, BACKEND])["params"] == {"prompt": "secret"}
+        assert task_registry.get("task_1", []) is None
+
+    def test_legacy_records_have_no_owner(self, tmp_path):
+        """Test that rows written before the account column existed are not returned to anyone"""
+        path = str(tmp_path / "tasks.db")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE tasks (task_id TEXT PRIMARY KEY, params TEXT NOT NULL, status TEXT, "
+                     "progress TEXT, video_url TEXT, fail_reason TEXT, backend TEXT, "
+                     "created_at REAL NOT NULL, updated_at REAL NOT NULL)")
+        conn.execute("INSERT INTO tasks (task_id, params, status, created_at, updated_at) "
+                     "VALUES ('task_1', '{}', 'SUCCESS', 0, 0)")
+        conn.commit()
+        conn.close()
+
+        registry = TaskRegistry(path)
+        assert registry.get("task_1", [BACKEND]) is None
+        registry.close()
+
+    def test_update_status_keeps_video_url(self, task_registry):
+        """Test status updates, and that a later empty url does not erase a known one"""
+        task_registry.record_created("task_1", {}, account=BACKEND.account)
+        task_registry.update_status("task_1", {"status": "SUCCESS", "progress": "100%",
+                                               "video_url": "https://example.com/v.mp4"})
+        task_registry.update_status("task_1", {"status": "SUCCESS", "progress": "100%"})
+
+        record = task_registry.get("task_1", [BACKEND])
+        assert record["status"] == "SUCCESS"
+        assert record["video_url"] == "https://example.com/v.mp4"
+
+    def test_persists_across_connections(self, tmp_path):
+        """Test that records survive a process restart"""
+        path = str(tmp_path / "tasks.db")
+        first = TaskRegistry(path)
+        first.record_created("task_1", {"prompt": "x"}, account=BACKEND.account)
+        first.close()
+
+        second = TaskRegistry(path)
+        assert second.get("task_1", [BACKEND])["params"] == {"prompt": "x"}
+        second.close()
+
+    def test_list_unfinished(self, task_registry):
+        """Test listing tasks that have not reached a terminal status"""
+        task_registry.record_created("running", {})
+        task_registry.record_created("done", {})
+        task_registry.update_status("done", {"status": "SUCCESS"})
+
+        assert [r["task_id"] for r in task_registry.list_unfinished()] == ["running"]
+
+
+class TestEngineRecordsTasks:
+    """Test that the engine writes to the registry"""
+
+    def test_engine_records_created_and_status(self, task_registry):
+        """Test that create and every poll are recorded"""
+        def handler(request):
+            if request.method == "POST":
+                return httpx.Response(200, json={"task_id": "task_1"})
+            return httpx.Response(200, json={"status": "SUCCESS", "progress": "100%",
+                                             "data": {"output": "https://example.com/v.mp4"}})
+
+        engine = AsyncPollEngine(
+            client_factory=lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+            registry=task_registry
+        )
+        try:
+            scheduler = PollScheduler(min_interval=0, max_interval=0)
+            list(engine.submit(BACKEND, {"prompt": "x", "model": "sora-2"}, scheduler=scheduler).events())
+        finally:
+            engine.shutdown()
+
+        record = task_registry.get("task_1", [BACKEND])
+        assert record["params"]["prompt"] == "x"
+        assert record["status"] == "SUCCESS"
+        assert record["video_url"] == "https://example.com/v.mp4"
+
+    def test_sqlite_writes_run_off_the_event_loop(self, task_registry, make_engine):
+        """Test that registry and completion-history writes do not block the engine's loop thread"""
+        threads = []
+
+        def recording(fn):
+            def wrapper(*args, **kwargs):
+                threads.append(threading.current_thread().name)
+                return fn(*args, **kwargs)
+            return wrapper
+
+        engine = make_engine(lambda request: httpx.Response(
+            200, json={"task_id": "task_1"} if request.method == "POST"
+            else {"status": "SUCCESS", "data": {"output": "https://example.com/v.mp4"}}
+        ))
+        engine._registry = task_registry
+        scheduler = PollScheduler(min_interval=0, max_interval=0)
+        with patch.object(task_registry, "record_created", recording(task_registry.record_created)), \
+             patch.object(task_registry, "update_status", recording(task_registry.update_status)), \
+             patch.object(engine.latency, "record", recording(engine.latency.record)):
+            events = list(engine.submit(BACKEND, {"prompt": "x"}, scheduler=scheduler).events())
+
+        assert events[-1]["type"] == "completed"
+        assert len(threads) == 3
+        assert "sora2-poll-engine" not in threads
+        assert task_registry.get("task_1", [BACKEND])["status"] == "SUCCESS"
+
+
+class TestResume:
+    """Test resuming a task by task_id instead of re-submitting"""
+
+    @pytest.mark.parametrize("tool_class", [TextToVideoTool, ImageToVideoTool])
+    def test_resume_completed_task_from_registry(self, tool_class, task_registry, mock_tool_runtime,
+                                                 mock_tool_session, mock_account):
+        """Test that a finished task is answered from the registry without any request"""
+        task_registry.record_created("task_1", {"prompt": "x", "duration": "15"}, account=mock_account)
+        task_registry.update_status("task_1", {"status": "SUCCESS", "video_url": "https://example.com/v.mp4"})
+        tool = tool_class(mock_tool_runtime, mock_tool_session)
+        with patch("utils.video_tool.get_registry", return_value=task_registry), \
+             patch("utils.video_tool.get_engine") as mock_engine:
+            results = [r.message.json_object for r in tool._invoke({"prompt": "x", "task_id": "task_1"})]
+
+        mock_engine.assert_not_called()
+        assert results == [{"task_id": "task_1", "status": "completed",
+                            "video_url": "https://example.com/v.mp4", "duration": "15", "polls": 0}]
+
+    def test_resume_running_task_polls_without_create(self, task_registry, make_engine, no_poll_delay,
+                                                      mock_tool_runtime, mock_tool_session, mock_account):
+        """Test that a running task is polled again and never re-created"""
+        task_registry.record_created("task_1", {"prompt": "x", "model": "sora-2-pro", "duration": "25"},
+                                     account=mock_account)
+        requests_seen = []
+
+        def handler(request):
+            requests_seen.append(request.method)
+            return httpx.Response(200, json={"status": "SUCCESS", "data": {"output": "https://example.com/v.mp4"}})
+
+        engine = make_engine(handler)
+        tool = TextToVideoTool(mock_tool_runtime, mock_tool_session)
+        with patch("utils.video_tool.get_registry", return_value=task_registry), \
+             patch("utils.video_tool.get_engine", return_value=engine):
+            results = [r.message.json_object for r in tool._invoke({"prompt": "x", "task_id": "task_1"})]
+
+        assert requests_seen == ["GET"]
+        assert results[-1]["status"] == "completed"
+        assert results[-1]["duration"] == "25"
+
+    def test_resume_other_account_task_queries_upstream(self, task_registry, make_engine, no_poll_delay,
+                                                        mock_tool_runtime, mock_tool_session):
+        """Test that another key's finished task is not served from the registry but queried with the caller's key"""
+        task_registry.record_created("task_1", {"prompt": "secret", "duration": "25"}, account="other_account")
+        task_registry.update_status("task_1", {"status": "SUCCESS", "video_url": "https://example.com/other.mp4"})
+        seen = []
+
+        def handler(request):
+            seen.append((request.method, request.headers["Authorization"]))
+            return httpx.Response(404, json={"error": "task not found"})
+
+        engine = make_engine(handler)
+        tool = TextToVideoTool(mock_tool_runtime, mock_tool_session)
+        with patch("utils.video_tool.get_registry", return_value=task_registry), \
+             patch("utils.video_tool.get_engine", return_value=engine):
+            results = [r.message.json_object for r in tool._invoke({"prompt": "x", "task_id": "task_1"})]
+
+        assert seen == [("GET", "Bearer test_api_key_12345")]
+        assert results[-1]["status"] == "failed"
+        assert "other.mp4" not in str(results)
+
+    def test_timeout_message_mentions_resume(self, make_engine, mock_tool_runtime, mock_tool_session):
+        """Test that the timeout message keeps the task_id for resuming"""
+        def handler(request):
+            if request.method == "POST":
+                return httpx.Response(200, json={"task_id": "task_1"})
+            return httpx.Response(200, json={"status": "IN_PROGRESS"})
+
+        engine = make_engine(handler)
+        tool = TextToVideoTool(mock_tool_runtime, mock_tool_session)
+        fast = PollScheduler(min_interval=0.01, max_interval=0.01)
+        submit = engine.submit
+        # Shrink the tool's 300s timeout so the test finishes quickly
+        with patch("utils.video_tool.get_engine", return_value=engine), \
+             patch("utils.async_engine.PollScheduler", return_value=fast), \
+             patch.object(engine, "submit", side_effect=lambda *args, **kw: submit(*args, **{**kw, "timeout": 0.05})):
+            results = [r.message.json_object for r in tool._invoke({"prompt": "x"})]
+
+        assert results[-1]["status"] == "timeout"
+        assert results[-1]["task_id"] == "task_1"
+        assert "task_id" in results[-1]["message"]
+
+    def test_request_error_keeps_task_id(self, make_engine, no_poll_delay, mock_tool_runtime, mock_tool_session):
+        """Test that a request error after the task was created still returns its task_id for resuming"""
+        def handler(request):
+            if request.method == "POST":
+                return httpx.Response(200, json={"task_id": "task_1"})
+            return httpx.Response(400, json={"error": "bad request"})
+
+        engine = make_engine(handler)
+        tool = TextToVideoTool(mock_tool_runtime, mock_tool_session)
+        with patch("utils.video_tool.get_engine", return_value=engine):
+            results = [r.message.json_object for r in tool._invoke({"prompt": "x", "use_cache": False})]
+
+        assert results[-1]["status"] == "failed"
+        assert results[-1]["task_id"] == "task_1"
@@ -0,0 +1,166 @@
+"""Tests for the normalized task status and the query-response parsers"""
+
+import asyncio
+import json
+import pickle
+
+import httpx
+import pytest
+from unittest.mock import patch
+
+from utils.backends import JuxinBackend, JuxinOpenAIBackend, ZhenzhenBackend
+from utils.task_status import TaskStatus, loads, parse_juxin, parse_zhenzhen
+
+
+class TestTaskStatus:
+    """Test the read-only mapping behaviour"""
+
+    def test_mapping_interface(self):
+        """Test that optional fields without a value are absent"""
+        status = TaskStatus("IN_PROGRESS", "45%", "", progress_pct=0.45)
+
+        assert dict(status) == {"status": "IN_PROGRESS", "progress": "45%", "fail_reason": "", "progress_pct": 0.45}
+        assert status == {"status": "IN_PROGRESS", "progress": "45%", "fail_reason": "", "progress_pct": 0.45}
+        assert status["progress_pct"] == 0.45
+        assert status.progress_pct == 0.45
+        assert "video_url" not in status
+        assert status.get("video_url", "") == ""
+        assert status.get("unknown") is None
+        assert len(status) == 4
+        with pytest.raises(KeyError):
+            status["video_url"]
+
+    def test_required_fields_always_present(self):
+        """Test that status is present even when the platform sent none"""
+        status = TaskStatus(None)
+
+        assert "status" in status
+        assert status.get("status", "x") is None
+        assert {**status, "task_id": "t"} == {"status": None, "progress": "", "fail_reason": "", "task_id": "t"}
+
+    def test_immutable(self):
+        """Test that fields cannot be reassigned or added"""
+        status = TaskStatus("SUCCESS")
+
+        with pytest.raises(AttributeError):
+            status.status = "FAILURE"
+        with pytest.raises(AttributeError):
+            status.extra = 1
+        with pytest.raises(TypeError):
+            status["status"] = "FAILURE"
+
+    def test_pickle_round_trip(self):
+        """Test that a status survives pickling"""
+        status = TaskStatus("SUCCESS", "100%", "", video_url="https://v")
+
+        assert pickle.loads(pickle.dumps(status)) == status
+
+
+class TestParseZhenzhen:
+    """Test the Zhenzhen /v2/videos/generations format"""
+
+    def test_pending_info(self):
+        """Test progress and queue position from detail.pending_info"""
+        status = parse_zhenzhen({
+            "task_id": "task_1", "status": "NOT_START", "submit_time": 1,
+            "detail": {"pending_info": {"progress_pct": 0.1, "progress_pos_in_queue": 3}, "unused": [1, 2, 3]}
+        })
+
+        assert status == {"status": "NOT_START", "progress": "", "fail_reason": "",
+                          "progress_pct": 0.1, "queue_position": 3}
+
+    def test_top_level_fields_win(self):
+        """Test that top-level progress_pct and queue_position take precedence"""
+        status = parse_zhenzhen({
+            "status": "IN_PROGRESS", "progress_pct": 0.5, "queue_position": None,
+            "detail": {"pending_info": {"progress_pct": 0.1, "progress_pos_in_queue": 3}}
+        })
+
+        assert status["progress_pct"] == 0.5
+        assert "queue_position" not in status
+
+    def test_completed(self):
+        """Test the video URL, preview fields and status update time"""
+        status = parse_zhenzhen({
+            "status": "SUCCESS", "progress": "100%", "status_update_time": 1700000000,
+            "data": {"output": "https://example.com/v.mp4", "thumbnail_url": "https://t"}
+        })
+
+        assert status.video_url == "https://example.com/v.mp4"
+        assert status.thumbnail_url == "https://t"
+        assert status.status_update_time == 1700000000
+
+    def test_empty_data_has_no_video_url(self):
+        """Test that an empty data object does not produce a video_url"""
+        assert "video_url" not in parse_zhenzhen({"status": "IN_PROGRESS", "data": {}})
+        assert parse_zhenzhen({"status": "IN_PROGRESS", "data": {"status": "x"}})["video_url"] == ""
+
+
+class TestParseJuxin:
+    """Test the Juxin unified format and OpenAI video objects"""
+
+    def test_status_from_detail(self):
+        """Test that the status falls back to detail.status"""
+        status = parse_juxin({"id": "sora-2:task_1", "detail": {"status": "running", "status_update_time": 5}})
+
+        assert status.status == "IN_PROGRESS"
+        assert status.status_update_time == 5
+
+    def test_failure_reason(self):
+        """Test the failure reason from the nested detail"""
+        status = parse_juxin({"status": "failed", "detail": {"failure_reason": "content policy"}})
+
+        assert status == {"status": "FAILURE", "progress": "", "fail_reason": "content policy"}
+
+    def test_openai_video_object(self):
+        """Test an OpenAI-format video: integer percent progress and error.message"""
+        rendering = parse_juxin({"id": "video_1", "object": "video", "status": "in_progress", "progress": 1})
+        failed = parse_juxin({"id": "video_1", "object": "video", "status": "failed",
+                              "error": {"code": "moderation", "message": "blocked"}})
+
+        assert rendering.status == "IN_PROGRESS"
+        assert rendering.progress == "1%"
+        assert rendering.progress_pct == 0.01
+        assert failed.fail_reason == "blocked"
+
+    def test_queued_openai_video_with_progress(self):
+        """Test that a queued video which already reports progress counts as rendering"""
+        status = parse_juxin({"status": "queued", "progress": 20})
+
+        assert status.status == "IN_PROGRESS"
+        assert status.progress == "20%"
+
+
+class TestLoads:
+    """Test the JSON decoding backend"""
+
+    def test_decodes_bytes_and_str(self):
+        """Test both bytes and str bodies"""
+        body = json.dumps({"status": "SUCCESS", "progress": "100%"}, ensure_ascii=False)
+
+        assert loads(body) == loads(body.encode("utf-8")) == {"status": "SUCCESS", "progress": "100%"}
+
+    def test_falls_back_to_stdlib(self):
+        """Test decoding without the optional orjson"""
+        with patch("utils.task_status.orjson", None):
+            assert loads(b'{"status": "\\u5b8c\\u6210"}') == {"status": "完成"}
+
+
+class TestEngineQuery:
+    """Test that every engine query goes through the shared parsers"""
+
+    @pytest.mark.parametrize("backend,response", [
+        (ZhenzhenBackend("k"), {"status": "SUCCESS", "progress": "100%", "data": {"output": "https://v"}}),
+        (JuxinBackend("k"), {"id": "sora-2:task_1", "status": "completed", "video_url": "https://v"}),
+        (JuxinOpenAIBackend("k"), {"id": "video_1", "object": "video", "status": "completed", "video_url": "https://v"}),
+    ])
+    def test_query_task_returns_task_status(self, make_engine, backend, response):
+        """Test that query_task returns a TaskStatus for each platform format"""
+        engine = make_engine(lambda request: httpx.Response(200, json=response))
+        loop = engine._ensure_started()
+
+        status = asyncio.run_coroutine_threadsafe(engine.query_task(backend, "task_1"), loop).result(timeout=5)
+
+        assert type(status) is TaskStatus
+        assert status.status == "SUCCESS"
+        assert status.video_url == "https://v"
@@ -1,11 +1,25 @@
 """Tests for TextToVideoTool"""
 
+import json
+
+import httpx
 import pytest
-import time
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import Mock
 from tools.text_to_video import TextToVideoTool
 
 
+def platform(query_response, posts=None):
+    """In-process Zhenzhen API: create returns test_task_123, every query returns query_response"""
+    def handler(request):
+        if request.method == "POST":
+            if posts is not None:
+                posts.append(request)
+            return httpx.Response(200, json={"task_id": "test_task_123"})
+        return httpx.Response(200, json=query_response)
+
+    return handler
+
+
 class TestTextToVideoTool:
     """Test cases for TextToVideoTool"""
 
@@ -23,171 +37,67 @@ class TestTextToVideoTool:
 
         results = list(tool._invoke({}))
         assert len(results) == 1
-        assert "API Key 未配置" in results[0].message
-
-    @patch("tools.text_to_video.requests.post")
-    @patch("tools.text_to_video.requests.get")
-    @patch("tools.text_to_video.time.sleep")
-    def test_invoke_success(
-        self,
-        mock_sleep,
-        mock_get,
-        mock_post,
-        tool,
-        text_to_video_params,
-        mock_video_task_response,
-        mock_video_completed_response
-    ):
-        """Test successful video generation"""
-        # Mock POST response (task creation)
-        mock_post_response = Mock()
-        mock_post_response.json.return_value = {"task_id": "test_task_123"}
-        mock_post.return_value = mock_post_response
+        assert "API Key 未配置" in results[0].message.text
 
-        # Mock GET response (task query - completed immediately)
-        mock_get_response = Mock()
-        mock_get_response.json.return_value = mock_video_completed_response
-        mock_get.return_value = mock_get_response
-
-        results = list(tool._invoke(text_to_video_params))
+    def test_invoke_success(self, run_tool, tool, text_to_video_params, mock_video_completed_response):
+        """Test successful video generation"""
+        results = run_tool(tool, platform(mock_video_completed_response), text_to_video_params)
 
-        assert len(results) == 2
+        # pending, progress, completed
+        assert [result["status"] for result in results] == ["pending", "processing", "completed"]
+        assert results[0]["task_id"] == "test_task_123"
+        assert results[-1]["task_id"] == "test_task_123"
+        assert results[-1]["video_url"] == "https://example.com/video.mp4"
+        assert results[-1]["duration"] == "10"
+        assert results[-1]["polls"] == 1
 
-        # First result - pending status
-        pending_result = results[0]
-        pending_data = eval(pending_result.message)
-        assert pending_data["task_id"] == "test_task_123"
-        assert pending_data["status"] == "pending"
-
-        # Second result - completed status
-        completed_result = results[1]
-        completed_data = eval(completed_result.message)
-        assert completed_data["task_id"] == "test_task_123"
-        assert completed_data["status"] == "completed"
-        assert completed_data["video_url"] == "https://example.com/video.mp4"
-
-    @patch("tools.text_to_video.requests.post")
-    @patch("tools.text_to_video.requests.get")
-    @patch("tools.text_to_video.time.sleep")
-    def test_invoke_timeout(
-        self,
-        mock_sleep,
-        mock_get,
-        mock_post,
-        tool,
-        text_to_video_params
-    ):
+    def test_invoke_timeout(self, run_tool, tool, text_to_video_params, mock_video_processing_response):
         """Test video generation timeout"""
-        # Mock POST response
-        mock_post_response = Mock()
-        mock_post_response.json.return_value = {"task_id": "test_task_123"}
-        mock_post.return_value = mock_post_response
-
-        # Mock GET response - always processing
-        mock_get_response = Mock()
-        mock_get_response.json.return_value = {
-            "task_id": "test_task_123",
-            "status": "processing"
-        }
-        mock_get.return_value = mock_get_response
-
-        # Mock time to simulate timeout
-        with patch("tools.text_to_video.time.time") as mock_time:
-            mock_time.side_effect = [0, 30, 60, 301]  # Exceeds 300s timeout
+        results = run_tool(tool, platform(mock_video_processing_response), text_to_video_params, timeout=0.05)
 
-        results = list(tool._invoke(text_to_video_params))
+        assert results[0]["status"] == "pending"
+        assert results[-1]["status"] == "timeout"
+        assert results[-1]["task_id"] == "test_task_123"
+        assert "超时" in results[-1]["error"]
 
-        assert len(results) == 2
-        timeout_result = results[1]
-        timeout_data = eval(timeout_result.message)
-        assert timeout_data["status"] == "timeout"
-        assert "超时" in timeout_data["error"]
-
-    @patch("tools.text_to_video.requests.post")
-    @patch("tools.text_to_video.requests.get")
-    @patch("tools.text_to_video.time.sleep")
-    def test_invoke_task_failed(
-        self,
-        mock_sleep,
-        mock_get,
-        mock_post,
-        tool,
-        text_to_video_params,
-        mock_video_failed_response
-    ):
+    def test_invoke_task_failed(self, run_tool, tool, text_to_video_params, mock_video_failed_response):
         """Test video generation task failure"""
-        # Mock POST response
-        mock_post_response = Mock()
-        mock_post_response.json.return_value = {"task_id": "test_task_123"}
-        mock_post.return_value = mock_post_response
-
-        # Mock GET response - task failed
-        mock_get_response = Mock()
-        mock_get_response.json.return_value = mock_video_failed_response
-        mock_get.return_value = mock_get_response
-
-        results = list(tool._invoke(text_to_video_params))
+        results = run_tool(tool, platform(mock_video_failed_response), text_to_video_params)
 
         assert len(results) == 2
-        failed_result = results[1]
-        failed_data = eval(failed_result.message)
-        assert failed_data["status"] == "failed"
-        assert "failed" in failed_data["error"].lower()
-
-    @patch("tools.text_to_video.requests.post")
-    def test_create_video_task(self, mock_post, tool, text_to_video_params):
-        """Test _create_video_task method"""
-        mock_response = Mock()
-        mock_response.json.return_value = {"task_id": "test_task_456"}
-        mock_post.return_value = mock_response
-
-        task_id = tool._create_video_task("test_key", text_to_video_params)
-
-        assert task_id == "test_task_456"
-        mock_post.assert_called_once()
-
-    @patch("tools.text_to_video.requests.get")
-    @patch("tools.text_to_video.time.sleep")
-    def test_poll_until_complete_with_retries(
-        self,
-        mock_sleep,
-        mock_get,
-        tool
-    ):
-        """Test _poll_until_complete with multiple polling attempts"""
-        # First call: processing, second call: completed
-        mock_get.side_effect = [
-            Mock(json=lambda: {"status": "processing"}),
-            Mock(json=lambda: {
-                "status": "completed",
-                "video_url": "https://example.com/video.mp4"
-            })
+        assert results[1]["status"] == "failed"
+        assert results[1]["error"] == "Generation failed"
+
+    def test_create_request(self, run_tool, tool, text_to_video_params, mock_video_completed_response):
+        """Test the create request sent to the platform"""
+        posts = []
+        run_tool(tool, platform(mock_video_completed_response, posts), text_to_video_params)
+
+        assert len(posts) == 1
+        assert posts[0].url == "https://ai.t8star.cn/v2/videos/generations"
+        assert posts[0].headers["Authorization"] == "Bearer test_api_key_12345"
+        assert json.loads(posts[0].content) == text_to_video_params
+
+    def test_invoke_reports_progress_until_complete(self, run_tool, tool, text_to_video_params):
+        """Test that polling continues through progress updates until completion"""
+        responses = [
+            {"status": "IN_PROGRESS", "progress": "30%"},
+            {"status": "IN_PROGRESS", "progress": "30%"},
+            {"status": "IN_PROGRESS", "progress": "80%"},
+            {"status": "SUCCESS", "progress": "100%", "data": {"output": "https://example.com/video.mp4"}}
         ]
 
-        result = tool._poll_until_complete("test_key", "task_123")
-
-        assert result["status"] == "completed"
-        assert result["video_url"] == "https://example.com/video.mp4"
-        assert mock_sleep.call_count == 1
-
-    def test_query_task(self, tool):
-        """Test _query_task method"""
-        with patch("tools.text_to_video.requests.get") as mock_get:
-            mock_response = Mock()
-            mock_response.json.return_value = {
-                "task_id": "task_123",
-                "status": "processing"
-            }
-            mock_get.return_value = mock_response
+        def handler(request):
+            if request.method == "POST":
+                return httpx.Response(200, json={"task_id": "test_task_123"})
+            return httpx.Response(200, json=responses.pop(0))
 
-            result = tool._query_task(
-                "https://gpt-best.apifox.cn",
-                {"Authorization": "Bearer test_key"},
-                "task_123"
-            )
+        results = run_tool(tool, handler, text_to_video_params)
 
-            assert result["status"] == "processing"
-            mock_get.assert_called_once()
+        # unchanged progress is reported once
+        assert [result.get("progress") for result in results[1:-1]] == ["30%", "80%", "100%"]
+        assert results[-1]["status"] == "completed"
+        assert results[-1]["polls"] == 4
 
 
 class TestTextToVideoToolEdgeCases:
@@ -199,44 +109,25 @@ class TestTextToVideoToolEdgeCases:
         tool = TextToVideoTool(mock_tool_runtime, mock_tool_session)
         return tool
 
-    def test_invoke_with_default_parameters(self, tool):
+    def test_invoke_with_default_parameters(self, run_tool, tool, mock_video_completed_response):
         """Test invoke with only required parameter (prompt)"""
-        with patch("tools.text_to_video.requests.post") as mock_post, \
-             patch("tools.text_to_video.requests.get") as mock_get, \
-             patch("tools.text_to_video.time.sleep"):
-
-            mock_post.return_value.json.return_value = {"task_id": "task_123"}
-            mock_get.return_value.json.return_value = {
-                "status": "completed",
-                "video_url": "https://example.com/video.mp4"
-            }
-
-            results = list(tool._invoke({"prompt": "test prompt"}))
-
-            # Verify default values are used
-            mock_post.assert_called_once()
-            call_params = mock_post.call_args[1]["json"]
-            assert call_params["model"] == "sora-2"
-            assert call_params["duration"] == "5s"
-            assert call_params["aspect_ratio"] == "16:9"
-
-    def test_invoke_with_sora_pro_model(self, tool):
+        posts = []
+        run_tool(tool, platform(mock_video_completed_response, posts), {"prompt": "test prompt"})
+
+        # Verify default values are used
+        call_params = json.loads(posts[0].content)
+        assert call_params["model"] == "sora-2"
+        assert call_params["duration"] == "10"
+        assert call_params["aspect_ratio"] == "16:9"
+
+    def test_invoke_with_sora_pro_model(self, run_tool, tool, mock_video_completed_response):
         """Test invoke with sora-2-pro model"""
-        with patch("tools.text_to_video.requests.post") as mock_post, \
-             patch("tools.text_to_video.requests.get") as mock_get, \
-             patch("tools.text_to_video.time.sleep"):
-
-            mock_post.return_value.json.return_value = {"task_id": "task_123"}
-            mock_get.return_value.json.return_value = {
-                "status": "completed",
-                "video_url": "https://example.com/video.mp4"
-            }
-
-            params = {
-                "prompt": "test",
-                "model": "sora-2-pro"
-            }
-            list(tool._invoke(params))
-
-            call_params = mock_post.call_args[1]["json"]
-            assert call_params["model"] == "sora-2-pro"
+        posts = []
+        params = {
+            "prompt": "test",
+            "model": "sora-2-pro"
+        }
+        run_tool(tool, platform(mock_video_completed_response, posts), params)
+
+        call_params = json.loads(posts[0].content)
+        assert call_params["model"] == "sora-2-pro"
@@ -0,0 +1,222 @@
+"""Tests for streaming video delivery as Dify blob chunks"""
+
+import pytest
+import requests
+from unittest.mock import Mock, patch
+
+from dify_plugin.entities.tool import ToolInvokeMessage
+
+from utils.backends import JuxinBackend, ZhenzhenBackend
+from utils.video_delivery import (
+    MESSAGE_SIZE, DownloadError, VideoStream, deliver_file, deliver_video, video_source
+)
+from tools.text_to_video import TextToVideoTool
+
+VIDEO = bytes(range(256)) * 100  # 25600 bytes
+VIDEO_URL = "https://example.com/video.mp4"
+
+
+def video_response(data, status=200, total=None, fail_after=None):
+    """Mock a streamed response; fail_after raises mid-stream after that many bytes"""
+    response = Mock()
+    response.status_code = status
+    response.headers = {"Content-Length": str(total if total is not None else len(data)), "Content-Type": "video/mp4"}
+
+    def iter_content(size):
+        sent = 0
+        for start in range(0, len(data), size):
+            if fail_after is not None and sent >= fail_after:
+                raise requests.exceptions.ChunkedEncodingError("connection reset")
+            chunk = data[start:start + size]
+            sent += len(chunk)
+            yield chunk
+
+    response.iter_content.side_effect = iter_content
+    return response
+
+
+@pytest.fixture(autouse=True)
+def no_resume_delay():
+    with patch("utils.video_delivery.time.sleep"):
+        yield
+
+
+class TestVideoStream:
+    """Test chunked download with range resume"""
+
+    def test_streams_in_chunks(self):
+        """Test that the body arrives in read-size chunks"""
+        with patch("utils.video_delivery.http_client.get", return_value=video_response(VIDEO)):
+            stream = VideoStream(VIDEO_URL, read_size=4096)
+            assert stream.open() == len(VIDEO)
+            chunks = list(stream.chunks())
+
+        assert b"".join(chunks) == VIDEO
+        assert max(len(chunk) for chunk in chunks) == 4096
+
+    def test_resumes_with_range_request(self):
+        """Test that an interrupted download continues from the received offset"""
+        first = video_response(VIDEO, fail_after=8192)
+        second = video_response(VIDEO[8192:], status=206, total=len(VIDEO) - 8192)
+
+        with patch("utils.video_delivery.http_client.get", side_effect=[first, second]) as mock_get:
+            stream = VideoStream(VIDEO_URL, read_size=4096)
+            data = b"".join(stream.chunks())
+
+        assert data == VIDEO
+        assert stream.resumes == 1
+        assert mock_get.call_args_list[1].kwargs["headers"]["Range"] == "bytes=8192-"
+
+    def test_resume_without_range_support_skips_sent_bytes(self):
+        """Test that a 200 response to a range request is trimmed to the missing part"""
+        first = video_response(VIDEO, fail_after=8192)
+        second = video_response(VIDEO)
+
+        with patch("utils.video_delivery.http_client.get", side_effect=[first, second]):
+            data = b"".join(VideoStream(VIDEO_URL, read_size=3000).chunks())
+
+        assert data == VIDEO
+
+    def test_gives_up_after_max_resumes(self):
+        """Test that repeated interruptions raise DownloadError"""
+        responses = [video_response(VIDEO, fail_after=4096) for _ in range(3)]
+
+        with patch("utils.video_delivery.http_client.get", side_effect=responses):
+            stream = VideoStream(VIDEO_URL, read_size=4096, max_resumes=2)
+            with pytest.raises(DownloadError):
+                list(stream.chunks())
+
+    def test_rejects_oversized_video(self):
+        """Test that videos above the size limit are not streamed"""
+        with patch("utils.video_delivery.http_client.get", return_value=video_response(VIDEO)):
+            with pytest.raises(DownloadError):
+                VideoStream(VIDEO_URL, max_bytes=1024).open()
+
+    def test_requires_content_length(self):
+        """Test that a response without a size is rejected"""
+        response = video_response(VIDEO)
+        response.headers = {}
+
+        with patch("utils.video_delivery.http_client.get", return_value=response):
+            with pytest.raises(DownloadError):
+                VideoStream(VIDEO_URL).open()
+
+
+class TestBlobChunkMessages:
+    """Test conversion to BLOB_CHUNK messages"""
+
+    def test_chunk_messages(self):
+        """Test sequence numbers, chunk size and the final end marker"""
+        with patch("utils.video_delivery.http_client.get", return_value=video_response(VIDEO)):
+            messages = list(deliver_video(None, "task_1", VIDEO_URL))
+
+        assert all(m.type == ToolInvokeMessage.MessageType.BLOB_CHUNK for m in messages)
+        assert [m.message.sequence for m in messages] == list(range(len(messages)))
+        assert all(len(m.message.blob) <= MESSAGE_SIZE for m in messages)
+        assert len({m.message.id for m in messages}) == 1
+        assert b"".join(m.message.blob for m in messages) == VIDEO
+        assert messages[-1].message.end and messages[-1].message.blob == b""
+        assert messages[0].message.total_length == len(VIDEO)
+        assert messages[0].meta == {"mime_type": "video/mp4", "filename": "task_1.mp4"}
+
+
+    def test_file_messages(self, tmp_path):
+        """Test that a local file is sent with its size as total_length"""
+        path = tmp_path / "story.mp4"
+        path.write_bytes(VIDEO)
+
+        messages = list(deliver_file(str(path), "story.mp4"))
+
+        assert b"".join(m.message.blob for m in messages) == VIDEO
+        assert messages[0].message.total_length == len(VIDEO)
+        assert messages[0].meta["filename"] == "story.mp4"
+
+
+class TestVideoSource:
+    """Test choosing the download endpoint"""
+
+    def test_openai_format_task_uses_content_endpoint(self):
+        """Test that Juxin video_ ids download from /v1/videos/{id}/content with auth"""
+        url, headers = video_source(JuxinBackend("jx_key"), "video_123", VIDEO_URL)
+
+        assert url == "https://api.jxincm.cn/v1/videos/video_123/content"
+        assert headers == {"Authorization": "Bearer jx_key"}
+
+    def test_other_tasks_use_output_url(self):
+        """Test that the signed output URL is used without credentials"""
+        assert video_source(ZhenzhenBackend("zz_key"), "task_1", VIDEO_URL) == (VIDEO_URL, {})
+        assert video_source(JuxinBackend("jx_key"), "sora-2:task_1", VIDEO_URL) == (VIDEO_URL, {})
+        assert video_source(None, "task_1", VIDEO_URL) == (VIDEO_URL, {})
+
+    def test_filename_is_sanitized(self):
+        """Test that Juxin ids with a colon make a usable filename"""
+        with patch("utils.video_delivery.http_client.get", return_value=video_response(VIDEO)):
+            messages = list(deliver_video(None, "sora-2:task_1", VIDEO_URL))
+
+        assert messages[0].meta["filename"] == "sora-2_task_1.mp4"
+
+
+class TestToolDelivery:
+    """Test the delivery parameter of the video tools"""
+
+    def test_blob_delivery_after_completion(self, mock_tool_runtime, mock_tool_session, task_registry,
+                                          mock_account):
+        """Test that a finished task is followed by the video file"""
+        task_registry.record_created("task_done", {"prompt": "x"}, account=mock_account)
+        task_registry.update_status("task_done", {"status": "SUCCESS", "video_url": VIDEO_URL})
+        tool = TextToVideoTool(mock_tool_runtime, mock_tool_session)
+
+        with patch("utils.video_tool.get_registry", return_value=task_registry), \
+             patch("utils.video_delivery.http_client.get", return_value=video_response(VIDEO)):
+            results = list(tool._invoke({"task_id": "task_done", "delivery": "blob"}))
+
+        assert results[0].message.json_object["video_url"] == VIDEO_URL
+        blobs = [r for r in results if r.type == ToolInvokeMessage.MessageType.BLOB_CHUNK]
+        assert b"".join(r.message.blob for r in blobs) == VIDEO
+
+    def test_download_failure_is_reported(self, mock_tool_runtime, mock_tool_session, task_registry,
+                                          mock_account):
+        """Test that a failed download adds a text message instead of raising"""
+        task_registry.record_created("task_done", {"prompt": "x"}, account=mock_account)
+        task_registry.update_status("task_done", {"status": "SUCCESS", "video_url": VIDEO_URL})
+        tool = TextToVideoTool(mock_tool_runtime, mock_tool_session)
+
+        with patch("utils.video_tool.get_registry", return_value=task_registry), \
+             patch("utils.video_delivery.http_client.get", side_effect=requests.ConnectionError("down")):
+            results = list(tool._invoke({"task_id": "task_done", "delivery": "blob"}))
+
+        assert results[0].message.json_object["status"] == "completed"
+        assert results[-1].message.text.startswith("视频文件下载失败")
+
+    def test_failure_mid_stream_ends_blob_before_error(self, mock_tool_runtime, mock_tool_session, task_registry,
+                                                       mock_account):
+        """Test that a download failing after chunks were sent closes the blob before the error text"""
+        task_registry.record_created("task_done", {"prompt": "x"}, account=mock_account)
+        task_registry.update_status("task_done", {"status": "SUCCESS", "video_url": VIDEO_URL})
+        tool = TextToVideoTool(mock_tool_runtime, mock_tool_session)
+        responses = [video_response(VIDEO[:MESSAGE_SIZE * 2], total=len(VIDEO)) for _ in range(4)]
+
+        with patch("utils.video_tool.get_registry", return_value=task_registry), \
+             patch("utils.video_delivery.http_client.get", side_effect=responses):
+            results = list(tool._invoke({"task_id": "task_done", "delivery": "blob"}))
+
+        blobs = [r.message for r in results if r.type == ToolInvokeMessage.MessageType.BLOB_CHUNK]
+        assert len(blobs) > 1
+        assert [blob.end for blob in blobs] == [False] * (len(blobs) - 1) + [True]
+        assert [blob.sequence for blob in blobs] == list(range(len(blobs)))
+        assert results[-2].type == ToolInvokeMessage.MessageType.BLOB_CHUNK
+        assert results[-1].message.text.startswith("视频文件下载失败")
+
+    def test_url_delivery_is_default(self, mock_tool_runtime, mock_tool_session, task_registry,
+                                      mock_account):
+        """Test that no file is downloaded unless requested"""
+        task_registry.record_created("task_done", {"prompt": "x"}, account=mock_account)
+        task_registry.update_status("task_done", {"status": "SUCCESS", "video_url": VIDEO_URL})
+        tool = TextToVideoTool(mock_tool_runtime, mock_tool_session)
+
+        with patch("utils.video_tool.get_registry", return_value=task_registry), \
+             patch("utils.video_delivery.http_client.get") as mock_get:
+            results = list(tool._invoke({"task_id": "task_done"}))
+
+        assert len(results) == 1
+        mock_get.assert_not_called()
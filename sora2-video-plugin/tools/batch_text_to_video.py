@@ -0,0 +1,142 @@
+import json
+from collections.abc import Generator
+from typing import Any, List
+from dify_plugin import Tool
+from dify_plugin.entities.tool import ToolInvokeMessage
+
+from utils.async_engine import COMPLETED, CREATED, FAILED, PREVIEW, PROGRESS, TIMEOUT, get_engine
+from utils.backends import PREVIEW_FIELDS, backends_from_credentials, extract_preview
+from utils.character_cache import resolve_mentions
+
+MAX_CONCURRENCY = 20
+
+
+class BatchTextToVideoTool(Tool):
+    def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
+        """批量文生视频工具 - 并发提交多个提示词，按完成先后返回视频"""
+        backends = backends_from_credentials(self.runtime.credentials)
+        if not backends:
+            yield self.create_text_message("API Key 未配置")
+            return
+
+        # 提取参数
+        prompts = self._parse_prompts(tool_parameters.get("prompts", ""))
+        model = tool_parameters.get("model", "sora-2")
+        duration = tool_parameters.get("duration", "10")
+        aspect_ratio = tool_parameters.get("aspect_ratio", "16:9")
+        try:
+            concurrency = int(tool_parameters.get("concurrency") or 5)
+        except (TypeError, ValueError):
+            yield self.create_text_message(f"并发数必须是整数: {tool_parameters.get('concurrency')}")
+            return
+        concurrency = max(1, min(concurrency, MAX_CONCURRENCY))
+
+        if not prompts:
+            yield self.create_text_message("提示词列表为空")
+            return
+
+        # 指定平台时只使用该平台，否则每个任务由路由器分别选择平台
+        preferred = tool_parameters.get("backend") or "auto"
+        if preferred != "auto":
+            backends = [backend for backend in backends if backend.name == preferred]
+            if not backends:
+                yield self.create_text_message(f"平台 {preferred} 的 API Key 未配置")
+                return
+
+        # 所有提示词共享模型、时长和画面比例；@名称 替换为调用方在可能提交到的平台上已登记角色的 @username
+        params_list = [
+            {
+                "prompt": resolve_mentions(prompt, backends),
+                "model": model,
+                "duration": duration,
+                "aspect_ratio": aspect_ratio
+            }
+            for prompt in prompts
+        ]
+
+        yield self.create_json_message({
+            "status": "pending",
+            "total": len(prompts),
+            "concurrency": concurrency,
+            "message": "批量视频生成任务已提交"
+        })
+
+        # 所有任务由轮询引擎在同一个循环里并发创建和轮询，事件按完成先后到达
+        videos: List[dict] = [
+            {"index": index, "prompt": prompt, "task_id": "", "status": "pending"}
+            for index, prompt in enumerate(prompts)
+        ]
+        handle = get_engine().submit_batch(
+            backends, params_list, concurrency=concurrency,
+            callback_url=self.runtime.credentials.get("callback_url") or None
+        )
+        for event in handle.events():
+            event_type = event["type"]
+            video = videos[event["index"]]
+            if event.get("task_id"):
+                video["task_id"] = event["task_id"]
+
+            if event_type == CREATED:
+                video["status"] = "processing"
+                video["backend"] = event.get("backend", "")
+                video["eta_seconds"] = event.get("eta_seconds")
+                continue
+            if event_type == PREVIEW:
+                # 缩略图和改写后的提示词出现时先返回一次
+                video.update({field: event[field] for field in PREVIEW_FIELDS if field in event})
+                yield self.create_json_message(dict(video))
+                continue
+            if event_type == PROGRESS:
+                continue
+
+            if event_type == COMPLETED:
+                video["status"] = "completed"
+                video["video_url"] = event["result"].get("video_url", "")
+                video.update(extract_preview(event["result"]))
+            elif event_type == FAILED:
+                video["status"] = "failed"
+                video["error"] = event["error"]
+            elif event_type == TIMEOUT:
+                video["status"] = "timeout"
+                video["error"] = event["error"]
+            else:
+                video["status"] = "failed"
+                video["error"] = event["error"]
+            if event.get("timing"):
+                video["timing"] = event["timing"]
+
+            # 每个任务结束时立即返回结果
+            yield self.create_json_message(dict(video))
+
+        succeeded = sum(1 for video in videos if video["status"] == "completed")
+        if succeeded == len(videos):
+            status = "completed"
+        elif succeeded:
+            status = "partial"
+        else:
+            status = "failed"
+        yield self.create_json_message({
+            "status": status,
+            "total": len(videos),
+            "succeeded": succeeded,
+            "failed": len(videos) - succeeded,
+            "duration": duration,
+            "videos": videos
+        })
+
+    @staticmethod
+    def _parse_prompts(raw: Any) -> List[str]:
+        """解析提示词列表：支持 JSON 字符串数组，或每行一个提示词"""
+        if isinstance(raw, list):
+            items = raw
+        else:
+            text = str(raw or "").strip()
+            items = None
+            if text.startswith("["):
+                try:
+                    items = json.loads(text)
+                except ValueError:
+                    items = None
+            if not isinstance(items, list):
+                items = text.splitlines()
+        return [str(item).strip() for item in items if str(item).strip()]
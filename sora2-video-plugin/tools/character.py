@@ -0,0 +1,117 @@
+import re
+from collections.abc import Generator
+from typing import Any, Optional, Tuple
+from dify_plugin import Tool
+from dify_plugin.entities.tool import ToolInvokeMessage
+
+from utils import http_client
+from utils.backends import backend_for_task, backends_from_credentials
+from utils.character_cache import get_character_cache, hash_video, task_source_key, video_source_key
+from utils.task_registry import get_registry
+
+# 角色出现的时间范围（秒）：时长 1～3 秒
+MIN_SPAN = 1
+MAX_SPAN = 3
+
+
+class CharacterTool(Tool):
+    def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
+        """角色工具 - 从视频或已完成的任务创建客串角色，已创建过的角色直接从本地索引返回"""
+        backends = backends_from_credentials(self.runtime.credentials)
+        if not backends:
+            yield self.create_text_message("API Key 未配置")
+            return
+
+        video_url = str(tool_parameters.get("video_url") or "").strip()
+        from_task = str(tool_parameters.get("from_task") or "").strip()
+        name = str(tool_parameters.get("name") or "").strip().lstrip("@") or None
+        cache = get_character_cache()
+
+        # 不指定来源时列出调用方账号已登记的角色
+        if not video_url and not from_task:
+            characters = cache.list(backends)
+            yield self.create_json_message({"total": len(characters), "characters": characters})
+            return
+        if video_url and from_task:
+            yield self.create_text_message("video_url 和 from_task 只能设置一个")
+            return
+
+        timestamps, error = self._parse_timestamps(tool_parameters.get("timestamps"))
+        if error:
+            yield self.create_text_message(error)
+            return
+
+        # 指定平台时只使用该平台
+        preferred = tool_parameters.get("backend") or "auto"
+        if preferred != "auto":
+            backends = [backend for backend in backends if backend.name == preferred]
+            if not backends:
+                yield self.create_text_message(f"平台 {preferred} 的 API Key 未配置")
+                return
+
+        # 按账号、平台和来源查找已创建的角色：任务按 task_id，视频按内容哈希（同一 URL 只下载一次）
+        if from_task:
+            record = get_registry().get(from_task, backends)
+            backend = backend_for_task(backends, from_task, record["backend"] if record else None)
+            source_key = task_source_key(backend, from_task, timestamps)
+            existing = cache.get(source_key)
+        else:
+            backend = backends[0]
+            existing = cache.find_by_url(video_url, timestamps, backend)
+            source_key = existing["source_key"] if existing else None
+            if existing is None:
+                try:
+                    source_key = video_source_key(backend, hash_video(video_url), timestamps)
+                except Exception as e:
+                    yield self.create_text_message(f"视频下载失败: {e}")
+                    return
+                existing = cache.get(source_key)
+
+        if existing:
+            if name and name != existing["name"]:
+                cache.rename(source_key, name)
+                existing["name"] = name
+            yield self.create_json_message({**self._output(existing), "cached": True})
+            return
+
+        body = {"timestamps": timestamps}
+        if from_task:
+            body["from_task"] = from_task
+        else:
+            body["url"] = video_url
+        try:
+            response = http_client.post(backend.characters_url, headers=backend.headers, json=body, timeout=60)
+            response.raise_for_status()
+            character = response.json()
+        except Exception as e:
+            yield self.create_text_message(f"角色创建失败: {e}")
+            return
+        if not isinstance(character, dict) or not character.get("username"):
+            yield self.create_text_message(f"角色创建失败: {character}")
+            return
+
+        record = cache.put(source_key, character, backend, name=name, source_url=video_url or None)
+        yield self.create_json_message({**self._output(record), "cached": False})
+
+    @staticmethod
+    def _output(record: dict) -> dict:
+        """工具返回的角色信息，mention 可直接放进提示词"""
+        return {
+            "character_id": record["character_id"],
+            "username": record["username"],
+            "name": record["name"] or "",
+            "mention": f"@{record['username']}",
+            "permalink": record["permalink"],
+            "profile_picture_url": record["profile_picture_url"]
+        }
+
+    @staticmethod
+    def _parse_timestamps(raw: Any) -> Tuple[str, Optional[str]]:
+        """校验并规范化时间范围 "start,end"，返回 (规范化结果, 错误信息)"""
+        numbers = re.findall(r"\d+(?:\.\d+)?", str(raw or ""))
+        if len(numbers) != 2:
+            return "", "timestamps 格式应为 \"开始秒,结束秒\"，例如 1,3"
+        start, end = float(numbers[0]), float(numbers[1])
+        if not MIN_SPAN <= end - start <= MAX_SPAN:
+            return "", f"timestamps 的范围应为 {MIN_SPAN}～{MAX_SPAN} 秒"
+        return f"{start:g},{end:g}", None
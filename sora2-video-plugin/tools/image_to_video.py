@@ -1,142 +1,35 @@
-import time
-import requests
-from collections.abc import Generator
-from typing import Any, Dict
-from dify_plugin import Tool
-from dify_plugin.entities.tool import ToolInvokeMessage
+from typing import Any, List
 
+from utils.backends import Backend
+from utils.video_tool import VideoGenerationTool
 
-class ImageToVideoTool(Tool):
-    def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
-        """图生视频工具 - 使用 Sora2 根据图片生成视频"""
-        api_key = self.runtime.credentials.get("api_key")
-        if not api_key:
-            yield self.create_text_message("API Key 未配置")
-            return
 
-        # 提取参数
-        prompt = tool_parameters.get("prompt", "")
-        images_input = tool_parameters.get("images", "")
-        model = tool_parameters.get("model", "sora-2")
-        duration = tool_parameters.get("duration", "10")
-        aspect_ratio = tool_parameters.get("aspect_ratio", "16:9")
-
-        # 将逗号分隔的图片URL转换为数组
-        images = [img.strip() for img in images_input.split(",") if img.strip()]
+class ImageToVideoTool(VideoGenerationTool):
+    """图生视频工具 - 使用 Sora2 根据图片生成视频"""
 
-        # 构建请求参数
+    def _build_params(self, tool_parameters: dict[str, Any]) -> dict:
         params = {
-            "prompt": prompt,
-            "model": model,
-            "duration": duration,
-            "aspect_ratio": aspect_ratio
+            "prompt": tool_parameters.get("prompt", ""),
+            "model": tool_parameters.get("model", "sora-2"),
+            "duration": tool_parameters.get("duration", "10"),
+            "aspect_ratio": tool_parameters.get("aspect_ratio", "16:9")
         }
 
-        # 只有当有图片时才添加 images 参数
+        # 将逗号分隔的图片URL转换为数组，只有当有图片时才添加 images 参数
+        images_input = tool_parameters.get("images", "")
+        images = [img.strip() for img in images_input.split(",") if img.strip()]
         if images:
             params["images"] = images
-
-        base_url = "https://ai.t8star.cn"
-        headers = {"Authorization": f"Bearer {api_key}"}
-        last_progress = ""
-        start_time = time.time()
-        task_id = None
-
-        try:
-            # 创建视频任务
-            task_id = self._create_video_task(base_url, headers, params)
-
-            # 返回初始状态
-            yield self.create_json_message({
-                "task_id": task_id,
-                "status": "pending",
-                "message": "视频生成任务已提交"
-            })
-
-            # 轮询直到完成
-            timeout = 300  # 5分钟超时
-            poll_interval = 30  # 30秒轮询间隔
-
-            while True:
-                if time.time() - start_time > timeout:
-                    raise TimeoutError(f"任务超时: {task_id}")
-
-                # 查询任务状态
-                result = self._query_task(base_url, headers, task_id)
-                status = result.get("status")
-                progress = result.get("progress", "")
-
-                # 发送进度更新（如果进度发生变化）
-                if progress and progress != last_progress:
-                    yield self.create_json_message({
-                        "task_id": task_id,
-                        "status": "processing",
-                        "progress": progress
-                    })
-                    last_progress = progress
-
-                # SUCCESS 表示完成，FAILURE 表示失败
-                if status == "SUCCESS":
-                    yield self.create_json_message({
-                        "task_id": task_id,
-                        "status": "completed",
-                        "video_url": result.get("video_url", ""),
-                        "duration": duration
-                    })
-                    break
-                elif status == "FAILURE":
-                    fail_reason = result.get("fail_reason", "Unknown error")
-                    yield self.create_json_message({
-                        "task_id": task_id,
-                        "status": "failed",
-                        "error": fail_reason
-                    })
-                    break
-
-                time.sleep(poll_interval)
-
-        except TimeoutError as e:
-            yield self.create_json_message({
-                "task_id": task_id if task_id else "",
-                "status": "timeout",
-                "error": str(e)
-            })
-        except Exception as e:
-            yield self.create_json_message({
-                "status": "failed",
-                "error": str(e)
-            })
-
-    def _create_video_task(self, base_url: str, headers: dict, params: dict) -> str:
-        """创建视频任务，返回 task_id"""
-        response = requests.post(
-            f"{base_url}/v2/videos/generations",
-            headers=headers,
-            json=params,
-            timeout=30
-        )
-        response.raise_for_status()
-        return response.json()["task_id"]
-
-    def _query_task(self, base_url: str, headers: dict, task_id: str) -> Dict[str, Any]:
-        """查询任务状态"""
-        response = requests.get(
-            f"{base_url}/v2/videos/generations/{task_id}",
-            headers=headers,
-            timeout=10
-        )
-        response.raise_for_status()
-        data = response.json()
-
-        # 解析响应，提取 video_url
-        result = {
-            "status": data.get("status"),
-            "progress": data.get("progress", ""),
-            "fail_reason": data.get("fail_reason", "")
-        }
-
-        # 从 data.output 中提取视频 URL
-        if data.get("data") and isinstance(data["data"], dict):
-            result["video_url"] = data["data"].get("output", "")
-
-        return result
+        return params
+
+    def _before_submit(self, params: dict, tool_parameters: dict[str, Any], backends: List[Backend]) -> dict:
+        # 参考图先下载、缩放并上传到图床，平台不必再去拉取原图
+        # 提供图床的平台（聚鑫）用于上传参考图，与视频提交到哪个平台无关
+        uploader = next((backend for backend in backends if backend.upload_url), None)
+        if params.get("images") and uploader is not None and tool_parameters.get("optimize_images", True):
+            # 用到时才导入（连同可选的 Pillow），不增加插件启动时间
+            from utils.image_ingest import ImageIngestor
+
+            ingestor = ImageIngestor(uploader.upload_url, uploader.api_key)
+            params = {**params, "images": ingestor.ingest(params["images"], params["model"])}
+        return params
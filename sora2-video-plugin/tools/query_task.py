@@ -0,0 +1,93 @@
+import json
+import re
+from collections.abc import Generator
+from typing import Any, List
+from dify_plugin import Tool
+from dify_plugin.entities.tool import ToolInvokeMessage
+
+from utils.async_engine import STATUS_NAMES, get_engine
+from utils.backends import PREVIEW_FIELDS, backend_for_task, backends_from_credentials
+from utils.task_registry import get_registry
+
+MAX_CONCURRENCY = 20
+QUERY_TIMEOUT = 60
+
+
+class QueryTaskTool(Tool):
+    def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
+        """查询任务工具 - 并发查询一个或多个任务的当前状态，不等待完成"""
+        backends = backends_from_credentials(self.runtime.credentials)
+        if not backends:
+            yield self.create_text_message("API Key 未配置")
+            return
+
+        task_ids = self._parse_task_ids(tool_parameters.get("task_ids", ""))
+        concurrency = int(tool_parameters.get("concurrency") or 10)
+        concurrency = max(1, min(concurrency, MAX_CONCURRENCY))
+
+        if not task_ids:
+            yield self.create_text_message("task_id 列表为空")
+            return
+
+        # 本账号登记过且已成功的任务不会再变化，直接返回，不再请求；其余任务用调用方的 Key 按所属平台查询
+        tasks = {}
+        pending = []
+        registry = get_registry()
+        for task_id in task_ids:
+            record = registry.get(task_id, backends)
+            if record and record["status"] == "SUCCESS" and record["video_url"]:
+                tasks[task_id] = {"task_id": task_id, "status": "SUCCESS", "progress": "100%",
+                                  "video_url": record["video_url"]}
+            else:
+                pending.append((backend_for_task(backends, task_id, record["backend"] if record else None), task_id))
+
+        if pending:
+            try:
+                results = get_engine().query_many(pending, concurrency=concurrency)
+                for result in results.result(timeout=QUERY_TIMEOUT):
+                    tasks[result["task_id"]] = result
+            except Exception as e:
+                yield self.create_json_message({"status": "failed", "error": str(e)})
+                return
+
+        items = [self._normalize(tasks[task_id]) for task_id in task_ids]
+        yield self.create_json_message({
+            "total": len(items),
+            "completed": sum(1 for item in items if item["status"] == "completed"),
+            "tasks": items
+        })
+
+    @staticmethod
+    def _normalize(result: dict) -> dict:
+        """统一单个任务的返回格式"""
+        if "error" in result:
+            return {"task_id": result["task_id"], "status": "error", "error": result["error"]}
+        status = result.get("status")
+        item = {
+            "task_id": result["task_id"],
+            "status": STATUS_NAMES.get(status, str(status or "unknown").lower()),
+            "progress": result.get("progress", ""),
+            "video_url": result.get("video_url", "")
+        }
+        if result.get("fail_reason"):
+            item["error"] = result["fail_reason"]
+        item.update({field: result[field] for field in PREVIEW_FIELDS if result.get(field)})
+        return item
+
+    @staticmethod
+    def _parse_task_ids(raw: Any) -> List[str]:
+        """解析 task_id 列表：支持 JSON 字符串数组，或用换行、逗号、空格分隔，重复的只保留一个"""
+        if isinstance(raw, list):
+            items = raw
+        else:
+            text = str(raw or "").strip()
+            items = None
+            if text.startswith("["):
+                try:
+                    items = json.loads(text)
+                except ValueError:
+                    items = None
+            if not isinstance(items, list):
+                items = re.split(r"[\s,，]+", text)
+        task_ids = [str(item).strip() for item in items if str(item).strip()]
+        return list(dict.fromkeys(task_ids))
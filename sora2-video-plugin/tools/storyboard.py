@@ -0,0 +1,325 @@
+import json
+import os
+import re
+import tempfile
+from collections.abc import Generator
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from dify_plugin import Tool
+from dify_plugin.entities.tool import ToolInvokeMessage
+
+from utils.async_engine import COMPLETED, CREATED, FAILED, PREVIEW, PROGRESS, TIMEOUT, get_engine
+from utils.backends import PREVIEW_FIELDS, backend_for_task, backends_from_credentials, extract_preview
+from utils.character_cache import resolve_mentions
+from utils.video_delivery import deliver_file, download_to_file, video_source
+
+# 各模型支持的视频时长（秒）
+DURATIONS = {"sora-2": (10, 15), "sora-2-pro": (10, 15, 25)}
+
+DEFAULT_SHOT_SECONDS = 5
+MAX_SHOTS = 10
+MAX_DOWNLOADS = 4
+
+SHOT_HEADER = re.compile(r"shot\s*\d+\s*[:：]", re.IGNORECASE)
+SHOT_DURATION = re.compile(r"duration\s*[:：]\s*([\d.]+)", re.IGNORECASE)
+SHOT_SCENE = re.compile(r"scene\s*[:：]\s*(.*)", re.IGNORECASE | re.DOTALL)
+
+
+class StoryboardTool(Tool):
+    def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
+        """故事板工具 - 按分镜生成视频：整体提交为一个故事板，或各镜头并行生成后拼接"""
+        backends = backends_from_credentials(self.runtime.credentials)
+        if not backends:
+            yield self.create_text_message("API Key 未配置")
+            return
+
+        # 提取参数
+        shots = self._parse_shots(tool_parameters.get("shots", ""))
+        model = tool_parameters.get("model", "sora-2")
+        aspect_ratio = tool_parameters.get("aspect_ratio", "16:9")
+        mode = tool_parameters.get("mode") or "auto"
+
+        if not shots:
+            yield self.create_text_message("分镜列表为空")
+            return
+        if len(shots) > MAX_SHOTS:
+            yield self.create_text_message(f"分镜数量不能超过 {MAX_SHOTS} 个")
+            return
+
+        # 指定平台时只使用该平台，否则由路由器在已配置的平台中选择
+        preferred = tool_parameters.get("backend") or "auto"
+        if preferred != "auto":
+            backends = [backend for backend in backends if backend.name == preferred]
+            if not backends:
+                yield self.create_text_message(f"平台 {preferred} 的 API Key 未配置")
+                return
+
+        # 镜头描述中的 @名称 替换为调用方在可能提交到的平台上已登记角色的 @username
+        for shot in shots:
+            shot["scene"] = resolve_mentions(shot["scene"], backends)
+
+        # 总时长在模型上限内时一次生成（镜头衔接由模型处理），否则各镜头并行生成后拼接
+        durations = DURATIONS.get(model, DURATIONS["sora-2"])
+        total = sum(shot["duration"] for shot in shots)
+        if mode == "auto":
+            mode = "native" if total <= durations[-1] else "parallel"
+
+        if mode == "native":
+            if total > durations[-1]:
+                yield self.create_text_message(
+                    f"分镜总时长 {total:g} 秒超过 {model} 的上限 {durations[-1]} 秒，请使用并行模式"
+                )
+                return
+            params = {
+                "prompt": self._storyboard_prompt(shots),
+                "model": model,
+                "duration": self._fit_duration(total, durations),
+                "aspect_ratio": aspect_ratio
+            }
+            yield from self._run_native(backends, params)
+        else:
+            # 每个镜头按能容纳它的最短时长生成，拼接时再截到镜头时长；单个镜头超过模型上限时无法生成
+            longest = max(shot["duration"] for shot in shots)
+            if longest > durations[-1]:
+                yield self.create_text_message(
+                    f"镜头时长 {longest:g} 秒超过 {model} 的上限 {durations[-1]} 秒，请拆分为多个镜头"
+                )
+                return
+            params_list = [
+                {
+                    "prompt": shot["scene"],
+                    "model": model,
+                    "duration": self._fit_duration(shot["duration"], durations),
+                    "aspect_ratio": aspect_ratio
+                }
+                for shot in shots
+            ]
+            yield from self._run_parallel(backends, shots, params_list)
+
+    def _run_native(self, backends: list, params: dict) -> Generator[ToolInvokeMessage]:
+        """整个故事板作为一个任务提交"""
+        task_id = None
+        handle = get_engine().submit(
+            backends, params, callback_url=self.runtime.credentials.get("callback_url") or None
+        )
+        for event in handle.events():
+            event_type = event["type"]
+            task_id = event.get("task_id") or task_id
+
+            if event_type == CREATED:
+                yield self.create_json_message({
+                    "task_id": task_id,
+                    "mode": "native",
+                    "status": "pending",
+                    "eta_seconds": event.get("eta_seconds"),
+                    "message": "故事板任务已提交"
+                })
+            elif event_type == PREVIEW:
+                yield self.create_json_message({
+                    "task_id": task_id,
+                    "mode": "native",
+                    "status": "processing",
+                    **{field: event[field] for field in PREVIEW_FIELDS if field in event}
+                })
+            elif event_type == PROGRESS:
+                yield self.create_json_message({
+                    "task_id": task_id,
+                    "mode": "native",
+                    "status": "processing",
+                    "progress": event["progress"]
+                })
+            elif event_type == COMPLETED:
+                yield self.create_json_message({
+                    "task_id": task_id,
+                    "mode": "native",
+                    "status": "completed",
+                    "video_url": event["result"].get("video_url", ""),
+                    "duration": params["duration"],
+                    "polls": event["polls"],
+                    "timing": event.get("timing"),
+                    **extract_preview(event["result"])
+                })
+            elif event_type == TIMEOUT:
+                # 任务仍在服务端运行，可以用文生视频工具传入 task_id 继续等待
+                yield self.create_json_message({
+                    "task_id": task_id,
+                    "mode": "native",
+                    "status": "timeout",
+                    "error": event["error"],
+                    "message": "任务仍在生成中，传入 task_id 再次调用可继续查询",
+                    "polls": event["polls"],
+                    "timing": event.get("timing")
+                })
+            else:
+                yield self.create_json_message({
+                    "task_id": task_id,
+                    "mode": "native",
+                    "status": "failed",
+                    "error": event["error"],
+                    "timing": event.get("timing")
+                })
+
+    def _run_parallel(
+        self,
+        backends: list,
+        shots: List[Dict[str, Any]],
+        params_list: List[dict]
+    ) -> Generator[ToolInvokeMessage]:
+        """各镜头作为独立任务并行生成，全部完成后拼接为一个视频"""
+        clips: List[dict] = [
+            {"index": index, "scene": shot["scene"], "duration": shot["duration"], "task_id": "", "status": "pending"}
+            for index, shot in enumerate(shots)
+        ]
+        yield self.create_json_message({
+            "mode": "parallel",
+            "status": "pending",
+            "total": len(clips),
+            "message": "分镜已并行提交"
+        })
+
+        # 所有镜头同时提交，总耗时取决于最慢的镜头
+        handle = get_engine().submit_batch(
+            backends, params_list, concurrency=len(params_list),
+            callback_url=self.runtime.credentials.get("callback_url") or None
+        )
+        for event in handle.events():
+            event_type = event["type"]
+            clip = clips[event["index"]]
+            if event.get("task_id"):
+                clip["task_id"] = event["task_id"]
+
+            if event_type == CREATED:
+                clip["status"] = "processing"
+                clip["backend"] = event.get("backend", "")
+                clip["eta_seconds"] = event.get("eta_seconds")
+                continue
+            if event_type in (PREVIEW, PROGRESS):
+                continue
+
+            if event_type == COMPLETED:
+                clip["status"] = "completed"
+                clip["video_url"] = event["result"].get("video_url", "")
+            elif event_type == TIMEOUT:
+                clip["status"] = "timeout"
+                clip["error"] = event["error"]
+            else:
+                clip["status"] = "failed"
+                clip["error"] = event["error"]
+            if event.get("timing"):
+                clip["timing"] = event["timing"]
+            yield self.create_json_message({"mode": "parallel", **clip})
+
+        if any(clip["status"] != "completed" or not clip.get("video_url") for clip in clips):
+            yield self.create_json_message({
+                "mode": "parallel",
+                "status": "partial",
+                "shots": clips,
+                "error": "部分镜头生成失败，未拼接"
+            })
+            return
+
+        # 拼接模块只在并行模式下用到，不在插件启动时导入
+        from utils.mp4_concat import concat_mp4
+
+        with tempfile.TemporaryDirectory(prefix="sora2-storyboard-") as workdir:
+            output = os.path.join(workdir, "storyboard.mp4")
+            try:
+                # 生成的视频按平台时长取整，拼接时截到各镜头的时长
+                duration = concat_mp4(
+                    self._download_clips(backends, clips, workdir), output,
+                    [shot["duration"] for shot in shots]
+                )
+            except Exception as e:
+                # 各镜头的视频已经生成，拼接失败时仍返回各自的 URL
+                yield self.create_json_message({
+                    "mode": "parallel",
+                    "status": "completed",
+                    "shots": clips,
+                    "error": f"镜头拼接失败: {e}"
+                })
+                return
+
+            yield self.create_json_message({
+                "mode": "parallel",
+                "status": "completed",
+                "duration": round(duration, 2),
+                "shots": clips
+            })
+            yield from deliver_file(output, "storyboard.mp4")
+
+    @staticmethod
+    def _download_clips(backends: list, clips: List[dict], workdir: str) -> List[str]:
+        """并发下载各镜头的视频，返回（按镜头顺序）本地文件路径"""
+        def download(clip: dict) -> str:
+            backend = backend_for_task(backends, clip["task_id"], clip.get("backend"))
+            url, headers = video_source(backend, clip["task_id"], clip["video_url"])
+            path = os.path.join(workdir, f"shot_{clip['index']}.mp4")
+            download_to_file(url, path, headers)
+            return path
+
+        with ThreadPoolExecutor(max_workers=min(MAX_DOWNLOADS, len(clips))) as executor:
+            return list(executor.map(download, clips))
+
+    @staticmethod
+    def _fit_duration(seconds: float, durations: tuple) -> str:
+        """取能容纳 seconds 的最短视频时长"""
+        for duration in durations:
+            if seconds <= duration:
+                return str(duration)
+        return str(durations[-1])
+
+    @staticmethod
+    def _storyboard_prompt(shots: List[Dict[str, Any]]) -> str:
+        """生成平台约定的故事板提示词格式"""
+        return "\n\n".join(
+            f"Shot {index}:\nduration: {shot['duration']:g}sec\nScene: {shot['scene']}"
+            for index, shot in enumerate(shots, 1)
+        )
+
+    @staticmethod
+    def _parse_seconds(value: Any) -> float:
+        """解析镜头时长（5、"5"、"5sec"），无法解析时使用默认值"""
+        match = re.search(r"[\d.]+", str(value)) if value is not None else None
+        try:
+            seconds = float(match.group()) if match else 0
+        except ValueError:
+            seconds = 0
+        return seconds if seconds > 0 else DEFAULT_SHOT_SECONDS
+
+    @classmethod
+    def _parse_shots(cls, raw: Any) -> List[Dict[str, Any]]:
+        """解析分镜：JSON 数组（字符串或 {"scene", "duration"}）、故事板格式文本，或每行一个镜头"""
+        if isinstance(raw, list):
+            items = raw
+        else:
+            text = str(raw or "").strip()
+            items: Optional[list] = None
+            if text.startswith("["):
+                try:
+                    items = json.loads(text)
+                except ValueError:
+                    items = None
+            if not isinstance(items, list):
+                if SHOT_HEADER.search(text):
+                    items = []
+                    for block in SHOT_HEADER.split(text)[1:]:
+                        duration = SHOT_DURATION.search(block)
+                        scene = SHOT_SCENE.search(block)
+                        items.append({
+                            "scene": (scene.group(1) if scene else block).strip(),
+                            "duration": duration.group(1) if duration else None
+                        })
+                else:
+                    items = text.splitlines()
+
+        shots = []
+        for item in items:
+            if isinstance(item, dict):
+                scene = str(item.get("scene") or item.get("prompt") or "").strip()
+                seconds = item.get("duration", item.get("seconds"))
+            else:
+                scene = str(item).strip()
+                seconds = None
+            if scene:
+                shots.append({"scene": scene, "duration": cls._parse_seconds(seconds)})
+        return shots
@@ -0,0 +1,772 @@
+"""asyncio 轮询引擎
+
+一个后台线程运行一个事件循环，所有工具调用的创建和轮询都以协程的方式在其中多路复用，
+等待期间不占用工作线程。同步的 _invoke 生成器通过 submit() 把任务交给引擎，
+再用返回的 TaskHandle.events() 逐个取回状态事件：
+
+    created   任务已创建     {"task_id", "backend", "eta_seconds"}
+    preview   出现预览信息   {"task_id", "thumbnail_url"?, "enhanced_prompt"?}
+    progress  进度变化       {"task_id", "progress", "result"}
+    completed 任务完成       {"task_id", "result", "polls", "timing"}
+    failed    服务端返回失败 {"task_id", "error", "polls", "timing"}
+    timeout   超时           {"task_id", "error", "polls", "timing"}
+    error     请求异常       {"task_id", "error"}
+
+请求的构造和响应解析由后端（utils.backends）负责，progress / completed 事件的 result 是
+解析得到的 TaskStatus（utils.task_status，按字段名读取的只读映射）。submit() 可以传入多个后端，
+创建任务时由 BackendRouter 选择最近延迟最低的一个，并记录提交耗时和完成耗时。
+
+每个端点的请求都经过熔断器（utils.circuit_breaker）：端点熔断时请求立即失败，
+创建任务会换到其他可用后端（仅在确定请求未被处理时），轮询则等到熔断器允许探测时再查询。
+临时错误按 RetryPolicy（utils.retry）退避重试。创建请求只在确定没有被处理时重试或换端点；
+读超时、5xx 等结果不确定的错误后不重新提交（任务可能已经创建），报告 UncertainCreateError。
+
+创建成功的任务和每次查询到的状态都写入任务登记表（utils.task_registry），
+超时后可以用 watch() 按 task_id 恢复轮询。登记表和完成耗时历史的 SQLite 读写都放到
+线程池中执行（_offload），不阻塞事件循环中多路复用的其他任务。
+
+submit() 传入 share_key 时，相同键的并发调用共享同一个任务协程：后来者先收到
+已发生事件的回放，再和首个调用一起接收后续事件，不会重复创建任务。
+
+轮询同样按 task_id 共享：进程内每个任务只有一个轮询协程，同时等待它的调用
+（并发的 watch()、恢复的会话、submit() 创建后的等待）都订阅这一个流，每次查询只发一次请求。
+各订阅者按自己的 timeout 超时退出，最后一个订阅者离开时轮询停止。
+
+submit_batch() 把一批任务的事件汇入同一个句柄，每个事件额外带上 "index"（在批次中的序号），
+事件按完成先后到达，而不是按提交顺序。
+
+query_many() 并发查询一批 task_id 的当前状态，只查询一次，不轮询。
+
+warm_up() 在后台预先建立异步连接池到各平台的连接（get_engine() 第一次创建引擎时调用）。
+
+回调模式：submit() / submit_batch() 传入 callback_url 且所选后端的文档中有回调字段（贞贞的 notify_hook）时，
+创建请求带上回调地址，轮询流每次等待期间都可以被 notify(task_id) 提前唤醒，唤醒后立即查询确认状态；
+等待时长仍按自适应调度，收不到回调时照常轮询。回调只用来唤醒，结果仍以查询为准。
+
+每个轮询流有一个 TaskTrace（utils.metrics）：记录提交耗时、由状态变化得出的排队和渲染时间、
+查询次数、收发字节数和请求错误数，同时累计到进程内的指标中；终止事件的 "timing" 是它的汇总
+加上本次调用的总耗时（total_seconds）。
+
+新创建的任务完成后，从创建到完成的耗时记入历史（utils.latency_history）。同一组合
+（平台、模型、时长、画面比例）的历史足够时，created 事件的 eta_seconds 取历史中位数，
+第一次查询推迟到历史上最快的一批任务完成时；timeout 为 None（默认）时按历史确定超时。
+"""
+
+import asyncio
+import functools
+import queue
+import threading
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Union
+
+import httpx
+
+from utils import http_client
+from utils.backends import PREVIEW_FIELDS, ZHENZHEN_BASE_URL, Backend, BackendRouter, get_router
+from utils.circuit_breaker import (
+    CircuitBreakers, CircuitOpenError, get_breakers, is_endpoint_failure, is_safe_to_fail_over
+)
+from utils.latency_history import LatencyHistory, get_latency_history
+from utils.metrics import Metrics, TaskTrace, get_metrics
+from utils.polling import PollScheduler
+from utils.retry import RetryPolicy, UncertainCreateError, is_uncertain
+from utils.task_registry import TaskRegistry, get_registry
+from utils.task_status import TaskStatus, loads, parse_zhenzhen
+
+# 事件类型
+CREATED = "created"
+PROGRESS = "progress"
+PREVIEW = "preview"
+COMPLETED = "completed"
+FAILED = "failed"
+TIMEOUT = "timeout"
+ERROR = "error"
+
+TERMINAL_EVENTS = {COMPLETED, FAILED, TIMEOUT, ERROR}
+
+# 服务端状态 -> 工具返回的状态
+STATUS_NAMES = {
+    "NOT_START": "pending",
+    "IN_PROGRESS": "processing",
+    "SUCCESS": "completed",
+    "FAILURE": "failed"
+}
+
+
+def parse_task_response(data: Dict[str, Any]) -> TaskStatus:
+    """解析贞贞的查询响应，提取状态、进度和视频 URL（见 utils.task_status.parse_zhenzhen）"""
+    return parse_zhenzhen(data)
+
+
+class TaskHandle:
+    """引擎中一个任务的句柄：事件队列 + 协程 future"""
+
+    def __init__(self, expected: int = 1):
+        self.queue: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self.future: Optional[Future] = None
+        # 收到多少个终止事件后结束（批量任务为任务数）
+        self.expected = expected
+
+    def events(self) -> Iterator[Dict[str, Any]]:
+        """同步地逐个产出事件，直到所有任务终止；调用方提前退出时取消协程"""
+        finished = 0
+        try:
+            while finished < self.expected:
+                event = self.queue.get()
+                yield event
+                if event["type"] in TERMINAL_EVENTS:
+                    finished += 1
+        finally:
+            self.cancel()
+
+    def cancel(self) -> None:
+        if self.future is not None and not self.future.done():
+            self.future.cancel()
+
+
+class _SharedStream:
+    """多个句柄共享的一个任务协程，事件广播给所有订阅者（只在事件循环线程内访问）"""
+
+    def __init__(self, scheduler: Optional[PollScheduler] = None, trace: Optional[TaskTrace] = None):
+        self.subscribers: list = []
+        self.history: list = []
+        self.task: Optional[asyncio.Future] = None
+        # 轮询流使用的调度器和耗时统计（只有按 task_id 共享的轮询流才有）
+        self.scheduler = scheduler
+        self.trace = trace
+
+    def emit(self, event: Dict[str, Any]) -> None:
+        self.history.append(event)
+        for subscriber in list(self.subscribers):
+            subscriber(event)
+
+
+class AsyncPollEngine:
+    """在单个事件循环中并发创建和轮询视频任务"""
+
+    def __init__(
+        self,
+        client_factory: Optional[Callable[[], httpx.AsyncClient]] = None,
+        registry: Optional[TaskRegistry] = None,
+        router: Optional[BackendRouter] = None,
+        breakers: Optional[CircuitBreakers] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        metrics: Optional[Metrics] = None,
+        latency: Optional[LatencyHistory] = None
+    ):
+        self._client_factory = client_factory or http_client.create_async_client
+        self._registry = registry
+        self._router = router
+        self._breakers = breakers
+        self._metrics = metrics
+        self._latency = latency
+        self.retry_policy = retry_policy or RetryPolicy()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._streams: Dict[str, _SharedStream] = {}
+        # 回调模式下正在等待通知的任务（只在事件循环线程内访问）
+        self._wakeups: Dict[str, asyncio.Event] = {}
+
+    @property
+    def registry(self) -> TaskRegistry:
+        if self._registry is None:
+            self._registry = get_registry()
+        return self._registry
+
+    @property
+    def router(self) -> BackendRouter:
+        if self._router is None:
+            self._router = get_router()
+        return self._router
+
+    @property
+    def breakers(self) -> CircuitBreakers:
+        if self._breakers is None:
+            self._breakers = get_breakers()
+        return self._breakers
+
+    @property
+    def metrics(self) -> Metrics:
+        if self._metrics is None:
+            self._metrics = get_metrics()
+        return self._metrics
+
+    @property
+    def latency(self) -> LatencyHistory:
+        if self._latency is None:
+            self._latency = get_latency_history()
+        return self._latency
+
+    @property
+    def in_flight(self) -> int:
+        """当前由引擎监视的任务数"""
+        return self._in_flight
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def _run():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=_run, name="sora2-poll-engine", daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+        return self._loop
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # 只在事件循环线程内调用，不需要加锁
+        if self._client is None:
+            self._client = self._client_factory()
+        return self._client
+
+    def warm_up(self, base_urls: List[str], connections: int = 2) -> Optional[Future]:
+        """在后台预先建立异步连接池到各平台的连接，返回 future；SORA2_HTTP_WARMUP=0 时跳过并返回 None"""
+        if not http_client.warmup_enabled():
+            return None
+        loop = self._ensure_started()
+
+        async def _warm_up():
+            client = self._get_client()
+            await asyncio.gather(*[http_client.warm_up_async(client, url, connections) for url in base_urls])
+
+        return asyncio.run_coroutine_threadsafe(_warm_up(), loop)
+
+    def submit(
+        self,
+        backend: Union[Backend, List[Backend]],
+        params: dict,
+        timeout: Optional[float] = None,
+        scheduler: Optional[PollScheduler] = None,
+        share_key: Optional[str] = None,
+        callback_url: Optional[str] = None
+    ) -> TaskHandle:
+        """提交一个新任务，返回任务句柄
+
+        :param backend: 一个后端，或者候选后端列表（由路由器选择）
+        :param timeout: 等待完成的秒数，None 时按历史完成耗时确定
+        :param share_key: 相同键的进行中任务会被复用，而不是重新创建
+        :param callback_url: 平台完成后通知的地址，提供时回调可以提前唤醒轮询（后端不支持回调时忽略）
+        """
+        return self._start(
+            _as_list(backend), params=params, timeout=timeout, scheduler=scheduler, share_key=share_key,
+            callback_url=callback_url
+        )
+
+    def watch(
+        self,
+        backend: Backend,
+        task_id: str,
+        timeout: Optional[float] = None,
+        scheduler: Optional[PollScheduler] = None,
+        params: Optional[dict] = None
+    ) -> TaskHandle:
+        """监视一个已存在的任务，返回任务句柄
+
+        :param params: 任务原始参数（来自登记表），用于选择轮询策略
+        """
+        if scheduler is None:
+            scheduler = self._default_scheduler(params)
+        return self._start([backend], params=params, task_id=task_id, timeout=timeout, scheduler=scheduler)
+
+    def submit_batch(
+        self,
+        backend: Union[Backend, List[Backend]],
+        params_list: list,
+        concurrency: int = 5,
+        timeout: Optional[float] = None,
+        scheduler_factory: Optional[Callable[[dict], PollScheduler]] = None,
+        callback_url: Optional[str] = None
+    ) -> TaskHandle:
+        """并发提交一批任务，返回汇总所有任务事件的句柄
+
+        同时进行中的创建请求不超过 concurrency 个；创建成功后的轮询不受限制，
+        所有任务在同一个事件循环里等待。传入多个后端时每个任务分别选择后端。
+        """
+        backends = _as_list(backend)
+        loop = self._ensure_started()
+        handle = TaskHandle(expected=len(params_list))
+        scheduler_factory = scheduler_factory or self._default_scheduler
+
+        async def _run_batch():
+            create_limit = asyncio.Semaphore(max(concurrency, 1))
+            await asyncio.gather(*[
+                self._run_task(
+                    backends, params, None, timeout, scheduler_factory(params),
+                    lambda event, index=index: handle.queue.put({**event, "index": index}),
+                    create_limit=create_limit, callback_url=callback_url
+                )
+                for index, params in enumerate(params_list)
+            ])
+
+        handle.future = asyncio.run_coroutine_threadsafe(_run_batch(), loop)
+        return handle
+
+    def query_many(self, tasks: list, concurrency: int = 10) -> Future:
+        """并发查询一批任务的当前状态，返回 future，结果按 tasks 顺序排列
+
+        :param tasks: (backend, task_id) 列表
+
+        每项为查询到的 TaskStatus 的字段加上 "task_id"；查询失败的项只有 "task_id" 和 "error"。
+        """
+        loop = self._ensure_started()
+
+        async def _query_all():
+            limit = asyncio.Semaphore(max(concurrency, 1))
+
+            async def _query_one(backend, task_id):
+                async with limit:
+                    try:
+                        result = await self.query_task(backend, task_id)
+                    except Exception as e:
+                        return {"task_id": task_id, "error": str(e)}
+                await self._offload(self.registry.update_status, task_id, result)
+                return {"task_id": task_id, **result}
+
+            return await asyncio.gather(*[_query_one(backend, task_id) for backend, task_id in tasks])
+
+        return asyncio.run_coroutine_threadsafe(_query_all(), loop)
+
+    @staticmethod
+    def _default_scheduler(params: Optional[dict]) -> PollScheduler:
+        params = params or {}
+        return PollScheduler(model=params.get("model", "sora-2"), duration=params.get("duration", "10"))
+
+    def _start(self, backends, params=None, task_id=None, timeout=None, scheduler=None, share_key=None,
+               callback_url=None):
+        loop = self._ensure_started()
+        handle = TaskHandle()
+        if scheduler is None:
+            scheduler = self._default_scheduler(params)
+
+        def make_coro(emit):
+            return self._run_task(backends, params, task_id, timeout, scheduler, emit, callback_url=callback_url)
+
+        if share_key is None:
+            coro = make_coro(handle.queue.put)
+        else:
+            coro = self._attach(share_key, make_coro, handle.queue.put)
+        handle.future = asyncio.run_coroutine_threadsafe(coro, loop)
+        return handle
+
+    @property
+    def shared_streams(self) -> int:
+        """当前的共享任务流数量（按 share_key 共享的任务和按 task_id 共享的轮询）"""
+        return len(self._streams)
+
+    def _open_stream(
+        self,
+        key: str,
+        make_coro: Callable,
+        scheduler: Optional[PollScheduler] = None,
+        trace: Optional[TaskTrace] = None
+    ) -> _SharedStream:
+        """返回 key 对应的共享流，不存在时新建一个并启动协程"""
+        stream = self._streams.get(key)
+        if stream is None:
+            stream = _SharedStream(scheduler, trace)
+            self._streams[key] = stream
+            stream.task = asyncio.ensure_future(make_coro(stream.emit))
+
+            def _forget(_task, stream=stream):
+                if self._streams.get(key) is stream:
+                    del self._streams[key]
+
+            stream.task.add_done_callback(_forget)
+        return stream
+
+    @staticmethod
+    def _subscribe(stream: _SharedStream, emit: Callable) -> None:
+        # 回放已经发生的事件（如 created），再订阅后续事件
+        for event in stream.history:
+            emit(event)
+        stream.subscribers.append(emit)
+
+    @staticmethod
+    def _unsubscribe(stream: _SharedStream, emit: Callable) -> None:
+        # 最后一个订阅者离开时才取消共享协程
+        stream.subscribers.remove(emit)
+        if not stream.subscribers and not stream.task.done():
+            stream.task.cancel()
+
+    async def _attach(self, key: str, make_coro: Callable, emit: Callable) -> None:
+        """订阅 key 对应的共享任务流，不存在时新建一个"""
+        stream = self._open_stream(key, make_coro)
+        self._subscribe(stream, emit)
+        try:
+            await asyncio.shield(stream.task)
+        except asyncio.CancelledError:
+            self._unsubscribe(stream, emit)
+            raise
+
+    async def create_task(
+        self,
+        backend: Backend,
+        params: dict,
+        callback_url: Optional[str] = None,
+        trace: Optional[TaskTrace] = None
+    ) -> str:
+        """创建视频任务，返回 task_id
+
+        创建请求不是幂等的，只在确定没有被处理时重试（见 utils.retry.is_retryable）。
+
+        :param callback_url: 任务完成后平台通知的地址（后端没有回调字段时不发送）
+        :param trace: 记录请求字节数和错误数的任务统计
+        """
+        url, body = backend.create_request(params)
+        if callback_url and backend.callback_field:
+            body = {**body, backend.callback_field: callback_url}
+        if backend.multipart:
+            payload = {"files": await self._form_files(backend, params, body)}
+        else:
+            payload = {"json": body}
+        response = await self.retry_policy.call(
+            lambda: self._request(backend, "POST", url, trace=trace, timeout=30, **payload),
+            idempotent=False
+        )
+        return backend.parse_created(response.json())
+
+    async def _form_files(self, backend: Backend, params: dict, body: dict) -> dict:
+        """multipart 创建请求的表单：body 中的字段，加上下载得到的参考图文件"""
+        files = {key: (None, str(value)) for key, value in body.items()}
+        reference = backend.reference_image(params)
+        if reference:
+            async def _download():
+                response = await self._get_client().get(reference, timeout=30)
+                response.raise_for_status()
+                return response
+
+            response = await self.retry_policy.call(_download)
+            filename = reference.split("?", 1)[0].rsplit("/", 1)[-1] or "reference.png"
+            content_type = response.headers.get("Content-Type", "application/octet-stream")
+            files[backend.reference_field] = (filename, response.content, content_type)
+        return files
+
+    async def query_task(self, backend: Backend, task_id: str, trace: Optional[TaskTrace] = None) -> TaskStatus:
+        """查询任务状态"""
+        url, query = backend.query_request(task_id)
+        response = await self.retry_policy.call(
+            lambda: self._request(backend, "GET", url, trace=trace, params=query, timeout=10)
+        )
+        return backend.parse_status(loads(response.content))
+
+    async def _request(
+        self,
+        backend: Backend,
+        method: str,
+        url: str,
+        headers: Optional[dict] = None,
+        trace: Optional[TaskTrace] = None,
+        **kwargs
+    ) -> httpx.Response:
+        """经过熔断器发出请求，并把结果和耗时记录到熔断器，字节数和错误记录到任务统计"""
+        breaker = self.breakers.get(backend.base_url)
+        if not breaker.allow_request():
+            raise CircuitOpenError(backend.base_url, breaker.retry_after())
+        start_time = time.monotonic()
+        response = None
+        try:
+            response = await self._get_client().request(
+                method, url, headers={**backend.headers, **(headers or {})}, **kwargs
+            )
+            response.raise_for_status()
+        except Exception as e:
+            if is_endpoint_failure(e):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            if trace is not None:
+                trace.record_request(_transferred(response), error=True)
+            raise
+        except BaseException:
+            # 请求被取消（等待方超时、引擎关闭）时没有结果，只归还半开状态的探测名额
+            breaker.release()
+            raise
+        breaker.record_success(time.monotonic() - start_time)
+        if trace is not None:
+            trace.record_request(_transferred(response))
+        return response
+
+    async def _create(
+        self,
+        backends: List[Backend],
+        params: dict,
+        callback_url: Optional[str] = None,
+        trace: Optional[TaskTrace] = None
+    ):
+        """选择后端并创建任务，失败时换到其他可用后端；每个端点的提交耗时记录到路由器，总耗时记录到任务统计
+
+        结果不确定的失败（读超时、5xx）不换端点重新提交：平台没有按请求查找任务的接口，
+        无法确认任务是否已经创建，抛出 UncertainCreateError 提醒调用方先确认。
+        """
+        submit_start = time.monotonic()
+        tried = []
+        last_error = None
+        while True:
+            candidates = [
+                backend for backend in backends
+                if backend not in tried and self.breakers.get(backend.base_url).is_available()
+            ]
+            if not candidates:
+                # 剩下的后端都已熔断：立即失败，不等待超时
+                if last_error is not None:
+                    raise last_error
+                breaker = self.breakers.get(backends[0].base_url)
+                raise CircuitOpenError(backends[0].base_url, breaker.retry_after())
+
+            backend = self.router.choose(candidates, params)
+            tried.append(backend)
+            if trace is not None:
+                trace.backend = backend.name
+            start_time = time.monotonic()
+            elapsed = None
+            try:
+                task_id = await self.create_task(backend, params, callback_url=callback_url, trace=trace)
+                elapsed = time.monotonic() - start_time
+            except Exception as e:
+                if not is_safe_to_fail_over(e):
+                    if is_uncertain(e):
+                        raise UncertainCreateError(backend.name, e) from e
+                    raise
+                last_error = e
+                continue
+            finally:
+                self.router.record_submit(backend.name, elapsed)
+            break
+
+        if trace is not None:
+            trace.record_submit(time.monotonic() - submit_start)
+        await self._offload(self.registry.record_created, task_id, params, backend=backend.name,
+                            account=backend.account)
+        return backend, task_id
+
+    async def _run_task(self, backends, params, task_id, timeout, scheduler, emit, create_limit=None,
+                        callback_url=None):
+        self._in_flight += 1
+        backend = backends[0]
+        started = time.monotonic()
+        trace = TaskTrace(self.metrics, params, backend.name)
+        try:
+            try:
+                created = task_id is None
+                if created:
+                    if create_limit is not None:
+                        async with create_limit:
+                            backend, task_id = await self._create(backends, params, callback_url, trace)
+                    else:
+                        backend, task_id = await self._create(backends, params, callback_url, trace)
+                    # 按历史完成耗时估算 ETA，并把第一次查询推迟到此前几乎不可能完成的时刻
+                    # （第一次读取某个组合时要查询 SQLite，之后读内存中的副本）
+                    eta = await self._offload(self.latency.eta_seconds, backend.name, params)
+                    emit({"type": CREATED, "task_id": task_id, "backend": backend.name, "eta_seconds": round(eta)})
+                    scheduler.first_delay = self.latency.first_poll_delay(backend.name, params)
+                if timeout is None:
+                    timeout = await self._offload(self.latency.timeout, backend.name, params)
+                start_time = time.monotonic()
+
+                async def _record_completion(final):
+                    # 新创建的任务完成时记录完成耗时（在终止事件发出前，调用方收到事件时已经记录）
+                    if created and final["type"] == COMPLETED:
+                        elapsed = time.monotonic() - start_time
+                        self.router.record_completion(backend.name, elapsed, params)
+                        await self._offload(self.latency.record, backend.name, params, elapsed)
+
+                # 创建请求带上了回调地址时，回调可以提前唤醒轮询
+                callback = bool(callback_url and backend.callback_field)
+                await self._follow(
+                    backend, task_id, timeout, scheduler, emit, callback=callback, trace=trace, started=started,
+                    on_final=_record_completion
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                emit({"type": ERROR, "task_id": task_id, "error": str(e)})
+        finally:
+            self._in_flight -= 1
+
+    async def _follow(self, backend, task_id, timeout, scheduler, emit, callback=False, trace=None, started=None,
+                      on_final=None):
+        """订阅 task_id 的共享轮询流直到终止状态或超时，发出并返回终止事件
+
+        没有进行中的轮询时用 scheduler 和 trace 新建一个；已有时直接加入，两者都不再使用。
+        终止事件由每个订阅者自己发出，调用方收到它时订阅者的收尾工作（包括 on_final）已经完成。
+        终止事件的 timing 为轮询流的统计加上从 started（默认为现在）起的总耗时。
+        """
+        started = time.monotonic() if started is None else started
+        if trace is None:
+            trace = TaskTrace(self.metrics, backend=backend.name)
+        stream = self._open_stream(
+            f"task:{backend.name}:{task_id}",
+            lambda stream_emit: self._poll(backend, task_id, scheduler, stream_emit, callback, trace),
+            scheduler,
+            trace
+        )
+        self._subscribe(stream, emit)
+        try:
+            final = await asyncio.wait_for(asyncio.shield(stream.task), max(timeout, 0))
+        except asyncio.TimeoutError:
+            final = {"type": TIMEOUT, "task_id": task_id, "error": f"任务超时: {task_id}",
+                     "polls": stream.scheduler.polls}
+        finally:
+            self._unsubscribe(stream, emit)
+        final = {**final, "timing": {**stream.trace.summary(), "total_seconds": round(time.monotonic() - started, 3)}}
+        if on_final is not None:
+            await on_final(final)
+        emit(final)
+        return final
+
+    async def _poll(self, backend, task_id, scheduler, emit, callback=False, trace=None):
+        """轮询到终止状态，返回终止事件（completed / failed）；超时由订阅者各自处理
+
+        callback 为 True 时每次等待都可以被平台回调提前唤醒，等待时长仍由 scheduler 决定。
+        每次查询记录到 trace，轮询结束（包括所有订阅者离开而取消）时结束 trace。
+        """
+        if trace is None:
+            trace = TaskTrace(self.metrics, backend=backend.name)
+        start_time = time.monotonic()
+        last_progress = ""
+        preview: Dict[str, str] = {}
+        wakeup = asyncio.Event()
+        if callback:
+            self._wakeups[task_id] = wakeup
+        outcome = "cancelled"
+
+        try:
+            if scheduler.first_delay > 0:
+                await self._wait(wakeup if callback else None, scheduler.first_delay)
+            while True:
+                scheduler.record_query()
+                try:
+                    result = await self.query_task(backend, task_id, trace)
+                except CircuitOpenError as e:
+                    # 端点熔断期间不查询（这次查询没有发出，不计入轮询次数），等到允许探测时再试
+                    # （半开时探测名额被占用则至少等 1 秒）
+                    scheduler.polls -= 1
+                    await asyncio.sleep(max(e.retry_after, 1.0))
+                    continue
+                trace.observe(result)
+                await self._offload(self.registry.update_status, task_id, result)
+                next_delay = scheduler.next_delay(result, time.monotonic() - start_time)
+                status = result.get("status")
+                progress = result.get("progress", "")
+
+                # 缩略图、改写后的提示词一出现就发出，不必等视频完成
+                changed = {field: result[field] for field in PREVIEW_FIELDS
+                           if result.get(field) and result[field] != preview.get(field)}
+                if changed and status not in ("SUCCESS", "FAILURE"):
+                    preview.update(changed)
+                    emit({"type": PREVIEW, "task_id": task_id, **preview})
+
+                if progress and progress != last_progress:
+                    emit({"type": PROGRESS, "task_id": task_id, "progress": progress, "result": result})
+                    last_progress = progress
+
+                # SUCCESS 表示完成，FAILURE 表示失败
+                if status == "SUCCESS":
+                    outcome = COMPLETED
+                    return {"type": COMPLETED, "task_id": task_id, "result": result, "polls": scheduler.polls}
+                elif status == "FAILURE":
+                    outcome = FAILED
+                    return {"type": FAILED, "task_id": task_id, "error": result.get("fail_reason") or "Unknown error",
+                            "polls": scheduler.polls}
+
+                # 回调模式下平台回调可以提前结束等待；查询期间到达的回调已经置位，不会丢失
+                await self._wait(wakeup if callback else None, next_delay)
+        except Exception:
+            outcome = ERROR
+            raise
+        finally:
+            trace.finish(outcome, task_id)
+            if self._wakeups.get(task_id) is wakeup:
+                del self._wakeups[task_id]
+
+    @staticmethod
+    async def _offload(fn: Callable, *args, **kwargs) -> Any:
+        """在线程池中执行阻塞调用（SQLite 读写），事件循环继续处理其他任务"""
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args, **kwargs))
+
+    @staticmethod
+    async def _wait(wakeup: Optional[asyncio.Event], delay: float) -> None:
+        """等待 delay 秒；wakeup 不为 None 时平台回调可以提前唤醒"""
+        if wakeup is None:
+            await asyncio.sleep(delay)
+            return
+        try:
+            await asyncio.wait_for(wakeup.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+        wakeup.clear()
+
+    def notify(self, task_id: str) -> bool:
+        """平台回调到达：唤醒等待 task_id 的轮询流（可在任意线程调用）
+
+        返回本进程是否有调用在等待这个任务的回调。
+        """
+        loop = self._loop
+        if loop is None:
+            return False
+        future = asyncio.run_coroutine_threadsafe(self._wake(task_id), loop)
+        try:
+            return future.result(timeout=5)
+        except Exception:
+            return False
+
+    async def _wake(self, task_id: str) -> bool:
+        wakeup = self._wakeups.get(task_id)
+        if wakeup is None:
+            return False
+        wakeup.set()
+        return True
+
+    def shutdown(self) -> None:
+        """停止事件循环并关闭异步客户端"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+
+        async def _close():
+            if self._client is not None:
+                await self._client.aclose()
+                self._client = None
+
+        asyncio.run_coroutine_threadsafe(_close(), loop).result(timeout=5)
+        loop.call_soon_threadsafe(loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+def _transferred(response: Optional[httpx.Response]) -> int:
+    """一次请求收发的字节数（请求体和响应体）"""
+    if response is None:
+        return 0
+    return len(response.request.content) + len(response.content)
+
+
+def _as_list(backend: Union[Backend, List[Backend]]) -> List[Backend]:
+    return list(backend) if isinstance(backend, (list, tuple)) else [backend]
+
+
+_engine: Optional[AsyncPollEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> AsyncPollEngine:
+    """返回进程内共享的轮询引擎；第一次使用时创建，并在后台预热到贞贞平台的连接"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = AsyncPollEngine()
+                _engine.warm_up([ZHENZHEN_BASE_URL])
+    return _engine
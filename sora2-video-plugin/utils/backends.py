@@ -0,0 +1,335 @@
+"""视频生成后端（贞贞 / 聚鑫）与按延迟选择后端的路由器
+
+每个后端负责把工具的统一参数（prompt、model、duration、aspect_ratio、images）转换成
+平台自己的创建请求，并把查询结果解析成统一的 TaskStatus（utils.task_status，
+status 统一为 NOT_START / IN_PROGRESS / SUCCESS / FAILURE），轮询引擎只和这个接口打交道。
+
+聚鑫提供两种请求格式：统一视频格式（JuxinBackend）和 OpenAI 官方视频格式（JuxinOpenAIBackend，
+multipart 表单创建，参考图作为 input_reference 文件上传），由凭据中的 juxin_api_format 选择，
+两者是同一个平台，共用后端名、熔断器和路由统计。
+
+BackendRouter 记录每个后端最近的提交耗时和完成耗时（指数滑动平均），
+每次提交时选择预计最快拿到结果的后端；还没有数据的后端优先被尝试。
+"""
+
+import hashlib
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils import http_client
+from utils.polling import expected_render_seconds
+from utils.task_status import TaskStatus, parse_juxin, parse_zhenzhen
+
+ZHENZHEN = "zhenzhen"
+JUXIN = "juxin"
+
+ZHENZHEN_BASE_URL = os.environ.get("SORA2_ZHENZHEN_BASE_URL", http_client.DEFAULT_BASE_URL)
+JUXIN_BASE_URL = os.environ.get("SORA2_JUXIN_BASE_URL", "https://api.jxincm.cn")
+
+
+# 完成前就可能出现的预览信息：缩略图和平台改写后的提示词
+PREVIEW_FIELDS = ("thumbnail_url", "enhanced_prompt")
+
+
+def extract_preview(data: Dict[str, Any]) -> Dict[str, str]:
+    """从查询响应（顶层、detail 或 data 中）取出已有的预览字段"""
+    preview = {}
+    sources = [data] + [data[key] for key in ("detail", "data") if isinstance(data.get(key), dict)]
+    for field in PREVIEW_FIELDS:
+        for source in sources:
+            value = source.get(field)
+            if isinstance(value, str) and value:
+                preview[field] = value
+                break
+    return preview
+
+
+def account_key(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+class Backend:
+    """一个视频生成平台的请求构造和响应解析"""
+
+    name = ""
+    default_base_url = ""
+    # 平台提供的图床上传路径（没有则为空）
+    upload_path = ""
+    # 创建角色（客串）的接口，两个平台相同
+    characters_path = "/sora/v1/characters"
+    # 平台文档中创建请求的回调地址字段（回调模式）；没有时不发送回调地址，照常轮询
+    callback_field = ""
+    # 创建请求以 multipart 表单发送（否则为 JSON），参考图作为 reference_field 文件上传
+    multipart = False
+    reference_field = ""
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None):
+        self.api_key = api_key
+        self.base_url = (base_url or self.default_base_url).rstrip("/")
+
+    @property
+    def account(self) -> str:
+        """API Key 的哈希：本地缓存和登记表按它区分账号（一个插件进程服务多个租户），不保存 Key 本身"""
+        return account_key(self.api_key)
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+    @property
+    def upload_url(self) -> Optional[str]:
+        return f"{self.base_url}{self.upload_path}" if self.upload_path else None
+
+    @property
+    def characters_url(self) -> str:
+        return f"{self.base_url}{self.characters_path}"
+
+    def create_request(self, params: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """返回创建任务的 URL 和 JSON 请求体"""
+        raise NotImplementedError
+
+    def query_request(self, task_id: str) -> Tuple[str, Optional[Dict[str, str]]]:
+        """返回查询任务的 URL 和查询参数"""
+        raise NotImplementedError
+
+    def reference_image(self, params: Dict[str, Any]) -> Optional[str]:
+        """multipart 创建请求需要上传的参考图 URL（没有时为 None）"""
+        images = params.get("images") or []
+        return images[0] if self.multipart and images else None
+
+    def parse_created(self, data: Dict[str, Any]) -> str:
+        """从创建响应中取出 task_id"""
+        raise NotImplementedError
+
+    def parse_status(self, data: Dict[str, Any]) -> TaskStatus:
+        """把查询响应解析成统一的任务状态"""
+        raise NotImplementedError
+
+    def content_url(self, task_id: str) -> Optional[str]:
+        """返回下载成品视频的接口地址（平台没有下载接口时返回 None）"""
+        return None
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self.base_url}>"
+
+
+class ZhenzhenBackend(Backend):
+    """贞贞平台：/v2/videos/generations"""
+
+    name = ZHENZHEN
+    default_base_url = ZHENZHEN_BASE_URL
+    callback_field = "notify_hook"
+
+    def create_request(self, params):
+        return f"{self.base_url}/v2/videos/generations", params
+
+    def query_request(self, task_id):
+        return f"{self.base_url}/v2/videos/generations/{task_id}", None
+
+    def parse_created(self, data):
+        return data["task_id"]
+
+    def parse_status(self, data):
+        return parse_zhenzhen(data)
+
+
+# 画面比例 -> 聚鑫的 orientation
+JUXIN_ORIENTATIONS = {"16:9": "landscape", "9:16": "portrait"}
+
+
+class JuxinBackend(Backend):
+    """聚鑫平台统一视频格式：/v1/video/create + /v1/video/query"""
+
+    name = JUXIN
+    default_base_url = JUXIN_BASE_URL
+    upload_path = "/api/upload"
+
+    def create_request(self, params):
+        body = {
+            "images": list(params.get("images") or []),
+            "model": params.get("model", "sora-2"),
+            "orientation": JUXIN_ORIENTATIONS.get(params.get("aspect_ratio", "16:9"), "landscape"),
+            "prompt": params.get("prompt", ""),
+            "size": "large" if params.get("model") == "sora-2-pro" else "small",
+            "duration": int(params.get("duration") or 10),
+            "watermark": True,
+            "private": False
+        }
+        return f"{self.base_url}/v1/video/create", body
+
+    def query_request(self, task_id):
+        return f"{self.base_url}/v1/video/query", {"id": task_id}
+
+    def content_url(self, task_id):
+        # 只有 OpenAI 官方格式创建的任务（video_ 开头）可以用 /v1/videos/{id}/content 下载
+        if task_id.startswith("video_"):
+            return f"{self.base_url}/v1/videos/{task_id}/content"
+        return None
+
+    def parse_created(self, data):
+        return data["id"]
+
+    def parse_status(self, data):
+        return parse_juxin(data)
+
+
+# 画面比例 -> OpenAI 格式的 size
+OPENAI_SIZES = {"16:9": "16x9", "9:16": "9x16"}
+
+
+class JuxinOpenAIBackend(JuxinBackend):
+    """聚鑫平台 OpenAI 官方视频格式：POST /v1/videos（multipart）+ GET /v1/videos/{id}"""
+
+    multipart = True
+    reference_field = "input_reference"
+
+    def create_request(self, params):
+        # 表单字段都是字符串；只支持一张参考图（reference_image），其余忽略
+        body = {
+            "model": params.get("model", "sora-2"),
+            "prompt": params.get("prompt", ""),
+            "seconds": str(params.get("duration") or 10),
+            "size": OPENAI_SIZES.get(params.get("aspect_ratio", "16:9"), "16x9"),
+            "watermark": "true",
+            "private": "false"
+        }
+        return f"{self.base_url}/v1/videos", body
+
+    def query_request(self, task_id):
+        return f"{self.base_url}/v1/videos/{task_id}", None
+
+
+BACKEND_CLASSES = {ZHENZHEN: ZhenzhenBackend, JUXIN: JuxinBackend}
+
+# 凭据字段 -> 后端
+CREDENTIAL_KEYS = {ZHENZHEN: "api_key", JUXIN: "juxin_api_key"}
+
+# 凭据 juxin_api_format -> 聚鑫后端的请求格式
+JUXIN_FORMATS = {"unified": JuxinBackend, "openai": JuxinOpenAIBackend}
+
+
+def backends_from_credentials(credentials: Dict[str, Any]) -> List[Backend]:
+    """按凭据中配置的 API Key 构造可用后端（贞贞在前）"""
+    backends = []
+    for name, key in CREDENTIAL_KEYS.items():
+        api_key = credentials.get(key)
+        if api_key:
+            cls = BACKEND_CLASSES[name]
+            if name == JUXIN:
+                cls = JUXIN_FORMATS.get(credentials.get("juxin_api_format") or "unified", JuxinBackend)
+            backends.append(cls(api_key))
+    return backends
+
+
+def backend_for_task(backends: List[Backend], task_id: str, name: Optional[str] = None) -> Backend:
+    """找到 task_id 所属的后端
+
+    优先用登记表中记录的后端名；没有记录时按 ID 格式判断（聚鑫的 ID 形如 "sora-2:task_..."）。
+    """
+    by_name = {backend.name: backend for backend in backends}
+    if name in by_name:
+        return by_name[name]
+    if ":" in task_id and JUXIN in by_name:
+        return by_name[JUXIN]
+    return by_name.get(ZHENZHEN, backends[0])
+
+
+class _BackendStats:
+    __slots__ = ("submit_seconds", "render_ratio", "in_flight", "submits", "completions")
+
+    def __init__(self):
+        self.submit_seconds: Optional[float] = None
+        # 实际完成耗时 / 预期渲染耗时，消除模型和时长的差异
+        self.render_ratio: Optional[float] = None
+        self.in_flight = 0
+        self.submits = 0
+        self.completions = 0
+
+
+class BackendRouter:
+    """按最近的提交耗时和完成耗时选择后端"""
+
+    def __init__(self, alpha: float = 0.3):
+        self.alpha = alpha
+        self._stats: Dict[str, _BackendStats] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name: str) -> _BackendStats:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = _BackendStats()
+        return stats
+
+    def _ewma(self, current: Optional[float], sample: float) -> float:
+        return sample if current is None else current + self.alpha * (sample - current)
+
+    def choose(self, backends: List[Backend], params: Optional[Dict[str, Any]] = None) -> Backend:
+        """选择预计最快完成的后端，并把它的进行中提交数加一
+
+        调用方需要在创建完成后调用 record_submit（成功或失败都要调用）。
+        """
+        if len(backends) == 1:
+            backend = backends[0]
+        else:
+            params = params or {}
+            expected = expected_render_seconds(params.get("model", "sora-2"), params.get("duration", "10"))
+            with self._lock:
+                backend = min(backends, key=lambda b: (self._score(b.name, expected), self._get(b.name).in_flight))
+        with self._lock:
+            self._get(backend.name).in_flight += 1
+        return backend
+
+    def _score(self, name: str, expected: float) -> float:
+        stats = self._get(name)
+        # 没有数据的后端得分为 0，优先尝试
+        if stats.submit_seconds is None:
+            return 0.0
+        ratio = stats.render_ratio if stats.render_ratio is not None else 1.0
+        return stats.submit_seconds + ratio * expected
+
+    def record_submit(self, name: str, seconds: Optional[float]) -> None:
+        """记录一次创建请求；seconds 为 None 表示没有拿到耗时（请求失败）"""
+        with self._lock:
+            stats = self._get(name)
+            stats.in_flight = max(stats.in_flight - 1, 0)
+            if seconds is not None:
+                stats.submits += 1
+                stats.submit_seconds = self._ewma(stats.submit_seconds, seconds)
+
+    def record_completion(self, name: str, seconds: float, params: Optional[Dict[str, Any]] = None) -> None:
+        """记录一个任务从创建到完成的耗时"""
+        params = params or {}
+        expected = expected_render_seconds(params.get("model", "sora-2"), params.get("duration", "10"))
+        with self._lock:
+            stats = self._get(name)
+            stats.completions += 1
+            stats.render_ratio = self._ewma(stats.render_ratio, seconds / expected)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """各后端当前的统计数据"""
+        with self._lock:
+            return {
+                name: {
+                    "submit_seconds": stats.submit_seconds,
+                    "render_ratio": stats.render_ratio,
+                    "in_flight": stats.in_flight,
+                    "submits": stats.submits,
+                    "completions": stats.completions
+                }
+                for name, stats in self._stats.items()
+            }
+
+
+_router: Optional[BackendRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> BackendRouter:
+    """返回进程内共享的后端路由器"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = BackendRouter()
+    return _router
@@ -0,0 +1,209 @@
+"""角色（客串）本地索引
+
+通过 /sora/v1/characters 创建的角色按账号、平台和来源登记在本地 SQLite：
+来自已有任务时以 task_id 为键，来自视频 URL 时以视频内容的 SHA-256 为键（再加上时间范围），
+同一账号在同一平台上，同一段素材不会重复创建角色。角色属于创建它的账号（API Key 的哈希）和平台，
+一个插件进程服务多个租户，查找、列出和 @名称 替换都只看调用方自己的账号。
+URL 到内容哈希的对应也一并记录，同一个 URL 不必再次下载。
+
+每个角色可以有一个自定义名称，提示词里的 @名称 在提交前替换为平台的 @username
+（只替换为调用方在任务可能提交到的平台上创建的角色）。
+"""
+
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils.backends import Backend
+from utils.storage import data_path
+from utils.video_delivery import VideoStream
+
+DB_FILENAME = "characters.db"
+
+# 提示词中的角色引用：@name 或 @{name}（名称可以包含 . 和 -；邮箱中的 @ 不算）
+MENTION = re.compile(r"(?<![A-Za-z0-9_.])@(?:\{([^{}\s]+)\}|([\w.\-]*\w))")
+# 英文名称后面紧跟的字母数字说明名称还没结束（中文名称后面可以直接接正文）
+_ASCII_WORD = re.compile(r"[A-Za-z0-9_.\-]")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS characters (
+    source_key          TEXT PRIMARY KEY,
+    username            TEXT NOT NULL,
+    character_id        TEXT NOT NULL,
+    name                TEXT,
+    source_url          TEXT,
+    permalink           TEXT,
+    profile_picture_url TEXT,
+    backend             TEXT,
+    account             TEXT,
+    created_at          REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_characters_name ON characters (name);
+CREATE INDEX IF NOT EXISTS idx_characters_source_url ON characters (source_url)
+"""
+
+_COLUMNS = ("source_key", "username", "character_id", "name", "source_url",
+            "permalink", "profile_picture_url", "backend", "account", "created_at")
+
+
+def task_source_key(backend: Backend, task_id: str, timestamps: str) -> str:
+    return f"task:{backend.account}:{backend.name}:{task_id}:{timestamps}"
+
+
+def video_source_key(backend: Backend, digest: str, timestamps: str) -> str:
+    return f"video:{backend.account}:{backend.name}:{digest}:{timestamps}"
+
+
+def _owners(backends: Iterable[Backend]) -> str:
+    """按 (平台, 账号) 过滤的 SQL 条件；参数见 _owner_args"""
+    return " OR ".join("(backend = ? AND account = ?)" for _ in backends) or "0"
+
+
+def _owner_args(backends: Iterable[Backend]) -> tuple:
+    return tuple(value for backend in backends for value in (backend.name, backend.account))
+
+
+def hash_video(url: str) -> str:
+    """流式下载视频并计算 SHA-256（不把整个视频读进内存）"""
+    digest = hashlib.sha256()
+    for chunk in VideoStream(url).chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CharacterCache:
+    """角色来源 -> 角色信息的持久化索引"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or data_path(DB_FILENAME)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            # 旧版本创建的表没有 account 列，其中的角色不属于任何账号，不再被查到
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(characters)")}
+            if "account" not in columns:
+                self._conn.execute("ALTER TABLE characters ADD COLUMN account TEXT")
+
+    def get(self, source_key: str) -> Optional[Dict[str, Any]]:
+        return self._one("SELECT * FROM characters WHERE source_key = ?", (source_key,))
+
+    def find_by_url(self, url: str, timestamps: str, backend: Backend) -> Optional[Dict[str, Any]]:
+        """按视频 URL、时间范围、平台和账号查找（URL 对应的内容之前已经哈希过）"""
+        return self._one(
+            "SELECT * FROM characters WHERE source_url = ? AND backend = ? AND account = ? AND source_key LIKE ?",
+            (url, backend.name, backend.account, f"video:%:{timestamps}")
+        )
+
+    def mentions(self, backends: List[Backend]) -> Dict[str, str]:
+        """backends 的账号在这些平台上创建的角色：可引用的名称（自定义名称和 username）-> username，
+        同名时取最新创建的"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT name, username FROM characters WHERE {_owners(backends)} ORDER BY created_at",
+                _owner_args(backends)
+            ).fetchall()
+        known = {}
+        for row in rows:
+            known[row["username"]] = row["username"]
+            if row["name"]:
+                known[row["name"]] = row["username"]
+        return known
+
+    def put(
+        self,
+        source_key: str,
+        character: Dict[str, Any],
+        backend: Backend,
+        name: Optional[str] = None,
+        source_url: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """登记平台返回的角色（属于 backend 的平台和账号），返回登记后的记录"""
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO characters ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                (
+                    source_key, character["username"], character.get("id", ""), name or None, source_url,
+                    character.get("permalink", ""), character.get("profile_picture_url", ""),
+                    backend.name, backend.account, time.time()
+                )
+            )
+        return self.get(source_key)
+
+    def rename(self, source_key: str, name: str) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE characters SET name = ? WHERE source_key = ?", (name, source_key))
+
+    def list(self, backends: List[Backend], limit: int = 100) -> List[Dict[str, Any]]:
+        """backends 的账号在这些平台上创建的角色，最新的在前"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM characters WHERE {_owners(backends)} ORDER BY created_at DESC LIMIT ?",
+                _owner_args(backends) + (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _one(self, sql: str, args: tuple) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(sql, args).fetchone()
+        return dict(row) if row else None
+
+
+def resolve_mentions(prompt: str, backends: List[Backend], cache: Optional["CharacterCache"] = None) -> str:
+    """把提示词中的 @名称 替换为已登记角色的 @username，并保证前后有空格（平台要求）
+
+    backends 为任务可能提交到的平台（带调用方的 API Key），只替换为该账号在这些平台上创建的角色
+    """
+    if "@" not in prompt:
+        return prompt
+    known = (cache or get_character_cache()).mentions(backends)
+    if not known:
+        return prompt
+
+    def replace(match: re.Match) -> str:
+        if match.group(1):
+            name, rest = match.group(1), ""
+            if name not in known:
+                return match.group(0)
+        else:
+            # 中文提示词里名称后面常常直接接正文（@小猫在跳舞），取最长的已登记名称
+            token = match.group(2)
+            name = next(
+                (token[:end] for end in range(len(token), 0, -1)
+                 if token[:end] in known
+                 and not (_ASCII_WORD.match(token[end - 1]) and _ASCII_WORD.match(token[end:end + 1]))),
+                None
+            )
+            if name is None:
+                return match.group(0)
+            rest = token[len(name):]
+        start, end = match.span()
+        following = rest or prompt[end:end + 1]
+        before = " " if start > 0 and not prompt[start - 1].isspace() else ""
+        after = " " if following and not following[0].isspace() else ""
+        return f"{before}@{known[name]}{after}{rest}"
+
+    return MENTION.sub(replace, prompt)
+
+
+_cache: Optional[CharacterCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_character_cache() -> CharacterCache:
+    """返回进程内共享的角色索引"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CharacterCache()
+    return _cache
@@ -0,0 +1,200 @@
+"""按端点（后端 base_url）的熔断器
+
+统计最近 window 次调用中失败（连接错误、超时、5xx、过慢的调用）的比例，超过阈值后熔断：
+熔断期间的调用立即抛出 CircuitOpenError，不再等待 30 秒超时。熔断 open_seconds 秒后进入半开状态，
+放行少量探测请求，探测成功则恢复，失败则继续熔断。
+
+    closed ──失败率超过阈值──▶ open ──冷却结束──▶ half_open ──探测成功──▶ closed
+                                  ▲                     │
+                                  └──────探测失败───────┘
+"""
+
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from typing import Any, Dict, Optional
+
+import httpx
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """端点处于熔断状态，请求没有发出"""
+
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(f"端点暂时不可用（已熔断）: {endpoint}，{retry_after:.0f} 秒后重试")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+def is_endpoint_failure(error: BaseException) -> bool:
+    """判断异常是否说明端点本身不健康（4xx 是请求的问题，不计入）"""
+    if isinstance(error, CircuitOpenError):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status >= 500 or status == 429
+    return isinstance(error, httpx.TransportError)
+
+
+def is_safe_to_fail_over(error: BaseException) -> bool:
+    """判断创建请求失败后能否换一个端点重新提交
+
+    只有确定请求没有被服务端处理时才能换端点，否则可能重复创建（重复计费）：
+    熔断、连接失败、限流（429）和服务不可用（503）。读超时和其他 5xx 不确定任务是否已创建，不换端点。
+    """
+    if isinstance(error, (CircuitOpenError, httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in (429, 503)
+    return False
+
+
+class CircuitBreaker:
+    """单个端点的熔断器（线程安全）"""
+
+    def __init__(
+        self,
+        endpoint: str,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 20.0,
+        open_seconds: float = 30.0,
+        half_open_probes: int = 1,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.endpoint = endpoint
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._clock = clock
+        self._outcomes: deque = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def _refresh(self) -> None:
+        # 冷却结束后进入半开状态
+        if self._state == OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probing = 0
+
+    def retry_after(self) -> float:
+        """距离允许下一次探测还有多少秒"""
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(self.open_seconds - (self._clock() - self._opened_at), 0.0)
+
+    def is_available(self) -> bool:
+        """当前能否放行请求（不占用半开状态的探测名额）"""
+        with self._lock:
+            self._refresh()
+            if self._state == HALF_OPEN:
+                return self._probing < self.half_open_probes
+            return self._state == CLOSED
+
+    def allow_request(self) -> bool:
+        """请求发出前调用；返回 True 时调用方必须随后调用 record_success、record_failure 或 release"""
+        with self._lock:
+            self._refresh()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probing < self.half_open_probes:
+                self._probing += 1
+                return True
+            return False
+
+    def record_success(self, latency: float = 0.0) -> None:
+        """记录一次成功的调用；超过 slow_call_seconds 的调用按失败计"""
+        self._record(latency >= self.slow_call_seconds)
+
+    def record_failure(self) -> None:
+        self._record(True)
+
+    def release(self) -> None:
+        """请求没有结果（例如被取消）时调用：归还半开状态的探测名额，不记录成功或失败"""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probing = max(self._probing - 1, 0)
+
+    def _record(self, failed: bool) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probing = max(self._probing - 1, 0)
+                if failed:
+                    self._trip()
+                else:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                return
+            if self._state == OPEN:
+                # 熔断前已经发出的请求，结果不再影响状态
+                return
+            self._outcomes.append(failed)
+            if len(self._outcomes) >= self.min_calls:
+                if sum(self._outcomes) / len(self._outcomes) >= self.failure_rate:
+                    self._trip()
+
+    def _trip(self) -> None:
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._outcomes.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh()
+            return {
+                "state": self._state,
+                "calls": len(self._outcomes),
+                "failures": sum(self._outcomes)
+            }
+
+
+class CircuitBreakers:
+    """按端点索引的熔断器集合"""
+
+    def __init__(self, **options: Any):
+        self._options = options
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, endpoint: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = self._breakers[endpoint] = CircuitBreaker(endpoint, **self._options)
+            return breaker
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {endpoint: breaker.snapshot() for endpoint, breaker in breakers.items()}
+
+
+_breakers: Optional[CircuitBreakers] = None
+_breakers_lock = threading.Lock()
+
+
+def get_breakers() -> CircuitBreakers:
+    """返回进程内共享的熔断器集合"""
+    global _breakers
+    if _breakers is None:
+        with _breakers_lock:
+            if _breakers is None:
+                _breakers = CircuitBreakers()
+    return _breakers
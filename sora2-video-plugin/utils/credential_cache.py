@@ -0,0 +1,81 @@
+"""凭证校验结果缓存
+
+Provider 的凭证校验（保存配置、刷新凭证时都会触发）按“探测地址 + API Key”的哈希缓存结果：
+有效的 Key 缓存 SORA2_CREDENTIAL_TTL 秒，返回 401 / 403 的 Key 缓存 SORA2_CREDENTIAL_INVALID_TTL 秒
+（负缓存，避免反复用错误的 Key 请求平台）。网络错误和无法判断的状态码（5xx、404 等）不缓存，下次校验会重新探测。
+缓存中只保存哈希，不保存 Key 本身。
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections.abc import Callable
+from typing import Dict, Optional, Tuple
+
+# 默认有效结果缓存 10 分钟，无效结果缓存 1 分钟
+VALID_TTL = float(os.environ.get("SORA2_CREDENTIAL_TTL", "600"))
+INVALID_TTL = float(os.environ.get("SORA2_CREDENTIAL_INVALID_TTL", "60"))
+
+
+def credential_key(probe_url: str, api_key: str) -> str:
+    return hashlib.sha256(f"{probe_url}\n{api_key}".encode("utf-8")).hexdigest()
+
+
+class CredentialCache:
+    """线程安全的校验结果缓存：键 -> (过期时间, 是否有效)"""
+
+    def __init__(
+        self,
+        valid_ttl: float = VALID_TTL,
+        invalid_ttl: float = INVALID_TTL,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.valid_ttl = valid_ttl
+        self.invalid_ttl = invalid_ttl
+        self._clock = clock
+        self._entries: Dict[str, Tuple[float, bool]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, probe_url: str, api_key: str) -> Optional[bool]:
+        """返回未过期的校验结果，没有时返回 None"""
+        key = credential_key(probe_url, api_key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, valid = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                return None
+            return valid
+
+    def put(self, probe_url: str, api_key: str, valid: bool) -> None:
+        ttl = self.valid_ttl if valid else self.invalid_ttl
+        with self._lock:
+            now = self._clock()
+            # 顺便清掉过期条目，Key 轮换不会让缓存无限增长
+            for key in [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]:
+                del self._entries[key]
+            self._entries[credential_key(probe_url, api_key)] = (now + ttl, valid)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_cache: Optional[CredentialCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_credential_cache() -> CredentialCache:
+    """返回进程内共享的校验结果缓存"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CredentialCache()
+    return _cache
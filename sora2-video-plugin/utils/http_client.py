@@ -0,0 +1,175 @@
+"""进程级共享 HTTP 客户端
+
+视频任务的创建和查询由 asyncio 轮询引擎发出，使用 create_async_client() 创建的异步连接池；
+凭证校验、参考图上传、视频下载等同步请求通过本模块复用同一个 requests.Session：
+- keep-alive 长连接，避免每次请求都重新 TCP+TLS 握手
+- 每个 host 一个有界连接池（超出上限时阻塞等待空闲连接）
+- 轮询引擎第一次使用时用 warm_up_async() 预热异步连接池
+- 通过 pool_stats() 查看两个连接池的统计
+"""
+
+import asyncio
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_BASE_URL = "https://ai.t8star.cn"
+
+# 缓存的 host 连接池数量 / 每个 host 的最大连接数
+POOL_CONNECTIONS = int(os.environ.get("SORA2_HTTP_POOL_CONNECTIONS", "4"))
+POOL_MAXSIZE = int(os.environ.get("SORA2_HTTP_POOL_MAXSIZE", "32"))
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "errors": 0, "async_requests": 0, "warmups": 0}
+# 最近一次 create_async_client() 创建的客户端（由轮询引擎持有），只用于统计
+_async_client: Optional[httpx.AsyncClient] = None
+
+
+def get_session() -> requests.Session:
+    """返回进程内唯一的 Session，首次调用时创建"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=POOL_CONNECTIONS,
+                    pool_maxsize=POOL_MAXSIZE,
+                    pool_block=True,
+                    max_retries=0
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers["Connection"] = "keep-alive"
+                _session = session
+    return _session
+
+
+def request(method: str, url: str, **kwargs: Any) -> requests.Response:
+    """通过共享连接池发送请求"""
+    with _stats_lock:
+        _stats["requests"] += 1
+    try:
+        return get_session().request(method, url, **kwargs)
+    except requests.RequestException:
+        with _stats_lock:
+            _stats["errors"] += 1
+        raise
+
+
+def get(url: str, **kwargs: Any) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs: Any) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def create_async_client(**kwargs: Any) -> httpx.AsyncClient:
+    """创建异步客户端，连接池上限与同步 Session 保持一致
+
+    AsyncClient 绑定创建它的事件循环，由调用方（轮询引擎）持有和关闭。
+    """
+    global _async_client
+    limits = httpx.Limits(
+        max_connections=POOL_MAXSIZE * POOL_CONNECTIONS,
+        max_keepalive_connections=POOL_MAXSIZE
+    )
+    client = httpx.AsyncClient(
+        limits=limits,
+        headers={"Connection": "keep-alive"},
+        event_hooks={"request": [_count_async_request]},
+        **kwargs
+    )
+    _async_client = client
+    return client
+
+
+async def _count_async_request(request: httpx.Request) -> None:
+    with _stats_lock:
+        _stats["async_requests"] += 1
+
+
+def warmup_enabled() -> bool:
+    """是否预热连接，可通过环境变量 SORA2_HTTP_WARMUP=0 关闭（例如测试环境）"""
+    return os.environ.get("SORA2_HTTP_WARMUP", "1") != "0"
+
+
+async def warm_up_async(client: httpx.AsyncClient, base_url: str, connections: int = 2) -> None:
+    """在 client 所在的事件循环中预先建立到 base_url 的连接，放回连接池供后续请求复用"""
+    async def _open_connection():
+        try:
+            # HEAD 请求只为建立连接，忽略响应状态
+            await client.head(base_url, timeout=5)
+        except httpx.HTTPError:
+            return
+        with _stats_lock:
+            _stats["warmups"] += 1
+
+    await asyncio.gather(*[_open_connection() for _ in range(max(connections, 1))])
+
+
+def async_pool_stats(client: Optional[httpx.AsyncClient]) -> Dict[str, Dict[str, int]]:
+    """异步客户端每个 host 的连接数和空闲连接数"""
+    # httpx 没有公开连接池统计，读取底层 httpcore 连接池（取不到时返回空）
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    hosts: Dict[str, Dict[str, int]] = {}
+    for connection in list(getattr(pool, "connections", None) or []):
+        origin = getattr(connection, "_origin", None)
+        if origin is None:
+            continue
+        name = f"{origin.scheme.decode()}://{origin.host.decode()}:{origin.port}"
+        entry = hosts.setdefault(name, {"connections": 0, "idle": 0})
+        entry["connections"] += 1
+        if connection.is_idle():
+            entry["idle"] += 1
+    return hosts
+
+
+def pool_stats() -> Dict[str, Any]:
+    """返回请求计数和每个 host 连接池（同步 Session 和异步客户端）的统计信息"""
+    with _stats_lock:
+        stats: Dict[str, Any] = dict(_stats)
+
+    hosts = {}
+    if _session is not None:
+        for prefix in ("https://", "http://"):
+            adapter = _session.adapters.get(prefix)
+            if adapter is None:
+                continue
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                name = f"{key.key_scheme}://{key.key_host}:{key.key_port}"
+                hosts[name] = {
+                    "connections_created": pool.num_connections,
+                    "requests": pool.num_requests,
+                    "idle": pool.pool.qsize() if pool.pool is not None else 0,
+                    "maxsize": pool.pool.maxsize if pool.pool is not None else 0
+                }
+            # 同一个 adapter 挂在两个前缀上，只统计一次
+            break
+
+    stats["pool_connections"] = POOL_CONNECTIONS
+    stats["pool_maxsize"] = POOL_MAXSIZE
+    stats["hosts"] = hosts
+    stats["async_max_connections"] = POOL_MAXSIZE * POOL_CONNECTIONS
+    stats["async_hosts"] = async_pool_stats(_async_client)
+    return stats
+
+
+def close() -> None:
+    """关闭共享 Session（释放所有连接）"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -0,0 +1,205 @@
+"""图生视频的参考图预处理
+
+用户给的图片 URL 可能很慢或很大（例如 2000px 的附件），直接交给平台会拖慢任务。
+提交前先在本地处理：
+
+1. 并发下载所有参考图
+2. 缩小到模型实际使用的分辨率并重新压缩（需要 Pillow，没有安装时保留原图）
+3. 上传到图床（/api/upload），用图床 URL 替换原 URL
+4. 按图片内容的哈希缓存图床 URL，同一张图重复使用时只处理一次
+
+任何一步失败时保留原 URL，不影响任务提交。
+"""
+
+import hashlib
+import io
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional
+
+from utils import http_client
+from utils.storage import data_path
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow 是可选依赖
+    Image = None
+    ImageOps = None
+
+DB_FILENAME = "uploads.db"
+
+# 各模型输出视频的长边像素（sora-2 为 720p，sora-2-pro 为 1792x1024）
+TARGET_LONG_EDGE = {"sora-2": 1280, "sora-2-pro": 1792}
+
+# 单张图片的下载上限，避免超大文件占满插件内存
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+JPEG_QUALITY = 88
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    cache_key  TEXT PRIMARY KEY,
+    url        TEXT NOT NULL,
+    created_at REAL NOT NULL
+)
+"""
+
+
+class UploadCache:
+    """内容哈希 -> 图床 URL 的持久化缓存"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or data_path(DB_FILENAME)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(_SCHEMA)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT url FROM uploads WHERE cache_key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, url: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO uploads (cache_key, url, created_at) VALUES (?, ?, ?)",
+                (key, url, time.time())
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def downscale(data: bytes, long_edge: int) -> bytes:
+    """把图片缩小到长边不超过 long_edge 并重新压缩；不需要处理或无法处理时返回原数据"""
+    if Image is None:
+        return data
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image = ImageOps.exif_transpose(image)
+            if max(image.size) <= long_edge and len(data) <= 1024 * 1024:
+                return data
+            image.thumbnail((long_edge, long_edge))
+            output = io.BytesIO()
+            # 带透明通道的图保留 PNG，其余转为 JPEG
+            if image.mode in ("RGBA", "LA") or "transparency" in image.info:
+                image.save(output, format="PNG", optimize=True)
+            else:
+                image.convert("RGB").save(output, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+    except Exception:
+        return data
+    processed = output.getvalue()
+    return processed if len(processed) < len(data) else data
+
+
+def _extract_url(data: Any) -> str:
+    """从图床响应中取出图片 URL（兼容 {"url"}、{"data": {"url"}}、{"data": "..."}）"""
+    if isinstance(data, str):
+        return data
+    if isinstance(data, dict):
+        for key in ("url", "link", "src"):
+            if isinstance(data.get(key), str) and data[key]:
+                return data[key]
+        if "data" in data:
+            return _extract_url(data["data"])
+    raise ValueError("图床响应中没有图片 URL")
+
+
+def _sniff(data: bytes):
+    """按文件头判断图片格式，返回 (扩展名, Content-Type)"""
+    if data.startswith(b"\x89PNG"):
+        return "png", "image/png"
+    if data.startswith(b"GIF8"):
+        return "gif", "image/gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp", "image/webp"
+    return "jpg", "image/jpeg"
+
+
+class ImageIngestor:
+    """下载、缩放、上传参考图，并按内容哈希缓存上传结果"""
+
+    def __init__(
+        self,
+        upload_url: str,
+        api_key: str,
+        cache: Optional[UploadCache] = None,
+        max_workers: int = 4
+    ):
+        self.upload_url = upload_url
+        self.api_key = api_key
+        self.cache = cache or get_upload_cache()
+        self.max_workers = max_workers
+
+    def ingest(self, urls: List[str], model: str = "sora-2") -> List[str]:
+        """并发处理一组图片，返回（按原顺序）替换后的 URL"""
+        if not urls:
+            return []
+        long_edge = TARGET_LONG_EDGE.get(model, TARGET_LONG_EDGE["sora-2"])
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(urls))) as executor:
+            return list(executor.map(lambda url: self.ingest_one(url, long_edge), urls))
+
+    def ingest_one(self, url: str, long_edge: int) -> str:
+        """处理单张图片，失败时返回原 URL"""
+        # 已经在图床上的图片和非 http(s) 的输入原样使用
+        if not url.startswith(("http://", "https://")) or url.startswith(self._host()):
+            return url
+        try:
+            data = self._download(url)
+            key = f"{hashlib.sha256(data).hexdigest()}:{long_edge}:{self._host()}"
+            cached = self.cache.get(key)
+            if cached:
+                return cached
+            uploaded = self._upload(downscale(data, long_edge))
+            self.cache.put(key, uploaded)
+            return uploaded
+        except Exception:
+            return url
+
+    def _host(self) -> str:
+        scheme, _, rest = self.upload_url.partition("://")
+        return f"{scheme}://{rest.split('/', 1)[0]}"
+
+    def _download(self, url: str) -> bytes:
+        response = http_client.get(url, timeout=30, stream=True)
+        try:
+            response.raise_for_status()
+            chunks = []
+            size = 0
+            for chunk in response.iter_content(64 * 1024):
+                size += len(chunk)
+                if size > MAX_IMAGE_BYTES:
+                    raise ValueError(f"图片超过 {MAX_IMAGE_BYTES // (1024 * 1024)}MB: {url}")
+                chunks.append(chunk)
+            return b"".join(chunks)
+        finally:
+            response.close()
+
+    def _upload(self, data: bytes) -> str:
+        extension, content_type = _sniff(data)
+        response = http_client.post(
+            self.upload_url,
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            files={"file": (f"image.{extension}", data, content_type)},
+            timeout=60
+        )
+        response.raise_for_status()
+        return _extract_url(response.json())
+
+
+_cache: Optional[UploadCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_upload_cache() -> UploadCache:
+    """返回进程内共享的上传缓存"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = UploadCache()
+    return _cache
@@ -0,0 +1,174 @@
+"""历史完成耗时（SQLite）和由它得出的 ETA、首次查询时间和超时
+
+按 (backend, model, duration, aspect_ratio) 保存最近 MAX_SAMPLES 个任务从创建成功到完成的耗时。
+同一组合的渲染耗时分布很稳定，引擎据此：
+
+- 估算 ETA：任务创建后在 created 事件中带上 eta_seconds（历史中位数），工具随 pending 消息返回
+- 推迟第一次查询：历史上最快的 FIRST_POLL_QUANTILE 的任务完成之前几乎不可能完成，此前不查询
+- 确定超时：历史 TIMEOUT_QUANTILE 分位数的 TIMEOUT_FACTOR 倍，限制在 [MIN_TIMEOUT, MAX_TIMEOUT]；
+  Pro 长视频不会被固定的 300 秒提前截断，短视频卡住时也不必白等
+
+同一组合的样本少于 MIN_SAMPLES 时不做估算：不推迟第一次查询，ETA 和超时按模型和时长的
+典型渲染耗时（utils.polling）估算。
+"""
+
+import math
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from utils.polling import expected_render_seconds
+from utils.storage import data_path
+
+DB_FILENAME = "latency.db"
+
+# 每个组合保留的样本数 / 开始估算所需的样本数
+MAX_SAMPLES = 100
+MIN_SAMPLES = 5
+
+FIRST_POLL_QUANTILE = 0.1
+TIMEOUT_QUANTILE = 0.95
+TIMEOUT_FACTOR = 1.5
+
+# 超时的范围（秒）；没有历史时至少等待 DEFAULT_TIMEOUT，或典型渲染耗时的 FALLBACK_TIMEOUT_FACTOR 倍
+MIN_TIMEOUT = 120.0
+MAX_TIMEOUT = 1800.0
+DEFAULT_TIMEOUT = 300.0
+FALLBACK_TIMEOUT_FACTOR = 2.5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS completions (
+    backend      TEXT NOT NULL,
+    model        TEXT NOT NULL,
+    duration     TEXT NOT NULL,
+    aspect_ratio TEXT NOT NULL,
+    seconds      REAL NOT NULL,
+    finished_at  REAL NOT NULL
+)
+"""
+
+_INDEX = """
+CREATE INDEX IF NOT EXISTS completions_key
+ON completions (backend, model, duration, aspect_ratio, finished_at)
+"""
+
+Key = Tuple[str, str, str, str]
+
+
+def history_key(backend: str, params: Optional[Dict[str, Any]]) -> Key:
+    params = params or {}
+    return (
+        backend,
+        str(params.get("model") or "sora-2"),
+        str(params.get("duration") or "10"),
+        str(params.get("aspect_ratio") or "16:9"),
+    )
+
+
+class LatencyEstimate:
+    """一个组合的历史完成耗时分布"""
+
+    def __init__(self, samples: List[float]):
+        self.samples = sorted(samples)
+
+    @property
+    def count(self) -> int:
+        return len(self.samples)
+
+    def quantile(self, q: float) -> float:
+        """最近秩分位数（q 取 0~1）"""
+        rank = max(math.ceil(q * len(self.samples)), 1)
+        return self.samples[min(rank, len(self.samples)) - 1]
+
+    @property
+    def median(self) -> float:
+        return self.quantile(0.5)
+
+
+class LatencyHistory:
+    """完成耗时的历史记录，单连接 + 锁，可在多线程间共享；读取走内存中的副本"""
+
+    def __init__(self, path: Optional[str] = None, max_samples: int = MAX_SAMPLES, min_samples: int = MIN_SAMPLES):
+        self.path = path or data_path(DB_FILENAME)
+        self.max_samples = max_samples
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._samples: Dict[Key, Deque[float]] = {}
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(_SCHEMA)
+            self._conn.execute(_INDEX)
+
+    def _load(self, key: Key) -> Deque[float]:
+        # 调用方持有锁
+        samples = self._samples.get(key)
+        if samples is None:
+            rows = self._conn.execute(
+                "SELECT seconds FROM completions WHERE backend = ? AND model = ? AND duration = ? AND aspect_ratio = ? "
+                "ORDER BY finished_at DESC LIMIT ?",
+                (*key, self.max_samples)
+            ).fetchall()
+            samples = self._samples[key] = deque(reversed([row[0] for row in rows]), maxlen=self.max_samples)
+        return samples
+
+    def record(self, backend: str, params: Optional[Dict[str, Any]], seconds: float) -> None:
+        """记录一个任务从创建成功到完成的耗时，只保留每个组合最近的 max_samples 个"""
+        key = history_key(backend, params)
+        with self._lock:
+            self._load(key).append(seconds)
+            self._conn.execute("INSERT INTO completions VALUES (?, ?, ?, ?, ?, ?)", (*key, seconds, time.time()))
+            self._conn.execute(
+                "DELETE FROM completions WHERE rowid IN ("
+                "SELECT rowid FROM completions WHERE backend = ? AND model = ? AND duration = ? AND aspect_ratio = ? "
+                "ORDER BY finished_at DESC LIMIT -1 OFFSET ?)",
+                (*key, self.max_samples)
+            )
+
+    def estimate(self, backend: str, params: Optional[Dict[str, Any]]) -> Optional[LatencyEstimate]:
+        """组合的完成耗时分布，样本不足 min_samples 时为 None"""
+        with self._lock:
+            samples = list(self._load(history_key(backend, params)))
+        return LatencyEstimate(samples) if len(samples) >= self.min_samples else None
+
+    def eta_seconds(self, backend: str, params: Optional[Dict[str, Any]]) -> float:
+        """刚创建的任务预计多少秒后完成"""
+        estimate = self.estimate(backend, params)
+        if estimate is not None:
+            return estimate.median
+        params = params or {}
+        return expected_render_seconds(params.get("model", "sora-2"), params.get("duration", "10"))
+
+    def first_poll_delay(self, backend: str, params: Optional[Dict[str, Any]]) -> float:
+        """创建后第一次查询前等待的秒数，没有历史时为 0"""
+        estimate = self.estimate(backend, params)
+        return estimate.quantile(FIRST_POLL_QUANTILE) if estimate is not None else 0.0
+
+    def timeout(self, backend: str, params: Optional[Dict[str, Any]]) -> float:
+        """等待任务完成的超时秒数"""
+        estimate = self.estimate(backend, params)
+        if estimate is not None:
+            return min(max(estimate.quantile(TIMEOUT_QUANTILE) * TIMEOUT_FACTOR, MIN_TIMEOUT), MAX_TIMEOUT)
+        params = params or {}
+        expected = expected_render_seconds(params.get("model", "sora-2"), params.get("duration", "10"))
+        return min(max(expected * FALLBACK_TIMEOUT_FACTOR, DEFAULT_TIMEOUT), MAX_TIMEOUT)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_history: Optional[LatencyHistory] = None
+_history_lock = threading.Lock()
+
+
+def get_latency_history() -> LatencyHistory:
+    """返回进程内共享的完成耗时历史"""
+    global _history
+    if _history is None:
+        with _history_lock:
+            if _history is None:
+                _history = LatencyHistory()
+    return _history
@@ -0,0 +1,297 @@
+"""生成耗时的指标和追踪
+
+每个任务的轮询流有一个 TaskTrace，把一次生成的耗时拆成几段：
+
+    submit  提交耗时：创建请求（包括重试和换端点）
+    queue   排队时间：创建成功到开始渲染（第一次查询到 IN_PROGRESS）
+    render  渲染时间：开始渲染到完成 / 失败
+
+并统计查询次数、收发的字节数和请求错误数。状态变化的时间优先取响应中的 status_update_time
+（平台记录的状态变化时间），没有时取查询到变化的时间（误差不超过一个轮询间隔）。
+任务结束时 summary() 随终止事件返回，工具把它放在最终结果的 "timing" 中。
+
+进程内的汇总（Metrics）按 backend / model / duration 分组：提交耗时、排队时间和渲染时间是直方图，
+查询次数、字节数、错误数和结束的任务数是计数器。可以导出为 Prometheus 文本格式
+（插件端点 /sora2/metrics）或 JSON（/sora2/metrics?format=json）。
+设置 SORA2_METRICS_LOG（stderr 或文件路径）后，每个任务结束时再写一行 JSON 日志。
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# 直方图的桶（秒）
+SUBMIT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+STAGE_BUCKETS = (5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1200.0)
+
+HISTOGRAMS = {
+    "sora2_submit_seconds": ("Time to create a task, including retries and fail-over", SUBMIT_BUCKETS),
+    "sora2_queue_seconds": ("Time from task creation until rendering started", STAGE_BUCKETS),
+    "sora2_render_seconds": ("Time from rendering start until the task finished", STAGE_BUCKETS),
+}
+
+COUNTERS = {
+    "sora2_tasks_total": "Finished task poll streams by outcome",
+    "sora2_polls_total": "Task status queries",
+    "sora2_transfer_bytes_total": "Request and response body bytes",
+    "sora2_request_errors_total": "Failed requests, including attempts that were retried",
+}
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_logger = logging.getLogger("sora2.metrics")
+
+
+def task_labels(backend: Optional[str], params: Optional[dict]) -> Labels:
+    params = params or {}
+    return (
+        ("backend", backend or "unknown"),
+        ("model", str(params.get("model") or "unknown")),
+        ("duration", str(params.get("duration") or "unknown")),
+    )
+
+
+def status_time(result: Dict[str, Any], observed: float) -> float:
+    """状态变化的时间：响应中的 status_update_time（秒、毫秒或 ISO 8601），无法使用时为观察到的时间"""
+    value = result.get("status_update_time")
+    if value is None or value == "":
+        return observed
+    try:
+        stamp = float(value)
+        if stamp > 1e12:
+            stamp /= 1000
+    except (TypeError, ValueError):
+        try:
+            stamp = datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            return observed
+    # 晚于观察时间（时钟偏差）的时间戳不可信
+    return stamp if 0 < stamp <= observed else observed
+
+
+class Metrics:
+    """进程内的计数器和直方图（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        # (name, labels) -> [各桶计数, 总和, 次数]
+        self._histograms: Dict[Tuple[str, Labels], list] = {}
+
+    def inc(self, name: str, labels: Labels, value: float = 1) -> None:
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, labels: Labels, value: float) -> None:
+        buckets = HISTOGRAMS[name][1]
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(buckets), 0.0, 0]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def value(self, name: str, **labels: str) -> float:
+        """计数器的值（按给出的标签过滤后求和）"""
+        with self._lock:
+            return sum(
+                value for (counter, counter_labels), value in self._counters.items()
+                if counter == name and labels.items() <= dict(counter_labels).items()
+            )
+
+    def snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": count,
+                    "sum": round(total, 6),
+                    "buckets": dict(zip((str(bound) for bound in HISTOGRAMS[name][1]), counts))
+                }
+                for (name, labels), (counts, total, count) in sorted(self._histograms.items())
+            ]
+        return {"counters": counters, "histograms": histograms}
+
+    def render_prometheus(self) -> str:
+        """Prometheus 文本格式（0.0.4）"""
+        snapshot = self.snapshot()
+        lines: List[str] = []
+        for name, help_text in COUNTERS.items():
+            samples = [item for item in snapshot["counters"] if item["name"] == name]
+            if not samples:
+                continue
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            lines += [f"{name}{_format_labels(item['labels'])} {_format_value(item['value'])}" for item in samples]
+        for name, (help_text, _) in HISTOGRAMS.items():
+            samples = [item for item in snapshot["histograms"] if item["name"] == name]
+            if not samples:
+                continue
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for item in samples:
+                # 各桶的计数本身已经是累计的（value <= bound）
+                for bound, count in item["buckets"].items():
+                    lines.append(f"{name}_bucket{_format_labels({**item['labels'], 'le': bound})} {count}")
+                lines.append(f"{name}_bucket{_format_labels({**item['labels'], 'le': '+Inf'})} {item['count']}")
+                lines.append(f"{name}_sum{_format_labels(item['labels'])} {_format_value(item['sum'])}")
+                lines.append(f"{name}_count{_format_labels(item['labels'])} {item['count']}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    def escape(value: str) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class TaskTrace:
+    """一个任务的耗时和请求统计（只在事件循环线程内修改）
+
+    提交时由创建任务的调用建立；按 task_id 恢复轮询时由第一个等待方建立，此时没有提交耗时和创建时间，
+    排队时间无法得知。
+    """
+
+    def __init__(
+        self,
+        metrics: Metrics,
+        params: Optional[dict] = None,
+        backend: Optional[str] = None,
+        clock=time.time
+    ):
+        self.metrics = metrics
+        self.params = params
+        self.backend = backend
+        self._clock = clock
+        self.submit_seconds: Optional[float] = None
+        self.created_at: Optional[float] = None
+        self.polls = 0
+        self.bytes = 0
+        self.errors = 0
+        # 状态 -> 第一次进入该状态的时间
+        self.transitions: Dict[str, float] = {}
+        self._status: Optional[str] = None
+        self.outcome: Optional[str] = None
+
+    @property
+    def labels(self) -> Labels:
+        return task_labels(self.backend, self.params)
+
+    def record_submit(self, seconds: float) -> None:
+        """创建成功：记录提交耗时，从此刻开始计算排队时间"""
+        self.submit_seconds = seconds
+        self.created_at = self._clock()
+        self.metrics.observe("sora2_submit_seconds", self.labels, seconds)
+
+    def record_request(self, transferred: int, error: bool = False) -> None:
+        self.bytes += transferred
+        self.metrics.inc("sora2_transfer_bytes_total", self.labels, transferred)
+        if error:
+            self.errors += 1
+            self.metrics.inc("sora2_request_errors_total", self.labels)
+
+    def observe(self, result: Dict[str, Any]) -> None:
+        """记录一次查询到的状态"""
+        self.polls += 1
+        self.metrics.inc("sora2_polls_total", self.labels)
+        status = result.get("status")
+        if status and status != self._status:
+            self._status = status
+            self.transitions.setdefault(status, status_time(result, self._clock()))
+
+    @property
+    def queue_seconds(self) -> Optional[float]:
+        started = self.transitions.get("IN_PROGRESS")
+        if started is None or self.created_at is None:
+            return None
+        return max(started - self.created_at, 0.0)
+
+    @property
+    def render_seconds(self) -> Optional[float]:
+        started = self.transitions.get("IN_PROGRESS")
+        finished = self.transitions.get("SUCCESS", self.transitions.get("FAILURE"))
+        if started is None or finished is None:
+            return None
+        return max(finished - started, 0.0)
+
+    def summary(self) -> Dict[str, Any]:
+        def seconds(value: Optional[float]) -> Optional[float]:
+            return round(value, 3) if value is not None else None
+
+        return {
+            "submit_seconds": seconds(self.submit_seconds),
+            "queue_seconds": seconds(self.queue_seconds),
+            "render_seconds": seconds(self.render_seconds),
+            "polls": self.polls,
+            "bytes": self.bytes,
+            "errors": self.errors
+        }
+
+    def finish(self, outcome: str, task_id: Optional[str] = None) -> None:
+        """轮询结束：记录排队和渲染时间、结束的任务数，并写一行 JSON 日志（只记录一次）"""
+        if self.outcome is not None:
+            return
+        self.outcome = outcome
+        labels = self.labels
+        for name, value in (("sora2_queue_seconds", self.queue_seconds), ("sora2_render_seconds", self.render_seconds)):
+            if value is not None and math.isfinite(value):
+                self.metrics.observe(name, labels, value)
+        self.metrics.inc("sora2_tasks_total", labels + (("outcome", outcome),))
+        if _logger.isEnabledFor(logging.INFO):
+            _logger.info(json.dumps(
+                {"event": "task", "task_id": task_id, "outcome": outcome, **dict(labels), **self.summary()},
+                ensure_ascii=False
+            ))
+
+
+def _configure_log() -> None:
+    """SORA2_METRICS_LOG=stderr 或文件路径时把任务日志写到那里（每行一个 JSON 对象）"""
+    target = os.environ.get("SORA2_METRICS_LOG", "").strip()
+    if not target or _logger.handlers:
+        return
+    # 插件的 stdout 是和 Dify 通信的通道，不能写日志
+    handler = logging.StreamHandler() if target == "stderr" else logging.FileHandler(target, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    _logger.addHandler(handler)
+    _logger.setLevel(logging.INFO)
+    _logger.propagate = False
+
+
+_metrics: Optional[Metrics] = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> Metrics:
+    """返回进程内共享的指标"""
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _configure_log()
+                _metrics = Metrics()
+    return _metrics
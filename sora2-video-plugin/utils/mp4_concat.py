@@ -0,0 +1,539 @@
+"""MP4 容器级拼接（纯 Python，不重新编码）
+
+故事板的各个镜头由同一个模型以相同的画面比例生成，编码参数一致，
+可以直接在容器层面把多个 MP4 首尾相接：
+
+1. 读取每个文件的 moov（只有几百 KB），解析每条轨道的样本表
+   （stts / ctts / stss / stsz / stsc / stco，编码描述 stsd）
+2. 按轨道顺序把样本表接起来：样本编号、chunk 编号依次平移，chunk 偏移重新计算；
+   编码描述不同时（例如 SPS/PPS 有差别）追加为新的 sample entry，由 stsc 引用
+3. 输出 ftyp + moov + mdat，moov 放在最前面（faststart），
+   各文件的 mdat 数据按 1MB 的块依次复制，不会把视频整个读进内存
+
+平台只能按固定时长（10 / 15 / 25 秒）生成，指定各段的时长时，拼接前先在样本边界截断每条轨道：
+只保留解码时间早于该时长的样本（最多比指定时长多出不到一帧），被截掉的样本数据仍留在 mdat 中，
+只是不再被样本表引用。截断不重新编码，B 帧视频末尾显示时间晚于截断点的几帧会被丢弃。
+
+只支持普通（非分片）MP4，轨道数、轨道类型和时间刻度必须一致，否则抛出 Mp4ConcatError。
+编辑列表只保留第一个文件的，后面各段开头的音频 priming（约 20ms）不会被裁掉。
+"""
+
+import math
+import struct
+from typing import BinaryIO, List, Optional, Sequence, Tuple
+
+# 需要展开解析的容器 box，其余 box 保留原始字节
+CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"edts"}
+
+COPY_BUFFER = 1024 * 1024
+
+UINT32_MAX = 0xFFFFFFFF
+
+
+class Mp4ConcatError(Exception):
+    """输入文件无法在容器层面拼接"""
+
+
+class Box:
+    """一个 MP4 box：容器 box 有 children，其余 box 只有 data（不含 box 头）"""
+
+    __slots__ = ("type", "data", "children")
+
+    def __init__(self, box_type: bytes, data: bytes = b"", children: Optional[List["Box"]] = None):
+        self.type = box_type
+        self.data = data
+        self.children = children
+
+    def find(self, box_type: bytes) -> Optional["Box"]:
+        for child in self.children or []:
+            if child.type == box_type:
+                return child
+        return None
+
+    def find_all(self, box_type: bytes) -> List["Box"]:
+        return [child for child in self.children or [] if child.type == box_type]
+
+    def serialize(self) -> bytes:
+        if self.children is not None:
+            payload = b"".join(child.serialize() for child in self.children)
+        else:
+            payload = self.data
+        size = len(payload) + 8
+        if size > UINT32_MAX:
+            return struct.pack(">I4sQ", 1, self.type, size + 8) + payload
+        return struct.pack(">I4s", size, self.type) + payload
+
+
+def parse_boxes(data: bytes) -> List[Box]:
+    """解析一段字节中的 box 序列，容器 box 递归展开"""
+    boxes = []
+    pos = 0
+    while pos + 8 <= len(data):
+        size, box_type = struct.unpack_from(">I4s", data, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = len(data) - pos
+        if size < header or pos + size > len(data):
+            raise Mp4ConcatError(f"box {box_type!r} 的长度无效")
+        payload = data[pos + header:pos + size]
+        if box_type in CONTAINERS:
+            boxes.append(Box(box_type, children=parse_boxes(payload)))
+        else:
+            boxes.append(Box(box_type, payload))
+        pos += size
+    return boxes
+
+
+def scan_top_level(f: BinaryIO) -> List[Tuple[bytes, int, int, int]]:
+    """扫描文件的顶层 box，返回 (类型, 偏移, 头长度, 总长度)，不读取 box 内容"""
+    f.seek(0, 2)
+    end = f.tell()
+    boxes = []
+    pos = 0
+    while pos + 8 <= end:
+        f.seek(pos)
+        size, box_type = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            raise Mp4ConcatError(f"box {box_type!r} 的长度无效")
+        boxes.append((box_type, pos, header, size))
+        pos += size
+    return boxes
+
+
+def _full_box_version(box: Box) -> int:
+    return box.data[0]
+
+
+def _read_uint(data: bytes, offset: int, size: int) -> int:
+    return struct.unpack_from(">Q" if size == 8 else ">I", data, offset)[0]
+
+
+def _write_uint(box: Box, offset: int, size: int, value: int) -> None:
+    if size == 4 and value > UINT32_MAX:
+        raise Mp4ConcatError(f"{box.type!r} 的时长超出范围")
+    data = bytearray(box.data)
+    struct.pack_into(">Q" if size == 8 else ">I", data, offset, value)
+    box.data = bytes(data)
+
+
+def _timescale_and_duration(box: Box) -> Tuple[int, int]:
+    """mvhd / mdhd 的时间刻度和时长"""
+    if _full_box_version(box) == 1:
+        return _read_uint(box.data, 20, 4), _read_uint(box.data, 24, 8)
+    return _read_uint(box.data, 12, 4), _read_uint(box.data, 16, 4)
+
+
+def _set_header_duration(box: Box, duration: int) -> None:
+    """设置 mvhd / mdhd 的时长"""
+    if _full_box_version(box) == 1:
+        _write_uint(box, 24, 8, duration)
+    else:
+        _write_uint(box, 16, 4, duration)
+
+
+def _set_tkhd_duration(box: Box, duration: int) -> None:
+    if _full_box_version(box) == 1:
+        _write_uint(box, 28, 8, duration)
+    else:
+        _write_uint(box, 20, 4, duration)
+
+
+def _entries(box: Box, fmt: str) -> List[tuple]:
+    """读取 full box 中 entry_count 之后的定长表项"""
+    count = struct.unpack_from(">I", box.data, 4)[0]
+    size = struct.calcsize(fmt)
+    if 8 + count * size > len(box.data):
+        raise Mp4ConcatError(f"{box.type!r} 的表项不完整")
+    return list(struct.iter_unpack(fmt, box.data[8:8 + count * size]))
+
+
+def _table_box(box_type: bytes, version: int, fmt: str, entries: List[tuple]) -> Box:
+    body = b"".join(struct.pack(fmt, *entry) for entry in entries)
+    return Box(box_type, struct.pack(">B3xI", version, len(entries)) + body)
+
+
+class _Track:
+    """一个输入文件中一条轨道的样本表"""
+
+    def __init__(self, trak: Box):
+        self.trak = trak
+        mdia = trak.find(b"mdia")
+        minf = mdia.find(b"minf") if mdia else None
+        stbl = minf.find(b"stbl") if minf else None
+        mdhd = mdia.find(b"mdhd") if mdia else None
+        hdlr = mdia.find(b"hdlr") if mdia else None
+        if stbl is None or mdhd is None or hdlr is None:
+            raise Mp4ConcatError("轨道缺少 mdhd / hdlr / stbl")
+        if stbl.find(b"stz2") is not None:
+            raise Mp4ConcatError("不支持 stz2 样本表")
+
+        self.handler = hdlr.data[8:12]
+        self.timescale = _timescale_and_duration(mdhd)[0]
+
+        stsd = stbl.find(b"stsd")
+        if stsd is None:
+            raise Mp4ConcatError("轨道缺少 stsd")
+        self.sample_entries = []
+        pos = 8
+        for _ in range(struct.unpack_from(">I", stsd.data, 4)[0]):
+            size = struct.unpack_from(">I", stsd.data, pos)[0]
+            self.sample_entries.append(stsd.data[pos:pos + size])
+            pos += size
+
+        self.stts = _entries(self._require(stbl, b"stts"), ">II")
+        ctts = stbl.find(b"ctts")
+        self.ctts_version = _full_box_version(ctts) if ctts else 0
+        self.ctts = _entries(ctts, ">Ii" if self.ctts_version else ">II") if ctts else None
+        stss = stbl.find(b"stss")
+        self.stss = [entry[0] for entry in _entries(stss, ">I")] if stss else None
+        self.stsc = _entries(self._require(stbl, b"stsc"), ">III")
+
+        stsz = self._require(stbl, b"stsz")
+        self.sample_size, self.sample_count = struct.unpack_from(">II", stsz.data, 4)
+        if self.sample_size == 0:
+            self.sizes = list(struct.unpack_from(f">{self.sample_count}I", stsz.data, 12))
+        else:
+            self.sizes = None
+
+        stco = stbl.find(b"stco")
+        co64 = stbl.find(b"co64")
+        if stco is not None:
+            self.chunk_offsets = [entry[0] for entry in _entries(stco, ">I")]
+        elif co64 is not None:
+            self.chunk_offsets = [entry[0] for entry in _entries(co64, ">Q")]
+        else:
+            raise Mp4ConcatError("轨道缺少 stco / co64")
+
+        self.media_duration = sum(count * delta for count, delta in self.stts)
+        # 截断前的时长，编辑列表按它计算增减
+        self.source_duration = self.media_duration
+
+    def trim(self, seconds: float) -> None:
+        """在样本边界截断轨道，只保留解码时间早于 seconds 的样本"""
+        limit = seconds * self.timescale
+        stts = []
+        kept = 0
+        time = 0
+        for count, delta in self.stts:
+            if time >= limit:
+                break
+            take = count if delta == 0 else min(count, math.ceil((limit - time) / delta))
+            stts.append((take, delta))
+            kept += take
+            time += take * delta
+        if kept >= self.sample_count:
+            return
+
+        self.stts = stts
+        self.media_duration = time
+        if self.ctts is not None:
+            ctts = []
+            remaining = kept
+            for count, offset in self.ctts:
+                if remaining <= 0:
+                    break
+                ctts.append((min(count, remaining), offset))
+                remaining -= count
+            self.ctts = ctts
+        if self.stss is not None:
+            self.stss = [number for number in self.stss if number <= kept]
+        if self.sizes is not None:
+            self.sizes = self.sizes[:kept]
+        self.sample_count = kept
+
+        # 找到最后一个样本所在的 chunk，去掉之后的 chunk；最后一个 chunk 只用到一部分时补一条 stsc
+        stsc = []
+        remaining = kept
+        for index, (first_chunk, samples, entry) in enumerate(self.stsc):
+            next_chunk = self.stsc[index + 1][0] if index + 1 < len(self.stsc) else len(self.chunk_offsets) + 1
+            chunks = next_chunk - first_chunk
+            stsc.append((first_chunk, samples, entry))
+            if remaining <= chunks * samples:
+                last_chunk = first_chunk + math.ceil(remaining / samples) - 1
+                partial = remaining - (last_chunk - first_chunk) * samples
+                if partial != samples:
+                    if last_chunk == first_chunk:
+                        stsc.pop()
+                    stsc.append((last_chunk, partial, entry))
+                break
+            remaining -= chunks * samples
+        else:
+            raise Mp4ConcatError("stsc 与样本数不一致")
+        self.stsc = stsc
+        self.chunk_offsets = self.chunk_offsets[:last_chunk]
+
+    @staticmethod
+    def _require(stbl: Box, box_type: bytes) -> Box:
+        box = stbl.find(box_type)
+        if box is None:
+            raise Mp4ConcatError(f"轨道缺少 {box_type.decode()}")
+        return box
+
+
+class _Input:
+    """一个输入文件：ftyp、moov 结构和 mdat 数据区间"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            top = scan_top_level(f)
+            types = [box_type for box_type, _, _, _ in top]
+            if b"moof" in types:
+                raise Mp4ConcatError("不支持分片 MP4")
+            if types.count(b"moov") != 1 or b"mdat" not in types:
+                raise Mp4ConcatError(f"不是有效的 MP4 文件: {path}")
+            self.ftyp = b""
+            self.mdat_ranges = []
+            for box_type, offset, header, size in top:
+                if box_type == b"ftyp":
+                    f.seek(offset)
+                    self.ftyp = f.read(size)
+                elif box_type == b"moov":
+                    f.seek(offset + header)
+                    self.moov = Box(b"moov", children=parse_boxes(f.read(size - header)))
+                elif box_type == b"mdat":
+                    self.mdat_ranges.append((offset + header, size - header))
+        if self.moov.find(b"mvex") is not None:
+            raise Mp4ConcatError("不支持分片 MP4")
+        self.tracks = [_Track(trak) for trak in self.moov.find_all(b"trak")]
+        if not self.tracks:
+            raise Mp4ConcatError(f"MP4 中没有轨道: {path}")
+        self.payload_size = sum(size for _, size in self.mdat_ranges)
+
+    def relative_offset(self, offset: int) -> int:
+        """把文件内的绝对偏移换算成该文件 mdat 数据中的相对偏移"""
+        position = 0
+        for start, size in self.mdat_ranges:
+            if start <= offset < start + size:
+                return position + offset - start
+            position += size
+        raise Mp4ConcatError(f"chunk 偏移 {offset} 不在 mdat 中")
+
+
+class _MergedTrack:
+    """合并后的一条轨道，chunk 偏移相对于输出 mdat 数据的起点"""
+
+    def __init__(self, parts: List[_Track], inputs: List[_Input], payload_starts: List[int]):
+        self.template = parts[0]
+        self.timescale = parts[0].timescale
+        self.sample_entries: List[bytes] = []
+        self.stts: List[List[int]] = []
+        self.ctts: Optional[List[Tuple[int, int]]] = [] if any(p.ctts is not None for p in parts) else None
+        self.ctts_version = max(p.ctts_version for p in parts)
+        self.stss: Optional[List[int]] = [] if any(p.stss is not None for p in parts) else None
+        self.stsc: List[Tuple[int, int, int]] = []
+        self.sizes: List[int] = []
+        self.chunk_offsets: List[int] = []
+        self.media_duration = 0
+        uniform = {p.sample_size for p in parts}
+        self.sample_size = uniform.pop() if len(uniform) == 1 and 0 not in uniform else 0
+        self.sample_count = 0
+
+        for part, source, payload_start in zip(parts, inputs, payload_starts):
+            entry_map = {}
+            for index, entry in enumerate(part.sample_entries, 1):
+                if entry not in self.sample_entries:
+                    self.sample_entries.append(entry)
+                entry_map[index] = self.sample_entries.index(entry) + 1
+
+            for count, delta in part.stts:
+                if self.stts and self.stts[-1][1] == delta:
+                    self.stts[-1][0] += count
+                else:
+                    self.stts.append([count, delta])
+            if self.ctts is not None:
+                self.ctts.extend(part.ctts if part.ctts is not None else [(part.sample_count, 0)])
+            if self.stss is not None:
+                numbers = part.stss if part.stss is not None else range(1, part.sample_count + 1)
+                self.stss.extend(number + self.sample_count for number in numbers)
+
+            chunk_base = len(self.chunk_offsets)
+            self.stsc.extend(
+                (first_chunk + chunk_base, samples, entry_map.get(index, index))
+                for first_chunk, samples, index in part.stsc
+            )
+            self.chunk_offsets.extend(payload_start + source.relative_offset(offset) for offset in part.chunk_offsets)
+            if self.sample_size == 0:
+                self.sizes.extend(part.sizes if part.sizes is not None else [part.sample_size] * part.sample_count)
+
+            self.sample_count += part.sample_count
+            self.media_duration += part.media_duration
+
+    def stbl(self, base: int, use_co64: bool) -> Box:
+        stsd = Box(b"stsd", struct.pack(">II", 0, len(self.sample_entries)) + b"".join(self.sample_entries))
+        children = [stsd, _table_box(b"stts", 0, ">II", [tuple(entry) for entry in self.stts])]
+        if self.ctts is not None:
+            children.append(_table_box(b"ctts", self.ctts_version, ">Ii" if self.ctts_version else ">II", self.ctts))
+        if self.stss is not None:
+            children.append(_table_box(b"stss", 0, ">I", [(number,) for number in self.stss]))
+        children.append(_table_box(b"stsc", 0, ">III", self.stsc))
+        sizes = struct.pack(f">{len(self.sizes)}I", *self.sizes) if self.sample_size == 0 else b""
+        children.append(Box(b"stsz", struct.pack(">III", 0, self.sample_size, self.sample_count) + sizes))
+        if use_co64:
+            children.append(_table_box(b"co64", 0, ">Q", [(base + offset,) for offset in self.chunk_offsets]))
+        else:
+            children.append(_table_box(b"stco", 0, ">I", [(base + offset,) for offset in self.chunk_offsets]))
+        return Box(b"stbl", children=children)
+
+
+def _rebuild_trak(merged: _MergedTrack, movie_timescale: int, base: int, use_co64: bool) -> Box:
+    """以第一个文件的轨道为模板，替换样本表和时长"""
+    template = merged.template.trak
+    track_duration = merged.media_duration * movie_timescale // merged.timescale
+    children = []
+    for child in template.children:
+        if child.type == b"tkhd":
+            tkhd = Box(b"tkhd", child.data)
+            _set_tkhd_duration(tkhd, track_duration)
+            children.append(tkhd)
+        elif child.type == b"edts":
+            added = (merged.media_duration - merged.template.source_duration) * movie_timescale // merged.timescale
+            edts = _rebuild_edts(child, added)
+            if edts is not None:
+                children.append(edts)
+        elif child.type == b"mdia":
+            children.append(_rebuild_mdia(child, merged, base, use_co64))
+        else:
+            children.append(child)
+    return Box(b"trak", children=children)
+
+
+def _rebuild_edts(edts: Box, added_duration: int) -> Optional[Box]:
+    """只有一段编辑（例如 B 帧延迟、音频 priming）时按拼接和截断增减的时长调整它，其余情况去掉编辑列表"""
+    elst = edts.find(b"elst")
+    if elst is None or struct.unpack_from(">I", elst.data, 4)[0] != 1:
+        return None
+    version = _full_box_version(elst)
+    fmt = ">QqI" if version == 1 else ">IiI"
+    segment, media_time, rate = struct.unpack_from(fmt, elst.data, 8)
+    if media_time < 0:
+        return None
+    segment += added_duration
+    if segment <= 0:
+        return None
+    if version == 0 and segment > UINT32_MAX:
+        raise Mp4ConcatError("编辑列表时长超出范围")
+    data = elst.data[:8] + struct.pack(fmt, segment, media_time, rate)
+    return Box(b"edts", children=[Box(b"elst", data)])
+
+
+def _rebuild_mdia(mdia: Box, merged: _MergedTrack, base: int, use_co64: bool) -> Box:
+    children = []
+    for child in mdia.children:
+        if child.type == b"mdhd":
+            mdhd = Box(b"mdhd", child.data)
+            _set_header_duration(mdhd, merged.media_duration)
+            children.append(mdhd)
+        elif child.type == b"minf":
+            minf_children = [
+                merged.stbl(base, use_co64) if grandchild.type == b"stbl" else grandchild
+                for grandchild in child.children
+            ]
+            children.append(Box(b"minf", children=minf_children))
+        else:
+            children.append(child)
+    return Box(b"mdia", children=children)
+
+
+def _build_moov(first: _Input, merged_tracks: List[_MergedTrack], base: int, use_co64: bool) -> bytes:
+    mvhd = first.moov.find(b"mvhd")
+    if mvhd is None:
+        raise Mp4ConcatError("MP4 缺少 mvhd")
+    movie_timescale = _timescale_and_duration(mvhd)[0]
+    traks = iter(merged_tracks)
+    children = []
+    for child in first.moov.children:
+        if child.type == b"mvhd":
+            new_mvhd = Box(b"mvhd", child.data)
+            _set_header_duration(new_mvhd, max(
+                track.media_duration * movie_timescale // track.timescale for track in merged_tracks
+            ))
+            children.append(new_mvhd)
+        elif child.type == b"trak":
+            children.append(_rebuild_trak(next(traks), movie_timescale, base, use_co64))
+        else:
+            children.append(child)
+    return Box(b"moov", children=children).serialize()
+
+
+def _copy_range(src: BinaryIO, dst: BinaryIO, offset: int, length: int) -> None:
+    src.seek(offset)
+    while length > 0:
+        chunk = src.read(min(COPY_BUFFER, length))
+        if not chunk:
+            raise Mp4ConcatError("mdat 数据不完整")
+        dst.write(chunk)
+        length -= len(chunk)
+
+
+def concat_mp4(
+    paths: List[str],
+    output_path: str,
+    durations: Optional[Sequence[Optional[float]]] = None
+) -> float:
+    """把多个 MP4 按顺序拼接为一个文件，返回拼接后的时长（秒）
+
+    durations 按顺序给出每个文件保留的时长（秒），None 表示保留整个文件
+    """
+    if not paths:
+        raise Mp4ConcatError("没有要拼接的文件")
+    if durations is not None and len(durations) != len(paths):
+        raise Mp4ConcatError("时长数量与文件数量不一致")
+    try:
+        inputs = [_Input(path) for path in paths]
+        for source, seconds in zip(inputs, durations or []):
+            if seconds is not None:
+                if seconds <= 0:
+                    raise Mp4ConcatError(f"截断时长必须大于 0: {seconds}")
+                for track in source.tracks:
+                    track.trim(seconds)
+    except struct.error:
+        raise Mp4ConcatError("MP4 结构不完整")
+    first = inputs[0]
+
+    layout = [(track.handler, track.timescale) for track in first.tracks]
+    for source in inputs[1:]:
+        if [(track.handler, track.timescale) for track in source.tracks] != layout:
+            raise Mp4ConcatError(f"轨道结构不一致，无法直接拼接: {source.path}")
+
+    # 每个输入的 mdat 数据在输出 mdat 中的起点
+    payload_starts = []
+    total_payload = 0
+    for source in inputs:
+        payload_starts.append(total_payload)
+        total_payload += source.payload_size
+
+    merged_tracks = [
+        _MergedTrack([source.tracks[index] for source in inputs], inputs, payload_starts)
+        for index in range(len(layout))
+    ]
+
+    # moov 的大小与 chunk 偏移的取值无关，先用 0 算出大小，再填入真实偏移
+    mdat_header = 8 if total_payload + 8 <= UINT32_MAX else 16
+    use_co64 = len(first.ftyp) + total_payload + mdat_header + (1 << 24) > UINT32_MAX
+    moov_size = len(_build_moov(first, merged_tracks, 0, use_co64))
+    base = len(first.ftyp) + moov_size + mdat_header
+    moov = _build_moov(first, merged_tracks, base, use_co64)
+
+    with open(output_path, "wb") as out:
+        out.write(first.ftyp)
+        out.write(moov)
+        if mdat_header == 8:
+            out.write(struct.pack(">I4s", total_payload + 8, b"mdat"))
+        else:
+            out.write(struct.pack(">I4sQ", 1, b"mdat", total_payload + 16))
+        for source in inputs:
+            with open(source.path, "rb") as src:
+                for start, size in source.mdat_ranges:
+                    _copy_range(src, out, start, size)
+
+    return max(track.media_duration / track.timescale for track in merged_tracks)
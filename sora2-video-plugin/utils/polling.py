@@ -0,0 +1,138 @@
+"""自适应轮询调度
+
+根据任务进度（progress / progress_pct）、排队位置、模型和时长决定下一次轮询的间隔：
+- 排队中：指数退避，不浪费请求
+- 渲染中：按观测到的进度速率估算剩余时间，取其一部分作为间隔
+- 接近完成：缩短到最小间隔，尽快拿到结果
+
+first_delay 是创建后第一次查询前的等待（由引擎按历史完成耗时设置，见 utils.latency_history）。
+"""
+
+from typing import Any, Dict, Optional
+
+# 各模型/时长的典型渲染耗时（秒），用于没有进度信息时的估算
+EXPECTED_RENDER_SECONDS = {
+    ("sora-2", "10"): 60,
+    ("sora-2", "15"): 90,
+    ("sora-2-pro", "10"): 150,
+    ("sora-2-pro", "15"): 240,
+    ("sora-2-pro", "25"): 420,
+}
+
+# 排队状态
+QUEUED_STATUSES = {"NOT_START", "QUEUED", "PENDING", "SUBMITTED"}
+
+
+def parse_progress(value: Any) -> Optional[float]:
+    """把 "45%"、"0.45"、45、0.45 等进度表示统一为 0~1 的小数"""
+    if value is None or value == "":
+        return None
+    try:
+        if isinstance(value, str):
+            text = value.strip()
+            if text.endswith("%"):
+                return max(0.0, min(float(text[:-1]) / 100, 1.0))
+            value = float(text)
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    # 大于 1 视为百分数
+    if value > 1:
+        value = value / 100
+    return max(0.0, min(value, 1.0))
+
+
+def expected_render_seconds(model: str, duration: str) -> float:
+    """返回模型+时长的典型渲染耗时"""
+    duration = str(duration)
+    if (model, duration) in EXPECTED_RENDER_SECONDS:
+        return EXPECTED_RENDER_SECONDS[(model, duration)]
+    # 未知组合：按时长线性估算，Pro 模型更慢
+    try:
+        seconds = float(duration)
+    except ValueError:
+        seconds = 10.0
+    per_second = 15.0 if model.endswith("pro") else 6.0
+    return seconds * per_second
+
+
+class PollScheduler:
+    """为单个任务计算轮询间隔，并统计轮询次数"""
+
+    def __init__(
+        self,
+        model: str = "sora-2",
+        duration: str = "10",
+        min_interval: float = 3.0,
+        max_interval: float = 30.0,
+        queue_interval: float = 5.0,
+        first_delay: float = 0.0
+    ):
+        self.model = model
+        self.duration = str(duration)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.queue_interval = queue_interval
+        self.first_delay = first_delay
+        self.expected_seconds = expected_render_seconds(model, self.duration)
+        # 已发出的查询数（包括还没有返回的）
+        self.polls = 0
+        self._queued_polls = 0
+        self._render_started: Optional[float] = None
+        self._last_sample: Optional[tuple] = None  # (elapsed, progress)
+
+    def _clamp(self, delay: float) -> float:
+        return max(self.min_interval, min(delay, self.max_interval))
+
+    def record_query(self) -> None:
+        """发出查询时调用：超时时仍在进行中的查询也计入轮询次数"""
+        self.polls += 1
+
+    def next_delay(self, result: Dict[str, Any], elapsed: float) -> float:
+        """根据一次轮询结果返回距离下一次轮询的秒数
+
+        :param result: 引擎 query_task 返回的 TaskStatus（status / progress / progress_pct / queue_position）
+        :param elapsed: 任务提交至今的秒数
+        """
+        status = str(result.get("status") or "").upper()
+        queue_position = result.get("queue_position")
+        progress = parse_progress(result.get("progress_pct"))
+        if progress is None:
+            progress = parse_progress(result.get("progress"))
+
+        # 排队中：从 queue_interval 开始指数退避，排位越靠后间隔越长
+        if status in QUEUED_STATUSES or (queue_position and not progress):
+            self._queued_polls += 1
+            delay = self.queue_interval * (1.5 ** (self._queued_polls - 1))
+            if queue_position:
+                delay = max(delay, float(queue_position) * 2)
+            return self._clamp(delay)
+
+        if self._render_started is None:
+            self._render_started = elapsed
+
+        # 有进度：根据进度速率估算剩余时间
+        if progress is not None and progress > 0:
+            if progress >= 0.9:
+                self._last_sample = (elapsed, progress)
+                return self.min_interval
+
+            rate = None
+            if self._last_sample and progress > self._last_sample[1] and elapsed > self._last_sample[0]:
+                rate = (progress - self._last_sample[1]) / (elapsed - self._last_sample[0])
+            elif elapsed > self._render_started:
+                rate = progress / (elapsed - self._render_started)
+            self._last_sample = (elapsed, progress)
+
+            if rate:
+                remaining = (1.0 - progress) / rate
+                # 取剩余时间的一半，逐步逼近完成时刻
+                return self._clamp(remaining / 2)
+
+        # 没有进度信息：按典型渲染耗时估算
+        rendering = elapsed - self._render_started
+        remaining = self.expected_seconds - rendering
+        if remaining > 0:
+            return self._clamp(remaining / 2)
+        # 已超过典型耗时，随时可能完成
+        return self._clamp(self.min_interval * 2)
@@ -0,0 +1,96 @@
+"""按内容寻址的结果缓存
+
+以 _invoke 构建的 params（prompt、model、duration、aspect_ratio、images）的规范化哈希为键，
+缓存已完成任务的结果，带 TTL 和 LRU 淘汰。同一个键的并发请求由轮询引擎合并到
+同一个进行中的任务上（见 AsyncPollEngine.submit 的 share_key）。
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any, Dict, Optional
+
+# 默认缓存 6 小时（视频 URL 的签名有效期更长）/ 最多 256 条
+DEFAULT_TTL = float(os.environ.get("SORA2_RESULT_CACHE_TTL", str(6 * 3600)))
+DEFAULT_MAX_ENTRIES = int(os.environ.get("SORA2_RESULT_CACHE_SIZE", "256"))
+
+
+def cache_key(params: Dict[str, Any], namespace: str = "") -> str:
+    """计算请求参数的规范化哈希
+
+    键的顺序不影响结果，列表（images）保持原有顺序。namespace 用于隔离不同 API Key，
+    避免一个账号的付费结果被另一个账号拿到。
+    """
+    canonical = json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    digest = hashlib.sha256()
+    if namespace:
+        digest.update(hashlib.sha256(namespace.encode("utf-8")).digest())
+    digest.update(canonical.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """线程安全的 TTL + LRU 缓存"""
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl: float = DEFAULT_TTL,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """返回未过期的缓存结果，并把它标记为最近使用"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(value)
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        """写入结果，超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, dict(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """返回进程内共享的结果缓存"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache()
+    return _cache
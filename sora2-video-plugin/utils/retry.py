@@ -0,0 +1,167 @@
+"""请求重试策略：可重试错误分类、指数退避 + 抖动、Retry-After 和重试预算
+
+查询请求是幂等的，临时错误（连接失败、读超时、5xx、429）都可以直接重试。
+创建请求不是幂等的（平台不支持幂等键），只在确定请求没有被服务端处理时重试：
+连接失败，或带 Retry-After 的 429 / 503。读超时、500 等错误后任务可能已经创建，
+重新提交可能重复创建（重复计费），此时不重试，由引擎报告 UncertainCreateError。
+
+重试预算限制重试占请求总数的比例，端点大面积故障时不会因为重试把流量放大数倍。
+"""
+
+import asyncio
+import random
+import threading
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional, TypeVar
+
+import httpx
+
+from utils.circuit_breaker import CircuitOpenError
+
+T = TypeVar("T")
+
+# 服务端拒绝处理并要求稍后重试的状态码（带 Retry-After 时确定请求没有被处理）
+REJECTED_STATUSES = {429, 503}
+
+# 请求没有发出或没有建立连接
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class UncertainCreateError(Exception):
+    """创建请求的结果不确定：任务可能已经在平台创建，为避免重复计费没有重新提交"""
+
+    def __init__(self, platform: str, error: BaseException):
+        super().__init__(
+            f"创建请求结果不确定（{error}），任务可能已在 {platform} 平台创建；"
+            f"为避免重复计费没有重新提交，请先在平台的任务列表中确认"
+        )
+        self.platform = platform
+        self.error = error
+
+
+def is_retryable(error: BaseException, idempotent: bool = True) -> bool:
+    """判断错误能否重试
+
+    :param idempotent: 请求是否幂等（查询）；非幂等请求（创建）只在确定未被处理时重试
+    """
+    if isinstance(error, CircuitOpenError):
+        # 熔断时立即失败，由调用方决定是否换端点
+        return False
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        if not idempotent:
+            return status in REJECTED_STATUSES and retry_after_seconds(error.response) is not None
+        return status == 429 or status >= 500
+    if isinstance(error, CONNECT_ERRORS):
+        return True
+    if isinstance(error, httpx.TransportError):
+        # 读超时、连接被重置等：请求可能已经被处理
+        return idempotent
+    return False
+
+
+def is_uncertain(error: BaseException) -> bool:
+    """判断失败的创建请求是否可能已经创建了任务（读超时、连接中断、500 等）"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, httpx.TransportError) and not isinstance(error, CONNECT_ERRORS)
+
+
+def retry_after_seconds(response: Optional[httpx.Response]) -> Optional[float]:
+    """解析 Retry-After 响应头（秒数或 HTTP 日期），没有或无法解析时返回 None"""
+    if response is None:
+        return None
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class RetryBudget:
+    """令牌桶形式的重试预算：每个请求存入 ratio 个令牌，每次重试取出 1 个"""
+
+    def __init__(self, ratio: float = 0.2, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def record_request(self) -> None:
+        with self._lock:
+            self._tokens = min(self._tokens + self.ratio, self.max_tokens)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+
+class RetryPolicy:
+    """指数退避 + 完全抖动的重试策略"""
+
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        max_retry_after: float = 60.0,
+        budget: Optional[RetryBudget] = None,
+        rand: Callable[[float, float], float] = random.uniform
+    ):
+        self.max_attempts = max(max_attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.budget = budget or RetryBudget()
+        self._rand = rand
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次重试（从 1 开始）前的等待时间"""
+        cap = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return self._rand(0, cap)
+
+    def delay_for(self, error: BaseException, attempt: int) -> Optional[float]:
+        """返回重试前的等待秒数；不应再重试时返回 None"""
+        response = getattr(error, "response", None) if isinstance(error, httpx.HTTPStatusError) else None
+        retry_after = retry_after_seconds(response)
+        if retry_after is not None:
+            # 服务端要求等待的时间过长时不再重试
+            if retry_after > self.max_retry_after:
+                return None
+            return retry_after
+        return self.backoff(attempt)
+
+    async def call(self, fn: Callable[[], Awaitable[T]], idempotent: bool = True) -> T:
+        """执行 fn，遇到可重试的错误时按策略重试"""
+        self.budget.record_request()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await fn()
+            except Exception as e:
+                if attempt >= self.max_attempts or not is_retryable(e, idempotent):
+                    raise
+                delay = self.delay_for(e, attempt)
+                if delay is None or not self.budget.try_spend():
+                    raise
+            await asyncio.sleep(delay)
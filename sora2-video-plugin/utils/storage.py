@@ -0,0 +1,29 @@
+"""插件本地数据目录
+
+任务登记表等需要跨调用持久化的数据都放在这里。默认 ~/.sora2-video-plugin，
+可用环境变量 SORA2_PLUGIN_DATA_DIR 指定；目录不可写时退回系统临时目录。
+"""
+
+import os
+import tempfile
+
+_DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".sora2-video-plugin")
+
+
+def data_dir() -> str:
+    """返回（并创建）插件数据目录"""
+    path = os.environ.get("SORA2_PLUGIN_DATA_DIR") or _DEFAULT_DIR
+    try:
+        os.makedirs(path, exist_ok=True)
+        if os.access(path, os.W_OK):
+            return path
+    except OSError:
+        pass
+    path = os.path.join(tempfile.gettempdir(), "sora2-video-plugin")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def data_path(filename: str) -> str:
+    """返回数据目录下的文件路径"""
+    return os.path.join(data_dir(), filename)
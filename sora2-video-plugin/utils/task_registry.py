@@ -0,0 +1,132 @@
+"""持久化任务登记表（SQLite）
+
+记录每个创建成功的任务、它的请求参数和最后一次查询到的状态。工具超时返回后，
+再次调用时传入 task_id 即可从登记表恢复参数继续轮询，不会重复提交（重复计费）。
+记录按创建它的账号（API Key 的哈希）隔离，其他账号只能向平台查询。
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils.backends import Backend
+from utils.storage import data_path
+
+DB_FILENAME = "tasks.db"
+
+# 服务端的终止状态
+TERMINAL_STATUSES = {"SUCCESS", "FAILURE"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id     TEXT PRIMARY KEY,
+    params      TEXT NOT NULL,
+    status      TEXT,
+    progress    TEXT,
+    video_url   TEXT,
+    fail_reason TEXT,
+    backend     TEXT,
+    account     TEXT,
+    created_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL
+)
+"""
+
+
+class TaskRegistry:
+    """任务登记表，单连接 + 锁，可在多线程间共享"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or data_path(DB_FILENAME)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(_SCHEMA)
+            # 旧版本创建的表没有 backend 列（都是贞贞的任务）
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(tasks)")}
+            if "backend" not in columns:
+                self._conn.execute("ALTER TABLE tasks ADD COLUMN backend TEXT")
+            # 旧版本的记录没有 account 列，不属于任何账号，不再被查到（恢复时改为向平台查询）
+            if "account" not in columns:
+                self._conn.execute("ALTER TABLE tasks ADD COLUMN account TEXT")
+
+    def record_created(self, task_id: str, params: Dict[str, Any], backend: Optional[str] = None,
+                       account: Optional[str] = None) -> None:
+        """登记一个刚创建的任务
+
+        :param backend: 创建任务的后端名（utils.backends），恢复轮询时据此选择后端
+        :param account: 创建任务的账号（Backend.account），只有同一账号能查到这条记录
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO tasks (task_id, params, status, backend, account, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (task_id, json.dumps(params, ensure_ascii=False), "NOT_START", backend, account, now, now)
+            )
+
+    def update_status(self, task_id: str, result: Dict[str, Any]) -> None:
+        """保存最近一次查询结果（引擎 query_task 返回的 TaskStatus）"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tasks SET status = ?, progress = ?, video_url = COALESCE(?, video_url), "
+                "fail_reason = ?, updated_at = ? WHERE task_id = ?",
+                (
+                    result.get("status"),
+                    result.get("progress") or "",
+                    result.get("video_url") or None,
+                    result.get("fail_reason") or "",
+                    time.time(),
+                    task_id
+                )
+            )
+
+    def get(self, task_id: str, backends: Iterable[Backend]) -> Optional[Dict[str, Any]]:
+        """按 task_id 查询 backends 的账号创建的登记记录，不存在或属于其他账号时返回 None"""
+        accounts = list(dict.fromkeys(backend.account for backend in backends))
+        if not accounts:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT * FROM tasks WHERE task_id = ? AND account IN ({', '.join('?' * len(accounts))})",
+                (task_id, *accounts)
+            ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list_unfinished(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """列出尚未到达终止状态的任务（最近创建的在前）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM tasks WHERE status IS NULL OR status NOT IN ('SUCCESS', 'FAILURE') "
+                "ORDER BY created_at DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        record = dict(row)
+        record["params"] = json.loads(record["params"])
+        return record
+
+
+_registry: Optional[TaskRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> TaskRegistry:
+    """返回进程内共享的任务登记表"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = TaskRegistry()
+    return _registry
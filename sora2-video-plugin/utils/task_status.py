@@ -0,0 +1,247 @@
+"""统一的任务状态和两种查询格式的解析
+
+每次轮询都要解析一次查询响应，聚鑫的响应还是一个大的嵌套文档，而用到的只有几个字段。
+这里的解析器只读取需要的字段，直接构造一个 TaskStatus：
+
+    parse_zhenzhen  贞贞 /v2/videos/generations/{task_id}
+    parse_juxin     聚鑫统一格式 /v1/video/query，以及 OpenAI 格式的视频对象（/v1/videos/{id}）
+
+TaskStatus 的字段存放在 __slots__ 中、对外只有只读属性，同时实现只读映射接口
+（get、[]、in、keys、**），字段名和以前 parse_task_response 返回的字典相同：
+status、progress、fail_reason 总是存在，其余字段（progress_pct、queue_position、
+status_update_time、video_url、thumbnail_url、enhanced_prompt）没有值时不出现。
+引擎、轮询调度、登记表和工具照旧按字段名读取，和字典比较也照旧相等。
+
+status 统一为 NOT_START / IN_PROGRESS / SUCCESS / FAILURE（贞贞原样返回平台的状态）。
+
+安装了 orjson 时 loads() 用它解码响应（可选依赖：pip install orjson），否则用标准库 json。
+"""
+
+import json
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional
+
+from utils.polling import parse_progress
+
+try:
+    import orjson
+except ImportError:  # orjson 是可选依赖
+    orjson = None
+
+# 聚鑫统一格式（以及 OpenAI 格式）的状态 -> 统一状态
+JUXIN_STATUSES = {
+    "pending": "NOT_START",
+    "queued": "NOT_START",
+    "processing": "IN_PROGRESS",
+    "running": "IN_PROGRESS",
+    "in_progress": "IN_PROGRESS",
+    "completed": "SUCCESS",
+    "succeeded": "SUCCESS",
+    "success": "SUCCESS",
+    "failed": "FAILURE",
+    "failure": "FAILURE",
+    "error": "FAILURE"
+}
+
+# 总是存在的字段 / 有值时才存在的字段
+REQUIRED_FIELDS = ("status", "progress", "fail_reason")
+OPTIONAL_FIELDS = (
+    "progress_pct", "queue_position", "status_update_time", "video_url", "thumbnail_url", "enhanced_prompt"
+)
+_REQUIRED = frozenset(REQUIRED_FIELDS)
+# 字段名 -> 存放它的槽
+_SLOTS = {field: f"_{field}" for field in REQUIRED_FIELDS + OPTIONAL_FIELDS}
+
+
+def loads(content: Any) -> Any:
+    """解码 JSON 响应体（bytes 或 str）"""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+class TaskStatus(Mapping):
+    """一次查询得到的任务状态（只读映射，字段也可以按属性读取）"""
+
+    __slots__ = tuple(f"_{field}" for field in REQUIRED_FIELDS + OPTIONAL_FIELDS)
+
+    def __init__(
+        self,
+        status: Optional[str],
+        progress: Any = "",
+        fail_reason: Any = "",
+        progress_pct: Any = None,
+        queue_position: Any = None,
+        status_update_time: Any = None,
+        video_url: Optional[str] = None,
+        thumbnail_url: Optional[str] = None,
+        enhanced_prompt: Optional[str] = None
+    ):
+        # 字段存放在私有槽中，对外只有只读属性
+        self._status = status
+        self._progress = progress
+        self._fail_reason = fail_reason
+        self._progress_pct = progress_pct
+        self._queue_position = queue_position
+        self._status_update_time = status_update_time
+        self._video_url = video_url
+        self._thumbnail_url = thumbnail_url
+        self._enhanced_prompt = enhanced_prompt
+
+    status = property(lambda self: self._status)
+    progress = property(lambda self: self._progress)
+    fail_reason = property(lambda self: self._fail_reason)
+    progress_pct = property(lambda self: self._progress_pct)
+    queue_position = property(lambda self: self._queue_position)
+    status_update_time = property(lambda self: self._status_update_time)
+    video_url = property(lambda self: self._video_url)
+    thumbnail_url = property(lambda self: self._thumbnail_url)
+    enhanced_prompt = property(lambda self: self._enhanced_prompt)
+
+    def __getitem__(self, key: str) -> Any:
+        slot = _SLOTS.get(key)
+        if slot is not None:
+            value = getattr(self, slot)
+            if value is not None or key in _REQUIRED:
+                return value
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        # 每次轮询都会按字段名读取多次，不经过 Mapping.get 的异常路径
+        slot = _SLOTS.get(key)
+        if slot is None:
+            return default
+        value = getattr(self, slot)
+        return default if value is None and key not in _REQUIRED else value
+
+    def __contains__(self, key: object) -> bool:
+        slot = _SLOTS.get(key)
+        return slot is not None and (key in _REQUIRED or getattr(self, slot) is not None)
+
+    def __iter__(self) -> Iterator[str]:
+        yield from REQUIRED_FIELDS
+        for field in OPTIONAL_FIELDS:
+            if getattr(self, _SLOTS[field]) is not None:
+                yield field
+
+    def __len__(self) -> int:
+        return len(REQUIRED_FIELDS) + sum(getattr(self, _SLOTS[field]) is not None for field in OPTIONAL_FIELDS)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self)
+
+    def __reduce__(self):
+        return TaskStatus, tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"TaskStatus({self.to_dict()!r})"
+
+
+def _preview(field: str, data: dict, detail: Optional[dict], inner: Optional[dict]) -> Optional[str]:
+    """预览字段：依次取顶层、detail、data 中第一个非空字符串"""
+    value = data.get(field)
+    if isinstance(value, str) and value:
+        return value
+    for source in (detail, inner):
+        if source is not None:
+            value = source.get(field)
+            if isinstance(value, str) and value:
+                return value
+    return None
+
+
+def parse_zhenzhen(data: Dict[str, Any]) -> TaskStatus:
+    """解析贞贞的查询响应：进度和排队位置可能在 detail.pending_info 中，视频 URL 在 data.output"""
+    detail = data.get("detail")
+    if not isinstance(detail, dict):
+        detail = None
+    pending_info = detail.get("pending_info") if detail is not None else None
+    if not isinstance(pending_info, dict):
+        pending_info = None
+    inner = data.get("data")
+    if not isinstance(inner, dict):
+        inner = None
+
+    progress_pct = data.get("progress_pct")
+    if progress_pct is None and "progress_pct" not in data and pending_info is not None:
+        progress_pct = pending_info.get("progress_pct")
+    queue_position = data.get("queue_position")
+    if queue_position is None and "queue_position" not in data and pending_info is not None:
+        queue_position = pending_info.get("progress_pos_in_queue")
+
+    return TaskStatus(
+        data.get("status"),
+        data.get("progress", ""),
+        data.get("fail_reason", ""),
+        progress_pct,
+        queue_position,
+        data.get("status_update_time"),
+        # 空的 data 视为没有视频 URL
+        inner.get("output", "") if inner else None,
+        _preview("thumbnail_url", data, detail, inner),
+        _preview("enhanced_prompt", data, detail, inner)
+    )
+
+
+def parse_juxin(data: Dict[str, Any]) -> TaskStatus:
+    """解析聚鑫统一格式的查询响应，也接受 OpenAI 格式的视频对象
+
+    统一格式的状态、进度和失败原因可能在顶层、detail 或 detail.pending_info 中；
+    OpenAI 格式的进度是顶层 0~100 的整数，失败原因在 error.message。
+    """
+    detail = data.get("detail")
+    if not isinstance(detail, dict):
+        detail = None
+    pending_info = detail.get("pending_info") if detail is not None else None
+    if not isinstance(pending_info, dict):
+        pending_info = None
+    inner = data.get("data")
+    if not isinstance(inner, dict):
+        inner = None
+
+    raw_status = data.get("status") or (detail.get("status") if detail is not None else None) or ""
+    raw_status = str(raw_status).lower()
+    status = JUXIN_STATUSES.get(raw_status, raw_status.upper() or None)
+
+    progress_pct = pending_info.get("progress_pct") if pending_info is not None else None
+    if progress_pct is None:
+        # OpenAI 格式：顶层 progress 为百分数（1 表示 1%，不是 100%）
+        value = data.get("progress")
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            progress_pct = max(0.0, min(value / 100, 1.0))
+    fraction = parse_progress(progress_pct)
+    # pending 但已经有渲染进度时按处理中对待
+    if status == "NOT_START" and fraction:
+        status = "IN_PROGRESS"
+
+    if status == "SUCCESS":
+        progress = "100%"
+    elif fraction is not None:
+        progress = f"{int(fraction * 100)}%"
+    else:
+        progress = ""
+
+    fail_reason = data.get("fail_reason")
+    if not fail_reason and detail is not None:
+        fail_reason = detail.get("failure_reason")
+    if not fail_reason and pending_info is not None:
+        fail_reason = pending_info.get("failure_reason")
+    if not fail_reason:
+        error = data.get("error")
+        fail_reason = error.get("message") if isinstance(error, dict) else None
+
+    status_update_time = data.get("status_update_time")
+    if status_update_time is None and "status_update_time" not in data and detail is not None:
+        status_update_time = detail.get("status_update_time")
+
+    return TaskStatus(
+        status,
+        progress,
+        fail_reason or "",
+        progress_pct,
+        pending_info.get("progress_pos_in_queue") if pending_info is not None else None,
+        status_update_time,
+        data.get("video_url") or (detail.get("url") if detail is not None else None) or None,
+        _preview("thumbnail_url", data, detail, inner),
+        _preview("enhanced_prompt", data, detail, inner)
+    )
@@ -0,0 +1,196 @@
+"""把生成的视频以 Dify blob 的形式分块返回
+
+平台返回的 video_url 带签名，过一段时间就会失效（查询结果中的 se= 参数）。
+blob 交付模式在任务完成后把 MP4 边下载边按块发给 Dify（BLOB_CHUNK 消息），
+任何时候内存里只有一个读取块，即使是 25 秒的 Pro 视频也远低于 manifest 中 256MB 的内存限制。
+
+下载中途断开时用 HTTP Range 请求从断点续传。
+"""
+
+import os
+import time
+import uuid
+from collections.abc import Iterable, Iterator
+from typing import Dict, Optional
+
+import requests
+from dify_plugin.entities.tool import ToolInvokeMessage
+
+from utils import http_client
+
+# 每次从网络读取的大小 / 每条 BLOB_CHUNK 消息的大小（与 dify_plugin 拆分 blob 的大小一致）
+READ_SIZE = 256 * 1024
+MESSAGE_SIZE = 8192
+
+# 单个视频的大小上限
+MAX_VIDEO_BYTES = int(os.environ.get("SORA2_MAX_VIDEO_BYTES", str(500 * 1024 * 1024)))
+
+# 断点续传次数
+MAX_RESUMES = 3
+
+
+class DownloadError(Exception):
+    """视频下载失败"""
+
+
+class VideoStream:
+    """可断点续传的视频下载流"""
+
+    def __init__(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        read_size: int = READ_SIZE,
+        max_resumes: int = MAX_RESUMES,
+        max_bytes: int = MAX_VIDEO_BYTES
+    ):
+        self.url = url
+        self.headers = dict(headers or {})
+        self.read_size = read_size
+        self.max_resumes = max_resumes
+        self.max_bytes = max_bytes
+        self.total_length: Optional[int] = None
+        self.content_type = "video/mp4"
+        self.resumes = 0
+        self._response: Optional[requests.Response] = None
+
+    def open(self) -> int:
+        """发起下载请求，返回视频总字节数"""
+        self._response = self._request(0)
+        length = self._response.headers.get("Content-Length")
+        if length is None:
+            self._response.close()
+            raise DownloadError("服务端没有返回视频大小（Content-Length）")
+        self.total_length = int(length)
+        if self.total_length > self.max_bytes:
+            self._response.close()
+            raise DownloadError(f"视频超过 {self.max_bytes // (1024 * 1024)}MB，无法以文件形式返回")
+        self.content_type = self._response.headers.get("Content-Type", "video/mp4").split(";")[0] or "video/mp4"
+        return self.total_length
+
+    def chunks(self) -> Iterator[bytes]:
+        """逐块产出视频数据，连接中断时从已收到的位置续传"""
+        if self._response is None:
+            self.open()
+        offset = 0
+        skip = 0
+        try:
+            while True:
+                try:
+                    for chunk in self._response.iter_content(self.read_size):
+                        if skip:
+                            # 服务端不支持 Range 时从头返回，丢掉已经发出的部分
+                            dropped = min(skip, len(chunk))
+                            chunk = chunk[dropped:]
+                            skip -= dropped
+                        if not chunk:
+                            continue
+                        offset += len(chunk)
+                        yield chunk
+                except requests.RequestException:
+                    pass
+                if offset >= self.total_length:
+                    return
+                self._response.close()
+                if self.resumes >= self.max_resumes:
+                    raise DownloadError(f"视频下载中断（{offset}/{self.total_length} 字节）")
+                self.resumes += 1
+                time.sleep(min(0.5 * self.resumes, 2.0))
+                self._response = self._request(offset)
+                skip = offset if self._response.status_code != 206 else 0
+        finally:
+            self._response.close()
+
+    def _request(self, offset: int) -> requests.Response:
+        headers = dict(self.headers)
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+        response = http_client.get(self.url, headers=headers, stream=True, timeout=(10, 60))
+        response.raise_for_status()
+        return response
+
+
+def blob_chunk_messages(
+    chunks: Iterable[bytes],
+    total_length: int,
+    filename: str,
+    mime_type: str = "video/mp4"
+) -> Iterator[ToolInvokeMessage]:
+    """把数据块转换为 BLOB_CHUNK 消息（与 dify_plugin 拆分 blob 消息的格式相同）"""
+    blob_id = uuid.uuid4().hex
+    meta = {"mime_type": mime_type, "filename": filename}
+    sequence = 0
+
+    def end_message() -> ToolInvokeMessage:
+        return ToolInvokeMessage(
+            type=ToolInvokeMessage.MessageType.BLOB_CHUNK,
+            message=ToolInvokeMessage.BlobChunkMessage(
+                id=blob_id, sequence=sequence, total_length=total_length, blob=b"", end=True
+            ),
+            meta=meta
+        )
+
+    try:
+        for chunk in chunks:
+            for start in range(0, len(chunk), MESSAGE_SIZE):
+                yield ToolInvokeMessage(
+                    type=ToolInvokeMessage.MessageType.BLOB_CHUNK,
+                    message=ToolInvokeMessage.BlobChunkMessage(
+                        id=blob_id,
+                        sequence=sequence,
+                        total_length=total_length,
+                        blob=chunk[start:start + MESSAGE_SIZE],
+                        end=False
+                    ),
+                    meta=meta
+                )
+                sequence += 1
+    except Exception:
+        # 已经开始发送时中途失败：先发结束块关闭这个 blob，再把异常交给调用方提示，
+        # 否则 Dify 会一直等待这个 blob 的剩余部分，之后的文本消息也无法显示
+        if sequence:
+            yield end_message()
+        raise
+    yield end_message()
+
+
+def file_chunks(path: str, read_size: int = READ_SIZE) -> Iterator[bytes]:
+    """逐块读取本地文件"""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(read_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def download_to_file(url: str, path: str, headers: Optional[Dict[str, str]] = None) -> int:
+    """把视频下载到本地文件（断点续传），返回字节数"""
+    stream = VideoStream(url, headers)
+    total_length = stream.open()
+    with open(path, "wb") as f:
+        for chunk in stream.chunks():
+            f.write(chunk)
+    return total_length
+
+
+def deliver_file(path: str, filename: str) -> Iterator[ToolInvokeMessage]:
+    """以 BLOB_CHUNK 消息返回本地视频文件"""
+    yield from blob_chunk_messages(file_chunks(path), os.path.getsize(path), filename)
+
+
+def video_source(backend, task_id: str, video_url: str):
+    """选择下载地址：平台有下载接口时用接口（带鉴权），否则用任务结果中的 URL"""
+    content_url = backend.content_url(task_id) if backend is not None else None
+    if content_url:
+        return content_url, backend.headers
+    return video_url, {}
+
+
+def deliver_video(backend, task_id: str, video_url: str) -> Iterator[ToolInvokeMessage]:
+    """下载已完成任务的视频并以 BLOB_CHUNK 消息返回"""
+    url, headers = video_source(backend, task_id, video_url)
+    stream = VideoStream(url, headers)
+    total_length = stream.open()
+    filename = f"{task_id.replace(':', '_')}.mp4"
+    yield from blob_chunk_messages(stream.chunks(), total_length, filename, stream.content_type)
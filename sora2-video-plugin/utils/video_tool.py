@@ -0,0 +1,177 @@
+"""文生视频 / 图生视频共用的工具基类
+
+两个工具只有请求参数不同（图生视频多了参考图）。提交、按 task_id 恢复、结果缓存、
+状态事件到消息的转换和视频文件返回都在 VideoGenerationTool 中完成：
+子类实现 _build_params()，需要在提交前处理参数（上传参考图）时覆盖 _before_submit()。
+
+创建和轮询都由 asyncio 引擎（utils.async_engine）完成，同一个 task_id 在进程内只有一个轮询流，
+超时按历史完成耗时确定。
+"""
+
+from collections.abc import Generator
+from typing import Any, List
+from dify_plugin import Tool
+from dify_plugin.entities.tool import ToolInvokeMessage
+
+from utils.async_engine import COMPLETED, CREATED, FAILED, PREVIEW, PROGRESS, TIMEOUT, get_engine
+from utils.backends import PREVIEW_FIELDS, Backend, backend_for_task, backends_from_credentials, extract_preview
+from utils.character_cache import resolve_mentions
+from utils.result_cache import cache_key, get_result_cache
+from utils.task_registry import get_registry
+from utils.video_delivery import deliver_video
+
+
+class VideoGenerationTool(Tool):
+    """创建视频任务并等待结果的工具"""
+
+    def _build_params(self, tool_parameters: dict[str, Any]) -> dict:
+        """从工具参数构建统一的请求参数"""
+        raise NotImplementedError
+
+    def _before_submit(self, params: dict, tool_parameters: dict[str, Any], backends: List[Backend]) -> dict:
+        """提交新任务前（未命中缓存时）处理参数，backends 为所有已配置的平台"""
+        return params
+
+    def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
+        configured = backends_from_credentials(self.runtime.credentials)
+        if not configured:
+            yield self.create_text_message("API Key 未配置")
+            return
+
+        params = self._build_params(tool_parameters)
+        duration = params.get("duration", "10")
+
+        # 指定平台时只使用该平台，否则由路由器在已配置的平台中选择
+        backends = configured
+        preferred = tool_parameters.get("backend") or "auto"
+        if preferred != "auto":
+            backends = [backend for backend in backends if backend.name == preferred]
+            if not backends:
+                yield self.create_text_message(f"平台 {preferred} 的 API Key 未配置")
+                return
+
+        # 提示词中的 @名称 替换为调用方在任务可能提交到的平台上已登记角色的 @username
+        if params.get("prompt"):
+            params["prompt"] = resolve_mentions(params["prompt"], backends)
+
+        # blob 模式在完成后把视频文件也返回给 Dify（签名 URL 会过期）
+        deliver_file = tool_parameters.get("delivery") == "blob"
+        task_id = str(tool_parameters.get("task_id") or "").strip() or None
+        resumed = task_id is not None
+
+        if resumed:
+            # 传入 task_id 时恢复轮询已有任务，不重新提交；其他调用正在轮询同一任务时共享它的查询。
+            # 登记表只返回本账号创建的任务，其他任务用调用方自己的 Key 向平台查询
+            record = get_registry().get(task_id, backends)
+            backend = backend_for_task(backends, task_id, record["backend"] if record else None)
+            if record:
+                params = record["params"]
+                duration = params.get("duration", duration)
+                if record["status"] == "SUCCESS" and record["video_url"]:
+                    yield self.create_json_message({
+                        "task_id": task_id,
+                        "status": "completed",
+                        "video_url": record["video_url"],
+                        "duration": duration,
+                        "polls": 0
+                    })
+                    if deliver_file:
+                        yield from self._deliver_video(backend, task_id, record["video_url"])
+                    return
+            handle = get_engine().watch(backend, task_id, params=params)
+        else:
+            # 相同参数的结果直接从缓存返回，进行中的相同请求合并到同一个任务
+            use_cache = bool(tool_parameters.get("use_cache", True))
+            key = cache_key(params, namespace="|".join(backend.api_key for backend in backends))
+            cached = get_result_cache().get(key) if use_cache else None
+            if cached:
+                yield self.create_json_message({**cached, "status": "completed", "polls": 0, "cached": True})
+                if deliver_file:
+                    backend = backend_for_task(backends, cached["task_id"])
+                    yield from self._deliver_video(backend, cached["task_id"], cached["video_url"])
+                return
+
+            params = self._before_submit(params, tool_parameters, configured)
+
+            # 交给 asyncio 轮询引擎创建并轮询任务，这里只消费状态事件
+            # 配置了回调地址时由平台回调唤醒，不按进度轮询
+            backend = None
+            handle = get_engine().submit(
+                backends, params, share_key=key if use_cache else None,
+                callback_url=self.runtime.credentials.get("callback_url") or None
+            )
+
+        for event in handle.events():
+            event_type = event["type"]
+            task_id = event.get("task_id") or task_id
+
+            if event_type == CREATED:
+                backend = backend_for_task(backends, task_id, event.get("backend"))
+                # 返回初始状态
+                yield self.create_json_message({
+                    "task_id": task_id,
+                    "status": "pending",
+                    "eta_seconds": event.get("eta_seconds"),
+                    "message": "视频生成任务已提交"
+                })
+            elif event_type == PREVIEW:
+                # 视频完成前先返回缩略图和改写后的提示词，供界面预览和下游节点提前使用
+                yield self.create_json_message({
+                    "task_id": task_id,
+                    "status": "processing",
+                    **{field: event[field] for field in PREVIEW_FIELDS if field in event}
+                })
+            elif event_type == PROGRESS:
+                # 发送进度更新（引擎只在进度变化时发出）
+                yield self.create_json_message({
+                    "task_id": task_id,
+                    "status": "processing",
+                    "progress": event["progress"]
+                })
+            elif event_type == COMPLETED:
+                video_url = event["result"].get("video_url", "")
+                if not resumed:
+                    get_result_cache().put(key, {"task_id": task_id, "video_url": video_url, "duration": duration})
+                yield self.create_json_message({
+                    "task_id": task_id,
+                    "status": "completed",
+                    "video_url": video_url,
+                    "duration": duration,
+                    "polls": event["polls"],
+                    "timing": event.get("timing"),
+                    **extract_preview(event["result"])
+                })
+                if deliver_file and video_url:
+                    yield from self._deliver_video(backend, task_id, video_url)
+            elif event_type == FAILED:
+                yield self.create_json_message({
+                    "task_id": task_id,
+                    "status": "failed",
+                    "error": event["error"],
+                    "polls": event["polls"],
+                    "timing": event.get("timing")
+                })
+            elif event_type == TIMEOUT:
+                # 任务仍在服务端运行，带上 task_id 再次调用即可继续等待结果
+                yield self.create_json_message({
+                    "task_id": task_id,
+                    "status": "timeout",
+                    "error": event["error"],
+                    "message": "任务仍在生成中，传入 task_id 再次调用可继续查询",
+                    "polls": event["polls"],
+                    "timing": event.get("timing")
+                })
+            else:
+                # 请求异常：任务可能已经创建，带上 task_id（有的话）以便再次调用时恢复轮询
+                yield self.create_json_message({
+                    "task_id": task_id,
+                    "status": "failed",
+                    "error": event["error"]
+                })
+
+    def _deliver_video(self, backend, task_id: str, video_url: str) -> Generator[ToolInvokeMessage]:
+        """以文件形式返回视频，下载失败时只提示，不影响已返回的结果"""
+        try:
+            yield from deliver_video(backend, task_id, video_url)
+        except Exception as e:
+            yield self.create_text_message(f"视频文件下载失败，请使用 video_url 获取: {e}")